@@ -7,16 +7,75 @@ This module is an implementation of the `ACME protocol`_.
 """
 import sys
 
+from acme.magic_typing import Dict, Any  # pylint: disable=unused-import, no-name-in-module
+
 # This code exists to keep backwards compatibility with people using acme.jose
 # before it became the standalone josepy package.
 #
 # It is based on
 # https://github.com/requests/requests/blob/1278ecdf71a312dc2268f3bfc0aabfab3c006dcf/requests/packages.py
+#
+# Importing josepy pulls in cryptography and pyOpenSSL, which is slow, so
+# on Python versions supporting module level __getattr__ (PEP 562),
+# acme.jose is only aliased to josepy when it is first used.
+
+
+def _alias_josepy():
+    import josepy
+    for mod in list(sys.modules):
+        # This traversal is apparently necessary such that the identities are
+        # preserved (acme.jose.* is josepy.*)
+        if mod == 'josepy' or mod.startswith('josepy.'):
+            sys.modules['acme.' + mod.replace('josepy', 'jose', 1)] = sys.modules[mod]
+    return josepy
+
+
+def _is_jose_module(fullname):
+    return fullname == 'acme.jose' or fullname.startswith('acme.jose.')
+
+
+class _JoseImporter(object):
+    """Import hook resolving acme.jose and its submodules to josepy (PEP 451)."""
+
+    def __init__(self):
+        self._specs = {}  # type: Dict[str, Any]
+
+    def find_spec(self, fullname, path, target=None):  # pylint: disable=unused-argument
+        """Find the spec of an acme.jose module."""
+        if not _is_jose_module(fullname):
+            return None
+        # importlib.util is missing from the Python 2.7 stubs, but this is
+        # only used on Python 3.7+
+        import importlib.util  # type: ignore # pylint: disable=import-error,no-name-in-module
+        return importlib.util.spec_from_loader(  # type: ignore # pylint: disable=no-member
+            fullname, self)
+
+    def create_module(self, spec):
+        """Return the josepy module aliased as the module of spec."""
+        _alias_josepy()
+        if spec.name not in sys.modules:
+            raise ImportError('No module named {0}'.format(spec.name))
+        module = sys.modules[spec.name]
+        # The import system sets __spec__ on the returned module, keep
+        # the spec of the josepy module to restore it in exec_module
+        self._specs[spec.name] = module.__spec__
+        return module
+
+    def exec_module(self, module):
+        """Restore the spec of the josepy module, which is already executed."""
+        name = module.__spec__.name
+        if name in self._specs:
+            module.__spec__ = self._specs.pop(name)
+
 
-import josepy as jose
+if sys.version_info >= (3, 7):
+    sys.meta_path.append(_JoseImporter())
 
-for mod in list(sys.modules):
-    # This traversal is apparently necessary such that the identities are
-    # preserved (acme.jose.* is josepy.*)
-    if mod == 'josepy' or mod.startswith('josepy.'):
-        sys.modules['acme.' + mod.replace('josepy', 'jose', 1)] = sys.modules[mod]
+    def __getattr__(name):
+        if name == 'jose':
+            josepy = _alias_josepy()
+            globals()['jose'] = josepy
+            return josepy
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+else:  # pragma: no cover
+    jose = _alias_josepy()
@@ -6,6 +6,7 @@ from certbot import errors
 from certbot.plugins import common
 
 from certbot_apache import constants
+from certbot_apache import parser
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +18,7 @@ class AugeasConfigurator(common.Installer):
     :type config: :class:`~certbot.interfaces.IConfig`
 
     :ivar aug: Augeas object
-    :type aug: :class:`augeas.Augeas`
+    :type aug: :class:`~certbot_apache.parser.TrackedAugeas`
 
     :ivar str save_notes: Human-readable configuration change notes
     :ivar reverter: saves and reverts checkpoints
@@ -36,14 +37,15 @@ class AugeasConfigurator(common.Installer):
     def init_augeas(self):
         """ Initialize the actual Augeas instance """
         import augeas
-        self.aug = augeas.Augeas(
+        # Changes are tracked to invalidate the queries cached by the parser
+        self.aug = parser.TrackedAugeas(augeas.Augeas(
             # specify a directory to load our preferred lens from
             loadpath=constants.AUGEAS_LENS_DIR,
             # Do not save backup (we do it ourselves), do not load
             # anything by default
             flags=(augeas.Augeas.NONE |
                    augeas.Augeas.NO_MODL_AUTOLOAD |
-                   augeas.Augeas.ENABLE_SPAN))
+                   augeas.Augeas.ENABLE_SPAN)))
         # See if any temporary changes need to be recovered
         # This needs to occur before VirtualHost objects are setup...
         # because this will change the underlying configuration and potential
@@ -141,13 +143,15 @@ class AugeasConfigurator(common.Installer):
             be quickly reversed in the future (ie. challenges)
 
         """
-        save_files = self.unsaved_files()
+        # Augeas is not initialized if the configuration was never edited
+        save_files = self.unsaved_files() if self.aug is not None else set()
         if save_files:
             self.add_to_checkpoint(save_files,
                                    self.save_notes, temporary=temporary)
 
         self.save_notes = ""
-        self.aug.save()
+        if self.aug is not None:
+            self.aug.save()
 
         # Force reload if files were modified
         # This is needed to recalculate augeas directive span
@@ -183,7 +187,7 @@ class AugeasConfigurator(common.Installer):
         """
         super(AugeasConfigurator, self).recovery_routine()
         # Need to reload configuration after these changes take effect
-        self.aug.load()
+        self._reload_augeas()
 
     def revert_challenge_config(self):
         """Used to cleanup challenge configurations.
@@ -192,7 +196,7 @@ class AugeasConfigurator(common.Installer):
 
         """
         self.revert_temporary_config()
-        self.aug.load()
+        self._reload_augeas()
 
     def rollback_checkpoints(self, rollback=1):
         """Rollback saved checkpoints.
@@ -204,4 +208,9 @@ class AugeasConfigurator(common.Installer):
 
         """
         super(AugeasConfigurator, self).rollback_checkpoints(rollback)
-        self.aug.load()
+        self._reload_augeas()
+
+    def _reload_augeas(self):
+        """Reload the configuration files, if Augeas is initialized."""
+        if self.aug is not None:
+            self.aug.load()
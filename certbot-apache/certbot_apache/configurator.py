@@ -1,5 +1,6 @@
 """Apache Configuration based off of Augeas Configurator."""
 # pylint: disable=too-many-lines
+import contextlib
 import copy
 import fnmatch
 import logging
@@ -14,8 +15,9 @@ import zope.component
 import zope.interface
 
 from acme import challenges
-from acme.magic_typing import Any, DefaultDict, Dict, List, Set, Union  # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import Any, DefaultDict, Dict, List, Optional, Set, Union  # pylint: disable=unused-import, no-name-in-module
 
+from certbot import error_handler
 from certbot import errors
 from certbot import interfaces
 from certbot import util
@@ -30,6 +32,7 @@ from certbot_apache import augeas_configurator
 from certbot_apache import constants
 from certbot_apache import display_ops
 from certbot_apache import http_01
+from certbot_apache import native_parser
 from certbot_apache import obj
 from certbot_apache import parser
 from certbot_apache import tls_sni_01
@@ -177,6 +180,10 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
                  "(Only Ubuntu/Debian currently)")
         add("ctl", default=DEFAULTS["ctl"],
             help="Full path to Apache control script")
+        add("native-parser", action="store_true", default=False,
+            help="Read the Apache configuration with a faster parser, "
+                 "written without Augeas, until it has to be edited. "
+                 "(experimental)")
         util.add_deprecated_argument(
             add, argument_name="init-script", nargs=1)
 
@@ -207,6 +214,12 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         self.parser = None
         self.version = version
         self.vhosts = None
+        # Index of self.vhosts, built when first needed
+        self._vhost_index = None  # type: Optional[obj.VirtualHostIndex]
+        # Whether changes are grouped in a transaction, and whether Apache
+        # has to be reloaded when it ends
+        self._in_transaction = False
+        self._reload_pending = False
         self.options = copy.deepcopy(self.OS_DEFAULTS)
         self._enhance_func = {"redirect": self._enable_redirect,
                               "ensure-http-header": self._set_http_header,
@@ -233,11 +246,12 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         :raises .errors.PluginError: If there is any other error
 
         """
-        # Perform the actual Augeas initialization to be able to react
-        try:
-            self.init_augeas()
-        except ImportError:
-            raise errors.NoInstallationError("Problem in Augeas installation")
+        if self.conf("native-parser"):
+            # Augeas is initialized once the configuration has to be edited
+            self.recovery_routine()
+        else:
+            # Perform the actual Augeas initialization to be able to react
+            self._init_augeas()
 
         self._prepare_options()
 
@@ -256,6 +270,41 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             raise errors.NotSupportedError(
                 "Apache Version %s not supported.", str(self.version))
 
+        if self.conf("native-parser"):
+            self.vhosts = self.get_native_parser().get_virtual_hosts()
+        else:
+            self._prepare_augeas()
+
+        self.install_ssl_options_conf(self.mod_ssl_conf,
+                                      self.updated_mod_ssl_conf_digest)
+
+        # Prevent two Apache plugins from modifying a config at once
+        try:
+            util.lock_dir_until_exit(self.option("server_root"))
+        except (OSError, errors.LockError):
+            logger.debug("Encountered error:", exc_info=True)
+            raise errors.PluginError(
+                "Unable to lock %s", self.option("server_root"))
+        self._prepared = True
+
+    def _init_augeas(self):
+        """Initialize Augeas.
+
+        :raises .errors.NoInstallationError: If Augeas cannot be imported
+
+        """
+        try:
+            self.init_augeas()
+        except ImportError:
+            raise errors.NoInstallationError("Problem in Augeas installation")
+
+    def _prepare_augeas(self):
+        """Parse the configuration and find the virtual hosts with Augeas.
+
+        :raises .errors.NotSupportedError: If Augeas is too old
+        :raises .errors.PluginError: If Augeas cannot parse the configuration
+
+        """
         if not self._check_aug_version():
             raise errors.NotSupportedError(
                 "Apache plugin support requires libaugeas0 and augeas-lenses "
@@ -269,18 +318,21 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         # Get all of the available vhosts
         self.vhosts = self.get_virtual_hosts()
+        self._vhost_index = None
 
-        self.install_ssl_options_conf(self.mod_ssl_conf,
-                                      self.updated_mod_ssl_conf_digest)
+    def _ensure_augeas(self):
+        """Load the configuration with Augeas before it is edited.
 
-        # Prevent two Apache plugins from modifying a config at once
-        try:
-            util.lock_dir_until_exit(self.option("server_root"))
-        except (OSError, errors.LockError):
-            logger.debug("Encountered error:", exc_info=True)
-            raise errors.PluginError(
-                "Unable to lock %s", self.option("server_root"))
-        self._prepared = True
+        With --apache-native-parser, the configuration is only read by
+        :class:`~certbot_apache.native_parser.NativeApacheParser` in
+        prepare(), and the virtual hosts found by Augeas replace the ones
+        found by the native parser here.
+
+        """
+        if self.aug is None and self._prepared and self.conf("native-parser"):
+            logger.debug("Loading the Apache configuration with Augeas")
+            self._init_augeas()
+            self._prepare_augeas()
 
     def _verify_exe_availability(self, exe):
         """Checks availability of Apache executable"""
@@ -311,6 +363,12 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             self.aug, self.option("server_root"), self.conf("vhost-root"),
             self.version, configurator=self)
 
+    def get_native_parser(self):
+        """Initializes the NativeApacheParser"""
+        return native_parser.NativeApacheParser(
+            self.option("server_root"), self.conf("vhost-root"),
+            self.option("vhost_files"))
+
     def _wildcard_domain(self, domain):
         """
         Checks if domain is a wildcard domain
@@ -359,6 +417,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         :returns: List of VirtualHosts or None
         :rtype: `list` of :class:`~certbot_apache.obj.VirtualHost`
         """
+        self._ensure_augeas()
 
         if self._wildcard_domain(domain):
             if domain in self._wildcard_vhosts:
@@ -378,7 +437,10 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         # Collect all vhosts that match the name
         matched = set()
-        for vhost in self.vhosts:
+        vhosts = self._get_vhost_index().find_wildcard(domain)
+        if vhosts is None:
+            vhosts = self.vhosts
+        for vhost in vhosts:
             for name in vhost.get_names():
                 if self._in_wildcard_scope(name, domain):
                     matched.add(vhost)
@@ -540,6 +602,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         :raises .errors.PluginError: If no vhost is available or chosen
 
         """
+        self._ensure_augeas()
         # Allows for domain names to be associated with a virtual host
         if target_name in self.assoc:
             return self.assoc[target_name]
@@ -657,7 +720,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if vhosts is None:
             vhosts = self.vhosts
 
-        for vhost in vhosts:
+        for vhost in self._vhost_candidates(target_name, vhosts):
             if vhost.modmacro is True:
                 continue
             names = vhost.get_names()
@@ -691,6 +754,53 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         return best_candidate
 
+    def _vhost_candidates(self, target_name, vhosts):
+        """Finds the vhosts which may get points in `_find_best_vhost`.
+
+        Only the vhosts with a name or address matching target_name can
+        get points, which are looked up in the vhost index.
+
+        :param str target_name: domain handled by the desired vhost
+        :param vhosts: vhosts to consider
+        :type vhosts: `collections.Iterable` of :class:`~certbot_apache.obj.VirtualHost`
+
+        :returns: the candidate vhosts
+        :rtype: list
+
+        """
+        index = self._get_vhost_index()
+        candidates = index.find(target_name)
+        if vhosts is not self.vhosts:
+            if index.contains(vhosts):
+                allowed = set(id(vhost) for vhost in vhosts)
+                candidates = [vhost for vhost in candidates
+                              if id(vhost) in allowed]
+            else:
+                candidates = vhosts
+        return candidates
+
+    def _get_vhost_index(self):
+        """Returns the index of self.vhosts, rebuilt if the list changed.
+
+        :rtype: :class:`~certbot_apache.obj.VirtualHostIndex`
+
+        """
+        if self._vhost_index is None or not self._vhost_index.is_current(self.vhosts):
+            self._vhost_index = obj.VirtualHostIndex(
+                self.vhosts if self.vhosts is not None else [])
+        return self._vhost_index
+
+    def _add_vhost(self, vhost):
+        """Adds a new vhost to self.vhosts and its index.
+
+        :param vhost: the new vhost
+        :type vhost: :class:`~certbot_apache.obj.VirtualHost`
+
+        """
+        self.vhosts.append(vhost)
+        if self._vhost_index is not None:
+            self._vhost_index.add(vhost)
+
     def _non_default_vhosts(self, vhosts):
         """Return all non _default_ only vhosts."""
         return [vh for vh in vhosts if not all(
@@ -793,6 +903,9 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if not host.modmacro:
             host.name = servername
 
+        if self._vhost_index is not None:
+            self._vhost_index.update_names(host)
+
     def _create_vhost(self, path):
         """Used by get_virtual_hosts to create vhost objects
 
@@ -849,6 +962,9 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         file_paths = {}  # type: Dict[str, str]
         internal_paths = defaultdict(set)  # type: DefaultDict[str, Set[str]]
         vhs = []
+        # vhosts by file path, and ids of the vhosts removed from vhs
+        filep_vhs = defaultdict(list)  # type: DefaultDict[str, List[obj.VirtualHost]]
+        removed = set()  # type: Set[int]
         # Make a list of parser paths because the parser_paths
         # dictionary may be modified during the loop.
         for vhost_path in list(self.parser.parser_paths):
@@ -866,29 +982,26 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
                 if realpath not in file_paths:
                     file_paths[realpath] = new_vhost.filep
                     internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
                 elif (realpath == new_vhost.filep and
                       realpath != file_paths[realpath]):
                     # Prefer "real" vhost paths instead of symlinked ones
                     # ex: sites-enabled/vh.conf -> sites-available/vh.conf
 
                     # remove old (most likely) symlinked one
-                    new_vhs = []
-                    for v in vhs:
-                        if v.filep == file_paths[realpath]:
-                            internal_paths[realpath].remove(
-                                apache_util.get_internal_aug_path(v.path))
-                        else:
-                            new_vhs.append(v)
-                    vhs = new_vhs
+                    for v in filep_vhs.pop(file_paths[realpath], []):
+                        internal_paths[realpath].remove(
+                            apache_util.get_internal_aug_path(v.path))
+                        removed.add(id(v))
 
                     file_paths[realpath] = realpath
                     internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
                 elif internal_path not in internal_paths[realpath]:
                     internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
-        return vhs
+                else:
+                    continue
+                vhs.append(new_vhost)
+                filep_vhs[new_vhost.filep].append(new_vhost)
+        return [v for v in vhs if id(v) not in removed]
 
     def is_name_vhost(self, target_addr):
         """Returns if vhost is a name based vhost
@@ -1165,7 +1278,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         ssl_vhost = self._create_vhost(vh_p)
         ssl_vhost.ancestor = nonssl_vhost
 
-        self.vhosts.append(ssl_vhost)
+        self._add_vhost(ssl_vhost)
 
         # NOTE: Searches through Augeas seem to ruin changes to directives
         #       The configuration must also be saved before being searched
@@ -2023,7 +2136,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         self.aug.load()
         # Make a new vhost data structure and add it to the lists
         new_vhost = self._create_vhost(parser.get_aug_path(self._escape(redirect_filepath)))
-        self.vhosts.append(new_vhost)
+        self._add_vhost(new_vhost)
         self._enhanced_vhosts["redirect"].add(new_vhost)
 
         # Finally create documentation for the change
@@ -2177,13 +2290,111 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             "run Certbot again.")
         raise errors.MisconfigurationError(mod_message.format(mod_name))
 
+    def deploy_certs(self, deployments, enhancements=None):
+        """Deploys certificates and enhancements for many domains at once.
+
+        The certificates are deployed for their domains, then every
+        enhancement is enabled for every domain, in one :meth:`transaction`.
+
+        :param list deployments: tuples of a list of domains and the
+            ``cert_path``, ``key_path``, ``chain_path`` and ``fullchain_path``
+            arguments of `deploy_cert` for the certificate of these domains
+        :param list enhancements: enhancements to enable, as tuples of an
+            enhancement name and its options
+
+        :raises .errors.PluginError: If a certificate or an enhancement
+            cannot be deployed, the configuration being reverted.
+
+        """
+        with self.transaction("Deployed ACME Certificates"):
+            for domains, cert_path, key_path, chain_path, fullchain_path in deployments:
+                for domain in domains:
+                    self.deploy_cert(domain, cert_path, key_path,
+                                     chain_path, fullchain_path)
+                    # The new SSL vhosts have to be saved before looking for
+                    # the vhosts of the next domain
+                    self.save()
+            for enhancement, options in enhancements or []:
+                for domain in common.deployed_domains(deployments):
+                    try:
+                        self.enhance(domain, enhancement, options)
+                    except errors.PluginEnhancementAlreadyPresent:
+                        logger.warning("Enhancement %s was already set for %s.",
+                                       enhancement, domain)
+            self.restart()
+
+    @contextlib.contextmanager
+    def transaction(self, title):
+        """Groups configuration changes, tested and applied at once.
+
+        Within the transaction, saving the configuration with a title does
+        not finalize a checkpoint, and restarting Apache is delayed. When the
+        transaction ends, the changes are saved as a single checkpoint, and,
+        if a restart was requested, the configuration is tested and Apache
+        is reloaded once. Nested transactions are part of the outer one.
+
+        :param str title: Title of the checkpoint of the transaction
+
+        :raises .errors.MisconfigurationError: If the configuration test or
+            the reload fails, the changes of the transaction being reverted.
+
+        """
+        if self._in_transaction:
+            yield
+            return
+        self._in_transaction = True
+        self._reload_pending = False
+        with error_handler.ErrorHandler(self._revert_transaction):
+            yield
+            self.save()
+            if self._reload_pending:
+                self.config_test()
+        self._in_transaction = False
+        self.save(title)
+        if self._reload_pending:
+            with error_handler.ErrorHandler(self._rollback_transaction):
+                self._reload()
+
+    def _revert_transaction(self):
+        """Reverts the changes of a failed transaction."""
+        self._in_transaction = False
+        logger.info("Reverting the changes made to the Apache configuration.")
+        self.recovery_routine()
+
+    def _rollback_transaction(self):
+        """Rolls back the checkpoint of a transaction Apache failed to load."""
+        logger.info("Rolling back the changes made to the Apache configuration.")
+        self.rollback_checkpoints()
+        self._reload()
+
+    def save(self, title=None, temporary=False):
+        """Saves all changes to the configuration files.
+
+        Within a :meth:`transaction`, the checkpoint is only finalized when
+        the transaction ends.
+
+        :param str title: The title of the save
+        :param bool temporary: Indicates whether the changes made will
+            be quickly reversed in the future (ie. challenges)
+
+        """
+        if self._in_transaction and not temporary:
+            title = None
+        super(ApacheConfigurator, self).save(title, temporary)
+
     def restart(self):
         """Runs a config test and reloads the Apache server.
 
+        Within a :meth:`transaction`, this is done when the transaction
+        ends.
+
         :raises .errors.MisconfigurationError: If either the config test
             or reload fails.
 
         """
+        if self._in_transaction:
+            self._reload_pending = True
+            return
         self.config_test()
         self._reload()
 
@@ -2254,11 +2465,15 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
     def more_info(self):
         """Human-readable string to help understand the module"""
+        if self.parser is not None:
+            root = self.parser.loc["root"]
+        else:
+            root = self.option("server_root")
         return (
             "Configures Apache to authenticate and install HTTPS.{0}"
             "Server root: {root}{0}"
             "Version: {version}".format(
-                os.linesep, root=self.parser.loc["root"],
+                os.linesep, root=root,
                 version=".".join(str(i) for i in self.version))
         )
 
@@ -2277,6 +2492,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         outstanding challenges will have to be designed better.
 
         """
+        self._ensure_augeas()
         self._chall_out.update(achalls)
         responses = [None] * len(achalls)
         http_doer = http_01.ApacheHttp01(self)
@@ -2425,6 +2641,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if not self._autohsts:
             # No AutoHSTS enabled for any domain
             return
+        self._ensure_augeas()
         curtime = time.time()
         save_and_restart = False
         for id_str, config in list(self._autohsts.items()):
@@ -2470,6 +2687,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if not self._autohsts:
             # No autohsts enabled for any vhost
             return
+        self._ensure_augeas()
 
         vhosts = []
         affected_ids = []
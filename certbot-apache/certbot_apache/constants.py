@@ -21,6 +21,10 @@ ALL_SSL_OPTIONS_HASHES = [
 ]
 """SHA256 hashes of the contents of previous versions of all versions of MOD_SSL_CONF_SRC"""
 
+RUNTIME_CFG_CACHE = "apache-runtime-cfg.json"
+"""Name of the cache of the httpd runtime configuration dumps, as saved in
+`IConfig.work_dir`."""
+
 AUGEAS_LENS_DIR = pkg_resources.resource_filename(
     "certbot_apache", "augeas_lens")
 """Path to the Augeas lens directory"""
@@ -0,0 +1,415 @@
+"""Read-only parser of the Apache configuration, written without Augeas.
+
+The configuration files are read line by line, following the Include and
+IncludeOptional directives, and only the information needed to select
+virtual hosts is kept. Editing the configuration still requires Augeas,
+see :class:`certbot_apache.parser.ApacheParser`.
+
+"""
+import collections
+import glob
+import logging
+import os
+import re
+
+import six
+
+from acme.magic_typing import DefaultDict, Dict, List, Set, Tuple  # pylint: disable=unused-import, no-name-in-module
+
+from certbot_apache import obj
+from certbot_apache import parser
+
+logger = logging.getLogger(__name__)
+
+Directive = collections.namedtuple("Directive", "name args filep")
+"""Directive of the Apache configuration, with its arguments and file."""
+
+_ARG_REGEX = re.compile(r'"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|(\S+)')
+_VAR_REGEX = re.compile(r"\$\{([^ \}]*)\}")
+_INCLUDES = frozenset(["include", "includeoptional"])
+
+# Directives interpreted while reading the configuration
+_DEFINE = "define"
+_UNDEFINE = "undefine"
+_LOADMODULE = "loadmodule"
+
+
+class _Section(object):
+    """Section of the configuration being read.
+
+    :ivar str name: Lowercase name of the section
+    :ivar bool active: Whether the directives of the section are loaded
+    :ivar vhost: Virtual host the section is part of
+    :type vhost: :class:`_VirtualHostBuilder` or `None`
+    :ivar bool macro: Whether the section is part of a mod_macro definition
+
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, name, active, vhost, macro):
+        self.name = name
+        self.active = active
+        self.vhost = vhost
+        self.macro = macro
+
+
+class _VirtualHostBuilder(object):
+    """Virtual host being read.
+
+    :ivar str filep: Path of the file defining the virtual host
+    :ivar set addrs: :class:`~certbot_apache.obj.Addr` of the virtual host
+    :ivar bool enabled: Whether the file is included in the configuration
+    :ivar bool macro: Whether the virtual host is part of a macro
+    :ivar list servernames: Arguments of the ServerName directives
+    :ivar list aliases: Arguments of the ServerAlias directives
+    :ivar bool ssl: Whether SSLEngine is turned on
+
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, filep, addrs, enabled, macro):
+        self.filep = filep
+        self.addrs = addrs
+        self.enabled = enabled
+        self.macro = macro
+        self.servernames = []  # type: List[str]
+        self.aliases = []  # type: List[str]
+        self.ssl = False
+
+    def build(self):
+        """Create the virtual host.
+
+        Names are collected the way
+        :meth:`certbot_apache.configurator.ApacheConfigurator.get_virtual_hosts`
+        does, so both parsers find the same virtual hosts.
+
+        :rtype: :class:`~certbot_apache.obj.VirtualHost`
+
+        """
+        is_ssl = self.ssl or any(addr.get_port() == "443" for addr in self.addrs)
+        vhost = obj.VirtualHost(self.filep, None, self.addrs, is_ssl,
+                                self.enabled, modmacro=self.macro)
+        if not self.macro:
+            vhost.aliases.update(self.aliases)
+            if self.servernames:
+                # Each ServerName overwrites the previous one
+                vhost.name = self.servernames[-1]
+        return vhost
+
+
+class NativeApacheParser(object):
+    """Reads the Apache configuration without Augeas.
+
+    Include and IncludeOptional are followed relative to the server root,
+    Define and UnDefine set the variables substituted in the arguments of
+    the directives, and LoadModule enables the modules checked by IfModule.
+    As with Augeas, virtual hosts are found regardless of the IfModule and
+    IfDefine sections enclosing them.
+
+    Variables defined on the httpd command line are not known to this
+    parser, unless they are given as ``variables``.
+
+    :ivar str root: Normalized absolute path to the server root
+        directory. Without trailing slash.
+    :ivar str config_root: Path of the main configuration file
+    :ivar set modules: All module names that are enabled.
+    :ivar dict variables: Variables defined by Define directives
+    :ivar set included: Paths of the files included by the configuration
+
+    """
+    def __init__(self, root, vhost_root=None, vhost_files="*",
+                 variables=None, modules=None):
+        """Read the configuration.
+
+        :param str root: Server root directory
+        :param str vhost_root: Directory of the virtual host files to read,
+            even if they are not included by the configuration
+        :param str vhost_files: Pattern of the files in vhost_root
+        :param dict variables: Variables already defined
+        :param set modules: Modules already enabled
+
+        """
+        self.root = os.path.abspath(root)
+        self.config_root = parser.find_config_root(self.root)
+        self.modules = set(modules or ())  # type: Set[str]
+        self.variables = dict(variables or {})  # type: Dict[str, str]
+        self.included = set()  # type: Set[str]
+        self._directives = collections.defaultdict(
+            list)  # type: DefaultDict[str, List[Directive]]
+        # Virtual hosts by real path of their file and position in the file
+        self._vhosts = collections.OrderedDict()  # type: Dict[Tuple[str, int], obj.VirtualHost]
+        self._vhost_counts = collections.defaultdict(int)  # type: DefaultDict[str, int]
+        self._reading = []  # type: List[str]
+
+        self._read_file(self.config_root, _Section("", True, None, False), True)
+        if vhost_root:
+            pattern = os.path.join(os.path.abspath(vhost_root), vhost_files)
+            for filep in self._expand(pattern):
+                if filep not in self.included:
+                    self._read_file(filep, _Section("", True, None, False), False)
+
+    def find_dir(self, directive):
+        """Find the loaded occurrences of a directive.
+
+        Directives within IfModule and IfDefine sections whose condition is
+        not met are not loaded.
+
+        :param str directive: Directive name, case insensitive
+
+        :returns: occurrences of the directive, in configuration order
+        :rtype: `list` of :class:`Directive`
+
+        """
+        return list(self._directives.get(directive.lower(), ()))
+
+    def get_virtual_hosts(self):
+        """Virtual hosts of the configuration.
+
+        The virtual hosts of a file reached through a symbolic link are only
+        returned once, preferably with the real path of the file.
+
+        :returns: virtual hosts, with no Augeas path
+        :rtype: `list` of :class:`~certbot_apache.obj.VirtualHost`
+
+        """
+        return list(self._vhosts.values())
+
+    def _read_file(self, filep, parent, enabled):
+        """Read a configuration file.
+
+        :param str filep: Path of the file
+        :param parent: Section the file is included in
+        :type parent: :class:`_Section`
+        :param bool enabled: Whether the file is included by the configuration
+
+        """
+        realpath = os.path.realpath(filep)
+        if realpath in self._reading:
+            logger.warning("Apache configuration file %s includes itself, "
+                           "skipping", filep)
+            return
+        if enabled:
+            self.included.add(filep)
+        self._reading.append(realpath)
+        sections = [parent]
+        try:
+            for line in _logical_lines(filep):
+                self._read_line(line, filep, sections, enabled)
+        except (IOError, OSError):
+            logger.debug("Unable to read %s", filep, exc_info=True)
+        finally:
+            self._reading.pop()
+
+    def _read_line(self, line, filep, sections, enabled):
+        """Interpret a line of a configuration file.
+
+        :param str line: Line, without comment and continuation
+        :param str filep: Path of the file
+        :param list sections: Stack of the sections being read
+        :param bool enabled: Whether the file is included by the configuration
+
+        """
+        current = sections[-1]
+        if line.startswith("</"):
+            if len(sections) > 1:
+                closed = sections.pop()
+                if closed.vhost is not None and closed.name == "virtualhost":
+                    self._add_vhost(closed.vhost)
+            return
+        if line.startswith("<"):
+            name, args = self._split(line[1:].rstrip(">"))
+            self._open_section(name.lower(), args, filep, sections, enabled)
+            return
+
+        name, args = self._split(line)
+        name = name.lower()
+        if current.vhost is not None and args:
+            _add_vhost_directive(current.vhost, name, args)
+        if not current.active:
+            return
+
+        self._directives[name].append(Directive(name, args, filep))
+        if name in _INCLUDES and args:
+            for included in self._expand(args[0], name == "includeoptional"):
+                self._read_file(included, current, enabled)
+        elif name == _DEFINE and args:
+            self.variables[args[0]] = args[1] if len(args) > 1 else ""
+        elif name == _UNDEFINE and args:
+            self.variables.pop(args[0], None)
+        elif name == _LOADMODULE and len(args) > 1:
+            self.modules.add(args[0])
+            self.modules.add(os.path.basename(args[1])[:-2] + "c")
+
+    def _open_section(self, name, args, filep, sections, enabled):
+        # pylint: disable=too-many-arguments
+        """Open a configuration section.
+
+        :param str name: Lowercase name of the section
+        :param list args: Arguments of the section
+        :param str filep: Path of the file
+        :param list sections: Stack of the sections being read
+        :param bool enabled: Whether the file is included by the configuration
+
+        """
+        parent = sections[-1]
+        vhost = parent.vhost
+        macro = parent.macro or name == "macro"
+        if name == "virtualhost" and vhost is None:
+            vhost = _VirtualHostBuilder(
+                filep, set(obj.Addr.fromstring(arg) for arg in args),
+                enabled, macro)
+        sections.append(_Section(
+            name, parent.active and self._check_condition(name, args),
+            vhost, macro))
+
+    def _check_condition(self, name, args):
+        """Check the condition of an IfModule or IfDefine section.
+
+        :param str name: Lowercase name of the section
+        :param list args: Arguments of the section
+
+        :returns: False if the section is not loaded
+        :rtype: bool
+
+        """
+        if name == "ifmodule":
+            defined = self.modules
+        elif name == "ifdefine":
+            defined = self.variables
+        else:
+            return True
+        if not args:
+            return True
+        expression = args[0]
+        if expression.startswith("!"):
+            return expression[1:] not in defined
+        return expression in defined
+
+    def _add_vhost(self, builder):
+        """Add a virtual host once it is read.
+
+        :param builder: Virtual host read
+        :type builder: :class:`_VirtualHostBuilder`
+
+        """
+        realpath = os.path.realpath(builder.filep)
+        position = self._vhost_counts[builder.filep]
+        self._vhost_counts[builder.filep] += 1
+        key = (realpath, position)
+        existing = self._vhosts.get(key)
+        if existing is None:
+            self._vhosts[key] = builder.build()
+        elif builder.filep == realpath and existing.filep != realpath:
+            # Prefer "real" vhost paths instead of symlinked ones
+            # ex: sites-enabled/vh.conf -> sites-available/vh.conf
+            builder.enabled = builder.enabled or existing.enabled
+            self._vhosts[key] = builder.build()
+
+    def _split(self, line):
+        """Split a line into directive name and arguments.
+
+        Variables are substituted in the arguments.
+
+        :param str line: Line of a configuration file
+
+        :returns: directive name and arguments
+        :rtype: tuple
+
+        """
+        args = []
+        for match in _ARG_REGEX.finditer(line):
+            quoted = match.group(1)
+            if quoted is None:
+                quoted = match.group(2)
+            if quoted is None:
+                arg = match.group(3)
+            else:
+                arg = re.sub(r"\\(.)", r"\1", quoted)
+            args.append(_VAR_REGEX.sub(self._substitute, arg))
+        if not args:
+            return "", []
+        return args[0], args[1:]
+
+    def _substitute(self, match):
+        """Value of the variable of a ${VAR} match.
+
+        As httpd does, the environment is used for variables that are not
+        defined, and unknown variables are left unchanged.
+
+        """
+        name = match.group(1)
+        if name in self.variables:
+            return self.variables[name]
+        return os.environ.get(name, match.group(0))
+
+    def _expand(self, path, optional=True):
+        """Files included by an Include path.
+
+        :param str path: Path, possibly relative to the server root, a
+            directory or a wildcard pattern
+        :param bool optional: Whether a missing file is expected
+
+        :returns: paths of the included files, sorted
+        :rtype: `list` of `str`
+
+        """
+        if not os.path.isabs(path):
+            path = os.path.join(self.root, path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "*")
+        matches = sorted(glob.glob(path))
+        if not matches and not optional:
+            logger.debug("No file matches the Include path %s", path)
+        files = []  # type: List[str]
+        for match in matches:
+            if os.path.isdir(match):
+                files.extend(self._expand(match))
+            else:
+                files.append(match)
+        return files
+
+
+def _add_vhost_directive(vhost, name, args):
+    """Record a directive read inside a virtual host.
+
+    :param vhost: Virtual host being read
+    :type vhost: :class:`_VirtualHostBuilder`
+    :param str name: Lowercase name of the directive
+    :param list args: Arguments of the directive, not empty
+
+    """
+    if name == "servername":
+        vhost.servernames.append(args[0])
+    elif name == "serveralias":
+        vhost.aliases.extend(args)
+    elif name == "sslengine" and args[0].lower() == "on":
+        vhost.ssl = True
+
+
+def _logical_lines(filep):
+    """Lines of a configuration file, without comments.
+
+    Lines ending with a backslash are joined with the next one.
+
+    :param str filep: Path of the file
+
+    :returns: stripped lines
+    :rtype: `iterator` of `str`
+
+    """
+    pending = ""
+    with open(filep, "rb") as config_file:
+        for raw in config_file:
+            if six.PY2:
+                line = raw
+            else:
+                line = raw.decode("utf-8", "replace")
+            line = line.rstrip("\r\n")
+            if line.endswith("\\"):
+                pending += line[:-1]
+                continue
+            line = (pending + line).strip()
+            pending = ""
+            if line and not line.startswith("#"):
+                yield line
+    pending = pending.strip()
+    if pending and not pending.startswith("#"):
+        yield pending
@@ -1,7 +1,9 @@
 """Module contains classes used by the Apache Configurator."""
+import collections
+import fnmatch
 import re
 
-from acme.magic_typing import Set # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import DefaultDict, Dict, List, Set, Tuple # pylint: disable=unused-import, no-name-in-module
 from certbot.plugins import common
 
 
@@ -269,3 +271,132 @@ class VirtualHost(object):  # pylint: disable=too-few-public-methods
                 return False
 
         return True
+
+
+class VirtualHostIndex(object):
+    """Index of virtual hosts by name, wildcard name and address.
+
+    Lookups return the virtual hosts which may match a domain, in the order
+    of the indexed list, so that callers only have to rank these. The index
+    is kept up to date with `add` and `update_names`; virtual hosts added
+    to the list by other means are detected with `is_current`.
+
+    :ivar list vhosts: indexed list of
+        :class:`~certbot_apache.obj.VirtualHost`
+
+    """
+    def __init__(self, vhosts):
+        self.vhosts = vhosts
+        self._size = 0
+        # id of each vhost -> position in vhosts
+        self._positions = {}  # type: Dict[int, int]
+        self._names = collections.defaultdict(list)  # type: DefaultDict[str, List[VirtualHost]]
+        # Names below each parent domain, for wildcard domains
+        self._parents = collections.defaultdict(list)  # type: DefaultDict[str, List[VirtualHost]]
+        self._wildcards = []  # type: List[Tuple[str, VirtualHost]]
+        self._addrs = collections.defaultdict(list)  # type: DefaultDict[str, List[VirtualHost]]
+        for vhost in vhosts:
+            self._index(vhost)
+
+    def is_current(self, vhosts):
+        """Is the index built from vhosts, in its current state?
+
+        :param list vhosts: list of virtual hosts
+
+        :rtype: bool
+
+        """
+        return vhosts is self.vhosts and len(vhosts) == self._size
+
+    def add(self, vhost):
+        """Index a virtual host appended to the indexed list.
+
+        :param vhost: the new virtual host
+        :type vhost: :class:`~certbot_apache.obj.VirtualHost`
+
+        """
+        if self._size == len(self.vhosts) - 1 and self.vhosts[-1] is vhost:
+            self._index(vhost)
+
+    def update_names(self, vhost):
+        """Index the current names of an indexed virtual host.
+
+        Names removed from the virtual host are left in the index, which
+        only makes lookups return it as a candidate.
+
+        :param vhost: indexed virtual host
+        :type vhost: :class:`~certbot_apache.obj.VirtualHost`
+
+        """
+        if id(vhost) in self._positions:
+            self._index_names(vhost)
+
+    def _index(self, vhost):
+        self._positions[id(vhost)] = self._size
+        self._size += 1
+        self._index_names(vhost)
+        for addr in vhost.addrs:
+            self._addrs[addr.get_addr()].append(vhost)
+
+    def _index_names(self, vhost):
+        for name in vhost.get_names():
+            name = name.lower()
+            _append_new(self._names[name], vhost)
+            _append_new(self._parents[name.partition(".")[2]], vhost)
+            if ("*" in name or "?" in name) and not any(
+                    wc_name == name and wc_vhost is vhost
+                    for wc_name, wc_vhost in self._wildcards):
+                self._wildcards.append((name, vhost))
+
+    def _sorted(self, vhosts):
+        """Unique vhosts, in the order of the indexed list."""
+        unique = dict((id(vhost), vhost) for vhost in vhosts)
+        return sorted(unique.values(), key=lambda vh: self._positions[id(vh)])
+
+    def find(self, target_name):
+        """Virtual hosts which may match a domain.
+
+        :param str target_name: domain name
+
+        :returns: virtual hosts with target_name as name, with a wildcard
+            name matching it, or with it as address
+        :rtype: list
+
+        """
+        target = target_name.lower()
+        found = list(self._names.get(target, []))
+        found.extend(vhost for name, vhost in self._wildcards
+                     if "[" not in name and fnmatch.fnmatch(target, name))
+        found.extend(self._addrs.get(target_name, []))
+        return self._sorted(found)
+
+    def find_wildcard(self, domain):
+        """Virtual hosts which may have a name covered by a wildcard domain.
+
+        :param str domain: wildcard domain, e.g. ``*.example.com``
+
+        :returns: virtual hosts with a name in the parent domain of
+            domain, or `None` if domain is not of the form ``*.parent``
+        :rtype: list or None
+
+        """
+        wildcard, _, parent = domain.partition(".")
+        if wildcard != "*" or "*" in parent or "?" in parent:
+            return None
+        return self._sorted(self._parents.get(parent.lower(), []))
+
+    def contains(self, vhosts):
+        """Are all vhosts indexed?
+
+        :param list vhosts: list of virtual hosts
+
+        :rtype: bool
+
+        """
+        return all(id(vhost) in self._positions for vhost in vhosts)
+
+
+def _append_new(vhosts, vhost):
+    """Append vhost to vhosts if it is not already there."""
+    if not any(vh is vhost for vh in vhosts):
+        vhosts.append(vhost)
@@ -7,6 +7,7 @@ from certbot import interfaces
 
 from certbot_apache import apache_util
 from certbot_apache import configurator
+from certbot_apache import native_parser
 from certbot_apache import parser
 
 @zope.interface.provider(interfaces.IPluginFactory)
@@ -47,6 +48,14 @@ class GentooConfigurator(configurator.ApacheConfigurator):
             self.aug, self.option("server_root"), self.option("vhost_root"),
             self.version, configurator=self)
 
+    def get_native_parser(self):
+        """Initializes the NativeApacheParser"""
+        return native_parser.NativeApacheParser(
+            self.option("server_root"), self.option("vhost_root"),
+            self.option("vhost_files"),
+            variables=apache_util.parse_define_file(
+                "/etc/conf.d/apache2", "APACHE2_OPTS"))
+
 
 class GentooParser(parser.ApacheParser):
     """Gentoo specific ApacheParser override class"""
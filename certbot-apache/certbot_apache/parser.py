@@ -1,6 +1,11 @@
 """ApacheParser is a member object of the ApacheConfigurator class."""
+# pylint: disable=too-many-lines
+import collections
 import copy
 import fnmatch
+import glob
+import itertools
+import json
 import logging
 import os
 import re
@@ -9,11 +14,83 @@ import sys
 
 import six
 
-from acme.magic_typing import Dict, List, Set  # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import Dict, List, Optional, Set, Tuple  # pylint: disable=unused-import, no-name-in-module
+from certbot import compat
 from certbot import errors
+from certbot import util
+
+from certbot_apache import constants
 
 logger = logging.getLogger(__name__)
 
+RUNTIME_DUMPS = ("DUMP_RUN_CFG", "DUMP_INCLUDES", "DUMP_MODULES")
+"""Runtime configuration dumps of httpd used by the parser"""
+
+_RUNTIME_DUMP_HEADERS = {
+    "Included configuration files:": "DUMP_INCLUDES",
+    "Loaded Modules:": "DUMP_MODULES",
+}
+
+_RUNTIME_CFG_CACHE_VERSION = 3
+
+_RUNTIME_ENV_FILES = ["/etc/sysconfig/httpd"]
+"""Files sourced by the httpd control commands of some distributions, which
+can change the runtime configuration dumps"""
+
+_RUNTIME_ENV_VARIABLES = ("HTTPD", "OPTIONS")
+"""Environment variables read by the httpd control commands, on top of the
+ones starting with APACHE, such as APACHE_ARGUMENTS and APACHE_CONFDIR"""
+
+_INCLUDE_ARGUMENT = re.compile(
+    r'^[ \t]*Include(?:Optional)?[ \t]+("[^"\n]*"|\S+)', re.IGNORECASE | re.MULTILINE)
+"""Argument of the Include and IncludeOptional directives"""
+
+FindDirCacheInfo = collections.namedtuple("FindDirCacheInfo", "hits misses size")
+"""Statistics of the `ApacheParser.find_dir` query cache."""
+
+
+class TrackedAugeas(object):
+    """Augeas object counting the changes made to its tree.
+
+    Every method call other than the read only ones in `READERS`, and every
+    attribute replaced on the object (e.g. by tests), increments
+    `generation`. Results computed from the Augeas tree remain valid as long
+    as `generation` doesn't change.
+
+    :ivar int generation: number of changes made through this object
+
+    """
+    READERS = frozenset(["get", "match", "span", "label", "defvar"])
+
+    def __init__(self, aug):
+        object.__setattr__(self, "_aug", aug)
+        object.__setattr__(self, "generation", 0)
+
+    def __getattr__(self, name):
+        attr = getattr(self._aug, name)
+        if name in self.READERS or not callable(attr):
+            return attr
+
+        def mutator(*args, **kwargs):
+            """Calls attr and records the change of the tree."""
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.touch()
+        return mutator
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self.touch()
+
+    def __delattr__(self, name):
+        object.__delattr__(self, name)
+        self.touch()
+
+    def touch(self):
+        """Records a change of the Augeas tree."""
+        object.__setattr__(self, "generation", self.generation + 1)
+
 
 class ApacheParser(object):
     # pylint: disable=too-many-public-methods
@@ -26,6 +103,8 @@ class ApacheParser(object):
     :ivar set modules: All module names that are currently enabled.
     :ivar dict loc: Location to place directives, root - configuration origin,
         default - user config file, name - NameVirtualHost,
+    :ivar aug: Augeas object
+    :type aug: :class:`TrackedAugeas`
 
     """
     arg_var_interpreter = re.compile(r"\$\{[^ \}]*}")
@@ -43,8 +122,18 @@ class ApacheParser(object):
         self.modules = set()  # type: Set[str]
         self.parser_paths = {}  # type: Dict[str, List[str]]
         self.variables = {}  # type: Dict[str, str]
+        # Outputs of the httpd dump commands, by command, while the runtime
+        # variables are updated
+        self._runtime_dumps = {}  # type: Dict[Tuple[str, ...], str]
+
+        self.aug = aug if isinstance(aug, TrackedAugeas) else TrackedAugeas(aug)
+        # Results of find_dir, valid while the Augeas tree, the enabled
+        # modules and the variables are unchanged
+        self._find_dir_cache = {}  # type: Dict[Tuple[str, Optional[str], str, bool], List[str]]
+        self._find_dir_state = None  # type: Optional[Tuple]
+        self._find_dir_hits = 0
+        self._find_dir_misses = 0
 
-        self.aug = aug
         # Find configuration root and make sure augeas can parse it.
         self.root = os.path.abspath(root)
         self.loc = {"root": self._find_config_root()}
@@ -144,16 +233,82 @@ class ApacheParser(object):
 
     def update_runtime_variables(self):
         """Update Includes, Defines and Includes from httpd config dump data"""
-        self.update_defines()
-        self.update_includes()
-        self.update_modules()
+        self._runtime_dumps = self._get_runtime_dumps()
+        try:
+            self.update_defines()
+            self.update_includes()
+            self.update_modules()
+        finally:
+            self._runtime_dumps = {}
+
+    def _get_runtime_dumps(self):
+        """Get all the runtime configuration dumps of httpd at once.
+
+        The dumps of the last run are reused if neither httpd nor the
+        configuration files changed since. Otherwise, httpd is invoked once
+        for all the dumps, and the result is cached in the work directory.
+
+        :returns: outputs of the dump commands, by command, or an empty dict
+            if the dumps have to be gathered separately
+        :rtype: dict
+
+        """
+        ctl = self.configurator.option("ctl")
+        cache_path = os.path.join(self.configurator.config.work_dir,
+                                  constants.RUNTIME_CFG_CACHE)
+        cache_key = [ctl, _find_executable(ctl), self.root, _runtime_cfg_environ()]
+        dumps = _read_runtime_cfg_cache(cache_path, cache_key)
+        if dumps is None:
+            command = [ctl, "-t"]
+            for dump in RUNTIME_DUMPS:
+                command.extend(["-D", dump])
+            dumps = _split_runtime_dumps(self._get_runtime_cfg(command))
+            if dumps is None:
+                logger.debug("Unable to gather the runtime configuration "
+                             "dumps of httpd at once.")
+                return {}
+            _write_runtime_cfg_cache(cache_path, cache_key, self._runtime_cfg_paths(
+                ctl, dumps["DUMP_INCLUDES"]), dumps)
+        return dict((tuple(self._dump_command(dump)), output)
+                    for dump, output in six.iteritems(dumps))
+
+    def _runtime_cfg_paths(self, ctl, includes):
+        """Paths the runtime configuration dumps of httpd depend on.
+
+        :param str ctl: httpd control command
+        :param str includes: output of DUMP_INCLUDES
+
+        :returns: the httpd control command, the environment files of
+            Debian and CentOS, the included files and their directories, and
+            the directories matched by the Include directives of these files
+        :rtype: list
+
+        """
+        paths = set([_find_executable(ctl), os.path.join(self.root, "envvars")])
+        paths.update(_RUNTIME_ENV_FILES)
+        for path in re.compile(r"\(.*\) (.*)").findall(includes):
+            paths.add(path)
+            paths.add(os.path.dirname(path))
+            # Files added to a directory that matched nothing yet, such as
+            # an empty sites-enabled, don't appear in the dump
+            paths.update(_include_dirs(path, self.root))
+        return sorted(paths)
+
+    def _dump_command(self, dump):
+        """Command printing a runtime configuration dump of httpd.
+
+        :param str dump: dump from `RUNTIME_DUMPS`
+
+        :rtype: list
+
+        """
+        return [self.configurator.option("ctl"), "-t", "-D", dump]
 
     def update_defines(self):
         """Get Defines from httpd process"""
 
         variables = dict()
-        define_cmd = [self.configurator.option("ctl"), "-t", "-D",
-                      "DUMP_RUN_CFG"]
+        define_cmd = self._dump_command("DUMP_RUN_CFG")
         matches = self.parse_from_subprocess(define_cmd, r"Define: ([^ \n]*)")
         try:
             matches.remove("DUMP_RUN_CFG")
@@ -179,19 +334,17 @@ class ApacheParser(object):
         # configuration files
         _ = self.find_dir("Include")
 
-        inc_cmd = [self.configurator.option("ctl"), "-t", "-D",
-                   "DUMP_INCLUDES"]
+        inc_cmd = self._dump_command("DUMP_INCLUDES")
         matches = self.parse_from_subprocess(inc_cmd, r"\(.*\) (.*)")
         if matches:
-            for i in matches:
-                if not self.parsed_in_current(i):
-                    self.parse_file(i)
+            # All the new files are loaded at once
+            self.parse_files(
+                [i for i in matches if not self.parsed_in_current(i)])
 
     def update_modules(self):
         """Get loaded modules from httpd process, and add them to DOM"""
 
-        mod_cmd = [self.configurator.option("ctl"), "-t", "-D",
-                       "DUMP_MODULES"]
+        mod_cmd = self._dump_command("DUMP_MODULES")
         matches = self.parse_from_subprocess(mod_cmd, r"(.*)_module")
         for mod in matches:
             self.add_mod(mod.strip())
@@ -206,7 +359,9 @@ class ApacheParser(object):
         :rtype: list
 
         """
-        stdout = self._get_runtime_cfg(command)
+        stdout = self._runtime_dumps.get(tuple(command))
+        if stdout is None:
+            stdout = self._get_runtime_cfg(command)
         return re.compile(regexp).findall(stdout)
 
     def _get_runtime_cfg(self, command):  # pylint: disable=no-self-use
@@ -410,11 +565,48 @@ class ApacheParser(object):
         :param bool exclude: Whether or not to exclude directives based on
             variables and enabled modules
 
+        :returns: Augeas paths of the matching directive arguments
+        :rtype: list
+
         """
         # Cannot place member variable in the definition of the function so...
         if not start:
             start = get_aug_path(self.loc["root"])
 
+        state = (self.aug.generation, frozenset(self.modules),
+                 frozenset(six.iteritems(self.variables)))
+        if state != self._find_dir_state:
+            self._find_dir_cache.clear()
+            self._find_dir_state = state
+
+        key = (directive, arg, start, exclude)
+        try:
+            matches = self._find_dir_cache[key]
+        except KeyError:
+            self._find_dir_misses += 1
+            matches = self._find_dir(directive, arg, start, exclude)
+            # The Augeas tree is not modified by find_dir
+            self._find_dir_cache[key] = matches
+        else:
+            self._find_dir_hits += 1
+        return list(matches)
+
+    def find_dir_cache_info(self):
+        """Returns statistics of the find_dir query cache.
+
+        :rtype: FindDirCacheInfo
+
+        """
+        return FindDirCacheInfo(self._find_dir_hits, self._find_dir_misses,
+                                len(self._find_dir_cache))
+
+    def _find_dir(self, directive, arg, start, exclude):
+        """Finds directive in the configuration, without caching.
+
+        See `find_dir` for the parameters.
+
+        """
+
         # No regexp code
         # if arg is None:
         #     matches = self.aug.match(start +
@@ -427,9 +619,7 @@ class ApacheParser(object):
         # includes = self.aug.match(start +
         # "//* [self::directive='Include']/* [label()='arg']")
 
-        regex = "(%s)|(%s)|(%s)" % (case_i(directive),
-                                    case_i("Include"),
-                                    case_i("IncludeOptional"))
+        regex = "(%s)|%s" % (case_i(directive), _INCLUDE_REGEX)
         matches = self.aug.match(
             "%s//*[self::directive=~regexp('%s')]" % (start, regex))
 
@@ -614,24 +804,69 @@ class ApacheParser(object):
         :param str filepath: Apache config file path
 
         """
-        use_new, remove_old = self._check_path_actions(filepath)
+        self.parse_files([filepath])
+
+    def parse_files(self, filepaths):
+        """Parse files with Augeas
+
+        Adds a transform for each file path not parsed by Augeas yet, and
+        then loads all the new files at once.
+
+        :param list filepaths: Apache config file paths
+
+        """
         # Ensure that we have the latest Augeas DOM state on disk before
         # calling aug.load() which reloads the state from disk
         if self.configurator:
             self.configurator.ensure_augeas_state()
-        # Test if augeas included file for Httpd.lens
-        # Note: This works for augeas globs, ie. *.conf
-        if use_new:
+        new_paths = []
+        full_load = False
+        for filepath in filepaths:
+            use_new, remove_old = self._check_path_actions(filepath)
+            if not use_new:
+                continue
+            # Test if augeas included file for Httpd.lens
+            # Note: This works for augeas globs, ie. *.conf
             inc_test = self.aug.match(
                 "/augeas/load/Httpd['%s' =~ glob(incl)]" % filepath)
             if not inc_test:
-                # Load up files
                 # This doesn't seem to work on TravisCI
                 # self.aug.add_transform("Httpd.lns", [filepath])
                 if remove_old:
                     self._remove_httpd_transform(filepath)
+                    # Files of the removed transforms must leave the tree
+                    full_load = True
                 self._add_httpd_transform(filepath)
-                self.aug.load()
+                new_paths.append(filepath)
+        if new_paths:
+            self._load_files(new_paths, full_load)
+
+    def _load_files(self, filepaths, full_load=False):
+        """Load files into the Augeas tree.
+
+        The files are loaded one by one with aug.load_file, which is only
+        available with Augeas 1.13 and later, instead of reloading every
+        file under every transform with aug.load. Files matching the excl
+        patterns of the Httpd transform are skipped, as aug.load would.
+
+        :param list filepaths: paths or globs of files with a transform
+        :param bool full_load: Whether the whole tree must be reloaded
+
+        """
+        if not full_load:
+            excluded = [self.aug.get(match) for match in
+                        self.aug.match("/augeas/load/Httpd/excl")]
+            try:
+                for filepath in filepaths:
+                    for path in sorted(glob.glob(filepath)):
+                        if os.path.isfile(path) and not _excluded(path, excluded):
+                            self.aug.load_file(path)
+                return
+            except (AttributeError, EnvironmentError, RuntimeError):
+                # RuntimeError includes augeas.AugeasRuntimeError
+                logger.debug("Unable to load the new files incrementally, "
+                             "reloading the Augeas tree.", exc_info=True)
+        self.aug.load()
 
     def parsed_in_current(self, filep):
         """Checks if the file path is parsed by current Augeas parser config
@@ -790,11 +1025,199 @@ class ApacheParser(object):
 
     def _find_config_root(self):
         """Find the Apache Configuration Root file."""
-        location = ["apache2.conf", "httpd.conf", "conf/httpd.conf"]
-        for name in location:
-            if os.path.isfile(os.path.join(self.root, name)):
-                return os.path.join(self.root, name)
-        raise errors.NoInstallationError("Could not find configuration root")
+        return find_config_root(self.root)
+
+
+def find_config_root(root):
+    """Find the Apache Configuration Root file.
+
+    :param str root: Server root directory
+
+    :returns: path of the main configuration file
+    :rtype: str
+
+    :raises .errors.NoInstallationError: If the file cannot be found
+
+    """
+    location = ["apache2.conf", "httpd.conf", "conf/httpd.conf"]
+    for name in location:
+        if os.path.isfile(os.path.join(root, name)):
+            return os.path.join(root, name)
+    raise errors.NoInstallationError("Could not find configuration root")
+
+
+def _find_executable(exe):
+    """Path of an executable, looked up in PATH if needed.
+
+    :param str exe: Executable path or name
+
+    :rtype: str
+
+    """
+    if os.path.dirname(exe):
+        return exe
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        if util.is_exe(os.path.join(path, exe)):
+            return os.path.join(path, exe)
+    return exe
+
+
+def _include_dirs(path, root):
+    """Directories the Include and IncludeOptional directives of a file match.
+
+    For a glob, this is its directory, e.g. ``sites-enabled`` for
+    ``sites-enabled/*.conf``, and for other arguments the included path
+    itself. Arguments using variables are ignored.
+
+    :param str path: path of a configuration file
+    :param str root: server root, relative arguments are resolved from
+
+    :returns: absolute paths of the directories
+    :rtype: list
+
+    """
+    try:
+        with open(path) as conf_file:
+            arguments = _INCLUDE_ARGUMENT.findall(conf_file.read())
+    except IOError:
+        return []
+    dirs = []
+    for arg in arguments:
+        arg = arg.strip("'\"")
+        if "${" in arg:
+            continue
+        parts = os.path.join(root, arg).split("/")
+        static = list(itertools.takewhile(
+            lambda part: not any(char in part for char in "*?["), parts))
+        dirs.append("/".join(static) or "/")
+    return dirs
+
+
+def _runtime_cfg_environ():
+    """Environment variables the runtime configuration dumps depend on.
+
+    :returns: sorted names and values of the variables
+    :rtype: list
+
+    """
+    return sorted([name, value] for name, value in six.iteritems(os.environ)
+                  if name.startswith("APACHE") or name in _RUNTIME_ENV_VARIABLES)
+
+
+def _split_runtime_dumps(output):
+    """Split the output of httpd invoked with all the `RUNTIME_DUMPS`.
+
+    :param str output: output of httpd
+
+    :returns: output of each dump, or `None` if some are missing
+    :rtype: dict or None
+
+    """
+    if not output:
+        return None
+    sections = dict((dump, []) for dump in RUNTIME_DUMPS)  # type: Dict[str, List[str]]
+    dump = "DUMP_RUN_CFG"
+    for line in output.splitlines(True):
+        if line.strip() in _RUNTIME_DUMP_HEADERS:
+            dump = _RUNTIME_DUMP_HEADERS[line.strip()]
+        elif not line.startswith((" ", "\t")):
+            # Included files and modules are indented
+            dump = "DUMP_RUN_CFG"
+        if dump == "DUMP_RUN_CFG" and line.strip() in (
+                "Define: DUMP_INCLUDES", "Define: DUMP_MODULES"):
+            continue
+        sections[dump].append(line)
+    if not all(sections.values()):
+        return None
+    return dict((dump, "".join(lines)) for dump, lines in six.iteritems(sections))
+
+
+def _stat_paths(paths):
+    """Fingerprint of the current state of paths.
+
+    :param list paths: paths of files or directories
+
+    :returns: path, modification time, size and inode of each path
+    :rtype: list
+
+    """
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stats.append([path, None])
+        else:
+            stats.append([path, [stat.st_mtime, stat.st_size, stat.st_ino]])
+    return stats
+
+
+def _read_runtime_cfg_cache(cache_path, key):
+    """Read cached runtime configuration dumps of httpd.
+
+    :param str cache_path: path of the cache file
+    :param list key: httpd control command, its path, the server root and
+        the relevant environment variables
+
+    :returns: output of each dump, or `None` if the cache file is missing,
+        unreadable or out of date
+    :rtype: dict or None
+
+    """
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+        if (cache["version"] != _RUNTIME_CFG_CACHE_VERSION or
+                cache["key"] != key or sorted(cache["dumps"]) != sorted(RUNTIME_DUMPS)):
+            return None
+        paths = [path for path, _ in cache["stats"]]
+        if _stat_paths(paths) != cache["stats"]:
+            logger.debug("The httpd configuration changed since its runtime "
+                         "dumps were cached.")
+            return None
+        return cache["dumps"]
+    except (IOError, OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def _write_runtime_cfg_cache(cache_path, key, paths, dumps):
+    """Cache runtime configuration dumps of httpd, if possible.
+
+    :param str cache_path: path of the cache file
+    :param list key: httpd control command, its path, the server root and
+        the relevant environment variables
+    :param list paths: paths the dumps depend on
+    :param dict dumps: output of each dump
+
+    """
+    cache = {"version": _RUNTIME_CFG_CACHE_VERSION, "key": key,
+             "stats": _stat_paths(paths), "dumps": dumps}
+    try:
+        with open(cache_path + ".new", "w") as cache_file:
+            json.dump(cache, cache_file)
+        compat.os_rename(cache_path + ".new", cache_path)
+    except (IOError, OSError):
+        logger.debug("Unable to cache the runtime configuration dumps of "
+                     "httpd in %s", cache_path, exc_info=True)
+
+
+_CASE_I_CACHE = {}  # type: Dict[str, str]
+
+
+def _excluded(path, patterns):
+    """Is path excluded by one of the excl patterns of an Augeas transform?
+
+    Like Augeas, patterns without a slash are matched against the file
+    name, and the others against the whole path.
+
+    :param str path: absolute path of a file
+    :param list patterns: excl glob patterns
+
+    :rtype: bool
+
+    """
+    return any(fnmatch.fnmatch(path if "/" in pattern else os.path.basename(path), pattern)
+               for pattern in patterns)
 
 
 def case_i(string):
@@ -809,8 +1232,16 @@ def case_i(string):
     :param str string: string to make case i regex
 
     """
-    return "".join(["[" + c.upper() + c.lower() + "]"
-                    if c.isalpha() else c for c in re.escape(string)])
+    try:
+        return _CASE_I_CACHE[string]
+    except KeyError:
+        regex = "".join(["[" + c.upper() + c.lower() + "]"
+                         if c.isalpha() else c for c in re.escape(string)])
+        _CASE_I_CACHE[string] = regex
+        return regex
+
+
+_INCLUDE_REGEX = "(%s)|(%s)" % (case_i("Include"), case_i("IncludeOptional"))
 
 
 def get_aug_path(file_path):
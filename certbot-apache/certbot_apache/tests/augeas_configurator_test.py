@@ -70,6 +70,14 @@ class AugeasConfiguratorTest(util.ApacheTest):
         self.config.recovery_routine()
         self.assertEqual(mock_load.call_count, 1)
 
+    def test_without_augeas(self):
+        self.config.aug = None
+        self.config.recovery_routine()
+        self.config.revert_challenge_config()
+        self.config.rollback_checkpoints()
+        self.config.save("Title")
+        self.assertEqual(self.config.aug, None)
+
     def test_recovery_routine_error(self):
         self.config.reverter.recovery_routine = mock.Mock(
             side_effect=errors.ReverterError)
@@ -81,7 +81,8 @@ class MultipleVhostsTestCentOS(util.ApacheTest):
             mock_osi.return_value = ("centos", "7")
             self.config.parser.update_runtime_variables()
 
-        self.assertEqual(mock_get.call_count, 3)
+        # The dumps are gathered separately after a combined attempt
+        self.assertEqual(mock_get.call_count, 4)
         self.assertEqual(len(self.config.parser.modules), 4)
         self.assertEqual(len(self.config.parser.variables), 2)
         self.assertTrue("TEST2" in self.config.parser.variables.keys())
@@ -92,6 +92,49 @@ class MultipleVhostsTest(util.ApacheTest):
         self.assertRaises(
             errors.NotSupportedError, self.config.prepare)
 
+    @certbot_util.patch_get_utility()
+    @mock.patch("certbot_apache.augeas_configurator.AugeasConfigurator.init_augeas")
+    @mock.patch("certbot_apache.configurator.util.exe_exists")
+    def test_prepare_native_parser(self, mock_exe_exists, mock_init_augeas, _):
+        mock_exe_exists.return_value = True
+        self.config.config_test = mock.Mock()
+        self.config.config.apache_native_parser = True
+        augeas_vhosts = self.config.vhosts
+        self.config.aug = None
+        self.config.parser = None
+        self.config.prepare()
+
+        self.assertFalse(mock_init_augeas.called)
+        self.assertEqual(self.config.parser, None)
+        self.assertEqual(
+            set((vh.filep, vh.name, vh.ssl, vh.enabled, vh.modmacro)
+                for vh in self.config.vhosts),
+            set((vh.filep, vh.name, vh.ssl, vh.enabled, vh.modmacro)
+                for vh in augeas_vhosts))
+        self.assertTrue("vhost.in.rootconf" in self.config.get_all_names())
+        self.assertTrue(self.config.more_info())
+
+    @mock.patch("certbot_apache.parser.ApacheParser.update_runtime_variables")
+    def test_ensure_augeas(self, _):
+        # pylint: disable=protected-access
+        self.config.config.apache_native_parser = True
+        aug = self.config.aug
+        self.config.aug = None
+        self.config.vhosts = []
+
+        def init_augeas():
+            """Restore the Augeas object of the test configurator."""
+            self.config.aug = aug
+
+        with mock.patch("certbot_apache.augeas_configurator."
+                        "AugeasConfigurator.init_augeas") as mock_init_augeas:
+            mock_init_augeas.side_effect = init_augeas
+            self.config._ensure_augeas()
+            self.config._ensure_augeas()
+        self.assertEqual(mock_init_augeas.call_count, 1)
+        self.assertTrue(self.config.vhosts)
+        self.assertTrue(all(vh.path for vh in self.config.vhosts))
+
     def test_prepare_locked(self):
         server_root = self.config.conf("server-root")
         self.config.config_test = mock.Mock()
@@ -701,6 +744,8 @@ class MultipleVhostsTest(util.ApacheTest):
                                 self.vh_truth[1].filep)))
 
     def test_make_vhost_ssl(self):
+        # pylint: disable=protected-access
+        index = self.config._get_vhost_index()
         ssl_vhost = self.config.make_vhost_ssl(self.vh_truth[0])
 
         self.assertEqual(
@@ -720,6 +765,9 @@ class MultipleVhostsTest(util.ApacheTest):
                          self.config.is_name_vhost(ssl_vhost))
 
         self.assertEqual(len(self.config.vhosts), 13)
+        # The new vhost was added to the index
+        self.assertTrue(self.config._get_vhost_index() is index)
+        self.assertTrue(ssl_vhost in index.find("encryption-example.demo"))
 
     def test_clean_vhost_ssl(self):
         # pylint: disable=protected-access
@@ -905,6 +953,119 @@ class MultipleVhostsTest(util.ApacheTest):
 
         self.assertRaises(errors.MisconfigurationError, self.config.restart)
 
+    def test_transaction(self):
+        # pylint: disable=protected-access
+        self.config.config_test = mock.Mock()
+        self.config._reload = mock.Mock()
+        self.config.finalize_checkpoint = mock.Mock()
+        with self.config.transaction("Title"):
+            with self.config.transaction("Nested"):
+                self.config.parser.add_dir(
+                    self.vh_truth[0].path, "ServerAlias", "transaction.demo")
+                self.config.save("Inner")
+                self.config.restart()
+            self.config.restart()
+            self.assertFalse(self.config.finalize_checkpoint.called)
+            self.assertFalse(self.config.config_test.called)
+        self.config.finalize_checkpoint.assert_called_once_with("Title")
+        self.assertEqual(self.config.config_test.call_count, 1)
+        self.assertEqual(self.config._reload.call_count, 1)
+
+        self.config.restart()
+        self.assertEqual(self.config._reload.call_count, 2)
+
+    def test_transaction_without_restart(self):
+        # pylint: disable=protected-access
+        self.config._reload = mock.Mock()
+        with self.config.transaction("Title"):
+            pass
+        self.assertFalse(self.config._reload.called)
+
+    def test_transaction_error(self):
+        # pylint: disable=protected-access
+        self.config._reload = mock.Mock()
+        self.config.recovery_routine = mock.Mock()
+        self.config.finalize_checkpoint = mock.Mock()
+
+        def failing_transaction():
+            """Restarts Apache and fails in a transaction."""
+            with self.config.transaction("Title"):
+                self.config.restart()
+                raise errors.PluginError("Failure")
+
+        self.assertRaises(errors.PluginError, failing_transaction)
+        self.assertEqual(self.config.recovery_routine.call_count, 1)
+        self.assertFalse(self.config.finalize_checkpoint.called)
+        self.assertFalse(self.config._reload.called)
+        self.assertFalse(self.config._in_transaction)
+
+    def test_transaction_config_test_failure(self):
+        # pylint: disable=protected-access
+        self.config.config_test = mock.Mock(
+            side_effect=errors.MisconfigurationError)
+        self.config._reload = mock.Mock()
+        self.config.recovery_routine = mock.Mock()
+
+        def transaction():
+            """Restarts Apache in a transaction."""
+            with self.config.transaction("Title"):
+                self.config.restart()
+
+        self.assertRaises(errors.MisconfigurationError, transaction)
+        self.assertEqual(self.config.recovery_routine.call_count, 1)
+        self.assertFalse(self.config._reload.called)
+
+    def test_transaction_reload_failure(self):
+        # pylint: disable=protected-access
+        self.config.config_test = mock.Mock()
+        self.config._reload = mock.Mock(
+            side_effect=[errors.MisconfigurationError, None])
+        self.config.rollback_checkpoints = mock.Mock()
+
+        def transaction():
+            """Restarts Apache in a transaction."""
+            with self.config.transaction("Title"):
+                self.config.restart()
+
+        self.assertRaises(errors.MisconfigurationError, transaction)
+        self.assertEqual(self.config.rollback_checkpoints.call_count, 1)
+        self.assertEqual(self.config._reload.call_count, 2)
+
+    @mock.patch("certbot_apache.configurator.logger")
+    def test_deploy_certs(self, mock_logger):
+        # pylint: disable=protected-access
+        self.config.deploy_cert = mock.Mock()
+        self.config.enhance = mock.Mock(side_effect=[
+            None, errors.PluginEnhancementAlreadyPresent, None, None])
+        self.config.config_test = mock.Mock()
+        self.config._reload = mock.Mock()
+        mock_finalize = self.config.finalize_checkpoint = mock.Mock()
+
+        self.config.deploy_certs(
+            [(["certbot.demo"], "cert.pem", "key.pem", "chain.pem", "fullchain.pem"),
+             (["encryption-example.demo"], "cert2.pem", "key2.pem", None, None)],
+            enhancements=[("redirect", None), ("staple-ocsp", "chain.pem")])
+
+        self.assertEqual(self.config.deploy_cert.call_args_list, [
+            mock.call("certbot.demo", "cert.pem", "key.pem", "chain.pem", "fullchain.pem"),
+            mock.call("encryption-example.demo", "cert2.pem", "key2.pem", None, None)])
+        self.assertEqual(self.config.enhance.call_args_list, [
+            mock.call("certbot.demo", "redirect", None),
+            mock.call("encryption-example.demo", "redirect", None),
+            mock.call("certbot.demo", "staple-ocsp", "chain.pem"),
+            mock.call("encryption-example.demo", "staple-ocsp", "chain.pem")])
+        self.assertTrue(mock_logger.warning.called)
+        mock_finalize.assert_called_once_with("Deployed ACME Certificates")
+        self.assertEqual(self.config.config_test.call_count, 1)
+        self.assertEqual(self.config._reload.call_count, 1)
+
+    def test_deploy_certs_error(self):
+        self.config.deploy_cert = mock.Mock(side_effect=errors.PluginError)
+        self.config.recovery_routine = mock.Mock()
+        self.assertRaises(errors.PluginError, self.config.deploy_certs,
+                          [(["certbot.demo"], "cert.pem", "key.pem", None, None)])
+        self.assertEqual(self.config.recovery_routine.call_count, 1)
+
     @mock.patch("certbot.util.run_script")
     def test_config_test(self, _):
         self.config.config_test()
@@ -0,0 +1,208 @@
+"""Tests for certbot_apache.native_parser."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from certbot import errors
+from certbot.plugins import common
+
+from certbot_apache import obj
+
+
+MAIN_CONFIG = """\
+# Comment \\
+ServerRoot "/etc/apache2"
+Define SITES sites
+Define TLS
+LoadModule ssl_module modules/mod_ssl.so
+<IfModule mod_ssl.c>
+    Define SSL_LOADED
+</IfModule>
+<IfModule !rewrite_module>
+    Define NO_REWRITE
+</IfModule>
+<IfDefine !TLS>
+    Include missing.conf
+    Define NO_TLS
+</IfDefine>
+UnDefine TLS
+<IfDefine TLS>
+    Define STILL_TLS
+</IfDefine>
+Include conf.d
+IncludeOptional ${SITES}/*.conf
+IncludeOptional nothing/*.conf
+Include apache2.conf
+<VirtualHost *:80 \\
+             [::]:80>
+    ServerName "first.example.org"
+    ServerName main.example.org
+    ServerAlias www.example.org \\
+                www2.example.org
+    <IfModule mod_alias.c>
+        ServerAlias alias.example.org
+    </IfModule>
+</VirtualHost>
+"""
+
+SITE_CONFIG = """\
+<VirtualHost 10.0.0.1:8443>
+    ServerName 'secure.example.org'
+    SSLEngine On
+</VirtualHost>
+<Macro VHost $name>
+    <VirtualHost *:80>
+        ServerName $name
+    </VirtualHost>
+</Macro>
+"""
+
+
+class NativeApacheParserTest(unittest.TestCase):
+    """Tests for certbot_apache.native_parser.NativeApacheParser."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self._write("apache2.conf", MAIN_CONFIG)
+        self._write(os.path.join("conf.d", "nested", "ports.conf"),
+                    "Listen 80\nListen 443 https\n")
+        self._write(os.path.join("sites", "secure.conf"), SITE_CONFIG)
+        self._write(os.path.join("available", "unused.conf"),
+                    "<VirtualHost *:443>\nServerName unused.example.org\n"
+                    "</VirtualHost>\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(content)
+
+    def _call(self, root=None, **kwargs):
+        from certbot_apache.native_parser import NativeApacheParser
+        return NativeApacheParser(root or self.root, **kwargs)
+
+    def test_variables_and_modules(self):
+        parser = self._call()
+        self.assertEqual(set(parser.variables),
+                         set(["SITES", "SSL_LOADED", "NO_REWRITE"]))
+        self.assertTrue("ssl_module" in parser.modules)
+        self.assertTrue("mod_ssl.c" in parser.modules)
+
+    @mock.patch("certbot_apache.native_parser.logger")
+    def test_included_files(self, mock_logger):
+        parser = self._call()
+        self.assertEqual(parser.included, set([
+            os.path.join(self.root, "apache2.conf"),
+            os.path.join(self.root, "conf.d", "nested", "ports.conf"),
+            os.path.join(self.root, "sites", "secure.conf")]))
+        self.assertEqual([directive.args for directive in parser.find_dir("LISTEN")],
+                         [["80"], ["443", "https"]])
+        self.assertEqual(parser.find_dir("Include")[0].args, ["conf.d"])
+        # apache2.conf includes itself
+        self.assertTrue(mock_logger.warning.called)
+
+    def test_get_virtual_hosts(self):
+        vhosts = self._call().get_virtual_hosts()
+        self.assertEqual(len(vhosts), 3)
+
+        main = vhosts[2]
+        self.assertEqual(main.filep, os.path.join(self.root, "apache2.conf"))
+        self.assertEqual(main.path, None)
+        self.assertEqual(main.addrs, set([obj.Addr.fromstring("*:80"),
+                                          obj.Addr.fromstring("[::]:80")]))
+        self.assertEqual(main.name, "main.example.org")
+        self.assertEqual(main.aliases, set(
+            ["www.example.org", "www2.example.org", "alias.example.org"]))
+        self.assertFalse(main.ssl)
+        self.assertTrue(main.enabled)
+
+        secure, macro = vhosts[0], vhosts[1]
+        self.assertEqual(secure.name, "secure.example.org")
+        self.assertTrue(secure.ssl)
+        self.assertFalse(secure.modmacro)
+        self.assertTrue(macro.modmacro)
+        self.assertEqual(macro.name, None)
+
+    def test_vhost_root(self):
+        vhosts = self._call(vhost_root=os.path.join(self.root, "available"),
+                            vhost_files="*.conf").get_virtual_hosts()
+        unused = vhosts[-1]
+        self.assertEqual(unused.name, "unused.example.org")
+        self.assertTrue(unused.ssl)
+        self.assertFalse(unused.enabled)
+
+    def test_symlinked_vhosts(self):
+        self._write("apache2.conf", "IncludeOptional enabled/*.conf\n")
+        os.mkdir(os.path.join(self.root, "enabled"))
+        os.symlink(os.path.join(self.root, "available", "unused.conf"),
+                   os.path.join(self.root, "enabled", "unused.conf"))
+        vhosts = self._call(
+            vhost_root=os.path.join(self.root, "available")).get_virtual_hosts()
+        self.assertEqual(len(vhosts), 1)
+        self.assertEqual(vhosts[0].filep,
+                         os.path.join(self.root, "available", "unused.conf"))
+        self.assertTrue(vhosts[0].enabled)
+
+    @mock.patch("certbot_apache.native_parser.logger")
+    @mock.patch("certbot_apache.native_parser._logical_lines")
+    def test_unreadable_file(self, mock_lines, mock_logger):
+        mock_lines.side_effect = IOError
+        self.assertEqual(self._call().get_virtual_hosts(), [])
+        self.assertTrue(mock_logger.debug.called)
+
+    def test_real_configuration(self):
+        temp_dir, config_dir, work_dir = common.dir_setup(
+            test_dir="debian_apache_2_4/multiple_vhosts",
+            pkg="certbot_apache.tests")
+        for path in (temp_dir, config_dir, work_dir):
+            self.addCleanup(shutil.rmtree, path)
+        config_path = os.path.join(
+            temp_dir, "debian_apache_2_4", "multiple_vhosts", "apache2")
+        parser = self._call(config_path)
+
+        # Same virtual hosts as found by Augeas, see tests.util.get_vh_truth
+        enabled = "sites-enabled"
+        self.assertEqual(
+            set((os.path.relpath(vh.filep, config_path), vh.name, vh.ssl,
+                 vh.enabled, vh.modmacro) for vh in parser.get_virtual_hosts()),
+            set([
+                (os.path.join(enabled, "000-default.conf"),
+                 "ip-172-30-0-17", False, True, False),
+                (os.path.join(enabled, "certbot.conf"),
+                 "certbot.demo", False, True, False),
+                (os.path.join(enabled, "default-ssl-port-only.conf"),
+                 None, True, True, False),
+                (os.path.join(enabled, "default-ssl.conf"),
+                 None, True, True, False),
+                (os.path.join(enabled, "duplicatehttp.conf"),
+                 "duplicate.example.com", False, True, False),
+                (os.path.join(enabled, "duplicatehttps.conf"),
+                 "duplicate.example.com", True, True, False),
+                (os.path.join(enabled, "encryption-example.conf"),
+                 "encryption-example.demo", False, True, False),
+                (os.path.join(enabled, "mod_macro-example.conf"),
+                 None, False, True, True),
+                (os.path.join(enabled, "non-symlink.conf"),
+                 "nonsym.link", False, True, False),
+                (os.path.join(enabled, "ocsp-ssl.conf"),
+                 "ocspvhost.com", True, True, False),
+                (os.path.join(enabled, "wildcard.conf"),
+                 "ip-172-30-0-17", False, True, False),
+                ("apache2.conf", "vhost.in.rootconf", False, True, False),
+            ]))
+        self.assertTrue("dav_module" in parser.modules)
+
+    def test_no_configuration(self):
+        os.remove(os.path.join(self.root, "apache2.conf"))
+        self.assertRaises(errors.NoInstallationError, self._call)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
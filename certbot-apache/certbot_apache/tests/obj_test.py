@@ -136,5 +136,67 @@ class AddrTest(unittest.TestCase):
         self.assertTrue(self.addr != self.addr1)
 
 
+
+class VirtualHostIndexTest(unittest.TestCase):
+    """Test the VirtualHostIndex class."""
+
+    def setUp(self):
+        from certbot_apache.obj import Addr
+        from certbot_apache.obj import VirtualHost
+        self.vhost_plain = VirtualHost(
+            "fp", "vhp", set([Addr.fromstring("*:80")]), False, False,
+            "example.org", set(["www.example.org"]))
+        self.vhost_wildcard = VirtualHost(
+            "fp", "vhp", set([Addr.fromstring("*:443")]), True, False,
+            None, set(["*.Example.org", "[bad].example.org"]))
+        self.vhost_addr = VirtualHost(
+            "fp", "vhp", set([Addr.fromstring("10.0.0.1:80")]), False, False)
+        self.vhosts = [self.vhost_plain, self.vhost_wildcard, self.vhost_addr]
+
+        from certbot_apache.obj import VirtualHostIndex
+        self.index = VirtualHostIndex(self.vhosts)
+
+    def test_find(self):
+        self.assertEqual(self.index.find("www.example.org"),
+                         [self.vhost_plain, self.vhost_wildcard])
+        self.assertEqual(self.index.find("WWW.example.org"),
+                         [self.vhost_plain, self.vhost_wildcard])
+        self.assertEqual(self.index.find("bad.example.org"),
+                         [self.vhost_wildcard])
+        self.assertEqual(self.index.find("[bad].example.org"),
+                         [self.vhost_wildcard])
+        self.assertEqual(self.index.find("10.0.0.1"), [self.vhost_addr])
+        self.assertEqual(self.index.find("example.com"), [])
+
+    def test_find_wildcard(self):
+        self.assertEqual(self.index.find_wildcard("*.example.org"),
+                         [self.vhost_plain, self.vhost_wildcard])
+        self.assertEqual(self.index.find_wildcard("*.example.com"), [])
+        self.assertEqual(self.index.find_wildcard("www.example.org"), None)
+        self.assertEqual(self.index.find_wildcard("*.*.org"), None)
+
+    def test_add_and_update_names(self):
+        from certbot_apache.obj import VirtualHost
+        self.assertTrue(self.index.is_current(self.vhosts))
+        new_vhost = VirtualHost("fp", "vhp", set(), True, False, "example.com")
+        self.vhosts.append(new_vhost)
+        self.assertFalse(self.index.is_current(self.vhosts))
+        self.index.add(new_vhost)
+        self.assertTrue(self.index.is_current(self.vhosts))
+        self.assertEqual(self.index.find("example.com"), [new_vhost])
+
+        self.vhost_addr.aliases.add("example.com")
+        self.index.update_names(self.vhost_addr)
+        self.assertEqual(self.index.find("example.com"),
+                         [self.vhost_addr, new_vhost])
+        self.assertTrue(self.index.contains([new_vhost, self.vhost_plain]))
+        self.assertFalse(self.index.contains([VirtualHost(
+            "fp", "vhp", set(), True, False)]))
+
+        # Vhosts not added to the end of the list are not indexed
+        self.index.add(self.vhost_plain)
+        self.assertTrue(self.index.is_current(self.vhosts))
+        self.assertFalse(self.index.is_current(list(self.vhosts)))
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
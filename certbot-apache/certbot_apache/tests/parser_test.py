@@ -11,7 +11,7 @@ from certbot import errors
 from certbot_apache.tests import util
 
 
-class BasicParserTest(util.ParserTest):
+class BasicParserTest(util.ParserTest):  # pylint: disable=too-many-public-methods
     """Apache Parser Test."""
 
     def setUp(self):  # pylint: disable=arguments-differ
@@ -22,6 +22,15 @@ class BasicParserTest(util.ParserTest):
         shutil.rmtree(self.config_dir)
         shutil.rmtree(self.work_dir)
 
+    def _make_not_parsed_file(self, name):
+        """Create an empty file in a directory not included by Apache."""
+        directory = os.path.join(self.config_path, "not-parsed-by-default")
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        path = os.path.join(directory, name)
+        open(path, "w").close()
+        return path
+
     def test_find_config_root_no_root(self):
         # pylint: disable=protected-access
         os.remove(self.parser.loc["root"])
@@ -46,6 +55,56 @@ class BasicParserTest(util.ParserTest):
 
         self.assertTrue(matches)
 
+    def test_parse_files(self):
+        paths = [os.path.join(self.config_path, "not-parsed-by-default", name)
+                 for name in ("certbot.conf", "*")]
+        with mock.patch.object(self.parser.aug, "load") as mock_load:
+            self.parser.parse_files(paths)
+        # The second path replaces the transform of the first one
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertTrue(self.parser.aug.match(
+            "/augeas/load/Httpd/incl [. ='%s']" % paths[1]))
+        self.assertFalse(self.parser.aug.match(
+            "/augeas/load/Httpd/incl [. ='%s']" % paths[0]))
+
+    def test_parse_files_incremental(self):
+        path = self._make_not_parsed_file("certbot.conf")
+        with mock.patch.object(self.parser.aug, "load") as mock_load:
+            with mock.patch.object(self.parser.aug, "load_file",
+                                   create=True) as mock_load_file:
+                self.parser.parse_files([path, path])
+        mock_load_file.assert_called_once_with(path)
+        self.assertFalse(mock_load.called)
+
+    def test_parse_files_incremental_unavailable(self):
+        path = self._make_not_parsed_file("certbot.conf")
+        with mock.patch.object(self.parser.aug, "load") as mock_load:
+            with mock.patch.object(self.parser.aug, "load_file", create=True,
+                                   side_effect=IOError) as mock_load_file:
+                self.parser.parse_files([path])
+        self.assertTrue(mock_load_file.called)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_parse_files_incremental_runtime_error(self):
+        path = self._make_not_parsed_file("certbot.conf")
+        with mock.patch.object(self.parser.aug, "load") as mock_load:
+            with mock.patch.object(self.parser.aug, "load_file", create=True,
+                                   side_effect=RuntimeError) as mock_load_file:
+                self.parser.parse_files([path])
+        self.assertTrue(mock_load_file.called)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_parse_files_incremental_excluded(self):
+        path = self._make_not_parsed_file("certbot.conf")
+        for name in ("backup.conf~", "certbot.conf.dpkg-old"):
+            self._make_not_parsed_file(name)
+        with mock.patch.object(self.parser.aug, "load") as mock_load:
+            with mock.patch.object(self.parser.aug, "load_file",
+                                   create=True) as mock_load_file:
+                self.parser.parse_files([os.path.join(os.path.dirname(path), "*")])
+        mock_load_file.assert_called_once_with(path)
+        self.assertFalse(mock_load.called)
+
     def test_find_dir(self):
         test = self.parser.find_dir("Listen", "80")
         # This will only look in enabled hosts
@@ -54,6 +113,45 @@ class BasicParserTest(util.ParserTest):
         self.assertEqual(len(test), 1)
         self.assertEqual(len(test2), 8)
 
+    def test_find_dir_cache(self):
+        aug_default = "/files" + self.parser.loc["default"]
+        test = self.parser.find_dir("Listen", "80")
+        info = self.parser.find_dir_cache_info()
+        # Cached results are copies
+        test.append("modified")
+        self.assertEqual(self.parser.find_dir("Listen", "80"), test[:-1])
+        self.assertEqual(self.parser.find_dir_cache_info().hits, info.hits + 1)
+        self.assertEqual(self.parser.find_dir_cache_info().misses, info.misses)
+
+        # Changes of the Augeas tree invalidate the cache
+        self.parser.add_dir(aug_default, "Listen", "80")
+        self.assertEqual(len(self.parser.find_dir("Listen", "80")), 2)
+        self.parser.aug.remove(aug_default + "/directive[last()]")
+        self.assertEqual(len(self.parser.find_dir("Listen", "80")), 1)
+
+        # And so do changes of the modules or the variables
+        self.parser.add_dir_to_ifmodssl(aug_default, "FakeDirective", ["123"])
+        self.assertEqual(self.parser.find_dir("FakeDirective", "123"), [])
+        self.parser.modules.add("mod_ssl.c")
+        self.assertEqual(len(self.parser.find_dir("FakeDirective", "123")), 1)
+        self.assertTrue(self.parser.find_dir_cache_info().misses > info.misses)
+
+    def test_tracked_augeas(self):
+        from certbot_apache.parser import TrackedAugeas
+        generation = self.parser.aug.generation
+        self.parser.aug.match("/files")
+        self.parser.aug.get("/augeas/root")
+        self.assertEqual(self.parser.aug.generation, generation)
+        self.parser.aug.set("/test/path", "value")
+        self.assertEqual(self.parser.aug.generation, generation + 1)
+        with mock.patch.object(self.parser.aug, "match"):
+            pass
+        self.assertEqual(self.parser.aug.generation, generation + 3)
+        # The Augeas object given to the parser is wrapped
+        self.assertTrue(isinstance(self.parser.aug, TrackedAugeas))
+        self.assertTrue(isinstance(
+            self.parser.aug._aug, augeas.Augeas))  # pylint: disable=protected-access
+
     def test_add_dir(self):
         aug_default = "/files" + self.parser.loc["default"]
         self.parser.add_dir(aug_default, "AddDirective", "test")
@@ -242,13 +340,14 @@ class BasicParserTest(util.ParserTest):
 
         self.parser.modules = set()
         with mock.patch(
-            "certbot_apache.parser.ApacheParser.parse_file") as mock_parse:
+            "certbot_apache.parser.ApacheParser.parse_files") as mock_parse:
             self.parser.update_runtime_variables()
             self.assertEqual(self.parser.variables, expected_vars)
             self.assertEqual(len(self.parser.modules), 58)
             # None of the includes in inc_val should be in parsed paths.
-            # Make sure we tried to include them all.
-            self.assertEqual(mock_parse.call_count, 25)
+            # Make sure we tried to include them all, at once.
+            self.assertEqual(mock_parse.call_count, 1)
+            self.assertEqual(len(mock_parse.call_args[0][0]), 25)
 
     @mock.patch("certbot_apache.parser.ApacheParser.find_dir")
     @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
@@ -265,13 +364,13 @@ class BasicParserTest(util.ParserTest):
         self.parser.modules = set()
 
         with mock.patch(
-            "certbot_apache.parser.ApacheParser.parse_file") as mock_parse:
+            "certbot_apache.parser.ApacheParser.parse_files") as mock_parse:
             self.parser.update_runtime_variables()
             # No matching modules should have been found
             self.assertEqual(len(self.parser.modules), 0)
             # Only one of the three includes do not exist in already parsed
             # path derived from root configuration Include statements
-            self.assertEqual(mock_parse.call_count, 1)
+            self.assertEqual(len(mock_parse.call_args[0][0]), 1)
 
     @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
     def test_update_runtime_vars_bad_output(self, mock_cfg):
@@ -282,6 +381,113 @@ class BasicParserTest(util.ParserTest):
         self.assertRaises(
             errors.PluginError, self.parser.update_runtime_variables)
 
+    @mock.patch("certbot_apache.parser.ApacheParser.parse_files")
+    @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
+    def test_update_runtime_vars_single_invocation(self, mock_cfg, mock_parse):
+        included = os.path.join(self.config_path, "ports.conf")
+        mock_cfg.return_value = (
+            'ServerRoot: "/etc/apache2"\n'
+            'Define: DUMP_RUN_CFG\n'
+            'Define: DUMP_INCLUDES\n'
+            'Define: DUMP_MODULES\n'
+            'Define: TLS=443\n'
+            'Included configuration files:\n'
+            '  (*) {0}\n'
+            '    (146) /etc/apache2/mods-enabled/alias.load\n'
+            'Loaded Modules:\n'
+            ' core_module (static)\n'
+            ' alias_module (shared)\n'
+        ).format(included)
+        self.parser.modules = set()
+
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 1)
+        self.assertEqual(self.parser.variables, {"TLS": "443"})
+        self.assertTrue("alias_module" in self.parser.modules)
+        self.assertEqual(mock_parse.call_args[0][0],
+                         ["/etc/apache2/mods-enabled/alias.load"])
+
+        # The dumps are cached until an included file changes
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 1)
+        stat = os.stat(included)
+        os.utime(included, (stat.st_atime, stat.st_mtime + 10))
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 2)
+
+        # ... or the environment of httpd changes
+        with mock.patch.dict(os.environ, {"APACHE_ARGUMENTS": "-D FOO"}):
+            self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 3)
+        sysconfig = os.path.join(self.config_path, "sysconfig")
+        with mock.patch("certbot_apache.parser._RUNTIME_ENV_FILES", [sysconfig]):
+            self.parser.update_runtime_variables()
+            self.assertEqual(mock_cfg.call_count, 4)
+            self.parser.update_runtime_variables()
+            self.assertEqual(mock_cfg.call_count, 4)
+            with open(sysconfig, "w") as sysconfig_file:
+                sysconfig_file.write('OPTIONS="-D FOO"\n')
+            self.parser.update_runtime_variables()
+            self.assertEqual(mock_cfg.call_count, 5)
+
+    @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
+    def test_update_runtime_vars_corrupted_cache(self, mock_cfg):
+        from certbot_apache import constants
+        mock_cfg.return_value = ""
+        with open(os.path.join(self.config.config.work_dir,
+                               constants.RUNTIME_CFG_CACHE), "w") as cache:
+            cache.write("[")
+        self.parser.update_runtime_variables()
+        # The dumps are gathered separately
+        self.assertEqual(mock_cfg.call_count, 4)
+
+    @mock.patch("certbot_apache.parser.ApacheParser.parse_files")
+    @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
+    def test_update_runtime_vars_include_dir_changed(self, mock_cfg, unused_parse):
+        mock_cfg.return_value = (
+            'Define: DUMP_RUN_CFG\n'
+            'Define: DUMP_INCLUDES\n'
+            'Define: DUMP_MODULES\n'
+            'Included configuration files:\n'
+            '  (*) {0}\n'
+            'Loaded Modules:\n'
+            ' core_module (static)\n'
+        ).format(self.parser.loc["root"])
+        self.parser.update_runtime_variables()
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 1)
+
+        # A site is enabled in sites-enabled, matched by an IncludeOptional
+        # glob of the root configuration file
+        sites_enabled = os.path.join(self.config_path, "sites-enabled")
+        stat = os.stat(sites_enabled)
+        open(os.path.join(sites_enabled, "new.conf"), "w").close()
+        os.utime(sites_enabled, (stat.st_atime, stat.st_mtime + 10))
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 2)
+
+    def test_include_dirs(self):
+        from certbot_apache.parser import _include_dirs
+        conf = os.path.join(self.config.config.work_dir, "include.conf")
+        with open(conf, "w") as conf_file:
+            conf_file.write('Include ports.conf\n'
+                            '  includeoptional "sites enabled/*.conf"\n'
+                            '# Include commented.conf\n'
+                            'IncludeOptional ${APACHE_CONFDIR}/conf.d/*.conf\n'
+                            'Include /etc/httpd/conf.d/*/*.conf\n')
+        self.assertEqual(_include_dirs(conf, "/etc/apache2"), [
+            "/etc/apache2/ports.conf", "/etc/apache2/sites enabled",
+            "/etc/httpd/conf.d"])
+        self.assertEqual(_include_dirs(conf + ".missing", "/etc/apache2"), [])
+
+    @mock.patch("certbot_apache.parser.compat.os_rename")
+    def test_write_runtime_cfg_cache_failure(self, mock_rename):
+        from certbot_apache.parser import _write_runtime_cfg_cache
+        mock_rename.side_effect = OSError
+        cache_path = os.path.join(self.config.config.work_dir, "cache")
+        _write_runtime_cfg_cache(cache_path, [], [], {})
+        self.assertFalse(os.path.exists(cache_path))
+
     @mock.patch("certbot_apache.configurator.ApacheConfigurator.option")
     @mock.patch("certbot_apache.parser.subprocess.Popen")
     def test_update_runtime_vars_bad_ctl(self, mock_popen, mock_opt):
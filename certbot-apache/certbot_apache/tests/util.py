@@ -98,6 +98,7 @@ def get_apache_configurator(  # pylint: disable=too-many-arguments, too-many-loc
     mock_le_config = mock.MagicMock(
         apache_server_root=config_path,
         apache_vhost_root=None,
+        apache_native_parser=False,
         apache_le_vhost_ext="-le-ssl.conf",
         apache_challenge_location=config_path,
         apache_enmod=None,
@@ -24,6 +24,8 @@ class Authenticator(dns_common.DNSAuthenticator):
     description = ('Obtain certificates using a DNS TXT record (if you are using Cloudflare for '
                    'DNS).')
     ttl = 120
+    # Each operation uses its own client, within the rate limits of the API
+    max_concurrent_operations = 4
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using CloudXNS for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -58,7 +59,8 @@ class Authenticator(dns_common.DNSAuthenticator):
     def _get_cloudxns_client(self):
         return _CloudXNSLexiconClient(self.credentials.conf('api-key'),
                                       self.credentials.conf('secret-key'),
-                                      self.ttl)
+                                      self.ttl,
+                                      zone_cache=self._get_zone_cache())
 
 
 class _CloudXNSLexiconClient(dns_common_lexicon.LexiconClient):
@@ -66,8 +68,8 @@ class _CloudXNSLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the CloudXNS via Lexicon.
     """
 
-    def __init__(self, api_key, secret_key, ttl):
-        super(_CloudXNSLexiconClient, self).__init__()
+    def __init__(self, api_key, secret_key, ttl, zone_cache=None):
+        super(_CloudXNSLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('cloudxns', {
             'ttl': ttl,
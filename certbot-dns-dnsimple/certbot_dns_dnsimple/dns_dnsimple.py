@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using DNSimple for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -54,7 +55,8 @@ class Authenticator(dns_common.DNSAuthenticator):
         self._get_dnsimple_client().del_txt_record(domain, validation_name, validation)
 
     def _get_dnsimple_client(self):
-        return _DNSimpleLexiconClient(self.credentials.conf('token'), self.ttl)
+        return _DNSimpleLexiconClient(self.credentials.conf('token'), self.ttl,
+                                      zone_cache=self._get_zone_cache())
 
 
 class _DNSimpleLexiconClient(dns_common_lexicon.LexiconClient):
@@ -62,8 +64,8 @@ class _DNSimpleLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the DNSimple via Lexicon.
     """
 
-    def __init__(self, token, ttl):
-        super(_DNSimpleLexiconClient, self).__init__()
+    def __init__(self, token, ttl, zone_cache=None):
+        super(_DNSimpleLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('dnssimple', {
             'ttl': ttl,
@@ -25,6 +25,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         dns_test_common.write({"dnsimple_token": TOKEN}, path)
 
         self.config = mock.MagicMock(dnsimple_credentials=path,
+                                     dnsimple_propagation_check=False,
                                      dnsimple_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "dnsimple")
@@ -25,6 +25,7 @@ class Authenticator(dns_common.DNSAuthenticator):
     description = ('Obtain certificates using a DNS TXT record (if you are using DNS Made Easy for '
                    'DNS).')
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -60,7 +61,8 @@ class Authenticator(dns_common.DNSAuthenticator):
     def _get_dnsmadeeasy_client(self):
         return _DNSMadeEasyLexiconClient(self.credentials.conf('api-key'),
                                          self.credentials.conf('secret-key'),
-                                         self.ttl)
+                                         self.ttl,
+                                         zone_cache=self._get_zone_cache())
 
 
 class _DNSMadeEasyLexiconClient(dns_common_lexicon.LexiconClient):
@@ -68,8 +70,8 @@ class _DNSMadeEasyLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the DNS Made Easy via Lexicon.
     """
 
-    def __init__(self, api_key, secret_key, ttl):
-        super(_DNSMadeEasyLexiconClient, self).__init__()
+    def __init__(self, api_key, secret_key, ttl, zone_cache=None):
+        super(_DNSMadeEasyLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('dnsmadeeasy', {
             'ttl': ttl,
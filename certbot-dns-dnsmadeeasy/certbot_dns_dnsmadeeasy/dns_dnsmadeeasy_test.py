@@ -29,6 +29,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
                               path)
 
         self.config = mock.MagicMock(dnsmadeeasy_credentials=path,
+                                     dnsmadeeasy_propagation_check=False,
                                      dnsmadeeasy_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "dnsmadeeasy")
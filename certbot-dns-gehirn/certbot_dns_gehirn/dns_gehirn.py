@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
     description = 'Obtain certificates using a DNS TXT record ' + \
                   '(if you are using Gehirn Infrastracture Service for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -60,7 +61,8 @@ class Authenticator(dns_common.DNSAuthenticator):
         return _GehirnLexiconClient(
             self.credentials.conf('api-token'),
             self.credentials.conf('api-secret'),
-            self.ttl
+            self.ttl,
+            zone_cache=self._get_zone_cache()
         )
 
 
@@ -69,8 +71,8 @@ class _GehirnLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the Gehirn Infrastracture Service via Lexicon.
     """
 
-    def __init__(self, api_token, api_secret, ttl):
-        super(_GehirnLexiconClient, self).__init__()
+    def __init__(self, api_token, api_secret, ttl, zone_cache=None):
+        super(_GehirnLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('gehirn', {
             'ttl': ttl,
@@ -29,6 +29,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         )
 
         self.config = mock.MagicMock(gehirn_credentials=path,
+                                     gehirn_propagation_check=False,
                                      gehirn_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "gehirn")
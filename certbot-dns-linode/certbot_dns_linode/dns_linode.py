@@ -22,6 +22,7 @@ class Authenticator(dns_common.DNSAuthenticator):
     """
 
     description = 'Obtain certs using a DNS TXT record (if you are using Linode for DNS).'
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -52,7 +53,7 @@ class Authenticator(dns_common.DNSAuthenticator):
         self._get_linode_client().del_txt_record(domain, validation_name, validation)
 
     def _get_linode_client(self):
-        return _LinodeLexiconClient(self.credentials.conf('key'))
+        return _LinodeLexiconClient(self.credentials.conf('key'), zone_cache=self._get_zone_cache())
 
 
 class _LinodeLexiconClient(dns_common_lexicon.LexiconClient):
@@ -60,8 +61,8 @@ class _LinodeLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the Linode API.
     """
 
-    def __init__(self, api_key):
-        super(_LinodeLexiconClient, self).__init__()
+    def __init__(self, api_key, zone_cache=None):
+        super(_LinodeLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('linode', {}, {
             'auth_token': api_key,
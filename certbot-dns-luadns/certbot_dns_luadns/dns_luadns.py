@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using LuaDNS for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -57,7 +58,8 @@ class Authenticator(dns_common.DNSAuthenticator):
     def _get_luadns_client(self):
         return _LuaDNSLexiconClient(self.credentials.conf('email'),
                                     self.credentials.conf('token'),
-                                    self.ttl)
+                                    self.ttl,
+                                    zone_cache=self._get_zone_cache())
 
 
 class _LuaDNSLexiconClient(dns_common_lexicon.LexiconClient):
@@ -65,8 +67,8 @@ class _LuaDNSLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the LuaDNS via Lexicon.
     """
 
-    def __init__(self, email, token, ttl):
-        super(_LuaDNSLexiconClient, self).__init__()
+    def __init__(self, email, token, ttl, zone_cache=None):
+        super(_LuaDNSLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('luadns', {
             'ttl': ttl,
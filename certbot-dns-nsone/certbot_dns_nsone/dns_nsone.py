@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using NS1 for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -54,7 +55,8 @@ class Authenticator(dns_common.DNSAuthenticator):
         self._get_nsone_client().del_txt_record(domain, validation_name, validation)
 
     def _get_nsone_client(self):
-        return _NS1LexiconClient(self.credentials.conf('api-key'), self.ttl)
+        return _NS1LexiconClient(self.credentials.conf('api-key'), self.ttl,
+                                 zone_cache=self._get_zone_cache())
 
 
 class _NS1LexiconClient(dns_common_lexicon.LexiconClient):
@@ -62,8 +64,8 @@ class _NS1LexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the NS1 via Lexicon.
     """
 
-    def __init__(self, api_key, ttl):
-        super(_NS1LexiconClient, self).__init__()
+    def __init__(self, api_key, ttl, zone_cache=None):
+        super(_NS1LexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('nsone', {
             'ttl': ttl,
@@ -26,6 +26,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         dns_test_common.write({"nsone_api_key": API_KEY}, path)
 
         self.config = mock.MagicMock(nsone_credentials=path,
+                                     nsone_propagation_check=False,
                                      nsone_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "nsone")
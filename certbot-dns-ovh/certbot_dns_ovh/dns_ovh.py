@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using OVH for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -65,7 +66,8 @@ class Authenticator(dns_common.DNSAuthenticator):
             self.credentials.conf('application-key'),
             self.credentials.conf('application-secret'),
             self.credentials.conf('consumer-key'),
-            self.ttl
+            self.ttl,
+            zone_cache=self._get_zone_cache()
         )
 
 
@@ -74,8 +76,10 @@ class _OVHLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the OVH API via Lexicon.
     """
 
-    def __init__(self, endpoint, application_key, application_secret, consumer_key, ttl):
-        super(_OVHLexiconClient, self).__init__()
+    def __init__(self, endpoint, application_key, application_secret, consumer_key, ttl,
+                 zone_cache=None):
+        # pylint: disable=too-many-arguments
+        super(_OVHLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('ovh', {
             'ttl': ttl,
@@ -34,6 +34,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         dns_test_common.write(credentials, path)
 
         self.config = mock.MagicMock(ovh_credentials=path,
+                                     ovh_propagation_check=False,
                                      ovh_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "ovh")
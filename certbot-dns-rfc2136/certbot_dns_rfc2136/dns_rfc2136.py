@@ -40,6 +40,9 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using BIND for DNS).'
     ttl = 120
+    # Each operation sends its own update message
+    max_concurrent_operations = 10
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -84,20 +87,23 @@ class Authenticator(dns_common.DNSAuthenticator):
                               self.credentials.conf('name'),
                               self.credentials.conf('secret'),
                               self.ALGORITHMS.get(self.credentials.conf('algorithm'),
-                                                  dns.tsig.HMAC_MD5))
+                                                  dns.tsig.HMAC_MD5),
+                              self._get_zone_cache())
 
 
 class _RFC2136Client(object):
     """
     Encapsulates all communication with the target DNS server.
     """
-    def __init__(self, server, port, key_name, key_secret, key_algorithm):
+    def __init__(self, server, port, key_name, key_secret, key_algorithm, zone_cache=None):
+        # pylint: disable=too-many-arguments
         self.server = server
         self.port = port
         self.keyring = dns.tsigkeyring.from_text({
             key_name: key_secret
         })
         self.algorithm = key_algorithm
+        self.zone_cache = zone_cache or dns_common.ZoneCache()
 
     def add_txt_record(self, record_name, record_content, record_ttl):
         """
@@ -179,15 +185,14 @@ class _RFC2136Client(object):
         :raises certbot.errors.PluginError: if no SOA record can be found.
         """
 
-        domain_name_guesses = dns_common.base_domain_name_guesses(record_name)
-
-        # Loop through until we find an authoritative SOA record
-        for guess in domain_name_guesses:
-            if self._query_soa(guess):
-                return guess
+        # Find the closest base domain with an authoritative SOA record
+        domain = self.zone_cache.find_zone(record_name, self._query_soa)
+        if domain is not None:
+            return domain
 
         raise errors.PluginError('Unable to determine base domain for {0} using names: {1}.'
-                                 .format(record_name, domain_name_guesses))
+                                 .format(record_name,
+                                         dns_common.base_domain_name_guesses(record_name)))
 
     def _query_soa(self, domain_name):
         """
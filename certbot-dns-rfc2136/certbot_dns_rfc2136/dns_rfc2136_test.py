@@ -31,6 +31,7 @@ class AuthenticatorTest(test_util.TempDirTestCase, dns_test_common.BaseAuthentic
         dns_test_common.write(VALID_CONFIG, path)
 
         self.config = mock.MagicMock(rfc2136_credentials=path,
+                                     rfc2136_propagation_check=False,
                                      rfc2136_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "rfc2136")
@@ -152,6 +153,17 @@ class RFC2136ClientTest(unittest.TestCase):
 
         self.assertTrue(domain == DOMAIN)
 
+    def test_find_domain_cached(self):
+        # _query_soa | pylint: disable=protected-access
+        self.rfc2136_client._query_soa = mock.MagicMock(side_effect=[False, False, True, False])
+
+        # _find_domain | pylint: disable=protected-access
+        self.rfc2136_client._find_domain('foo.bar.'+DOMAIN)
+        domain = self.rfc2136_client._find_domain('baz.bar.'+DOMAIN)
+
+        self.assertTrue(domain == DOMAIN)
+        self.assertEqual(self.rfc2136_client._query_soa.call_count, 4)
+
     def test_find_domain_wraps_errors(self):
         # _query_soa | pylint: disable=protected-access
         self.rfc2136_client._query_soa = mock.MagicMock(return_value=False)
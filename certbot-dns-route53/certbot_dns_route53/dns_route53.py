@@ -11,7 +11,7 @@ from certbot import errors
 from certbot import interfaces
 from certbot.plugins import dns_common
 
-from acme.magic_typing import DefaultDict, List, Dict # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import DefaultDict, List, Dict, Optional # pylint: disable=unused-import, no-name-in-module
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +32,15 @@ class Authenticator(dns_common.DNSAuthenticator):
     description = ("Obtain certificates using a DNS TXT record (if you are using AWS Route53 for "
                    "DNS).")
     ttl = 10
+    uses_zone_cache = True
+    # perform waits for the Route53 changes to be in sync instead
+    uses_propagation_check = False
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
         self.r53 = boto3.client("route53")
         self._resource_records = collections.defaultdict(list) # type: DefaultDict[str, List[Dict[str, str]]]
+        self._hosted_zones = None # type: Optional[Dict[str, str]]
 
     def more_info(self):  # pylint: disable=missing-docstring,no-self-use
         return "Solve a DNS01 challenge using AWS Route53"
@@ -77,29 +81,31 @@ class Authenticator(dns_common.DNSAuthenticator):
            That is, the id for the zone whose name is the longest parent of the
            domain.
         """
-        paginator = self.r53.get_paginator("list_hosted_zones")
-        zones = []
-        target_labels = domain.rstrip(".").split(".")
-        for page in paginator.paginate():
-            for zone in page["HostedZones"]:
-                if zone["Config"]["PrivateZone"]:
-                    continue
-
-                candidate_labels = zone["Name"].rstrip(".").split(".")
-                if candidate_labels == target_labels[-len(candidate_labels):]:
-                    zones.append((zone["Name"], zone["Id"]))
-
-        if not zones:
+        # The hosted zones are only listed if the zone of the domain is not cached
+        zone, zone_id = self._get_zone_cache().find_zone_data(
+            domain, lambda name: self._get_hosted_zones().get(name))
+
+        if zone is None:
             raise errors.PluginError(
                 "Unable to find a Route53 hosted zone for {0}".format(domain)
             )
+        return zone_id
+
+    def _get_hosted_zones(self):
+        """Get the ids of the public hosted zones, by zone name.
 
-        # Order the zones that are suffixes for our desired to domain by
-        # length, this puts them in an order like:
-        # ["foo.bar.baz.com", "bar.baz.com", "baz.com", "com"]
-        # And then we choose the first one, which will be the most specific.
-        zones.sort(key=lambda z: len(z[0]), reverse=True)
-        return zones[0][1]
+           The zones are only listed once per run, and not at all when the
+           zones of the domains are cached.
+        """
+        if self._hosted_zones is None:
+            zones = {}
+            paginator = self.r53.get_paginator("list_hosted_zones")
+            for page in paginator.paginate():
+                for zone in page["HostedZones"]:
+                    if not zone["Config"]["PrivateZone"]:
+                        zones[zone["Name"].rstrip(".")] = zone["Id"]
+            self._hosted_zones = zones
+        return self._hosted_zones
 
     def _change_txt_record(self, action, validation_domain_name, validation):
         zone_id = self._find_zone_id_for_domain(validation_domain_name)
@@ -118,23 +124,31 @@ class Authenticator(dns_common.DNSAuthenticator):
         else:
             rrecords.append(challenge)
 
-        response = self.r53.change_resource_record_sets(
-            HostedZoneId=zone_id,
-            ChangeBatch={
-                "Comment": "certbot-dns-route53 certificate validation " + action,
-                "Changes": [
-                    {
-                        "Action": action,
-                        "ResourceRecordSet": {
-                            "Name": validation_domain_name,
-                            "Type": "TXT",
-                            "TTL": self.ttl,
-                            "ResourceRecords": rrecords,
-                        }
+        change_batch = {
+            "Comment": "certbot-dns-route53 certificate validation " + action,
+            "Changes": [
+                {
+                    "Action": action,
+                    "ResourceRecordSet": {
+                        "Name": validation_domain_name,
+                        "Type": "TXT",
+                        "TTL": self.ttl,
+                        "ResourceRecords": rrecords,
                     }
-                ]
-            }
-        )
+                }
+            ]
+        }
+        try:
+            response = self.r53.change_resource_record_sets(
+                HostedZoneId=zone_id, ChangeBatch=change_batch)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchHostedZone":
+                raise
+            # The zone was cached by an earlier run and is not hosted anymore
+            self._get_zone_cache().invalidate(validation_domain_name)
+            response = self.r53.change_resource_record_sets(
+                HostedZoneId=self._find_zone_id_for_domain(validation_domain_name),
+                ChangeBatch=change_batch)
         return response["ChangeInfo"]["Id"]
 
     def _wait_for_change(self, change_id):
@@ -1,6 +1,8 @@
 """Tests for certbot_dns_route53.dns_route53.Authenticator"""
 
 import os
+import shutil
+import tempfile
 import unittest
 
 import mock
@@ -19,7 +21,7 @@ class AuthenticatorTest(unittest.TestCase, dns_test_common.BaseAuthenticatorTest
 
         super(AuthenticatorTest, self).setUp()
 
-        self.config = mock.MagicMock()
+        self.config = mock.MagicMock(route53_zone_cache_seconds=0)
 
         # Set up dummy credentials for testing
         os.environ["AWS_ACCESS_KEY_ID"] = "dummy_access_key"
@@ -44,6 +46,11 @@ class AuthenticatorTest(unittest.TestCase, dns_test_common.BaseAuthenticatorTest
                                                              mock.ANY)
         self.assertEqual(self.auth._wait_for_change.call_count, 1)
 
+    def test_no_propagation_check(self):
+        m = mock.MagicMock()
+        self.auth.add_parser_arguments(m)
+        self.assertFalse('propagation-check' in [args[0] for args, _ in m.call_args_list])
+
     def test_perform_no_credentials_error(self):
         self.auth._change_txt_record = mock.MagicMock(side_effect=NoCredentialsError)
 
@@ -126,7 +133,7 @@ class ClientTest(unittest.TestCase):
 
         super(ClientTest, self).setUp()
 
-        self.config = mock.MagicMock()
+        self.config = mock.MagicMock(route53_zone_cache_seconds=0)
 
         # Set up dummy credentials for testing
         os.environ["AWS_ACCESS_KEY_ID"] = "dummy_access_key"
@@ -174,6 +181,74 @@ class ClientTest(unittest.TestCase):
         result = self.client._find_zone_id_for_domain("foo.example.com")
         self.assertEqual(result, "FOO")
 
+    def test_find_zone_id_for_domain_listed_once(self):
+        self.client.r53.get_paginator = mock.MagicMock()
+        self.client.r53.get_paginator().paginate.return_value = [
+            {
+                "HostedZones": [
+                    self.EXAMPLE_NET_ZONE,
+                    self.EXAMPLE_COM_ZONE,
+                ]
+            }
+        ]
+
+        self.client._find_zone_id_for_domain("foo.example.com")
+        result = self.client._find_zone_id_for_domain("foo.example.net")
+        self.assertEqual(result, "BAD-WRONG-TLD")
+        self.assertEqual(self.client.r53.get_paginator().paginate.call_count, 1)
+
+    def test_find_zone_id_for_domain_cached_on_disk(self):
+        from certbot_dns_route53.dns_route53 import Authenticator
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        self.config.route53_zone_cache_seconds = 3600
+        self.config.work_dir = work_dir
+        self.client.r53.get_paginator = mock.MagicMock()
+        self.client.r53.get_paginator().paginate.return_value = [
+            {
+                "HostedZones": [
+                    self.EXAMPLE_COM_ZONE,
+                ]
+            }
+        ]
+        self.client._find_zone_id_for_domain("foo.example.com")
+
+        client = Authenticator(self.config, "route53")
+        client.r53.get_paginator = mock.MagicMock()
+        result = client._find_zone_id_for_domain("foo.example.com")
+        self.assertEqual(result, "EXAMPLE")
+        self.assertFalse(client.r53.get_paginator.called)
+
+    def test_change_txt_record_stale_zone(self):
+        self.client.r53.get_paginator = mock.MagicMock()
+        self.client.r53.get_paginator().paginate.return_value = [
+            {
+                "HostedZones": [
+                    self.EXAMPLE_COM_ZONE,
+                ]
+            }
+        ]
+        # The zone was cached with another id by an earlier run
+        self.client._get_zone_cache().find_zone_data(
+            DOMAIN, lambda name: "STALE" if name == DOMAIN else None)
+        self.client.r53.change_resource_record_sets = mock.MagicMock(side_effect=[
+            ClientError({"Error": {"Code": "NoSuchHostedZone"}}, "bar"),
+            {"ChangeInfo": {"Id": 1}}])
+
+        self.assertEqual(self.client._change_txt_record("UPSERT", DOMAIN, "foo"), 1)
+        self.assertEqual(
+            [call[1]["HostedZoneId"]
+             for call in self.client.r53.change_resource_record_sets.call_args_list],
+            ["STALE", "EXAMPLE"])
+
+    def test_change_txt_record_client_error(self):
+        self.client._find_zone_id_for_domain = mock.MagicMock()
+        self.client.r53.change_resource_record_sets = mock.MagicMock(
+            side_effect=ClientError({"Error": {"Code": "foo"}}, "bar"))
+
+        self.assertRaises(ClientError, self.client._change_txt_record, "UPSERT", DOMAIN, "foo")
+        self.assertEqual(self.client.r53.change_resource_record_sets.call_count, 1)
+
     def test_find_zone_id_for_domain_no_results(self):
         self.client.r53.get_paginator = mock.MagicMock()
         self.client.r53.get_paginator().paginate.return_value = []
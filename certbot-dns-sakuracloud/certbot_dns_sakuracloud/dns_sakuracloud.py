@@ -24,6 +24,7 @@ class Authenticator(dns_common.DNSAuthenticator):
     description = 'Obtain certificates using a DNS TXT record ' + \
                   '(if you are using Sakura Cloud for DNS).'
     ttl = 60
+    uses_zone_cache = True
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
@@ -63,7 +64,8 @@ class Authenticator(dns_common.DNSAuthenticator):
         return _SakuraCloudLexiconClient(
             self.credentials.conf('api-token'),
             self.credentials.conf('api-secret'),
-            self.ttl
+            self.ttl,
+            zone_cache=self._get_zone_cache()
         )
 
 
@@ -72,8 +74,8 @@ class _SakuraCloudLexiconClient(dns_common_lexicon.LexiconClient):
     Encapsulates all communication with the Sakura Cloud via Lexicon.
     """
 
-    def __init__(self, api_token, api_secret, ttl):
-        super(_SakuraCloudLexiconClient, self).__init__()
+    def __init__(self, api_token, api_secret, ttl, zone_cache=None):
+        super(_SakuraCloudLexiconClient, self).__init__(zone_cache)
 
         config = dns_common_lexicon.build_lexicon_config('sakuracloud', {
             'ttl': ttl,
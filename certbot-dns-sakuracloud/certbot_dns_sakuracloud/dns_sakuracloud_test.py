@@ -29,6 +29,7 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         )
 
         self.config = mock.MagicMock(sakuracloud_credentials=path,
+                                     sakuracloud_propagation_check=False,
                                      sakuracloud_propagation_seconds=0)  # don't wait during tests
 
         self.auth = Authenticator(self.config, "sakuracloud")
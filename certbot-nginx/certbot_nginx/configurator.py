@@ -1,4 +1,6 @@
 """Nginx Configuration"""
+# pylint: disable=too-many-lines
+import collections
 import logging
 import os
 import re
@@ -28,7 +30,7 @@ from certbot_nginx import parser
 from certbot_nginx import tls_sni_01
 from certbot_nginx import http_01
 from certbot_nginx import obj # pylint: disable=unused-import
-from acme.magic_typing import List, Dict, Set # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import List, Dict, Set, Optional, Tuple # pylint: disable=unused-import, no-name-in-module
 
 
 NAME_RANK = 0
@@ -80,6 +82,18 @@ class NginxConfigurator(common.Installer):
         add("ctl", default=constants.CLI_DEFAULTS["ctl"], help="Path to the "
             "'nginx' binary, used for 'configtest' and retrieving nginx "
             "version number.")
+        add("native-parser", action="store_true",
+            default=constants.CLI_DEFAULTS["native_parser"],
+            help="Parse the Nginx configuration with a faster parser, written "
+            "without pyparsing. (experimental)")
+        add("parse-jobs", type=int, default=constants.CLI_DEFAULTS["parse_jobs"],
+            help="Number of processes parsing the Nginx configuration files "
+            "concurrently.")
+        add("shared-http01-responder", action="store_true",
+            default=constants.CLI_DEFAULTS["shared_http01_responder"],
+            help="Serve HTTP-01 challenges from files, through a location "
+            "included once in the server blocks of the challenged domains, so "
+            "that Nginx doesn't need to be reloaded for each authorization.")
 
     @property
     def nginx_conf(self):
@@ -105,6 +119,10 @@ class NginxConfigurator(common.Installer):
         # For creating new vhosts if no names match
         self.new_vhost = None
 
+        # Paths of the certificate and key used by vhosts made SSL
+        self._snakeoil_cert = None # type: Optional[str]
+        self._snakeoil_key = None # type: Optional[str]
+
         # List of vhosts configured per wildcard domain on this run.
         # used by deploy_cert() and enhance()
         self._wildcard_vhosts = {} # type: Dict[str, List[obj.VirtualHost]]
@@ -112,6 +130,8 @@ class NginxConfigurator(common.Installer):
 
         # Add number of outstanding challenges
         self._chall_out = 0
+        # Whether challenges modified the configuration temporarily
+        self._challenge_config_modified = False
 
         # These will be set in the prepare function
         self.parser = None
@@ -149,7 +169,10 @@ class NginxConfigurator(common.Installer):
         self.config_test()
 
 
-        self.parser = parser.NginxParser(self.conf('server-root'))
+        self.parser = parser.NginxParser(
+            self.conf('server-root'), native_parser=self.conf('native-parser'),
+            cache_dir=os.path.join(self.config.work_dir, constants.PARSE_CACHE_DIR),
+            parse_jobs=self.conf('parse-jobs'))
 
         install_ssl_options_conf(self.mod_ssl_conf, self.updated_mod_ssl_conf_digest)
 
@@ -192,6 +215,83 @@ class NginxConfigurator(common.Installer):
         for vhost in vhosts:
             self._deploy_cert(vhost, cert_path, key_path, chain_path, fullchain_path)
 
+    def deploy_certs(self, deployments, enhancements=None):
+        """Deploys several certificates, then saves and reloads Nginx once.
+
+        The virtual hosts of all the domains are modified, and the
+        enhancements enabled for all of them, before the configuration is
+        saved in a single checkpoint, tested and reloaded. If any
+        certificate or enhancement can't be deployed, none is. If the new
+        configuration can't be loaded, the checkpoint is rolled back.
+
+        :param list deployments: tuples of a list of domains and the
+            ``cert_path``, ``key_path``, ``chain_path`` and ``fullchain_path``
+            arguments of `deploy_cert` for the certificate of these domains
+        :param list enhancements: enhancements to enable, as tuples of an
+            enhancement name and its options
+
+        :raises errors.PluginError: When unable to deploy a certificate or
+            an enhancement due to a lack of directives or configuration
+        :raises errors.MisconfigurationError: When Nginx rejects or fails
+            to reload the new configuration
+
+        """
+        try:
+            # Each server block is made SSL and given a certificate once, even
+            # if several of the domains are served by it
+            for vhost, deployment in self._select_deployment_vhosts(deployments):
+                _, cert_path, key_path, chain_path, fullchain_path = deployment
+                if not vhost.ssl:
+                    self._make_server_ssl(vhost)
+                self._deploy_cert(vhost, cert_path, key_path, chain_path, fullchain_path)
+            for enhancement, options in enhancements or []:
+                for domain in common.deployed_domains(deployments):
+                    try:
+                        self.enhance(domain, enhancement, options)
+                    except errors.PluginEnhancementAlreadyPresent:
+                        logger.warning("Enhancement %s was already set for %s.",
+                                       enhancement, domain)
+        except errors.Error:
+            self.save_notes = ""
+            self.recovery_routine()
+            raise
+
+        self.save("Deployed ACME Certificates")
+        try:
+            self.config_test()
+            self.restart()
+        except errors.MisconfigurationError:
+            logger.error("Rolling back the deployment of %d certificates.",
+                         len(deployments))
+            self.rollback_checkpoints()
+            raise
+
+    def _select_deployment_vhosts(self, deployments):
+        """Selects the virtual hosts of all the domains of several certificates.
+
+        :param list deployments: deployments, as passed to `deploy_certs`
+
+        :returns: pairs of a vhost and the deployment of the certificate to
+            install in it, each vhost appearing once. If several certificates
+            are deployed to a vhost, the last one is used.
+        :rtype: `list` of `tuple`
+
+        :raises errors.PluginError: When the full chain of a certificate
+            is missing
+
+        """
+        selected = collections.OrderedDict()  # type: Dict[obj.VirtualHost, Tuple]
+        for deployment in deployments:
+            domains, fullchain_path = deployment[0], deployment[4]
+            if not fullchain_path:
+                raise errors.PluginError(
+                    "The nginx plugin currently requires --fullchain-path to "
+                    "install a cert.")
+            for domain in domains:
+                for vhost in self._select_vhosts(domain, create_if_no_match=True):
+                    selected[vhost] = deployment
+        return list(selected.items())
+
     def _deploy_cert(self, vhost, cert_path, key_path, chain_path, fullchain_path):
         # pylint: disable=unused-argument
         """
@@ -288,6 +388,26 @@ class NginxConfigurator(common.Installer):
         :returns: ssl vhosts associated with name
         :rtype: list of :class:`~certbot_nginx.obj.VirtualHost`
 
+        """
+        vhosts = self._select_vhosts(target_name, create_if_no_match)
+        # Note: if we are enhancing with ocsp, vhost should already be ssl.
+        for vhost in vhosts:
+            if not vhost.ssl:
+                self._make_server_ssl(vhost)
+
+        return vhosts
+
+    def _select_vhosts(self, target_name, create_if_no_match=False):
+        """Selects the virtual hosts of a domain name.
+
+        Unlike `choose_vhosts`, the selected vhosts aren't made SSL-enabled.
+
+        :param str target_name: domain name
+        :param bool create_if_no_match: see `choose_vhosts`
+
+        :returns: vhosts associated with name
+        :rtype: list of :class:`~certbot_nginx.obj.VirtualHost`
+
         """
         if util.is_wildcard_domain(target_name):
             # Ask user which VHosts to support.
@@ -307,11 +427,6 @@ class NginxConfigurator(common.Installer):
                              "please add a corresponding server_name directive to your "
                              "nginx configuration for every domain on your certificate: "
                              "https://nginx.org/en/docs/http/server_names.html") % (target_name))
-        # Note: if we are enhancing with ocsp, vhost should already be ssl.
-        for vhost in vhosts:
-            if not vhost.ssl:
-                self._make_server_ssl(vhost)
-
         return vhosts
 
     def ipv6_info(self, port):
@@ -396,8 +511,7 @@ class NginxConfigurator(common.Installer):
         :rtype: list
 
         """
-        vhost_list = self.parser.get_vhosts()
-        return self._rank_matches_by_name_and_ssl(vhost_list, target_name)
+        return self._rank_matches_by_name_and_ssl(target_name)
 
     def _select_best_name_match(self, matches):
         """Returns the best name match of a ranked list of vhosts.
@@ -420,12 +534,13 @@ class NginxConfigurator(common.Installer):
             # Exact or regex match
             return matches[0]['vhost']
 
-    def _rank_matches_by_name(self, vhost_list, target_name):
-        """Returns a ranked list of vhosts from vhost_list that match target_name.
+    def _rank_matches_by_name(self, target_name, vhost_filter=None):
+        """Returns a ranked list of vhosts that match target_name.
         This method should always be followed by a call to _select_best_name_match.
 
-        :param list vhost_list: list of vhosts to filter and rank
         :param str target_name: The name to match
+        :param callable vhost_filter: If given, only the vhosts for which it
+            returns `True` are ranked
         :returns: list of dicts containing the vhost, the matching name, and
             the numerical rank
         :rtype: list
@@ -437,8 +552,10 @@ class NginxConfigurator(common.Installer):
         # 3. longest wildcard name ending with *
         # 4. first matching regex in order of appearance in the file
         matches = []
-        for vhost in vhost_list:
-            name_type, name = parser.get_best_match(target_name, vhost.names)
+        name_index = self.parser.get_name_index()
+        for vhost, name_type, name in name_index.get_best_matches(target_name):
+            if vhost_filter is not None and not vhost_filter(vhost):
+                continue
             if name_type == 'exact':
                 matches.append({'vhost': vhost,
                                 'name': name,
@@ -457,18 +574,17 @@ class NginxConfigurator(common.Installer):
                                 'rank': REGEX_RANK})
         return sorted(matches, key=lambda x: x['rank'])
 
-    def _rank_matches_by_name_and_ssl(self, vhost_list, target_name):
-        """Returns a ranked list of vhosts from vhost_list that match target_name.
+    def _rank_matches_by_name_and_ssl(self, target_name):
+        """Returns a ranked list of vhosts that match target_name.
         The ranking gives preference to SSLishness before name match level.
 
-        :param list vhost_list: list of vhosts to filter and rank
         :param str target_name: The name to match
         :returns: list of dicts containing the vhost, the matching name, and
             the numerical rank
         :rtype: list
 
         """
-        matches = self._rank_matches_by_name(vhost_list, target_name)
+        matches = self._rank_matches_by_name(target_name)
         for match in matches:
             if not match['vhost'].ssl:
                 match['rank'] += NO_SSL_MODIFIER
@@ -545,14 +661,10 @@ class NginxConfigurator(common.Installer):
         :rtype: list
 
         """
-        all_vhosts = self.parser.get_vhosts()
-
-        def _vhost_matches(vhost, port):
+        def _vhost_matches(vhost):
             return self._vhost_listening_on_port_no_ssl(vhost, port)
 
-        matching_vhosts = [vhost for vhost in all_vhosts if _vhost_matches(vhost, port)]
-
-        return self._rank_matches_by_name(matching_vhosts, target_name)
+        return self._rank_matches_by_name(target_name, _vhost_matches)
 
     def get_all_names(self):
         """Returns all names found in the Nginx Configuration.
@@ -588,20 +700,21 @@ class NginxConfigurator(common.Installer):
 
     def _get_snakeoil_paths(self):
         """Generate invalid certs that let us create ssl directives for Nginx"""
-        # TODO: generate only once
-        tmp_dir = os.path.join(self.config.work_dir, "snakeoil")
-        le_key = crypto_util.init_save_key(
-            key_size=1024, key_dir=tmp_dir, keyname="key.pem")
-        key = OpenSSL.crypto.load_privatekey(
-            OpenSSL.crypto.FILETYPE_PEM, le_key.pem)
-        cert = acme_crypto_util.gen_ss_cert(key, domains=[socket.gethostname()])
-        cert_pem = OpenSSL.crypto.dump_certificate(
-            OpenSSL.crypto.FILETYPE_PEM, cert)
-        cert_file, cert_path = util.unique_file(
-            os.path.join(tmp_dir, "cert.pem"), mode="wb")
-        with cert_file:
-            cert_file.write(cert_pem)
-        return cert_path, le_key.file
+        if self._snakeoil_cert is None:
+            tmp_dir = os.path.join(self.config.work_dir, "snakeoil")
+            le_key = crypto_util.init_save_key(
+                key_size=1024, key_dir=tmp_dir, keyname="key.pem")
+            key = OpenSSL.crypto.load_privatekey(
+                OpenSSL.crypto.FILETYPE_PEM, le_key.pem)
+            cert = acme_crypto_util.gen_ss_cert(key, domains=[socket.gethostname()])
+            cert_pem = OpenSSL.crypto.dump_certificate(
+                OpenSSL.crypto.FILETYPE_PEM, cert)
+            cert_file, cert_path = util.unique_file(
+                os.path.join(tmp_dir, "cert.pem"), mode="wb")
+            with cert_file:
+                cert_file.write(cert_pem)
+            self._snakeoil_cert, self._snakeoil_key = cert_path, le_key.file
+        return self._snakeoil_cert, self._snakeoil_key
 
     def _make_server_ssl(self, vhost):
         """Make a server SSL.
@@ -1066,9 +1179,12 @@ class NginxConfigurator(common.Installer):
 
         sni_response = sni_doer.perform()
         http_response = http_doer.perform()
+        if sni_doer.achalls or http_doer.config_modified:
+            self._challenge_config_modified = True
         # Must restart in order to activate the challenges.
         # Handled here because we may be able to load up other challenge types
-        self.restart()
+        if sni_doer.achalls or http_doer.reload_needed:
+            self.restart()
 
         # Go through all of the challenges and assign them to the proper place
         # in the responses return value. All responses must be in the same order
@@ -1084,10 +1200,19 @@ class NginxConfigurator(common.Installer):
         """Revert all challenges."""
         self._chall_out -= len(achalls)
 
-        # If all of the challenges have been finished, clean up everything
-        if self._chall_out <= 0:
+        if self.conf("shared-http01-responder"):
+            http_doer = http_01.NginxHttp01(self)
+            for achall in achalls:
+                if isinstance(achall.chall, challenges.HTTP01):
+                    http_doer.add_chall(achall)
+            http_doer.cleanup()
+
+        # If all of the challenges have been finished, clean up everything.
+        # With the shared responder, there may be nothing to revert.
+        if self._chall_out <= 0 and self._challenge_config_modified:
             self.revert_challenge_config()
             self.restart()
+            self._challenge_config_modified = False
 
 
 def _test_block_from_block(block):
@@ -2,6 +2,8 @@
 import pkg_resources
 import platform
 
+from acme.magic_typing import Any, Dict  # pylint: disable=unused-import, no-name-in-module
+
 FREEBSD_DARWIN_SERVER_ROOT = "/usr/local/etc/nginx"
 LINUX_SERVER_ROOT = "/etc/nginx"
 
@@ -13,10 +15,24 @@ else:
 CLI_DEFAULTS = dict(
     server_root=server_root_tmp,
     ctl="nginx",
-)
+    native_parser=False,
+    parse_jobs=1,
+    shared_http01_responder=False,
+)  # type: Dict[str, Any]
 """CLI defaults."""
 
 
+PARSE_CACHE_DIR = "nginx_parse_cache"
+"""Name of the directory of cached parsed trees in `IConfig.work_dir`."""
+
+HTTP01_RESPONDER_CONF = "nginx-http01-responder.conf"
+"""Name of the configuration of the shared HTTP-01 challenge responder, as
+saved in `IConfig.config_dir`."""
+
+HTTP01_CHALLENGE_DIR = "nginx-http01-challenges"
+"""Name of the directory in `IConfig.config_dir` from which the shared
+HTTP-01 challenge responder serves challenges."""
+
 MOD_SSL_CONF_DEST = "options-ssl-nginx.conf"
 """Name of the mod_ssl config file as saved in `IConfig.config_dir`."""
 
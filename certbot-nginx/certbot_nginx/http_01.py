@@ -8,6 +8,7 @@ from acme import challenges
 from certbot import errors
 from certbot.plugins import common
 
+from certbot_nginx import constants
 from certbot_nginx import obj
 from certbot_nginx import nginxparser
 from acme.magic_typing import List # pylint: disable=unused-import, no-name-in-module
@@ -15,6 +16,38 @@ from acme.magic_typing import List # pylint: disable=unused-import, no-name-in-m
 
 logger = logging.getLogger(__name__)
 
+HTTP01_LOCATION_PATH = "/.well-known/acme-challenge"
+
+RESPONDER_CONF = """\
+# Serves the HTTP-01 challenges written by Certbot in {0}
+rewrite ^(/.well-known/acme-challenge/.*) $1 break;
+location ^~ /.well-known/acme-challenge/ {{
+    default_type text/plain;
+    alias {0}/;
+}}
+"""
+
+
+def _has_challenge_location(vhost):
+    """Whether a server block already has a location for HTTP-01 challenges.
+
+    Such a location may take precedence over the one of the shared
+    responder, so the challenges of the block are served from a
+    temporary server block instead.
+
+    :param vhost: server block
+    :type vhost: :class:`~certbot_nginx.obj.VirtualHost`
+
+    :rtype: bool
+
+    """
+    for directive in vhost.raw:
+        if (directive and isinstance(directive[0], list) and directive[0] and
+                directive[0][0] == 'location' and
+                any(HTTP01_LOCATION_PATH in arg for arg in directive[0][1:])):
+            return True
+    return False
+
 
 class NginxHttp01(common.ChallengePerformer):
     """HTTP-01 authenticator for Nginx
@@ -34,12 +67,23 @@ class NginxHttp01(common.ChallengePerformer):
         TLS-SNI-01 Challenges belong in the response array.  This is an
         optional utility.
 
+    :ivar bool reload_needed: Whether Nginx has to be reloaded for the
+        challenges to be served, set by `perform`
+    :ivar bool config_modified: Whether `perform` modified the configuration
+        temporarily, which has to be reverted once challenges are done
+
     """
 
     def __init__(self, configurator):
         super(NginxHttp01, self).__init__(configurator)
         self.challenge_conf = os.path.join(
             configurator.config.config_dir, "le_http_01_cert_challenge.conf")
+        self.responder_conf = os.path.join(
+            configurator.config.config_dir, constants.HTTP01_RESPONDER_CONF)
+        self.challenge_dir = os.path.join(
+            configurator.config.config_dir, constants.HTTP01_CHALLENGE_DIR)
+        self.reload_needed = False
+        self.config_modified = False
 
     def perform(self):
         """Perform a challenge on Nginx.
@@ -53,18 +97,164 @@ class NginxHttp01(common.ChallengePerformer):
 
         responses = [x.response(x.account_key) for x in self.achalls]
 
-        # Set up the configuration
-        self._mod_config()
+        achalls = self.achalls
+        if self.configurator.conf("shared-http01-responder"):
+            achalls = self._perform_shared()
+
+        if achalls:
+            # Set up the configuration
+            self._mod_config(achalls)
 
-        # Save reversible changes
-        self.configurator.save("HTTP Challenge", True)
+            # Save reversible changes
+            self.configurator.save("HTTP Challenge", True)
+            self.reload_needed = True
+            self.config_modified = True
 
         return responses
 
-    def _mod_config(self):
+    def cleanup(self):
+        """Removes the files of the challenges served by the shared responder."""
+        for achall in self.achalls:
+            validation_path = self._get_shared_validation_path(achall)
+            if os.path.exists(validation_path):
+                logger.debug("Removing %s", validation_path)
+                os.remove(validation_path)
+
+    def _perform_shared(self):
+        """Serves challenges from files with the shared responder.
+
+        The responder is a location, included once and for all in the server
+        blocks of the challenged domains, which serves the files of
+        `challenge_dir`. Nginx only has to be reloaded when it is included
+        in a new server block. If Nginx rejects the configuration with the
+        new includes, they are rolled back.
+
+        :returns: challenges for which no server block was found, whose
+            server block already has a location for the challenges, or that
+            couldn't be served by the responder, which are performed by
+            modifying the configuration temporarily instead
+        :rtype: list
+
+        """
+        self._write_responder_conf()
+        include_directive = ['\n    ', 'include', ' ', self.responder_conf]
+        shared = []
+        remaining = []
+        installed = False
+        for achall in self.achalls:
+            vhosts = self.configurator.choose_redirect_vhosts(achall.domain,
+                '%i' % self.configurator.config.http01_port)
+            if not vhosts:
+                remaining.append(achall)
+                continue
+            vhost = vhosts[0]
+            if ['include', self.responder_conf] not in vhost.raw:
+                if not self._include_responder(vhost, include_directive):
+                    remaining.append(achall)
+                    continue
+                installed = True
+            shared.append(achall)
+
+        if installed:
+            self.configurator.save("Installed the shared HTTP-01 challenge responder")
+            try:
+                self.configurator.config_test()
+            except errors.MisconfigurationError as err:
+                logger.warning("Nginx rejected the configuration including the "
+                               "HTTP-01 challenge responder, rolling it back: %s", err)
+                self.configurator.rollback_checkpoints()
+                return self.achalls
+            self.reload_needed = True
+        for achall in shared:
+            self._write_validation(achall)
+        return remaining
+
+    def _include_responder(self, vhost, include_directive):
+        """Includes the shared responder in a server block, if possible.
+
+        :param vhost: server block
+        :type vhost: :class:`~certbot_nginx.obj.VirtualHost`
+        :param list include_directive: directive including the responder
+
+        :returns: whether the responder was included
+        :rtype: bool
+
+        """
+        if _has_challenge_location(vhost):
+            logger.debug("Not including %s in %s, which already has a location "
+                         "for HTTP-01 challenges", self.responder_conf, vhost.filep)
+            return False
+        try:
+            self.configurator.parser.add_server_directives(
+                vhost, [include_directive], insert_at_top=True)
+        except errors.MisconfigurationError as err:
+            logger.debug("Unable to include %s in %s: %s",
+                         self.responder_conf, vhost.filep, err)
+            return False
+        return True
+
+    def _write_responder_conf(self):
+        """Writes the responder configuration and creates challenge_dir."""
+        responder = RESPONDER_CONF.format(self.challenge_dir)
+        # Change permissions to be world-readable, owner-writable (GH #1795)
+        old_umask = os.umask(0o022)
+        try:
+            if not os.path.isdir(self.challenge_dir):
+                os.makedirs(self.challenge_dir, 0o755)
+            if not os.path.exists(self.responder_conf):
+                current = None
+            else:
+                with open(self.responder_conf) as responder_file:
+                    current = responder_file.read()
+            if current != responder:
+                with open(self.responder_conf, "w") as responder_file:
+                    responder_file.write(responder)
+        finally:
+            os.umask(old_umask)
+
+    def _write_validation(self, achall):
+        validation_path = self._get_shared_validation_path(achall)
+        logger.debug("Attempting to save validation to %s", validation_path)
+        # Change permissions to be world-readable, owner-writable (GH #1795)
+        old_umask = os.umask(0o022)
+        try:
+            with open(validation_path, "wb") as validation_file:
+                validation_file.write(achall.validation(achall.account_key).encode())
+        finally:
+            os.umask(old_umask)
+
+    def _get_shared_validation_path(self, achall):
+        return os.path.join(self.challenge_dir, achall.chall.encode("token"))
+
+    def _mod_config(self, achalls=None):
         """Modifies Nginx config to include server_names_hash_bucket_size directive
            and server challenge blocks.
 
+        :param list achalls: challenges to perform, all of them by default
+
+        :raises .MisconfigurationError:
+            Unable to find a suitable HTTP block in which to include
+            authenticator hosts.
+        """
+        if achalls is None:
+            achalls = self.achalls
+        self._include_challenge_conf()
+        config = [self._make_or_mod_server_block(achall) for achall in achalls]
+        config = [x for x in config if x is not None]
+        config = nginxparser.UnspacedList(config)
+        logger.debug("Generated server block:\n%s", str(config))
+
+        self.configurator.reverter.register_file_creation(
+            True, self.challenge_conf)
+
+        with open(self.challenge_conf, "w") as new_conf:
+            nginxparser.dump(config, new_conf)
+
+    def _include_challenge_conf(self):
+        """Includes the server challenge blocks in the http block.
+
+        The server_names_hash_bucket_size directive is added too.
+
         :raises .MisconfigurationError:
             Unable to find a suitable HTTP block in which to include
             authenticator hosts.
@@ -91,22 +281,14 @@ class NginxHttp01(common.ChallengePerformer):
                     body.insert(0, bucket_directive)
                 if include_directive not in body:
                     body.insert(0, include_directive)
+                # Server blocks in body may have moved
+                self.configurator.parser.clear_servers_cache()
                 included = True
                 break
         if not included:
             raise errors.MisconfigurationError(
                 'Certbot could not find a block to include '
                 'challenges in %s.' % root)
-        config = [self._make_or_mod_server_block(achall) for achall in self.achalls]
-        config = [x for x in config if x is not None]
-        config = nginxparser.UnspacedList(config)
-        logger.debug("Generated server block:\n%s", str(config))
-
-        self.configurator.reverter.register_file_creation(
-            True, self.challenge_conf)
-
-        with open(self.challenge_conf, "w") as new_conf:
-            nginxparser.dump(config, new_conf)
 
     def _default_listen_addresses(self):
         """Finds addresses for a challenge block to listen on.
@@ -1,14 +1,18 @@
-"""Very low-level nginx config parser based on pyparsing."""
+"""Very low-level nginx config parsers, based on pyparsing or hand-written."""
 # Forked from https://github.com/fatiherikli/nginxparser (MIT Licensed)
 import copy
 import logging
+import re
 
 from pyparsing import (
     Literal, White, Forward, Group, Optional, OneOrMore, QuotedString, Regex, ZeroOrMore, Combine)
+from pyparsing import ParseException
 from pyparsing import stringEnd
 from pyparsing import restOfLine
 import six
 
+from acme.magic_typing import Any, List  # pylint: disable=unused-import, no-name-in-module
+
 logger = logging.getLogger(__name__)
 
 class RawNginxParser(object):
@@ -62,6 +66,103 @@ class RawNginxParser(object):
         """Returns the parsed tree as a list."""
         return self.parse().asList()
 
+class NativeNginxParser(object):
+    """A class that parses nginx configuration without pyparsing.
+
+    This is a hand-written recursive descent parser for the grammar of
+    `RawNginxParser`, producing the same parsed tree in linear time.
+
+    """
+    _SPACE = re.compile(r"[ \t\r\n]*")
+    _TAIL = r"(?:\$\{|[^{;\s])*"
+    _QUOTED = r"""(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')"""
+    # The alternatives of RawNginxParser.token, in the same order
+    _TOKEN = re.compile(r"{quoted}\){tail}|(?:\$\{{|[^{{}};\s'\"]){tail}|{quoted}".format(
+        quoted=_QUOTED, tail=_TAIL), re.DOTALL)
+    _REST_OF_LINE = re.compile(r"[^\n]*")
+
+    def __init__(self, source):
+        self.source = source
+
+    def _error(self, loc, msg):
+        return ParseException(self.source, loc, msg)
+
+    def _space(self, loc, tokens):
+        """Append the whitespace at loc to tokens, if any."""
+        end = self._SPACE.match(self.source, loc).end()
+        if end != loc:
+            tokens.append(self.source[loc:end])
+        return end
+
+    def _whitespace_token_group(self, loc):
+        """Parse whitespace separated tokens, with surrounding whitespace."""
+        tokens = []  # type: List[str]
+        loc = self._space(loc, tokens)
+        match = self._TOKEN.match(self.source, loc)
+        if match is None:
+            raise self._error(loc, "Expected a token")
+        tokens.append(match.group())
+        loc = match.end()
+        while True:
+            space_end = self._SPACE.match(self.source, loc).end()
+            match = self._TOKEN.match(self.source, space_end)
+            if space_end == loc or match is None:
+                break
+            tokens.append(self.source[loc:space_end])
+            tokens.append(match.group())
+            loc = match.end()
+        return tokens, self._space(loc, tokens)
+
+    def _contents(self, loc):
+        """Parse a comment, a block or an assignment."""
+        source = self.source
+        space_end = self._SPACE.match(source, loc).end()
+        if source.startswith("#", space_end):
+            comment = []  # type: List[str]
+            if space_end != loc:
+                comment.append(source[loc:space_end])
+            end = self._REST_OF_LINE.match(source, space_end + 1).end()
+            comment.extend(("#", source[space_end + 1:end]))
+            return comment, end
+        tokens, loc = self._whitespace_token_group(loc)
+        if source.startswith(";", loc):
+            return tokens, loc + 1
+        if not source.startswith("{", loc):
+            raise self._error(loc, "Expected \"{\" or \";\"")
+        innards, loc = self._block_innards(loc + 1)
+        if not source.startswith("}", loc):
+            raise self._error(loc, "Expected \"}\"")
+        return [tokens, innards], loc + 1
+
+    def _block_innards(self, loc):
+        """Parse the contents of a block, followed by whitespace."""
+        innards = []  # type: List[Any]
+        while True:
+            try:
+                contents, loc = self._contents(loc)
+            except ParseException:
+                break
+            innards.append(contents)
+        return innards, self._space(loc, innards)
+
+    def parse(self):
+        """Returns the parsed tree.
+
+        :raises pyparsing.ParseException: if the source isn't valid
+
+        """
+        tree, loc = self._block_innards(0)
+        if not tree or not isinstance(tree[0], list):
+            raise self._error(0, "Expected a comment, a block or an assignment")
+        if loc != len(self.source):
+            raise self._error(loc, "Expected end of text")
+        return tree
+
+    def as_list(self):
+        """Returns the parsed tree as a list."""
+        return self.parse()
+
+
 class RawNginxDumper(object):
     # pylint: disable=too-few-public-methods
     """A class that dumps nginx configuration from the provided tree."""
@@ -101,26 +202,32 @@ class RawNginxDumper(object):
 # Shortcut functions to respect Python's serialization interface
 # (like pyyaml, picker or json)
 
-def loads(source):
+def loads(source, native=False):
     """Parses from a string.
 
     :param str source: The string to parse
+    :param bool native: Whether to use `NativeNginxParser` instead of
+        the pyparsing based `RawNginxParser`
     :returns: The parsed tree
     :rtype: list
 
     """
+    if native:
+        return UnspacedList(NativeNginxParser(source).as_list())
     return UnspacedList(RawNginxParser(source).as_list())
 
 
-def load(_file):
+def load(_file, native=False):
     """Parses from a file.
 
     :param file _file: The file to parse
+    :param bool native: Whether to use `NativeNginxParser` instead of
+        the pyparsing based `RawNginxParser`
     :returns: The parsed tree
     :rtype: list
 
     """
-    return loads(_file.read())
+    return loads(_file.read(), native)
 
 
 def dumps(blocks):
@@ -148,63 +255,127 @@ def dump(blocks, _file):
 
 spacey = lambda x: (isinstance(x, six.string_types) and x.isspace()) or x == ''
 
+def _compact_spaces(spaces):
+    """Compact representation of a sequence of whitespace entries.
+
+    As most entries are preceded by no or a single whitespace entry, these
+    are represented by `None` and the entry itself, longer sequences by a
+    tuple.
+
+    :param list spaces: whitespace entries
+
+    :rtype: None or str or tuple
+
+    """
+    if not spaces:
+        return None
+    return spaces[0] if len(spaces) == 1 else tuple(spaces)
+
+
+def _spaces_of(trivia):
+    """Whitespace entries of a compact representation made by `_compact_spaces`."""
+    if trivia is None:
+        return ()
+    return (trivia,) if isinstance(trivia, six.string_types) else trivia
+
+
+def _concat_spaces(trivia1, trivia2):
+    """Concatenate two compact representations made by `_compact_spaces`."""
+    return _compact_spaces(_spaces_of(trivia1) + _spaces_of(trivia2))
+
+
 class UnspacedList(list):
-    """Wrap a list [of lists], making any whitespace entries magically invisible"""
+    """Wrap a list [of lists], making any whitespace entries magically invisible
 
-    def __init__(self, list_source):
-        # ensure our argument is not a generator, and duplicate any sublists
-        self.spaced = copy.deepcopy(list(list_source))
-        self.dirty = False
+    The list only holds the entries which aren't whitespace. The whitespace
+    entries preceding each of them, and the ones at the end of the list, are
+    kept as trivia alongside, from which the spaced list is rebuilt on
+    demand.
+
+    :ivar bool dirty: Whether the list was modified since it was created
+
+    """
+    __slots__ = ('_trivia', 'dirty')
 
-        # Turn self into a version of the source list that has spaces removed
-        # and all sub-lists also UnspacedList()ed
-        list.__init__(self, list_source)
-        for i, entry in reversed(list(enumerate(self))):
+    def __init__(self, list_source):  # pylint: disable=super-init-not-called
+        self.dirty = False
+        # _trivia[i] holds the whitespace entries preceding self[i], and
+        # _trivia[-1] the ones at the end of the list, see _compact_spaces()
+        self._trivia = [] # type: List[Any]
+        spaces = [] # type: List[str]
+        in_comment = False
+        for entry in list(list_source):
             if isinstance(entry, list):
-                sublist = UnspacedList(entry)
-                list.__setitem__(self, i, sublist)
-                self.spaced[i] = sublist.spaced
-            elif spacey(entry):
-                # don't delete comments
-                if "#" not in self[:i]:
-                    list.__delitem__(self, i)
-
-    def _coerce(self, inbound):
+                entry = UnspacedList(entry)
+            # don't delete spaces in comments
+            elif spacey(entry) and not in_comment:
+                spaces.append(entry)
+                continue
+            in_comment = in_comment or entry == "#"
+            list.append(self, entry)
+            self._trivia.append(_compact_spaces(spaces))
+            spaces = []
+        self._trivia.append(_compact_spaces(spaces))
+
+    @property
+    def spaced(self):
+        """The list with its whitespace entries, recursively.
+
+        :rtype: list
+
+        """
+        spaced = [] # type: List[Any]
+        for trivia, entry in zip(self._trivia, self):
+            spaced.extend(_spaces_of(trivia))
+            spaced.append(entry.spaced if isinstance(entry, UnspacedList) else entry)
+        spaced.extend(_spaces_of(self._trivia[-1]))
+        return spaced
+
+    @staticmethod
+    def _coerce(inbound):
         """
         Coerce some inbound object to be appropriately usable in this object
 
         :param inbound: string or None or list or UnspacedList
-        :returns: (coerced UnspacedList or string or None, spaced equivalent)
-        :rtype: tuple
+        :returns: coerced UnspacedList or string or None
+        :rtype: UnspacedList or str or None
 
         """
-        if not isinstance(inbound, list):                      # str or None
-            return (inbound, inbound)
-        else:
-            if not hasattr(inbound, "spaced"):
-                inbound = UnspacedList(inbound)
-            return (inbound, inbound.spaced)
+        if isinstance(inbound, list) and not isinstance(inbound, UnspacedList):
+            return UnspacedList(inbound)
+        return inbound
 
+    def _index(self, i):
+        """Normalize an index of the list, like list[-1] etc."""
+        if isinstance(i, slice):
+            raise NotImplementedError("Slice operations on UnspacedLists not yet implemented")
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("list index out of range")
+        return i
 
     def insert(self, i, x):
-        item, spaced_item = self._coerce(x)
-        slicepos = self._spaced_position(i) if i < len(self) else len(self.spaced)
-        self.spaced.insert(slicepos, spaced_item)
-        if not spacey(item):
+        item = self._coerce(x)
+        i = min(max(len(self) + i, 0) if i < 0 else i, len(self))
+        if spacey(item):
+            self._trivia[i] = _concat_spaces(self._trivia[i], item)
+        else:
             list.insert(self, i, item)
+            # the whitespace preceding the former self[i] now precedes item
+            self._trivia.insert(i + 1, None)
         self.dirty = True
 
     def append(self, x):
-        item, spaced_item = self._coerce(x)
-        self.spaced.append(spaced_item)
-        if not spacey(item):
-            list.append(self, item)
-        self.dirty = True
+        self.insert(len(self), x)
 
     def extend(self, x):
-        item, spaced_item = self._coerce(x)
-        self.spaced.extend(spaced_item)
-        list.extend(self, item)
+        other = x if isinstance(x, UnspacedList) else UnspacedList(x)
+        # pylint: disable=protected-access
+        trailing = self._trivia.pop()
+        self._trivia.append(_concat_spaces(trailing, other._trivia[0]))
+        self._trivia.extend(other._trivia[1:])
+        list.extend(self, other)
         self.dirty = True
 
     def __add__(self, other):
@@ -225,45 +396,38 @@ class UnspacedList(list):
         raise NotImplementedError("Slice operations on UnspacedLists not yet implemented")
 
     def __setitem__(self, i, value):
-        if isinstance(i, slice):
-            raise NotImplementedError("Slice operations on UnspacedLists not yet implemented")
-        item, spaced_item = self._coerce(value)
-        self.spaced.__setitem__(self._spaced_position(i), spaced_item)
-        if not spacey(item):
+        i = self._index(i)
+        item = self._coerce(value)
+        if spacey(item):
+            list.__delitem__(self, i)
+            self._trivia[i] = _concat_spaces(
+                _concat_spaces(self._trivia[i], item), self._trivia.pop(i + 1))
+        else:
             list.__setitem__(self, i, item)
         self.dirty = True
 
     def __delitem__(self, i):
-        self.spaced.__delitem__(self._spaced_position(i))
+        i = self._index(i)
         list.__delitem__(self, i)
+        # the whitespace preceding the deleted entry now precedes the next one
+        self._trivia[i] = _concat_spaces(self._trivia[i], self._trivia.pop(i + 1))
         self.dirty = True
 
     def __deepcopy__(self, memo):
-        new_spaced = copy.deepcopy(self.spaced, memo=memo)
-        l = UnspacedList(new_spaced)
+        l = UnspacedList([])
+        list.extend(l, (copy.deepcopy(entry, memo) for entry in self))
+        l._trivia = list(self._trivia)  # pylint: disable=protected-access
         l.dirty = self.dirty
         return l
 
+    def __reduce__(self):
+        return (UnspacedList, (self.spaced,), self.dirty)
+
+    def __setstate__(self, dirty):
+        self.dirty = dirty
+
     def is_dirty(self):
         """Recurse through the parse tree to figure out if any sublists are dirty"""
         if self.dirty:
             return True
         return any((isinstance(x, UnspacedList) and x.is_dirty() for x in self))
-
-    def _spaced_position(self, idx):
-        "Convert from indexes in the unspaced list to positions in the spaced one"
-        pos = spaces = 0
-        # Normalize indexes like list[-1] etc, and save the result
-        if idx < 0:
-            idx = len(self) + idx
-        if not 0 <= idx < len(self):
-            raise IndexError("list index out of range")
-        idx0 = idx
-        # Count the number of spaces in the spaced list before idx in the unspaced one
-        while idx != -1:
-            if spacey(self.spaced[pos]):
-                spaces += 1
-            else:
-                idx -= 1
-            pos += 1
-        return idx0 + spaces
@@ -1,22 +1,32 @@
 """NginxParser is a member object of the NginxConfigurator class."""
+# pylint: disable=too-many-lines
 import copy
 import functools
 import glob
+import hashlib
 import logging
+import marshal
+import multiprocessing
 import os
 import pyparsing
 import re
+import sys
 
 import six
 
+from certbot import compat
 from certbot import errors
+from certbot import util
 
 from certbot_nginx import obj
 from certbot_nginx import nginxparser
-from acme.magic_typing import Union, Dict, Set, Any, List, Tuple # pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import Union, Dict, Set, Any, List, Optional, Tuple # pylint: disable=unused-import, no-name-in-module
 
 logger = logging.getLogger(__name__)
 
+# Version of the parse cache format, computed by _parse_cache_version
+_PARSE_CACHE_VERSION = None # type: Optional[Tuple]
+
 
 class NginxParser(object):
     """Class handles the fine details of parsing the Nginx Configuration.
@@ -24,13 +34,29 @@ class NginxParser(object):
     :ivar str root: Normalized absolute path to the server root
         directory. Without trailing slash.
     :ivar dict parsed: Mapping of file paths to parsed trees
+    :ivar bool native_parser: Whether files are parsed with
+        `.NativeNginxParser` instead of pyparsing
+    :ivar str cache_dir: Directory where parsed trees are cached between
+        runs, or `None` to always parse files
+    :ivar int parse_jobs: Number of processes parsing files concurrently
 
     """
 
-    def __init__(self, root):
+    def __init__(self, root, native_parser=False, cache_dir=None, parse_jobs=1):
+        # pylint: disable=too-many-arguments
         self.parsed = {} # type: Dict[str, Union[List, nginxparser.UnspacedList]]
         self.root = os.path.abspath(root)
+        self.native_parser = native_parser
+        self.cache_dir = cache_dir
+        self.parse_jobs = parse_jobs
+        # Files parsed ahead of _parse_recursively by _preload
+        self._preloaded = {} # type: Dict[str, nginxparser.UnspacedList]
         self.config_root = self._find_config_root()
+        # Server blocks of self.parsed and whether their addresses listen
+        # with SSL in any server block, computed when first needed
+        self._raw_servers = None # type: Optional[Dict[str, List]]
+        self._addr_to_ssl = None # type: Optional[Dict[Tuple[str, str], bool]]
+        self._name_index = None # type: Optional[ServerNameIndex]
 
         # Parse nginx.conf and included files.
         # TODO: Check sites-available/ as well. For now, the configurator does
@@ -42,7 +68,16 @@ class NginxParser(object):
 
         """
         self.parsed = {}
-        self._parse_recursively(self.config_root)
+        self.clear_servers_cache()
+        if self.parse_jobs > 1:
+            self._preload(self.config_root)
+        try:
+            self._parse_recursively(self.config_root)
+        finally:
+            self._preloaded = {}
+        if self.cache_dir is not None:
+            _prune_parse_cache(self.cache_dir, set(
+                _parse_cache_name(filename) for filename in self.parsed))
 
     def _parse_recursively(self, filepath):
         """Parses nginx config files recursively by looking at 'include'
@@ -55,21 +90,33 @@ class NginxParser(object):
         filepath = self.abs_path(filepath)
         trees = self._parse_files(filepath)
         for tree in trees:
-            for entry in tree:
-                if _is_include_directive(entry):
-                    # Parse the top-level included file
-                    self._parse_recursively(entry[1])
-                elif entry[0] == ['http'] or entry[0] == ['server']:
-                    # Look for includes in the top-level 'http'/'server' context
-                    for subentry in entry[1]:
-                        if _is_include_directive(subentry):
-                            self._parse_recursively(subentry[1])
-                        elif entry[0] == ['http'] and subentry[0] == ['server']:
-                            # Look for includes in a 'server' context within
-                            # an 'http' context
-                            for server_entry in subentry[1]:
-                                if _is_include_directive(server_entry):
-                                    self._parse_recursively(server_entry[1])
+            for included in _included_paths(tree):
+                self._parse_recursively(included)
+
+    def _preload(self, filepath):
+        """Parses the files _parse_recursively will parse, concurrently.
+
+        The include graph is walked breadth first and the files included at
+        each depth are parsed together in a process pool. The parsed trees
+        are then picked up by _parse_recursively, which adds them to
+        self.parsed in the same order as when files are parsed one by one.
+
+        :param str filepath: The path to the files to parse, as a glob
+
+        """
+        seen = set() # type: Set[str]
+        patterns = [filepath]
+        while patterns:
+            filenames = []
+            for pattern in patterns:
+                for item in glob.glob(self.abs_path(pattern)):
+                    if item not in seen:
+                        seen.add(item)
+                        filenames.append(item)
+            trees = self._load_files(filenames)
+            self._preloaded.update(trees)
+            patterns = [included for item in filenames if item in trees
+                        for included in _included_paths(trees[item])]
 
     def abs_path(self, path):
         """Converts a relative path to an absolute path relative to the root.
@@ -85,9 +132,22 @@ class NginxParser(object):
         else:
             return path
 
+    def clear_servers_cache(self):
+        """Forget the server blocks found in the parsed files.
+
+        This must be called when server blocks are modified other than
+        through the methods of this class.
+
+        """
+        self._raw_servers = None
+        self._addr_to_ssl = None
+        self._name_index = None
+
     def _build_addr_to_ssl(self):
         """Builds a map from address to whether it listens on ssl in any server block
         """
+        if self._addr_to_ssl is not None:
+            return self._addr_to_ssl
         servers = self._get_raw_servers()
 
         addr_to_ssl = {} # type: Dict[Tuple[str, str], bool]
@@ -100,6 +160,7 @@ class NginxParser(object):
                     if addr_tuple not in addr_to_ssl:
                         addr_to_ssl[addr_tuple] = addr.ssl
                     addr_to_ssl[addr_tuple] = addr.ssl or addr_to_ssl[addr_tuple]
+        self._addr_to_ssl = addr_to_ssl
         return addr_to_ssl
 
     def _get_raw_servers(self):
@@ -107,6 +168,8 @@ class NginxParser(object):
         # type: () -> Dict
         """Get a map of unparsed all server blocks
         """
+        if self._raw_servers is not None:
+            return self._raw_servers
         servers = {} # type: Dict[str, Union[List, nginxparser.UnspacedList]]
         for filename in self.parsed:
             tree = self.parsed[filename]
@@ -121,6 +184,7 @@ class NginxParser(object):
             for i, (server, path) in enumerate(servers[filename]):
                 new_server = self._get_included_directives(server)
                 servers[filename][i] = (new_server, path)
+        self._raw_servers = servers
         return servers
 
     def get_vhosts(self):
@@ -149,13 +213,27 @@ class NginxParser(object):
                                         enabled,
                                         parsed_server['names'],
                                         server,
-                                        path)
+                                        list(path))
                 vhosts.append(vhost)
 
         self._update_vhosts_addrs_ssl(vhosts)
 
         return vhosts
 
+    def get_name_index(self):
+        """Gets an index of the server names of the 'virtual hosts' found in
+        the Nginx configuration.
+
+        The index is built when first needed after the configuration changed.
+
+        :returns: index of the vhosts returned by `get_vhosts`
+        :rtype: `ServerNameIndex`
+
+        """
+        if self._name_index is None:
+            self._name_index = ServerNameIndex(self.get_vhosts())
+        return self._name_index
+
     def _update_vhosts_addrs_ssl(self, vhosts):
         """Update a list of raw parsed vhosts to include global address sslishness
         """
@@ -203,16 +281,131 @@ class NginxParser(object):
             if item in self.parsed and not override:
                 continue
             try:
-                with open(item) as _file:
-                    parsed = nginxparser.load(_file)
-                    self.parsed[item] = parsed
-                    trees.append(parsed)
+                if item in self._preloaded:
+                    parsed = self._preloaded.pop(item)
+                else:
+                    parsed = self._load_file(item)
+                self.parsed[item] = parsed
+                self.clear_servers_cache()
+                trees.append(parsed)
             except IOError:
                 logger.warning("Could not open file: %s", item)
             except pyparsing.ParseException as err:
                 logger.debug("Could not parse file: %s due to %s", item, err)
         return trees
 
+    def _load_file(self, filename):
+        """Parse a file, reusing the tree cached for it if it is unchanged.
+
+        :param str filename: path of the file to parse
+
+        :returns: the parsed tree
+        :rtype: nginxparser.UnspacedList
+
+        :raises IOError: if the file can't be read
+        :raises pyparsing.ParseException: if the file can't be parsed
+
+        """
+        source, cache_key, tree = self._read_file(filename)
+        if tree is None:
+            tree = _parse_source(source, self.native_parser)
+            self._cache_tree(cache_key, tree)
+        return nginxparser.UnspacedList(tree)
+
+    def _load_files(self, filenames):
+        """Parse files concurrently, reusing the trees cached for them.
+
+        Files which can't be read or parsed are left out, and reported
+        when _load_file is called for them.
+
+        :param list filenames: paths of the files to parse
+
+        :returns: map of the paths of the parsed files to the parsed trees
+        :rtype: dict
+
+        """
+        trees = {} # type: Dict[str, Any]
+        unparsed = []
+        for filename in filenames:
+            try:
+                source, cache_key, tree = self._read_file(filename)
+            except IOError:
+                continue
+            if tree is None:
+                unparsed.append((filename, source, cache_key))
+            else:
+                trees[filename] = tree
+
+        jobs = [(source, self.native_parser) for _, source, _ in unparsed]
+        for (filename, _, cache_key), tree in zip(unparsed, self._map(jobs)):
+            if tree is not None:
+                self._cache_tree(cache_key, tree)
+                trees[filename] = tree
+        return dict((filename, nginxparser.UnspacedList(tree))
+                    for filename, tree in six.iteritems(trees))
+
+    def _map(self, jobs):
+        """Run _parse_job for each job, in a process pool if worthwhile.
+
+        :param list jobs: arguments of _parse_job
+
+        :returns: the results of _parse_job
+        :rtype: list
+
+        """
+        processes = min(self.parse_jobs, len(jobs))
+        if processes > 1:
+            try:
+                pool = multiprocessing.Pool(processes)
+            except (OSError, ImportError):
+                logger.debug("Unable to start processes to parse files", exc_info=True)
+            else:
+                try:
+                    return pool.map(_parse_job, jobs)
+                except Exception:  # pylint: disable=broad-except
+                    # Parse the files again in this process, where errors
+                    # are reported as when files are parsed one by one
+                    logger.debug("Unable to parse files in other processes", exc_info=True)
+                finally:
+                    pool.close()
+                    pool.join()
+        return [_parse_job(job) for job in jobs]
+
+    def _read_file(self, filename):
+        """Read a file and look up the tree cached for it.
+
+        :param str filename: path of the file to read
+
+        :returns: the contents of the file, the key of its tree in the
+            cache (or `None` if the cache is disabled) and the cached
+            spaced tree (or `None` if it has to be parsed)
+        :rtype: tuple
+
+        :raises IOError: if the file can't be read
+
+        """
+        with open(filename) as _file:
+            source = _file.read()
+        if self.cache_dir is None:
+            return source, None, None
+
+        cache_path = os.path.join(self.cache_dir, _parse_cache_name(filename))
+        digest = hashlib.sha256(
+            source if isinstance(source, bytes) else source.encode("utf-8")).hexdigest()
+        cache_key = (cache_path, os.path.abspath(filename), digest)
+        return source, cache_key, _read_parse_cache(cache_path, digest)
+
+    def _cache_tree(self, cache_key, tree):
+        """Save a parsed tree in the cache, if enabled.
+
+        :param tuple cache_key: key returned by `_read_file`, or `None`
+        :param list tree: the spaced parsed tree
+
+        """
+        if cache_key is not None:
+            cache_path, filename, digest = cache_key
+            _write_parse_cache(self.cache_dir, cache_path, filename, digest, tree)
+
     def _find_config_root(self):
         """Return the Nginx Configuration Root file."""
         location = ['nginx.conf']
@@ -349,12 +542,45 @@ class NginxParser(object):
             if not isinstance(result, list) or len(result) != 2:
                 raise errors.MisconfigurationError("Not a server block.")
             result = result[1]
-            block_func(result)
+            identity = _server_identity(self._get_included_directives(result))
+            try:
+                block_func(result)
+            finally:
+                self._update_servers_cache(vhost, identity, result)
 
             self._update_vhost_based_on_new_directives(vhost, result)
         except errors.MisconfigurationError as err:
             raise errors.MisconfigurationError("Problem in %s: %s" % (filename, str(err)))
 
+    def _update_servers_cache(self, vhost, identity, directives_list):
+        """Update the server blocks found in the parsed files after the
+        server block of vhost was modified.
+
+        The caches are only cleared if the addresses, names or SSL settings
+        of the server block changed. Otherwise, as when certificates are
+        deployed to SSL server blocks, only the server block is updated.
+
+        :param :class:`~certbot_nginx.obj.VirtualHost` vhost: The vhost
+            whose server block was modified
+        :param list identity: `_server_identity` of the server block before
+            it was modified
+        :param list directives_list: The modified server block
+
+        """
+        new_server = self._get_included_directives(directives_list)
+        if _server_identity(new_server) != identity:
+            self.clear_servers_cache()
+            return
+        if self._raw_servers is not None:
+            servers = self._raw_servers.get(vhost.filep, [])
+            for i, (_, path) in enumerate(servers):
+                if path == vhost.path:
+                    servers[i] = (new_server, path)
+        if self._name_index is not None:
+            for indexed_vhost in self._name_index.vhosts:
+                if indexed_vhost.filep == vhost.filep and indexed_vhost.path == vhost.path:
+                    indexed_vhost.raw = new_server
+
     def duplicate_vhost(self, vhost_template, remove_singleton_listen_params=False,
         only_directives=None):
         """Duplicate the vhost in the configuration files.
@@ -388,6 +614,7 @@ class NginxParser(object):
             self._update_vhost_based_on_new_directives(new_vhost, new_directives)
 
         enclosing_block.append(raw_in_parsed)
+        self.clear_servers_cache()
         new_vhost.path[-1] = len(enclosing_block) - 1
         if remove_singleton_listen_params:
             for addr in new_vhost.addrs:
@@ -409,6 +636,187 @@ class NginxParser(object):
         return new_vhost
 
 
+def _included_paths(tree):
+    """Paths included in the contexts of a parsed file which may declare
+    virtual hosts: the top-level context, the top-level 'http' and 'server'
+    contexts and the 'server' contexts within an 'http' context.
+
+    :param list tree: the parsed file
+
+    :returns: the included paths, as globs, in the order of the file
+    :rtype: list
+
+    """
+    included = []
+    for entry in tree:
+        if _is_include_directive(entry):
+            # Parse the top-level included file
+            included.append(entry[1])
+        elif entry[0] == ['http'] or entry[0] == ['server']:
+            # Look for includes in the top-level 'http'/'server' context
+            for subentry in entry[1]:
+                if _is_include_directive(subentry):
+                    included.append(subentry[1])
+                elif entry[0] == ['http'] and subentry[0] == ['server']:
+                    # Look for includes in a 'server' context within
+                    # an 'http' context
+                    for server_entry in subentry[1]:
+                        if _is_include_directive(server_entry):
+                            included.append(server_entry[1])
+    return included
+
+
+def _parse_source(source, native_parser):
+    """Parse the contents of a file.
+
+    :param str source: the contents of the file
+    :param bool native_parser: Whether to use `.NativeNginxParser`
+
+    :returns: the spaced parsed tree
+    :rtype: list
+
+    :raises pyparsing.ParseException: if the file can't be parsed
+
+    """
+    if native_parser:
+        return nginxparser.NativeNginxParser(source).as_list()
+    return nginxparser.RawNginxParser(source).as_list()
+
+
+def _parse_job(job):
+    """Parse the contents of a file, possibly in another process.
+
+    :param tuple job: arguments of `_parse_source`
+
+    :returns: the spaced parsed tree, or `None` if the file can't be parsed
+    :rtype: list or None
+
+    """
+    source, native_parser = job
+    try:
+        return _parse_source(source, native_parser)
+    except pyparsing.ParseException:
+        return None
+
+
+def _parse_cache_version():
+    """Version of the parse cache, computed on first use.
+
+    Trees cached by another version of Python, or parsed with another
+    grammar, are parsed again. The grammar is identified by a digest of
+    the source of `.nginxparser`.
+
+    :rtype: tuple
+
+    """
+    global _PARSE_CACHE_VERSION  # pylint: disable=global-statement
+    if _PARSE_CACHE_VERSION is None:
+        source_path = nginxparser.__file__
+        if source_path.endswith((".pyc", ".pyo")) and os.path.exists(source_path[:-1]):
+            source_path = source_path[:-1]
+        with open(source_path, "rb") as source_file:
+            grammar = hashlib.sha256(source_file.read()).hexdigest()
+        _PARSE_CACHE_VERSION = (2, sys.version_info[0], sys.version_info[1], grammar)
+    return _PARSE_CACHE_VERSION
+
+
+def _parse_cache_name(filename):
+    """Name of the file caching the parsed tree of a file."""
+    return hashlib.sha256(os.path.abspath(filename).encode("utf-8")).hexdigest()
+
+
+def _read_parse_cache_header(cache_file):
+    """Read the header of a cache file.
+
+    :param file cache_file: the cache file, opened in binary mode
+
+    :returns: the path of the parsed file and the SHA-256 digest of its
+        contents, or `None` if the cache file is unreadable or was
+        written by another version
+    :rtype: tuple or None
+
+    """
+    try:
+        version, filename, digest = marshal.load(cache_file)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != _parse_cache_version():
+        return None
+    return filename, digest
+
+
+def _read_parse_cache(cache_path, digest):
+    """Load a cached parsed tree.
+
+    :param str cache_path: path of the cache file
+    :param str digest: SHA-256 digest of the contents of the parsed file
+
+    :returns: the spaced parsed tree, or `None` if the cache file is
+        missing, unreadable or was written for other contents
+    :rtype: list or None
+
+    """
+    try:
+        with open(cache_path, "rb") as cache_file:
+            header = _read_parse_cache_header(cache_file)
+            if header is None or header[1] != digest:
+                return None
+            tree = marshal.load(cache_file)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    return tree if isinstance(tree, list) else None
+
+
+def _write_parse_cache(cache_dir, cache_path, filename, digest, tree):
+    """Save a parsed tree in the cache, if possible.
+
+    :param str cache_dir: directory of the cache
+    :param str cache_path: path of the cache file
+    :param str filename: absolute path of the parsed file
+    :param str digest: SHA-256 digest of the contents of the parsed file
+    :param list tree: the spaced parsed tree
+
+    """
+    temp_path = "{0}.{1}.tmp".format(cache_path, os.getpid())
+    try:
+        util.make_or_verify_dir(cache_dir, 0o700, compat.os_geteuid())
+        with util.safe_open(temp_path, "wb", chmod=0o600) as cache_file:
+            # The header is written separately, so that it can be read
+            # without loading the tree
+            marshal.dump((_parse_cache_version(), filename, digest), cache_file)
+            marshal.dump(tree, cache_file)
+        compat.os_rename(temp_path, cache_path)
+    except (IOError, OSError, ValueError, errors.Error):
+        logger.debug("Unable to cache the parsed tree at %s", cache_path, exc_info=True)
+
+
+def _prune_parse_cache(cache_dir, used):
+    """Remove the cached trees of files which no longer exist.
+
+    Cache files written by other versions are removed as well.
+
+    :param str cache_dir: directory of the cache
+    :param set used: names of the cache files of the files just parsed,
+        which are known to be up to date
+
+    """
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if name in used or name.endswith(".tmp"):
+            continue
+        cache_path = os.path.join(cache_dir, name)
+        try:
+            with open(cache_path, "rb") as cache_file:
+                header = _read_parse_cache_header(cache_file)
+            if header is None or not os.path.exists(header[0]):
+                os.remove(cache_path)
+        except (IOError, OSError):
+            logger.debug("Unable to prune the parse cache file %s", cache_path, exc_info=True)
+
+
 def _parse_ssl_options(ssl_options):
     if ssl_options is not None:
         try:
@@ -485,6 +893,116 @@ def get_best_match(target_name, names):
     return (None, None)
 
 
+class ServerNameIndex(object):
+    """Index of the server names of vhosts, following `get_best_match`.
+
+    Exact names are found with a hash map, and wildcard names with hash
+    maps of the part of the name after the leading wildcard or before the
+    trailing wildcard, which are looked up with each suffix or prefix of
+    the target name, so that a lookup doesn't depend on the number of
+    vhosts. Regex names are compiled once and tried in order.
+
+    :ivar list vhosts: the indexed :class:`~certbot_nginx.obj.VirtualHost`
+        objects
+
+    """
+    def __init__(self, vhosts):
+        self.vhosts = vhosts
+        # Map keys to lists of (vhost position, name position, name)
+        self._exact = {} # type: Dict[str, List[Tuple[int, int, str]]]
+        self._wildcard_start = {} # type: Dict[str, List[Tuple[int, int, str]]]
+        self._wildcard_end = {} # type: Dict[str, List[Tuple[int, int, str]]]
+        self._wildcard_any = [] # type: List[Tuple[int, int, str]]
+        self._regex = [] # type: List[Tuple[int, int, str, Any]]
+
+        for vhost_pos, vhost in enumerate(vhosts):
+            for name_pos, name in enumerate(vhost.names):
+                entry = (vhost_pos, name_pos, name)
+                self._exact.setdefault(name, []).append(entry)
+                if name.startswith('.'):
+                    self._exact.setdefault(name[1:], []).append(entry)
+                if name == '*':
+                    self._wildcard_any.append(entry)
+                    continue
+                first, _, rest = name.partition('.')
+                if first in ('*', ''):
+                    self._wildcard_start.setdefault(rest, []).append(entry)
+                rest, _, last = name.rpartition('.')
+                if last in ('*', ''):
+                    self._wildcard_end.setdefault(rest, []).append(entry)
+                if len(name) >= 2 and name[0] == '~':
+                    try:
+                        regex = re.compile(name[1:])
+                    except re.error:  # pragma: no cover
+                        # perl-compatible regexes are sometimes not recognized by python
+                        continue
+                    self._regex.append((vhost_pos, name_pos, name, regex))
+
+    def get_best_matches(self, target_name):
+        """Finds the best match for target_name among the names of each vhost.
+
+        :param str target_name: The name to match
+        :returns: List of (vhost, type of match, the name that matched) for
+            the vhosts having a name matching target_name, in the order of
+            `vhosts`. The types and names are those `get_best_match` returns.
+        :rtype: list
+
+        """
+        exact, wildcard_start, wildcard_end, regex = self._lookup(target_name)
+        matches = []
+        for vhost_pos in sorted(set(exact) | set(wildcard_start) |
+                                set(wildcard_end) | set(regex)):
+            if vhost_pos in exact:
+                match = ('exact', min(exact[vhost_pos], key=len))
+            elif vhost_pos in wildcard_start:
+                match = ('wildcard_start', max(wildcard_start[vhost_pos], key=len))
+            elif vhost_pos in wildcard_end:
+                match = ('wildcard_end', max(wildcard_end[vhost_pos], key=len))
+            else:
+                match = ('regex', regex[vhost_pos][0])
+            matches.append((self.vhosts[vhost_pos],) + match)
+        return matches
+
+    def _lookup(self, target_name):
+        """Find the names matching target_name in each index.
+
+        :param str target_name: The name to match
+        :returns: maps of vhost positions to the exact, wildcard start,
+            wildcard end and regex names matching target_name, as
+            returned by `_candidates`
+        :rtype: tuple
+
+        """
+        # Suffixes and prefixes of target_name at the label boundaries
+        dots = [i for i, char in enumerate(target_name) if char == '.']
+        suffixes = [target_name[i + 1:] for i in dots]
+        prefixes = [target_name[:i] for i in dots]
+
+        return (
+            self._candidates([self._exact.get(target_name, [])]),
+            self._candidates([self._wildcard_any] +
+                             [self._wildcard_start.get(key, []) for key in suffixes]),
+            self._candidates([self._wildcard_end.get(key, []) for key in prefixes]),
+            self._candidates([[entry[:3] for entry in self._regex
+                               if entry[3].match(target_name)]]),
+        )
+
+    @staticmethod
+    def _candidates(entry_lists):
+        """Group matching names by vhost, in the order of the vhost names.
+
+        :param list entry_lists: lists of (vhost position, name position, name)
+        :returns: map of vhost positions to names
+        :rtype: dict
+
+        """
+        candidates = {} # type: Dict[int, List[str]]
+        for vhost_pos, _, name in sorted(
+                entry for entries in entry_lists for entry in entries):
+            candidates.setdefault(vhost_pos, []).append(name)
+        return candidates
+
+
 def _exact_match(target_name, name):
     return target_name == name or '.' + target_name == name
 
@@ -597,23 +1115,15 @@ def comment_directive(block, location):
 def _comment_out_directive(block, location, include_location):
     """Comment out the line at location, with a note of explanation."""
     comment_message = ' duplicated in {0}'.format(include_location)
-    # add the end comment
     # create a dumpable object out of block[location] (so it includes the ;)
     directive = block[location]
     new_dir_block = nginxparser.UnspacedList([]) # just a wrapper
     new_dir_block.append(directive)
     dumped = nginxparser.dumps(new_dir_block)
-    commented = dumped + ' #' + comment_message # add the comment directly to the one-line string
-    new_dir = nginxparser.loads(commented) # reload into UnspacedList
-
-    # add the beginning comment
-    insert_location = 0
-    if new_dir[0].spaced[0] != new_dir[0][0]: # if there's whitespace at the beginning
-        insert_location = 1
-    new_dir[0].spaced.insert(insert_location, "# ") # comment out the line
-    new_dir[0].spaced.append(";") # directly add in the ;, because now dumping won't work properly
-    dumped = nginxparser.dumps(new_dir)
-    new_dir = nginxparser.loads(dumped) # reload into an UnspacedList
+    # comment out the line after its indentation, and add the end comment
+    stripped = dumped.lstrip()
+    commented = dumped[:len(dumped) - len(stripped)] + '# ' + stripped + ' #' + comment_message
+    new_dir = nginxparser.loads(commented) # reload into an UnspacedList
 
     block[location] = new_dir[0] # set the now-single-line-comment directive back in place
 
@@ -726,6 +1236,18 @@ def _apply_global_addr_ssl(addr_to_ssl, parsed_server):
         if addr.ssl:
             parsed_server['ssl'] = True
 
+def _server_identity(server):
+    """The directives of a server block which determine its addresses,
+    names and SSL settings.
+
+    :param list server: list of directives in a server block
+    :rtype: list
+
+    """
+    return [list(directive) for directive in server
+            if directive and directive[0] in ('listen', 'server_name', 'ssl')]
+
+
 def _parse_server_raw(server):
     """Parses a list of server directives.
 
@@ -296,6 +296,103 @@ class NginxConfiguratorTest(util.NginxTest):
             ]],
             2))
 
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_deploy_certs(self, mock_config_test, mock_restart):
+        example_conf = self.config.parser.abs_path('sites-enabled/example.com')
+        nginx_conf = self.config.parser.abs_path('nginx.conf')
+        self.config.version = (1, 3, 1)
+
+        add_to_checkpoint = self.config.reverter.add_to_checkpoint
+        with mock.patch("certbot.reverter.Reverter.add_to_checkpoint") as mock_checkpoint:
+            mock_checkpoint.side_effect = add_to_checkpoint
+            self.config.deploy_certs([
+                (["www.example.com", "example.org"], "example/cert.pem",
+                 "example/key.pem", "example/chain.pem", "example/fullchain.pem"),
+                (["another.alias"], "/etc/nginx/cert.pem", "/etc/nginx/key.pem",
+                 "/etc/nginx/chain.pem", "/etc/nginx/fullchain.pem")])
+        self.assertEqual(mock_checkpoint.call_count, 1)
+        self.assertEqual(mock_config_test.call_count, 1)
+        self.assertEqual(mock_restart.call_count, 1)
+
+        self.config.parser.load()
+        self.assertTrue(util.contains_at_depth(
+            util.filter_comments(self.config.parser.parsed[example_conf]),
+            ['ssl_certificate', 'example/fullchain.pem'], 2))
+        self.assertTrue(util.contains_at_depth(
+            util.filter_comments(self.config.parser.parsed[nginx_conf]),
+            ['ssl_certificate', '/etc/nginx/fullchain.pem'], 4))
+
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_deploy_certs_config_test_fails(self, mock_config_test, mock_restart):
+        example_conf = self.config.parser.abs_path('sites-enabled/example.com')
+        with open(example_conf) as f:
+            original = f.read()
+        mock_config_test.side_effect = errors.MisconfigurationError
+        self.assertRaises(errors.MisconfigurationError, self.config.deploy_certs, [
+            (["www.example.com"], "example/cert.pem", "example/key.pem",
+             "example/chain.pem", "example/fullchain.pem")])
+        self.assertFalse(mock_restart.called)
+        with open(example_conf) as f:
+            self.assertEqual(f.read(), original)
+        self.assertFalse(util.contains_at_depth(
+            self.config.parser.parsed[example_conf],
+            ['ssl_certificate', 'example/fullchain.pem'], 2))
+
+    @mock.patch("certbot_nginx.configurator.logger")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_deploy_certs_enhancements(self, unused_config_test, unused_restart,
+                                       mock_logger):
+        with mock.patch("certbot_nginx.configurator.NginxConfigurator.enhance") as mock_enhance:
+            mock_enhance.side_effect = [None, errors.PluginEnhancementAlreadyPresent]
+            self.config.deploy_certs([
+                (["www.example.com"], "example/cert.pem", "example/key.pem",
+                 "example/chain.pem", "example/fullchain.pem"),
+                (["another.alias"], "/etc/nginx/cert.pem", "/etc/nginx/key.pem",
+                 "/etc/nginx/chain.pem", "/etc/nginx/fullchain.pem")],
+                enhancements=[("redirect", None)])
+        self.assertEqual(mock_enhance.call_args_list, [
+            mock.call("www.example.com", "redirect", None),
+            mock.call("another.alias", "redirect", None)])
+        self.assertTrue(mock_logger.warning.called)
+
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_deploy_certs_shared_vhost(self, unused_config_test, unused_restart):
+        example_conf = self.config.parser.abs_path('sites-enabled/example.com')
+        make_server_ssl = self.config._make_server_ssl  # pylint: disable=protected-access
+        with mock.patch("certbot_nginx.configurator.NginxConfigurator."
+                        "_make_server_ssl") as mock_make_ssl:
+            mock_make_ssl.side_effect = make_server_ssl
+            self.config.deploy_certs([
+                (["www.example.com", "example.com"], "example/cert.pem",
+                 "example/key.pem", "example/chain.pem", "example/fullchain.pem"),
+                (["example.net"], "other/cert.pem", "other/key.pem",
+                 "other/chain.pem", "other/fullchain.pem")])
+        # The three domains are served by the same server block
+        self.assertEqual(mock_make_ssl.call_count, 1)
+
+        self.config.parser.load()
+        parsed = util.filter_comments(self.config.parser.parsed[example_conf])
+        self.assertTrue(util.contains_at_depth(
+            parsed, ['ssl_certificate', 'other/fullchain.pem'], 2))
+        self.assertFalse(util.contains_at_depth(
+            parsed, ['ssl_certificate', 'example/fullchain.pem'], 2))
+
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.save")
+    def test_deploy_certs_fails(self, mock_save):
+        self.assertRaises(errors.PluginError, self.config.deploy_certs, [
+            (["www.example.com"], "example/cert.pem", "example/key.pem",
+             "example/chain.pem", "example/fullchain.pem"),
+            (["www.example.com"], "example/cert.pem", "example/key.pem",
+             "example/chain.pem", None)])
+        self.assertFalse(mock_save.called)
+        self.assertFalse(util.contains_at_depth(
+            self.config.parser.parsed[self.config.parser.abs_path('sites-enabled/example.com')],
+            ['ssl_certificate', 'example/fullchain.pem'], 2))
+
     def test_deploy_cert_add_explicit_listen(self):
         migration_conf = self.config.parser.abs_path('sites-enabled/migration.com')
         self.config.deploy_cert(
@@ -360,6 +457,56 @@ class NginxConfiguratorTest(util.NginxTest):
         self.assertEqual(mock_revert.call_count, 1)
         self.assertEqual(mock_restart.call_count, 2)
 
+    @mock.patch("certbot_nginx.configurator.http_01.NginxHttp01.cleanup")
+    @mock.patch("certbot_nginx.configurator.http_01.NginxHttp01.perform")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.revert_challenge_config")
+    def test_perform_and_cleanup_shared_responder(self, mock_revert, mock_restart,
+        mock_http_perform, mock_http_cleanup):
+        self.config.config.nginx_shared_http01_responder = True
+        achall = achallenges.KeyAuthorizationAnnotatedChallenge(
+            challb=messages.ChallengeBody(
+                chall=challenges.HTTP01(token=b"m8TdO1qik4JVFtgPPurJmg"),
+                uri="https://ca.org/chall1_uri",
+                status=messages.Status("pending"),
+            ), domain="example.com", account_key=self.rsa512jwk)
+        mock_http_perform.return_value = [achall.response(self.rsa512jwk)]
+
+        self.config.perform([achall])
+        # The responder was already in place, no reload is needed
+        self.assertFalse(mock_restart.called)
+
+        self.config.cleanup([achall])
+        self.assertEqual(mock_http_cleanup.call_count, 1)
+        # Nothing was changed temporarily, so there is nothing to revert
+        self.assertFalse(mock_revert.called)
+        self.assertFalse(mock_restart.called)
+
+    @mock.patch("certbot_nginx.configurator.http_01.NginxHttp01.cleanup")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.revert_challenge_config")
+    def test_perform_and_cleanup_shared_responder_fallback(self, mock_revert, mock_restart,
+        mock_http_cleanup):
+        self.config.config.nginx_shared_http01_responder = True
+        achall = achallenges.KeyAuthorizationAnnotatedChallenge(
+            challb=messages.ChallengeBody(
+                chall=challenges.HTTP01(token=b"m8TdO1qik4JVFtgPPurJmg"),
+                uri="https://ca.org/chall1_uri",
+                status=messages.Status("pending"),
+            ), domain="example.com", account_key=self.rsa512jwk)
+
+        # No server block can include the responder for the domain
+        with mock.patch("certbot_nginx.configurator.http_01.NginxHttp01._perform_shared") \
+                as mock_perform_shared:
+            mock_perform_shared.return_value = [achall]
+            self.config.perform([achall])
+        self.assertEqual(mock_restart.call_count, 1)
+
+        self.config.cleanup([achall])
+        self.assertEqual(mock_http_cleanup.call_count, 1)
+        self.assertEqual(mock_revert.call_count, 1)
+        self.assertEqual(mock_restart.call_count, 2)
+
     @mock.patch("certbot_nginx.configurator.subprocess.Popen")
     def test_get_version(self, mock_popen):
         mock_popen().communicate.return_value = (
@@ -466,6 +613,7 @@ class NginxConfiguratorTest(util.NginxTest):
     def test_get_snakeoil_paths(self):
         # pylint: disable=protected-access
         cert, key = self.config._get_snakeoil_paths()
+        self.assertEqual(self.config._get_snakeoil_paths(), (cert, key))
         self.assertTrue(os.path.exists(cert))
         self.assertTrue(os.path.exists(key))
         with open(cert) as cert_file:
@@ -1,4 +1,5 @@
 """Tests for certbot_nginx.http_01"""
+import os
 import unittest
 import shutil
 
@@ -8,6 +9,7 @@ import six
 from acme import challenges
 
 from certbot import achallenges
+from certbot import errors
 
 from certbot.plugins import common_test
 from certbot.tests import acme_util
@@ -109,6 +111,79 @@ class HttpPerformTest(util.NginxTest):
             #     self.assertEqual(vhost.addrs, set(v_addr2_print))
             # self.assertEqual(vhost.names, set([response.z_domain.decode('ascii')]))
 
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_perform_shared(self, mock_config_test):
+        from certbot_nginx import http_01
+        self.http01.configurator.config.nginx_shared_http01_responder = True
+        nomatch_achall = achallenges.KeyAuthorizationAnnotatedChallenge(
+            challb=acme_util.chall_to_challb(
+                challenges.HTTP01(token=b"kNdwjyOeX0I_A8DXt9Msmg"), "pending"),
+            domain="www.nomatch.com", account_key=self.account_key)
+        achalls = self.achalls + [nomatch_achall]
+        for achall in achalls:
+            self.http01.add_chall(achall)
+        with mock.patch.object(self.http01, "_mod_config") as mock_mod_config:
+            responses = self.http01.perform()
+        self.assertEqual(responses, [achall.response(self.account_key)
+                                     for achall in achalls])
+        self.assertTrue(self.http01.reload_needed)
+        self.assertTrue(mock_config_test.called)
+        # www.nomatch.com has no server block listening on port 80
+        mock_mod_config.assert_called_once_with([nomatch_achall])
+        with open(self.http01.responder_conf) as responder_file:
+            self.assertTrue(self.http01.challenge_dir in responder_file.read())
+        for achall in self.achalls:
+            validation_path = os.path.join(self.http01.challenge_dir,
+                                           achall.chall.encode("token"))
+            with open(validation_path) as validation_file:
+                self.assertEqual(validation_file.read(),
+                                 achall.validation(self.account_key))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.http01.challenge_dir, nomatch_achall.chall.encode("token"))))
+
+        vhost = self.http01.configurator.choose_redirect_vhosts("www.example.com", "80")[0]
+        self.assertTrue(['include', self.http01.responder_conf] in vhost.raw)
+
+        self.http01.cleanup()
+        self.assertEqual(os.listdir(self.http01.challenge_dir), [])
+
+        # The responder is already included
+        self.http01.configurator.parser.load()
+        http01 = http_01.NginxHttp01(self.http01.configurator)
+        http01.add_chall(self.achalls[0])
+        with mock.patch("certbot_nginx.configurator.NginxConfigurator.save") as mock_save:
+            http01.perform()
+        self.assertFalse(mock_save.called)
+        self.assertFalse(http01.reload_needed)
+
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.rollback_checkpoints")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_perform_shared_config_test_fails(self, mock_config_test, mock_rollback):
+        self.http01.configurator.config.nginx_shared_http01_responder = True
+        mock_config_test.side_effect = errors.MisconfigurationError
+        for achall in self.achalls:
+            self.http01.add_chall(achall)
+        with mock.patch.object(self.http01, "_mod_config") as mock_mod_config:
+            self.http01.perform()
+        mock_rollback.assert_called_once_with()
+        # All the challenges are performed with a temporary configuration
+        mock_mod_config.assert_called_once_with(self.achalls)
+        self.assertEqual(os.listdir(self.http01.challenge_dir), [])
+
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.config_test")
+    def test_perform_shared_existing_location(self, unused_config_test):
+        self.http01.configurator.config.nginx_shared_http01_responder = True
+        vhost = self.http01.configurator.choose_redirect_vhosts("www.example.com", "80")[0]
+        self.http01.configurator.parser.add_server_directives(
+            vhost, [[['\n    ', 'location', ' ', '/.well-known/acme-challenge/', ' '],
+                     [['\n        ', 'root', ' ', '/var/www/acme'], '\n    ']]])
+        self.http01.add_chall(self.achalls[0])
+        with mock.patch.object(self.http01, "_mod_config") as mock_mod_config:
+            self.http01.perform()
+        mock_mod_config.assert_called_once_with([self.achalls[0]])
+        vhost = self.http01.configurator.choose_redirect_vhosts("www.example.com", "80")[0]
+        self.assertFalse(['include', self.http01.responder_conf] in vhost.raw)
+
     @mock.patch("certbot_nginx.configurator.NginxConfigurator.ipv6_info")
     def test_default_listen_addresses_no_memoization(self, ipv6_info):
         # pylint: disable=protected-access
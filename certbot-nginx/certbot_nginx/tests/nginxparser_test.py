@@ -1,13 +1,15 @@
 """Test for certbot_nginx.nginxparser."""
 import copy
 import operator
+import pickle
+import random
 import tempfile
 import unittest
 
 from pyparsing import ParseException
 
 from certbot_nginx.nginxparser import (
-    RawNginxParser, loads, load, dumps, dump, UnspacedList)
+    NativeNginxParser, RawNginxParser, loads, load, dumps, dump, UnspacedList)
 from certbot_nginx.tests import util
 
 
@@ -348,6 +350,73 @@ class TestRawNginxParser(unittest.TestCase):
         self.assertRaises(ParseException, loads, "blag${dfgdf{g};")
 
 
+class TestNativeNginxParser(unittest.TestCase):
+    """Test the native parser against the pyparsing grammar."""
+
+    WHITESPACE = ['', ' ', '  ', '\t', '\n', '\n    ', '\r\n']
+    TOKENS = ['server_name', '80', '${var}', '$uri', '"a b"', "'c\\'d'", '"e\\"f")g',
+              'a}b', '#x', '~*', '^/(.*)$', 'h"i"', "'multi\nline'", '"j")', '(', ')']
+    MUTATIONS = ['', '{', '}', ';', '"', "'", '#', '\\', ' ', '\x0c']
+
+    def _assert_same_as_pyparsing(self, source):
+        try:
+            expected = RawNginxParser(source).as_list()
+        except ParseException:
+            self.assertRaises(ParseException, NativeNginxParser(source).as_list)
+        else:
+            self.assertEqual(NativeNginxParser(source).as_list(), expected)
+            self.assertEqual(dumps(loads(source, native=True)), source)
+
+    def _random_block(self, rnd, depth):
+        source = ''
+        for _ in range(rnd.randint(0, 4)):
+            if rnd.random() < 0.2:
+                source += '{0}#{1}\n'.format(rnd.choice(self.WHITESPACE),
+                                              rnd.choice(['', ' comment', ' a { ;']))
+                continue
+            tokens = rnd.choice(self.WHITESPACE) + rnd.choice(self.TOKENS)
+            for _ in range(rnd.randint(0, 3)):
+                tokens += rnd.choice(self.WHITESPACE[1:]) + rnd.choice(self.TOKENS)
+            tokens += rnd.choice(self.WHITESPACE)
+            if rnd.random() < 0.3 and depth < 3:
+                source += '{0}{{{1}{2}}}'.format(tokens, self._random_block(rnd, depth + 1),
+                                                 rnd.choice(self.WHITESPACE))
+            else:
+                source += tokens + ';'
+        return source
+
+    def test_differential_fuzz(self):
+        rnd = random.Random(6584)
+        for _ in range(1000):
+            source = self._random_block(rnd, 0) + rnd.choice(self.WHITESPACE)
+            for _ in range(rnd.choice([0, 0, 1, 2])):
+                pos = rnd.randint(0, len(source))
+                source = source[:pos] + rnd.choice(self.MUTATIONS) + source[pos + 1:]
+            self._assert_same_as_pyparsing(source)
+
+    def test_edge_cases(self):
+        for source in ['a;', ' a b ;', 'a;#', '#x\n', ' # x y \n', 'a{ }', 'a "x" ;',
+                       'a ${x}y;', '"x")y;', 'a"b" c;', 'a #b;', 'a;\r\n', 'a\tb;',
+                       '', ' ', 'a', ';', '}', 'a{b}', 'x{#c}', "'x'y;", 'a b{;',
+                       'a${b{c;', 'a\x0cb;']:
+            self._assert_same_as_pyparsing(source)
+
+    def test_testdata(self):
+        for name in ['foo.conf', 'edge_cases.conf', 'multiline_quotes.conf',
+                     'minimalistic_comments.conf', 'comment_in_file.conf',
+                     'broken.conf', 'nginx.conf', 'mime.types', 'server.conf']:
+            with open(util.get_data_filename(name)) as handle:
+                self._assert_same_as_pyparsing(handle.read())
+
+    def test_load(self):
+        with open(util.get_data_filename('foo.conf')) as handle:
+            parsed = load(handle, native=True)
+        with open(util.get_data_filename('foo.conf')) as handle:
+            expected = load(handle)
+        self.assertEqual(parsed, expected)
+        self.assertEqual(parsed.spaced, expected.spaced)
+
+
 class TestUnspacedList(unittest.TestCase):
     """Test the UnspacedList data structure"""
     def setUp(self):
@@ -424,6 +493,48 @@ class TestUnspacedList(unittest.TestCase):
         del ul3[2]
         self.assertEqual(ul3, ["some", "things", "why", "did", "whether"])
 
+    def test_delete(self):
+        ul3 = UnspacedList(["\n", "a", " ", "b", "\n", ["c", " ", "d"], " "])
+        del ul3[1]
+        self.assertEqual(ul3, ["a", ["c", "d"]])
+        self.assertEqual(ul3.spaced, ["\n", "a", " ", "\n", ["c", " ", "d"], " "])
+        del ul3[-1]
+        self.assertEqual(ul3.spaced, ["\n", "a", " ", "\n", " "])
+        self.assertRaises(IndexError, ul3.__delitem__, 1)
+        self.assertRaises(NotImplementedError, ul3.__delitem__, slice(0, 1))
+
+    def test_set_space(self):
+        ul3 = copy.deepcopy(self.ul)
+        ul3[0] = "\n"
+        self.assertEqual(ul3, ["quirk"])
+        self.assertEqual(ul3.spaced, ["\n    ", "\n", " ", "quirk"])
+
+    def test_comment_spaces(self):
+        ul3 = UnspacedList(["\n", "#", " "])
+        self.assertEqual(ul3, ["#", " "])
+        self.assertEqual(ul3.spaced, ["\n", "#", " "])
+
+    def test_deepcopy(self):
+        ul3 = UnspacedList([" ", ["a", " ", "b"], "\n"])
+        ul4 = copy.deepcopy(ul3)
+        ul4[0].append("c")
+        self.assertEqual(ul3.spaced, [" ", ["a", " ", "b"], "\n"])
+        self.assertEqual(ul4.spaced, [" ", ["a", " ", "b", "c"], "\n"])
+        self.assertEqual(False, ul3.is_dirty())
+        self.assertEqual(True, ul4.is_dirty())
+
+    def test_pickle(self):
+        ul3 = UnspacedList([" ", ["a", " ", "b"], "\n"])
+        ul3.append("c")
+        ul4 = pickle.loads(pickle.dumps(ul3))
+        self.assertEqual(ul4, ul3)
+        self.assertEqual(ul4.spaced, ul3.spaced)
+        self.assertEqual(True, ul4.dirty)
+        self.assertEqual(ul3.spaced, copy.copy(ul3).spaced)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.ul, "__dict__"))
+
     def test_is_dirty(self):
         self.assertEqual(False, self.ul2.is_dirty())
         ul3 = UnspacedList([])
@@ -1,10 +1,15 @@
 """Tests for certbot_nginx.parser."""
+import copy
 import glob
 import os
+import random
 import re
 import shutil
 import unittest
 
+import mock
+import six
+
 from certbot import errors
 
 from certbot_nginx import nginxparser
@@ -65,6 +70,103 @@ class NginxParserTest(util.NginxTest): #pylint: disable=too-many-public-methods
                          nparser.parsed[nparser.abs_path(
                              'sites-enabled/example.com')])
 
+    def test_load_native_parser(self):
+        nparser = parser.NginxParser(self.config_path)
+        native_nparser = parser.NginxParser(self.config_path, native_parser=True)
+        self.assertEqual(nparser.parsed, native_nparser.parsed)
+        for filename, tree in six.iteritems(nparser.parsed):
+            self.assertEqual(nginxparser.dumps(tree),
+                             nginxparser.dumps(native_nparser.parsed[filename]))
+
+    def test_load_parse_jobs(self):
+        nparser = parser.NginxParser(self.config_path)
+        cache_dir = os.path.join(self.work_dir, "cache")
+        parallel_nparser = parser.NginxParser(
+            self.config_path, cache_dir=cache_dir, parse_jobs=4)
+        self.assertEqual(list(parallel_nparser.parsed.items()), list(nparser.parsed.items()))
+        for filename, tree in six.iteritems(nparser.parsed):
+            self.assertEqual(nginxparser.dumps(parallel_nparser.parsed[filename]),
+                             nginxparser.dumps(tree))
+
+        with mock.patch("certbot_nginx.parser.multiprocessing.Pool") as mock_pool:
+            cached_nparser = parser.NginxParser(
+                self.config_path, cache_dir=cache_dir, parse_jobs=4)
+            # Only the broken file is left to parse
+            self.assertFalse(mock_pool.called)
+        self.assertEqual(cached_nparser.parsed, nparser.parsed)
+
+    @mock.patch("certbot_nginx.parser.multiprocessing.Pool")
+    def test_load_parse_jobs_no_pool(self, mock_pool):
+        mock_pool.side_effect = OSError
+        nparser = parser.NginxParser(self.config_path, parse_jobs=4)
+        self.assertTrue(mock_pool.called)
+        self.assertEqual(nparser.parsed, parser.NginxParser(self.config_path).parsed)
+
+    @mock.patch("certbot_nginx.parser.multiprocessing.Pool")
+    def test_load_parse_jobs_worker_error(self, mock_pool):
+        mock_pool().map.side_effect = RuntimeError
+        nparser = parser.NginxParser(self.config_path, parse_jobs=4)
+        self.assertTrue(mock_pool().map.called)
+        self.assertTrue(mock_pool().join.called)
+        self.assertEqual(nparser.parsed, parser.NginxParser(self.config_path).parsed)
+
+    def test_parse_cache(self):
+        cache_dir = os.path.join(self.work_dir, "cache")
+        raw_parser = nginxparser.RawNginxParser
+        with mock.patch("certbot_nginx.parser.nginxparser.RawNginxParser",
+                        wraps=raw_parser) as mock_parser:
+            nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+            parse_count = mock_parser.call_count
+            cached_nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+            # Only the files which can't be parsed are parsed again
+            self.assertEqual(mock_parser.call_count - parse_count,
+                             parse_count - len(nparser.parsed))
+        self.assertEqual(len(os.listdir(cache_dir)), len(nparser.parsed))
+        self.assertEqual(cached_nparser.parsed, nparser.parsed)
+        for filename, tree in six.iteritems(nparser.parsed):
+            self.assertEqual(nginxparser.dumps(cached_nparser.parsed[filename]),
+                             nginxparser.dumps(tree))
+
+        with open(nparser.abs_path('server.conf'), 'a') as server_conf:
+            server_conf.write('\nlisten 8080;\n')
+        with open(os.path.join(cache_dir, os.listdir(cache_dir)[0]), 'wb') as cache_file:
+            cache_file.write(b'corrupted')
+        reloaded_nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+        self.assertEqual(reloaded_nparser.parsed[nparser.abs_path('server.conf')][-1],
+                         ['listen', '8080'])
+        self.assertEqual(reloaded_nparser.parsed, parser.NginxParser(self.config_path).parsed)
+
+    def test_parse_cache_pruned(self):
+        cache_dir = os.path.join(self.work_dir, "cache")
+        nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+        cache_files = set(os.listdir(cache_dir))
+        os.remove(nparser.abs_path('server.conf'))
+        with open(os.path.join(cache_dir, "garbage"), "wb") as garbage:
+            garbage.write(b"corrupted")
+        nparser.load()
+        # Only the cache file of the removed file and the unreadable one are gone
+        self.assertEqual(set(os.listdir(cache_dir)), cache_files - set(
+            [parser._parse_cache_name(nparser.abs_path('server.conf'))]))  # pylint: disable=protected-access
+
+    def test_parse_cache_other_grammar(self):
+        cache_dir = os.path.join(self.work_dir, "cache")
+        parser.NginxParser(self.config_path, cache_dir=cache_dir)
+        version = parser._parse_cache_version()  # pylint: disable=protected-access
+        with mock.patch("certbot_nginx.parser._PARSE_CACHE_VERSION", version[:-1] + ("other",)):
+            with mock.patch("certbot_nginx.parser.nginxparser.RawNginxParser",
+                            wraps=nginxparser.RawNginxParser) as mock_parser:
+                nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+            self.assertTrue(mock_parser.called)
+        self.assertEqual(len(os.listdir(cache_dir)), len(nparser.parsed))
+
+    @mock.patch("certbot_nginx.parser.util.safe_open")
+    def test_parse_cache_write_failure(self, mock_safe_open):
+        mock_safe_open.side_effect = IOError
+        cache_dir = os.path.join(self.work_dir, "cache")
+        nparser = parser.NginxParser(self.config_path, cache_dir=cache_dir)
+        self.assertEqual(nparser.parsed, parser.NginxParser(self.config_path).parsed)
+        self.assertEqual(os.listdir(cache_dir), [])
+
     def test_abs_path(self):
         nparser = parser.NginxParser(self.config_path)
         self.assertEqual('/etc/nginx/*', nparser.abs_path('/etc/nginx/*'))
@@ -349,6 +451,47 @@ class NginxParserTest(util.NginxTest): #pylint: disable=too-many-public-methods
             self.assertEqual(winner,
                              parser.get_best_match(target_name, names[i]))
 
+    def test_server_name_index(self):
+        labels = ['www', 'eff', 'org', '*', '']
+        rand = random.Random(0)
+        names = [set(rand.choice([
+            '.'.join(rand.choice(labels) for _ in range(rand.randint(1, 4))),
+            r'~^(www\.)?(eff.+)', '~^eff', 'www.eff.org', '.eff.org']) for _ in range(3))
+                 for _ in range(50)]
+        vhosts = [mock.MagicMock(names=vhost_names) for vhost_names in names]
+        index = parser.ServerNameIndex(vhosts)
+        for target_name in ['www.eff.org', 'eff.org', 'test.www.eff.org', 'org', '*',
+                            '.eff.org', 'www.eff.', 'www.eff.com', 'www.com',
+                            'example.com', '']:
+            expected = [(vhost,) + parser.get_best_match(target_name, vhost.names)
+                        for vhost in vhosts]
+            self.assertEqual(index.get_best_matches(target_name),
+                             [match for match in expected if match[1] is not None])
+
+    def test_get_name_index(self):
+        nparser = parser.NginxParser(self.config_path)
+        index = nparser.get_name_index()
+        self.assertEqual([vhost.names for vhost in index.vhosts],
+                         [vhost.names for vhost in nparser.get_vhosts()])
+        self.assertTrue(nparser.get_name_index() is index)
+        nparser.clear_servers_cache()
+        self.assertFalse(nparser.get_name_index() is index)
+
+    def test_servers_cache_kept(self):
+        nparser = parser.NginxParser(self.config_path)
+        index = nparser.get_name_index()
+        vhost = [x for x in index.vhosts if 'example.com' in x.filep][0]
+        other_vhost = copy.deepcopy(vhost)
+        nparser.update_or_add_server_directives(
+            other_vhost, [['\n    ', 'ssl_certificate', ' ', 'cert.pem']])
+        self.assertTrue(nparser.get_name_index() is index)
+        self.assertTrue(['ssl_certificate', 'cert.pem'] in vhost.raw)
+        self.assertEqual([x.raw for x in nparser.get_vhosts()], [x.raw for x in index.vhosts])
+
+        nparser.update_or_add_server_directives(
+            vhost, [['\n    ', 'server_name', ' ', 'example.net']])
+        self.assertFalse(nparser.get_name_index() is index)
+
     def test_comment_directive(self):
         # pylint: disable=protected-access
         block = nginxparser.UnspacedList([
@@ -427,6 +570,32 @@ class NginxParserTest(util.NginxTest): #pylint: disable=too-many-public-methods
         ])
         self.assertTrue(server['ssl'])
 
+    def test_servers_cache(self):
+        nparser = parser.NginxParser(self.config_path)
+        do_for_subarray = parser._do_for_subarray  # pylint: disable=protected-access
+        with mock.patch("certbot_nginx.parser._do_for_subarray") as mock_do_for_subarray:
+            mock_do_for_subarray.side_effect = do_for_subarray
+            vhosts = nparser.get_vhosts()
+            calls = mock_do_for_subarray.call_count
+            self.assertEqual(len(nparser.get_vhosts()), len(vhosts))
+            self.assertFalse(nparser.parse_server([['listen', '69.50.225.155:9000']])['ssl'])
+            self.assertEqual(mock_do_for_subarray.call_count, calls)
+
+            example = [x for x in vhosts if 'example.com' in x.filep][0]
+            nparser.add_server_directives(
+                example, [['listen', ' ', '69.50.225.155:9000', ' ', 'ssl']])
+            self.assertTrue(nparser.parse_server([['listen', '69.50.225.155:9000']])['ssl'])
+            self.assertTrue(mock_do_for_subarray.call_count > calls)
+
+            nparser.load()
+            self.assertFalse(nparser.parse_server([['listen', '69.50.225.155:9000']])['ssl'])
+
+    def test_get_vhosts_paths_not_shared(self):
+        nparser = parser.NginxParser(self.config_path)
+        vhost = nparser.get_vhosts()[0]
+        vhost.path.append(0)
+        self.assertNotEqual(nparser.get_vhosts()[0].path, vhost.path)
+
     def test_duplicate_vhost(self):
         nparser = parser.NginxParser(self.config_path)
 
@@ -55,6 +55,9 @@ def get_nginx_configurator(
             config = configurator.NginxConfigurator(
                 config=mock.MagicMock(
                     nginx_server_root=config_path,
+                    nginx_native_parser=False,
+                    nginx_parse_jobs=1,
+                    nginx_shared_http01_responder=False,
                     le_vhost_ext="-le-ssl.conf",
                     config_dir=config_dir,
                     work_dir=work_dir,
@@ -125,6 +125,8 @@ class NginxTlsSni01(common.TLSSNI01):
                     body.insert(0, bucket_directive)
                 if include_directive not in body:
                     body.insert(0, include_directive)
+                # Server blocks in body may have moved
+                self.configurator.parser.clear_servers_cache()
                 included = True
                 break
         if not included:
@@ -12,6 +12,7 @@ from certbot import compat
 from certbot import crypto_util
 from certbot import errors
 from certbot import interfaces
+from certbot import lineage_storage
 from certbot import ocsp
 from certbot import storage
 from certbot import util
@@ -36,8 +37,32 @@ def update_live_symlinks(config):
     :type config: :class:`certbot.configuration.NamespaceConfig`
 
     """
+    util.lock_dir_until_exit(config.config_dir)
     for renewal_file in storage.renewal_conf_files(config):
-        storage.RenewableCert(renewal_file, config, update_symlinks=True)
+        with util.lock_lineage(config, storage.lineagename_for_filename(renewal_file)):
+            storage.RenewableCert(renewal_file, config, update_symlinks=True)
+
+def migrate_lineages(config):
+    """Import all lineages into the selected lineage storage.
+
+    The renewal configurations are copied from the storage that isn't
+    selected by ``config.lineage_storage``.
+
+    :param config: Configuration.
+    :type config: :class:`certbot.configuration.NamespaceConfig`
+
+    """
+    util.lock_dir_until_exit(config.config_dir)
+    for lineagename in lineage_storage.other_storage(config).find_all():
+        # Wait for the commands using the lineage to finish. New ones can't
+        # start while the config directory is locked.
+        with util.lock_lineage(config, lineagename):
+            pass
+    migrated = lineage_storage.migrate(lineage_storage.other_storage(config),
+                                       lineage_storage.get_storage(config))
+    disp = zope.component.getUtility(interfaces.IDisplay)
+    disp.notification("Imported {0} certificate(s) into the {1} lineage storage."
+        .format(len(migrated), config.lineage_storage), pause=False)
 
 def rename_lineage(config):
     """Rename the specified lineage to the new name.
@@ -58,6 +83,7 @@ def rename_lineage(config):
         if code != display_util.OK or not new_certname:
             raise errors.Error("User ended interaction.")
 
+    util.lock_lineage_until_exit(config, certname)
     lineage = lineage_for_certname(config, certname)
     if not lineage:
         raise errors.ConfigurationError("No existing certificate with name "
@@ -74,7 +100,7 @@ def certificates(config):
     """
     parsed_certs = []
     parse_failures = []
-    for renewal_file in storage.renewal_conf_files(config):
+    for renewal_file in storage.renewal_conf_files(config, config.domains):
         try:
             renewal_candidate = storage.RenewableCert(renewal_file, config)
             crypto_util.verify_renewable_cert(renewal_candidate)
@@ -92,7 +118,8 @@ def delete(config):
     """Delete Certbot files associated with a certificate lineage."""
     certnames = get_certnames(config, "delete", allow_multiple=True)
     for certname in certnames:
-        storage.delete_files(config, certname)
+        with util.lock_lineage(config, certname):
+            storage.delete_files(config, certname)
         disp = zope.component.getUtility(interfaces.IDisplay)
         disp.notification("Deleted all files relating to certificate {0}."
             .format(certname), pause=False)
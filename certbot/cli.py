@@ -16,7 +16,6 @@ import zope.interface
 
 from zope.interface import interfaces as zope_interfaces
 
-from acme import challenges
 # pylint: disable=unused-import, no-name-in-module
 from acme.magic_typing import Any, Dict, Optional
 # pylint: enable=unused-import, no-name-in-module
@@ -24,7 +23,6 @@ from acme.magic_typing import Any, Dict, Optional
 import certbot
 
 from certbot import constants
-from certbot import crypto_util
 from certbot import errors
 from certbot import hooks
 from certbot import interfaces
@@ -35,6 +33,10 @@ from certbot.plugins import disco as plugins_disco
 import certbot.plugins.enhancements as enhancements
 import certbot.plugins.selection as plugin_selection
 
+# Only needed to parse some of the arguments
+challenges = util.lazy_import("acme.challenges")
+crypto_util = util.lazy_import("certbot.crypto_util")
+
 logger = logging.getLogger(__name__)
 
 # Global, to save us from a lot of argument passing within the scope of this module
@@ -441,6 +443,13 @@ VERB_HELP = [
                   os.path.join(flag_default("config_dir"), "live"))),
         "usage": "\n\n  certbot update_symlinks [options]\n\n"
     }),
+    ("migrate_lineages", {
+        "short": "Copy the renewal configuration of your certificates between storages",
+        "opts": ("Imports the renewal configuration of every certificate into the "
+                 "storage selected by --lineage-storage from the other storage"),
+        "usage": "\n\n  certbot migrate_lineages --lineage-storage {files,sqlite} "
+                 "[options]\n\n"
+    }),
     ("enhance", {
         "short": "Add security enhancements to your existing configuration",
         "opts": ("Helps to harden the TLS configuration by adding security enhancements "
@@ -480,6 +489,7 @@ class HelpfulArgumentParser(object):
             "rollback": main.rollback,
             "everything": main.run,
             "update_symlinks": main.update_symlinks,
+            "migrate_lineages": main.migrate_lineages,
             "certificates": main.certificates,
             "delete": main.delete,
             "enhance": main.enhance,
@@ -850,7 +860,7 @@ class HelpfulArgumentParser(object):
         for name, plugin_ep in six.iteritems(plugins):
             parser_or_group = self.add_group(name,
                                              description=plugin_ep.long_description)
-            plugin_ep.plugin_cls.inject_parser_options(parser_or_group, name)
+            plugin_ep.inject_parser_options(parser_or_group)
 
     def determine_help_topics(self, chosen_topic):
         """
@@ -884,7 +894,8 @@ def _add_all_groups(helpful):
     helpful.add_group("paths", description="Flags for changing execution paths & servers")
     helpful.add_group("manage",
         description="Various subcommands and flags are available for managing your certificates:",
-        verbs=["certificates", "delete", "renew", "revoke", "update_symlinks"])
+        verbs=["certificates", "delete", "renew", "revoke", "update_symlinks",
+               "migrate_lineages"])
 
     # VERBS
     for verb, docs in VERB_HELP:
@@ -1283,7 +1294,13 @@ def _create_subparsers(helpful):
     helpful.add("config_changes", "--num", type=int, default=flag_default("num"),
                 help="How many past revisions you want to be displayed")
 
-    from certbot.client import sample_user_agent # avoid import loops
+    if helpful.help_arg:
+        from certbot.client import sample_user_agent # avoid import loops
+        user_agent_sample = sample_user_agent()
+    else:
+        # The help is suppressed, so certbot.client and its dependencies
+        # don't need to be imported to document the user agent
+        user_agent_sample = ""
     helpful.add(
         None, "--user-agent", default=flag_default("user_agent"),
         help='Set a custom user agent string for the client. User agent strings allow '
@@ -1293,7 +1310,7 @@ def _create_subparsers(helpful):
              'Encrypt server, set this to "". '
              '(default: {0}). The flags encoded in the user agent are: '
              '--duplicate, --force-renew, --allow-subset-of-names, -n, and '
-             'whether any hooks are set.'.format(sample_user_agent()))
+             'whether any hooks are set.'.format(user_agent_sample))
     helpful.add(
         None, "--user-agent-comment", default=flag_default("user_agent_comment"),
         type=_user_agent_comment_type,
@@ -1327,6 +1344,13 @@ def _create_subparsers(helpful):
                 "--checkpoints", type=int, metavar="N",
                 default=flag_default("rollback_checkpoints"),
                 help="Revert configuration N number of checkpoints.")
+    helpful.add("rollback",
+                "--keep-checkpoints", type=int, metavar="N",
+                default=flag_default("keep_checkpoints"),
+                help="Number of configuration checkpoints kept as they are "
+                     "after installing a certificate or enhancements. Older "
+                     "checkpoints are compacted into one, reverting all of "
+                     "their changes at once. (default: keep all)")
     helpful.add("plugins",
                 "--init", action="store_true", default=flag_default("init"),
                 help="Initialize plugins.")
@@ -1391,6 +1415,10 @@ def _paths_parser(helpful):
         help=config_help("work_dir"))
     add("paths", "--logs-dir", default=flag_default("logs_dir"),
         help="Logs directory.")
+    add(["paths", "migrate_lineages"], "--lineage-storage",
+        default=flag_default("lineage_storage"),
+        choices=constants.LINEAGE_STORAGE_BACKENDS,
+        help=config_help("lineage_storage"))
     add("paths", "--server", default=flag_default("server"),
         help=config_help("server"))
 
@@ -716,6 +716,20 @@ def view_config_changes(config, num=None):
     rev.recovery_routine()
     rev.view_config_changes(num)
 
+
+def compact_checkpoints(config):
+    """Compact the oldest configuration checkpoints.
+
+    The newest `config.keep_checkpoints` checkpoints are kept as they are,
+    nothing is compacted if it is 0.
+
+    :param config: Configuration.
+    :type config: :class:`certbot.interfaces.IConfig`
+
+    """
+    if config.keep_checkpoints > 0:
+        reverter.Reverter(config).compact_checkpoints(config.keep_checkpoints)
+
 def _open_pem_file(cli_arg_path, pem_path):
     """Open a pem file.
 
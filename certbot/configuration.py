@@ -33,7 +33,9 @@ class NamespaceConfig(object):
     paths defined in :py:mod:`certbot.constants`:
 
       - `default_archive_dir`
+      - `lineage_db_path`
       - `live_dir`
+      - `locks_dir`
       - `renewal_configs_dir`
 
     :ivar namespace: Namespace typically produced by
@@ -105,10 +107,18 @@ class NamespaceConfig(object):
     def default_archive_dir(self):  # pylint: disable=missing-docstring
         return os.path.join(self.namespace.config_dir, constants.ARCHIVE_DIR)
 
+    @property
+    def lineage_db_path(self):  # pylint: disable=missing-docstring
+        return os.path.join(self.namespace.config_dir, constants.LINEAGE_DB)
+
     @property
     def live_dir(self):  # pylint: disable=missing-docstring
         return os.path.join(self.namespace.config_dir, constants.LIVE_DIR)
 
+    @property
+    def locks_dir(self):  # pylint: disable=missing-docstring
+        return os.path.join(self.namespace.config_dir, constants.LOCKS_DIR)
+
     @property
     def renewal_configs_dir(self):  # pylint: disable=missing-docstring
         return os.path.join(
@@ -1,9 +1,7 @@
 """Certbot constants."""
 import logging
 import os
-import pkg_resources
 
-from acme import challenges
 from certbot import compat
 
 SETUPTOOLS_PLUGINS_ENTRY_POINT = "certbot.plugins"
@@ -12,6 +10,15 @@ SETUPTOOLS_PLUGINS_ENTRY_POINT = "certbot.plugins"
 OLD_SETUPTOOLS_PLUGINS_ENTRY_POINT = "letsencrypt.plugins"
 """Plugins Setuptools entry point before rename."""
 
+PLUGINS_CACHE = "plugins.json"
+"""Name of the file caching the results of plugins discovery, in the
+user's cache directory (``$XDG_CACHE_HOME/certbot`` or
+``~/.cache/certbot``). It can be safely deleted to clear the cache."""
+
+PLUGINS_CACHE_DISABLE_ENV = "CERTBOT_NO_PLUGINS_CACHE"
+"""Environment variable which, when set to a non-empty value, makes
+plugins discovery neither read nor write the cache."""
+
 CLI_DEFAULTS = dict(
     config_files=[
         os.path.join(compat.get_default_folder('config'), 'cli.ini'),
@@ -50,9 +57,9 @@ CLI_DEFAULTS = dict(
     debug=False,
     debug_challenges=False,
     no_verify_ssl=False,
-    tls_sni_01_port=challenges.TLSSNI01Response.PORT,
+    tls_sni_01_port=443,  # acme.challenges.TLSSNI01Response.PORT
     tls_sni_01_address="",
-    http01_port=challenges.HTTP01Response.PORT,
+    http01_port=80,  # acme.challenges.HTTP01Response.PORT
     http01_address="",
     break_my_certs=False,
     rsa_key_size=2048,
@@ -80,6 +87,7 @@ CLI_DEFAULTS = dict(
     reason=0,
     delete_after_revoke=None,
     rollback_checkpoints=1,
+    keep_checkpoints=0,
     init=False,
     prepare=False,
     ifaces=None,
@@ -91,6 +99,7 @@ CLI_DEFAULTS = dict(
     config_dir=compat.get_default_folder('config'),
     work_dir=compat.get_default_folder('work'),
     logs_dir=compat.get_default_folder('logs'),
+    lineage_storage="files",
     server="https://acme-v02.api.letsencrypt.org/directory",
 
     # Plugins parsers
@@ -176,6 +185,10 @@ LE_REUSE_SERVERS = {
 BACKUP_DIR = "backups"
 """Directory (relative to `IConfig.work_dir`) where backups are kept."""
 
+BACKUP_BLOBS_DIR = "backup_blobs"
+"""Directory (relative to `IConfig.work_dir`) where the contents of the files
+saved in backups are kept."""
+
 CSR_DIR = "csr"
 """See `.IConfig.csr_dir`."""
 
@@ -195,6 +208,25 @@ TEMP_CHECKPOINT_DIR = "temp_checkpoint"
 RENEWAL_CONFIGS_DIR = "renewal"
 """Renewal configs directory, relative to `IConfig.config_dir`."""
 
+LINEAGE_STORAGE_BACKENDS = ["files", "sqlite"]
+"""Available values for `IConfig.lineage_storage`."""
+
+LINEAGE_DB = "lineages.sqlite"
+"""Lineages database used by the sqlite lineage storage, relative to
+`IConfig.config_dir`."""
+
+LOCKS_DIR = "locks"
+"""Directory (relative to `IConfig.config_dir`) holding the lock files of
+single lineages and accounts."""
+
+CONFIG_DIR_LOCK_TIMEOUT = 5
+"""Number of seconds to wait for the `IConfig.config_dir` lock when it is
+only needed briefly to lock a single lineage or account."""
+
+CONFIG_ITEM_LOCK_TIMEOUT = 60
+"""Number of seconds to wait for the lock of a single lineage or account
+held by another process."""
+
 RENEWAL_HOOKS_DIR = "renewal-hooks"
 """Basename of directory containing hooks to run with the renew command."""
 
@@ -216,8 +248,8 @@ EFF_SUBSCRIBE_URI = "https://supporters.eff.org/subscribe/certbot"
 SSL_DHPARAMS_DEST = "ssl-dhparams.pem"
 """Name of the ssl_dhparams file as saved in `IConfig.config_dir`."""
 
-SSL_DHPARAMS_SRC = pkg_resources.resource_filename(
-    "certbot", "ssl-dhparams.pem")
+SSL_DHPARAMS_SRC = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "ssl-dhparams.pem")
 """Path to the nginx ssl_dhparams file found in the Certbot distribution."""
 
 UPDATED_SSL_DHPARAMS_DIGEST = ".updated-ssl-dhparams-pem-digest.txt"
@@ -41,6 +41,121 @@ class AccountStorage(object):
         raise NotImplementedError()
 
 
+@six.add_metaclass(abc.ABCMeta)
+class LineageStorage(object):
+    """Certificate lineages renewal configuration storage interface.
+
+    :ivar bool indexed: Whether lineages are found with an index, instead
+        of by loading all of them.
+
+    """
+    indexed = False
+
+    @abc.abstractmethod
+    def find_all(self):  # pragma: no cover
+        """Find the names of all lineages.
+
+        :returns: Sorted names of all stored lineages.
+        :rtype: `list` of `str`
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def exists(self, lineagename):  # pragma: no cover
+        """Is there a renewal configuration stored for lineagename?
+
+        :rtype: bool
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def reserve(self, lineagename):  # pragma: no cover
+        """Reserve a unique lineage name based on lineagename.
+
+        :returns: lineagename, possibly suffixed with ``-NNNN`` to make
+            it unique. An empty renewal configuration is stored under it.
+        :rtype: str
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def load(self, lineagename):  # pragma: no cover
+        """Load the renewal configuration of a lineage.
+
+        :rtype: configobj.ConfigObj
+
+        :raises .CertStorageError: if the configuration is missing or
+            could not be parsed
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def save(self, lineagename, renewal_config):  # pragma: no cover
+        """Save the renewal configuration of a lineage.
+
+        :raises .CertStorageError: if the configuration could not be saved
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def rename(self, prev_name, new_name):  # pragma: no cover
+        """Rename a lineage.
+
+        :raises .CertStorageError: if the lineage could not be renamed
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def delete(self, lineagename):  # pragma: no cover
+        """Delete the renewal configuration of a lineage."""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def find_by_domain(self, domain):  # pragma: no cover
+        """Find the lineages whose newest certificate contains domain.
+
+        :returns: Sorted lineage names.
+        :rtype: `list` of `str`
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def find_due(self, now):  # pragma: no cover
+        """Find the lineages whose newest certificate may be due for renewal.
+
+        This takes the ``renew_before_expiry`` and ``autorenew`` settings
+        of the lineages into account, and finds them a few days early, so
+        that every lineage `certbot.storage.RenewableCert.should_autorenew`
+        accepts is found.
+
+        :param datetime.datetime now: timezone aware date
+
+        :returns: Sorted lineage names.
+        :rtype: `list` of `str`
+
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def find_unreadable(self):  # pragma: no cover
+        """Find the lineages whose newest certificate cannot be read.
+
+        These lineages are never found by `find_by_domain` and `find_due`.
+
+        :returns: Sorted lineage names.
+        :rtype: `list` of `str`
+
+        """
+        raise NotImplementedError()
+
+
 class IPluginFactory(zope.interface.Interface):
     """IPlugin factory.
 
@@ -212,6 +327,10 @@ class IConfig(zope.interface.Interface):
 
     config_dir = zope.interface.Attribute("Configuration directory.")
     work_dir = zope.interface.Attribute("Working directory.")
+    lineage_storage = zope.interface.Attribute(
+        "Backend storing the renewal configuration of certificates: one "
+        "file per certificate in the renewal directory (files) or a single "
+        "indexed database in the configuration directory (sqlite).")
 
     accounts_dir = zope.interface.Attribute(
         "Directory where all account information is stored.")
@@ -0,0 +1,474 @@
+"""Storage backends for the renewal configuration of certificate lineages."""
+import contextlib
+import datetime
+import glob
+import logging
+import os
+import re
+import sqlite3
+import stat
+import threading
+
+import configobj
+import pytz
+
+from acme.magic_typing import Dict, Optional  # pylint: disable=unused-import, no-name-in-module
+
+from certbot import compat
+from certbot import constants
+from certbot import crypto_util
+from certbot import errors
+from certbot import interfaces
+from certbot import util
+
+logger = logging.getLogger(__name__)
+
+_EXPIRY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_DUE_MARGIN = datetime.timedelta(days=3)
+"""How early lineages are considered due by `find_due`, to make up for the
+varying length of the months in renewal intervals."""
+
+_SQLITE_STORAGES = {}  # type: Dict[str, LineageSQLiteStorage]
+
+
+def get_storage(config):
+    """Return the lineage storage selected by ``config.lineage_storage``.
+
+    :param certbot.interfaces.IConfig config: Configuration object
+
+    :rtype: `certbot.interfaces.LineageStorage`
+
+    """
+    if config.lineage_storage == "sqlite":
+        return _sqlite_storage(config)
+    return LineageFileStorage(config)
+
+
+def other_storage(config):
+    """Return the lineage storage not selected by ``config.lineage_storage``.
+
+    :param certbot.interfaces.IConfig config: Configuration object
+
+    :rtype: `certbot.interfaces.LineageStorage`
+
+    """
+    if config.lineage_storage == "sqlite":
+        return LineageFileStorage(config)
+    return _sqlite_storage(config)
+
+
+def _sqlite_storage(config):
+    """Return the SQLite storage of ``config.lineage_db_path``.
+
+    The storage, and its connection to the database, is shared by all the
+    callers in this process, and closed when it exits.
+
+    :param certbot.interfaces.IConfig config: Configuration object
+
+    :rtype: `LineageSQLiteStorage`
+
+    """
+    if config.lineage_db_path not in _SQLITE_STORAGES:
+        storage = LineageSQLiteStorage(config)
+        util.atexit_register(storage.close)
+        _SQLITE_STORAGES[config.lineage_db_path] = storage
+    return _SQLITE_STORAGES[config.lineage_db_path]
+
+
+def migrate(source, destination):
+    """Copy all renewal configurations from source to destination.
+
+    Lineages already present in destination are left untouched.
+
+    :param certbot.interfaces.LineageStorage source: storage to read from
+    :param certbot.interfaces.LineageStorage destination: storage to write to
+
+    :returns: names of the lineages that were copied
+    :rtype: `list` of `str`
+
+    """
+    migrated = []
+    for lineagename in source.find_all():
+        if destination.exists(lineagename):
+            logger.warning("Lineage %s already exists in the destination "
+                           "storage. Skipping.", lineagename)
+            continue
+        destination.save(lineagename, source.load(lineagename))
+        migrated.append(lineagename)
+    return migrated
+
+
+def _newest_archived_cert(renewal_config):
+    """Path to the newest certificate version in the lineage archive.
+
+    :param configobj.ConfigObj renewal_config: renewal configuration
+
+    :rtype: str or None
+
+    """
+    archive_dir = renewal_config.get("archive_dir")
+    if archive_dir is None and "cert" in renewal_config:
+        archive_dir = os.path.dirname(os.path.realpath(renewal_config["cert"]))
+    if archive_dir is None or not os.path.isdir(archive_dir):
+        return None
+    pattern = re.compile(r"^cert([0-9]+)\.pem$")
+    versions = [int(match.group(1)) for match in
+                (pattern.match(f) for f in os.listdir(archive_dir)) if match]
+    if not versions:
+        return None
+    return os.path.join(archive_dir, "cert{0}.pem".format(max(versions)))
+
+
+def _lineage_metadata(renewal_config):
+    """Expiry, renewal date and names of the newest certificate of a lineage.
+
+    :param configobj.ConfigObj renewal_config: renewal configuration
+
+    :returns: UTC expiry and renewal date as sortable strings (or `None`)
+        and the subject names of the newest certificate in the lineage
+    :rtype: tuple
+
+    """
+    cert_path = _newest_archived_cert(renewal_config)
+    if cert_path is None:
+        return None, None, []
+    try:
+        expiry = crypto_util.notAfter(cert_path)
+        with open(cert_path) as f:
+            names = crypto_util.get_names_from_cert(f.read())
+    except Exception:  # pylint: disable=broad-except
+        logger.debug("Unable to read certificate %s.", cert_path, exc_info=True)
+        return None, None, []
+    return _format_date(expiry), _renewal_date(renewal_config, expiry), names
+
+
+def _renewal_date(renewal_config, expiry):
+    """Date from which `find_due` finds a lineage.
+
+    This is `_DUE_MARGIN` before the certificate is due for renewal
+    according to the ``renew_before_expiry`` of the lineage.
+
+    :param configobj.ConfigObj renewal_config: renewal configuration
+    :param datetime.datetime expiry: expiry of the newest certificate
+
+    :returns: UTC date as a sortable string, or `None` if automatic
+        renewal is disabled
+    :rtype: str
+
+    """
+    # certbot.storage imports this module
+    from certbot import storage
+
+    renewalparams = renewal_config.get("renewalparams", {})
+    if "autorenew" in renewalparams and not renewalparams.as_bool("autorenew"):
+        return None
+    interval = renewal_config.get("renew_before_expiry",
+                                  constants.RENEWER_DEFAULTS["renew_before_expiry"])
+    window = storage.add_time_interval(expiry, interval) - expiry
+    return _format_date(expiry - window - _DUE_MARGIN)
+
+
+def _format_date(date):
+    return date.astimezone(pytz.UTC).strftime(_EXPIRY_FORMAT)
+
+
+class LineageFileStorage(interfaces.LineageStorage):
+    """One renewal configuration file per lineage.
+
+    There is no index: lineages are found by loading all of them.
+
+    :ivar str renewal_configs_dir: directory containing the renewal
+        configuration files
+
+    """
+    indexed = False
+
+    def __init__(self, config):
+        self.renewal_configs_dir = config.renewal_configs_dir
+
+    def _ensure_dir(self):
+        if not os.path.exists(self.renewal_configs_dir):
+            os.makedirs(self.renewal_configs_dir, 0o755)
+
+    def _path(self, lineagename):
+        return os.path.join(self.renewal_configs_dir, lineagename) + ".conf"
+
+    def find_all(self):
+        filenames = glob.glob(os.path.join(self.renewal_configs_dir, "*.conf"))
+        filenames.sort()
+        return [os.path.basename(filename[:-len(".conf")]) for filename in filenames]
+
+    def exists(self, lineagename):
+        return os.path.exists(self._path(lineagename))
+
+    def reserve(self, lineagename):
+        self._ensure_dir()
+        config_file, config_filename = util.unique_lineage_name(
+            self.renewal_configs_dir, lineagename)
+        if not config_filename.endswith(".conf"):
+            raise errors.CertStorageError(
+                "renewal config file name must end in .conf")
+        config_file.close()
+        return os.path.basename(config_filename[:-len(".conf")])
+
+    def load(self, lineagename):
+        path = self._path(lineagename)
+        if not os.path.exists(path):
+            raise errors.CertStorageError(
+                "No renewal configuration found at {0}".format(path))
+        try:
+            return configobj.ConfigObj(path)
+        except configobj.ConfigObjError:
+            raise errors.CertStorageError("error parsing {0}".format(path))
+
+    def save(self, lineagename, renewal_config):
+        path = self._path(lineagename)
+        temp_path = path + ".new"
+        logger.debug("Writing new config %s.", path)
+        self._ensure_dir()
+
+        # If an existing tempfile exists, delete it
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+        # Ensure that the file exists
+        open(temp_path, 'a').close()
+
+        # Copy permissions from the old version of the file, if it exists.
+        if os.path.exists(path):
+            current_permissions = stat.S_IMODE(os.lstat(path).st_mode)
+            os.chmod(temp_path, current_permissions)
+
+        with open(temp_path, "wb") as f:
+            renewal_config.write(outfile=f)
+            util.fsync_file(f)
+        compat.os_rename(temp_path, path)
+        util.fsync_dir(self.renewal_configs_dir)
+
+    def rename(self, prev_name, new_name):
+        try:
+            os.rename(self._path(prev_name), self._path(new_name))
+        except OSError:
+            raise errors.CertStorageError(
+                "Unable to rename {0} to {1}".format(prev_name, new_name))
+
+    def delete(self, lineagename):
+        path = self._path(lineagename)
+        os.remove(path)
+        logger.debug("Removed %s", path)
+
+    def _find(self, predicate, broken=False):
+        found = []
+        for lineagename in self.find_all():
+            try:
+                renewal_config = self.load(lineagename)
+            except errors.CertStorageError:
+                if broken:
+                    found.append(lineagename)
+                continue
+            expiry, due, names = _lineage_metadata(renewal_config)
+            if predicate(expiry, due, names):
+                found.append(lineagename)
+        return found
+
+    def find_by_domain(self, domain):
+        return self._find(lambda expiry, due, names: domain in names)
+
+    def find_due(self, now):
+        now = _format_date(now)
+        return self._find(lambda expiry, due, names: due is not None and due < now)
+
+    def find_unreadable(self):
+        return self._find(lambda expiry, due, names: expiry is None, broken=True)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lineages (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    expiry TEXT,
+    due TEXT
+);
+CREATE INDEX IF NOT EXISTS lineages_due ON lineages (due);
+CREATE TABLE IF NOT EXISTS lineage_domains (
+    domain TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (domain, name)
+);
+CREATE INDEX IF NOT EXISTS lineage_domains_name ON lineage_domains (name);
+"""
+
+
+class LineageSQLiteStorage(interfaces.LineageStorage):
+    """All renewal configurations in a single SQLite database.
+
+    Lineages are indexed by name, and by the expiry, renewal date and
+    subject names of their newest certificate, which are refreshed on every
+    save. A single connection to the database is opened on first use. The
+    database is only created when a lineage is written: until then, the
+    storage reads as empty.
+
+    :ivar str db_path: path to the SQLite database
+
+    """
+    indexed = True
+
+    def __init__(self, config):
+        self.db_path = config.lineage_db_path
+        self._connection = None  # type: Optional[sqlite3.Connection]
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Open the database and create its schema if needed.
+
+        :rtype: sqlite3.Connection
+
+        :raises .CertStorageError: if the database cannot be opened
+
+        """
+        if self._connection is None:
+            db_dir = os.path.dirname(self.db_path)
+            if not os.path.exists(db_dir):
+                os.makedirs(db_dir, 0o755)
+            try:
+                connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            except sqlite3.Error as error:
+                raise errors.CertStorageError(
+                    "Unable to open {0}: {1}".format(self.db_path, error))
+            try:
+                with connection:
+                    connection.executescript(_SCHEMA)
+            except sqlite3.Error as error:
+                connection.close()
+                raise errors.CertStorageError(
+                    "Unable to open {0}: {1}".format(self.db_path, error))
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        """Close the connection to the database, if it is open."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _missing(self):
+        """Whether the database does not exist yet.
+
+        :rtype: bool
+
+        """
+        return self._connection is None and not os.path.exists(self.db_path)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    yield connection
+            except sqlite3.Error as error:
+                raise errors.CertStorageError(
+                    "Error accessing {0}: {1}".format(self.db_path, error))
+
+    def _names(self, query, parameters=()):
+        if self._missing():
+            return []
+        with self._transaction() as connection:
+            return [row[0] for row in connection.execute(query, parameters)]
+
+    def find_all(self):
+        return self._names("SELECT name FROM lineages ORDER BY name")
+
+    def exists(self, lineagename):
+        return bool(self._names(
+            "SELECT name FROM lineages WHERE name = ?", (lineagename,)))
+
+    def reserve(self, lineagename):
+        candidate = lineagename
+        count = 1
+        with self._transaction() as connection:
+            while True:
+                try:
+                    connection.execute(
+                        "INSERT INTO lineages (name, config) VALUES (?, '')",
+                        (candidate,))
+                    return candidate
+                except sqlite3.IntegrityError:
+                    candidate = "{0}-{1:04d}".format(lineagename, count)
+                    count += 1
+
+    def load(self, lineagename):
+        row = None
+        if not self._missing():
+            with self._transaction() as connection:
+                row = connection.execute(
+                    "SELECT config FROM lineages WHERE name = ?",
+                    (lineagename,)).fetchone()
+        if row is None:
+            raise errors.CertStorageError(
+                "No renewal configuration found for {0} in {1}".format(
+                    lineagename, self.db_path))
+        try:
+            return configobj.ConfigObj(row[0].splitlines())
+        except configobj.ConfigObjError:
+            raise errors.CertStorageError("error parsing {0} in {1}".format(
+                lineagename, self.db_path))
+
+    def save(self, lineagename, renewal_config):
+        logger.debug("Writing new config for %s to %s.", lineagename, self.db_path)
+        filename = renewal_config.filename
+        renewal_config.filename = None
+        try:
+            text = "\n".join(renewal_config.write())
+        finally:
+            renewal_config.filename = filename
+        expiry, due, names = _lineage_metadata(renewal_config)
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO lineages (name, config, expiry, due) "
+                "VALUES (?, ?, ?, ?)", (lineagename, text, expiry, due))
+            connection.execute(
+                "DELETE FROM lineage_domains WHERE name = ?", (lineagename,))
+            connection.executemany(
+                "INSERT OR IGNORE INTO lineage_domains (domain, name) "
+                "VALUES (?, ?)", [(name, lineagename) for name in names])
+
+    def rename(self, prev_name, new_name):
+        with self._transaction() as connection:
+            try:
+                cursor = connection.execute(
+                    "UPDATE lineages SET name = ? WHERE name = ?",
+                    (new_name, prev_name))
+            except sqlite3.IntegrityError:
+                raise errors.CertStorageError(
+                    "Unable to rename {0} to {1}".format(prev_name, new_name))
+            if cursor.rowcount != 1:
+                raise errors.CertStorageError(
+                    "Unable to rename {0} to {1}".format(prev_name, new_name))
+            connection.execute(
+                "UPDATE lineage_domains SET name = ? WHERE name = ?",
+                (new_name, prev_name))
+
+    def delete(self, lineagename):
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM lineages WHERE name = ?", (lineagename,))
+            connection.execute(
+                "DELETE FROM lineage_domains WHERE name = ?", (lineagename,))
+        logger.debug("Removed %s from %s", lineagename, self.db_path)
+
+    def find_by_domain(self, domain):
+        return self._names(
+            "SELECT name FROM lineage_domains WHERE domain = ? ORDER BY name",
+            (domain,))
+
+    def find_due(self, now):
+        return self._names(
+            "SELECT name FROM lineages WHERE due < ? ORDER BY name",
+            (_format_date(now),))
+
+    def find_unreadable(self):
+        return self._names(
+            "SELECT name FROM lineages WHERE expiry IS NULL ORDER BY name")
@@ -21,16 +21,18 @@ import sys
 import tempfile
 import traceback
 
-from acme import messages
-
 from certbot import compat
 from certbot import constants
 from certbot import errors
 from certbot import util
 
+messages = util.lazy_import("acme.messages")
+
 # Logging format
 CLI_FMT = "%(message)s"
 FILE_FMT = "%(asctime)s:%(levelname)s:%(name)s:%(message)s"
+# Log files of instances running while another one holds the logs directory
+_PROCESS_LOG_FMT = "{0}.pid{1}"
 
 
 logger = logging.getLogger(__name__)
@@ -133,13 +135,22 @@ def setup_log_file_handler(config, logfile, fmt):
     """
     # TODO: logs might contain sensitive data such as contents of the
     # private key! #525
-    util.set_up_core_dir(
-        config.logs_dir, 0o700, compat.os_geteuid(), config.strict_permissions)
+    backup_count = config.max_log_backups
+    try:
+        util.set_up_core_dir(
+            config.logs_dir, 0o700, compat.os_geteuid(), config.strict_permissions)
+    except errors.LockError:
+        # Another Certbot instance is logging to this directory, so use a
+        # log file of our own rather than rotating the files it writes to.
+        # The instance holding the directory prunes these files.
+        logfile = _PROCESS_LOG_FMT.format(logfile, os.getpid())
+        backup_count = 0
+    else:
+        _prune_process_logs(config.logs_dir, logfile, config.max_log_backups)
     log_file_path = os.path.join(config.logs_dir, logfile)
     try:
         handler = logging.handlers.RotatingFileHandler(
-            log_file_path, maxBytes=2 ** 20,
-            backupCount=config.max_log_backups)
+            log_file_path, maxBytes=2 ** 20, backupCount=backup_count)
     except IOError as error:
         raise errors.Error(util.PERM_ERR_FMT.format(error))
     # rotate on each invocation, rollover only possible when maxBytes
@@ -152,6 +163,25 @@ def setup_log_file_handler(config, logfile, fmt):
     return handler, log_file_path
 
 
+def _prune_process_logs(logs_dir, logfile, keep):
+    """Delete old log files of concurrent Certbot instances.
+
+    :param str logs_dir: directory holding the log files
+    :param str logfile: basename for the log file
+    :param int keep: number of the newest files to keep
+
+    """
+    prefix = _PROCESS_LOG_FMT.format(logfile, '')
+    paths = [os.path.join(logs_dir, name) for name in os.listdir(logs_dir)
+             if name.startswith(prefix)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            logger.debug('Unable to delete old log file %s', path, exc_info=True)
+
+
 class ColoredStreamHandler(logging.StreamHandler):
     """Sends colored logging output to a stream.
 
@@ -6,39 +6,44 @@ import logging.handlers
 import os
 import sys
 
-import configobj
-import josepy as jose
 import zope.component
 
-from acme import errors as acme_errors
 from acme.magic_typing import Union  # pylint: disable=unused-import, no-name-in-module
 
 import certbot
 
-from certbot import account
-from certbot import cert_manager
 from certbot import cli
-from certbot import client
 from certbot import compat
 from certbot import configuration
 from certbot import constants
-from certbot import crypto_util
-from certbot import eff
 from certbot import errors
 from certbot import hooks
 from certbot import interfaces
 from certbot import log
-from certbot import renewal
 from certbot import reporter
-from certbot import storage
-from certbot import updater
 from certbot import util
 
-from certbot.display import util as display_util, ops as display_ops
+from certbot.display import util as display_util
 from certbot.plugins import disco as plugins_disco
 from certbot.plugins import selection as plug_sel
 from certbot.plugins import enhancements
 
+# Modules only needed by some of the commands, and which (together with
+# their dependencies, such as josepy, cryptography, requests and
+# configobj) take most of the time needed to start Certbot, are imported
+# when first used.
+jose = util.lazy_import("josepy")
+acme_errors = util.lazy_import("acme.errors")
+account = util.lazy_import("certbot.account")
+cert_manager = util.lazy_import("certbot.cert_manager")
+client = util.lazy_import("certbot.client")
+crypto_util = util.lazy_import("certbot.crypto_util")
+display_ops = util.lazy_import("certbot.display.ops")
+eff = util.lazy_import("certbot.eff")
+renewal = util.lazy_import("certbot.renewal")
+storage = util.lazy_import("certbot.storage")
+updater = util.lazy_import("certbot.updater")
+
 USER_CANCELLED = ("User chose to cancel the operation and may "
                   "reinvoke the client.")
 
@@ -107,6 +112,8 @@ def _get_and_save_cert(le_client, config, domains=None, certname=None, lineage=N
     :raises errors.Error: if certificate could not be obtained
 
     """
+    if lineage is not None:
+        util.lock_lineage_until_exit(config, lineage.lineagename)
     hooks.pre_hook(config)
     try:
         if lineage is not None:
@@ -129,6 +136,20 @@ def _get_and_save_cert(le_client, config, domains=None, certname=None, lineage=N
     return lineage
 
 
+def _lineage_ref(lineage):
+    """Reference to a lineage shown to the user.
+
+    :param lineage: Certificate lineage object
+    :type lineage: storage.RenewableCert
+
+    :returns: the path to the renewal configuration file of the lineage,
+        or its name if the lineage storage has no such files
+    :rtype: str
+
+    """
+    return lineage.configfile.filename or lineage.lineagename
+
+
 def _handle_subset_cert_request(config, domains, cert):
     """Figure out what to do if a previous cert had a subset of the names now requested
 
@@ -153,7 +174,7 @@ def _handle_subset_cert_request(config, domains, cert):
         "names: {1}{br}{br}You requested these names for the new "
         "certificate: {2}.{br}{br}Do you want to expand and replace this existing "
         "certificate with the new certificate?"
-    ).format(cert.configfile.filename,
+    ).format(_lineage_ref(cert),
              existing,
              ", ".join(domains),
              br=os.linesep)
@@ -203,7 +224,7 @@ def _handle_identical_cert_request(config, lineage):
         "You have an existing certificate that has exactly the same "
         "domains or certificate name you requested and isn't close to expiry."
         "{br}(ref: {0}){br}{br}What would you like to do?"
-    ).format(lineage.configfile.filename, br=os.linesep)
+    ).format(_lineage_ref(lineage), br=os.linesep)
 
     if config.verb == "run":
         keep_opt = "Attempt to reinstall this existing certificate"
@@ -508,28 +529,73 @@ def _determine_account(config):
     if config.account is not None:
         acc = account_storage.load(config.account)
     else:
-        accounts = account_storage.find_all()
-        if len(accounts) > 1:
-            acc = display_ops.choose_account(accounts)
-        elif len(accounts) == 1:
-            acc = accounts[0]
-        else:  # no account registered yet
-            if config.email is None and not config.register_unsafely_without_email:
-                config.email = display_ops.get_email()
-            try:
-                acc, acme = client.register(
-                    config, account_storage, tos_cb=_tos_cb)
-            except errors.MissingCommandlineFlag:
-                raise
-            except errors.Error:
-                logger.debug("", exc_info=True)
-                raise errors.Error(
-                    "Unable to register an account with ACME server")
+        acc, acme = _find_or_register_account(
+            config, _LockedAccountStorage(config, account_storage), _tos_cb)
 
     config.account = acc.id
     return acc, acme
 
 
+class _LockedAccountStorage(object):
+    """Account storage taking the accounts lock around each read and save.
+
+    The lock is not held in between, so that concurrent runs are not
+    blocked while the user is prompted.
+
+    :ivar config: Configuration object
+    :type config: interfaces.IConfig
+
+    """
+    def __init__(self, config, account_storage):
+        self.config = config
+        self._storage = account_storage
+
+    def find_all(self):
+        """Find all accounts, see `.AccountStorage.find_all`."""
+        with util.lock_config_item(self.config, "accounts"):
+            return self._storage.find_all()
+
+    def save(self, account_, client_):
+        """Save an account, see `.AccountStorage.save`."""
+        with util.lock_config_item(self.config, "accounts"):
+            self._storage.save(account_, client_)
+
+
+def _find_or_register_account(config, account_storage, tos_cb):
+    """Choose an existing account or register a new one.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param account.AccountFileStorage account_storage: account storage
+    :param callable tos_cb: callback accepting the Terms of Service
+
+    :returns: Account and optionally ACME client API
+    :rtype: tuple of :class:`certbot.account.Account` and :class:`acme.client.Client`
+
+    :raises errors.Error: If unable to register an account with ACME server
+
+    """
+    acme = None
+    accounts = account_storage.find_all()
+    if len(accounts) > 1:
+        acc = display_ops.choose_account(accounts)
+    elif len(accounts) == 1:
+        acc = accounts[0]
+    else:  # no account registered yet
+        if config.email is None and not config.register_unsafely_without_email:
+            config.email = display_ops.get_email()
+        try:
+            acc, acme = client.register(
+                config, account_storage, tos_cb=tos_cb)
+        except errors.MissingCommandlineFlag:
+            raise
+        except errors.Error:
+            logger.debug("", exc_info=True)
+            raise errors.Error(
+                "Unable to register an account with ACME server")
+    return acc, acme
+
+
 def _delete_if_appropriate(config): # pylint: disable=too-many-locals,too-many-branches
     """Does the user want to delete their now-revoked certs? If run in non-interactive mode,
     deleting happens automatically.
@@ -566,7 +632,7 @@ def _delete_if_appropriate(config): # pylint: disable=too-many-locals,too-many-b
 
     # don't delete if the archive_dir is used by some other lineage
     archive_dir = storage.full_archive_path(
-            configobj.ConfigObj(storage.renewal_file_for_certname(config, config.certname)),
+            storage.renewal_config_for_certname(config, config.certname),
             config, config.certname)
     try:
         cert_manager.match_and_check_overlaps(config, [lambda x: archive_dir],
@@ -609,6 +675,10 @@ def _init_le_client(config, authenticator, installer):
     else:
         acc, acme = None, None
 
+    if installer is not None or interfaces.IInstaller.providedBy(authenticator):
+        # Checkpoints of server configuration changes are kept in work_dir
+        util.lock_dir_until_exit(config.work_dir)
+
     return client.Client(config, acc, authenticator, installer, acme=acme)
 
 
@@ -641,6 +711,7 @@ def unregister(config, unused_plugins):
         return "Deactivation aborted."
 
     acc, acme = _determine_account(config)
+    util.lock_account_until_exit(config, acc.id)
     cb_client = client.Client(config, acc, None, None, acme=acme)
 
     # delete on boulder
@@ -720,6 +791,7 @@ def update_account(config, unused_plugins):
         config.email = display_ops.get_email(optional=False)
 
     acc, acme = _determine_account(config)
+    util.lock_account_until_exit(config, acc.id)
     cb_client = client.Client(config, acc, None, None, acme=acme)
     # We rely on an exception to interrupt this process if it didn't work.
     acc_contacts = ['mailto:' + email for email in config.email.split(',')]
@@ -759,6 +831,7 @@ def _install_cert(config, le_client, domains, lineage=None):
     le_client.deploy_certificate(domains, path_provider.key_path,
         path_provider.cert_path, path_provider.chain_path, path_provider.fullchain_path)
     le_client.enhance_config(domains, path_provider.chain_path)
+    client.compact_checkpoints(config)
 
 def install(config, plugins):
     """Install a previously obtained cert in a server.
@@ -777,6 +850,9 @@ def install(config, plugins):
     # FIXME: be consistent about whether errors are raised or returned from
     # this function ...
 
+    # Checkpoints of server configuration changes are kept in work_dir,
+    # preparing the installer may already roll back or add some
+    util.lock_dir_until_exit(config.work_dir)
     try:
         installer, _ = plug_sel.choose_configurator_plugins(config, plugins, "install")
     except errors.PluginSelectionError as e:
@@ -901,6 +977,9 @@ def enhance(config, plugins):
         logger.warning(msg, sys.argv[0])
         raise errors.MisconfigurationError("No enhancements requested, exiting.")
 
+    # Checkpoints of server configuration changes are kept in work_dir,
+    # preparing the installer may already roll back or add some
+    util.lock_dir_until_exit(config.work_dir)
     try:
         installer, _ = plug_sel.choose_configurator_plugins(config, plugins, "enhance")
     except errors.PluginSelectionError as e:
@@ -934,6 +1013,7 @@ def enhance(config, plugins):
         le_client.enhance_config(domains, config.chain_path, ask_redirect=False)
     if enhancements.are_requested(config):
         enhancements.enable(lineage, domains, installer, config)
+    client.compact_checkpoints(config)
 
 
 def rollback(config, plugins):
@@ -949,6 +1029,7 @@ def rollback(config, plugins):
     :rtype: None
 
     """
+    util.lock_dir_until_exit(config.work_dir)
     client.rollback(config.installer, config.checkpoints, config, plugins)
 
 
@@ -987,6 +1068,24 @@ def update_symlinks(config, unused_plugins):
     """
     cert_manager.update_live_symlinks(config)
 
+def migrate_lineages(config, unused_plugins):
+    """Copy the renewal configuration of all lineages between storages
+
+    The lineages are imported into the storage selected with
+    ``--lineage-storage`` from the other storage.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    :param unused_plugins: List of plugins (deprecated)
+    :type unused_plugins: `list` of `str`
+
+    :returns: `None`
+    :rtype: None
+
+    """
+    cert_manager.migrate_lineages(config)
+
 def rename(config, unused_plugins):
     """Rename a certificate
 
@@ -1097,6 +1196,9 @@ def run(config, plugins):  # pylint: disable=too-many-branches,too-many-locals
     """
     # TODO: Make run as close to auth + install as possible
     # Possible difficulties: config.csr was hacked into auth
+    # Checkpoints of server configuration changes are kept in work_dir,
+    # preparing the installer may already roll back or add some
+    util.lock_dir_until_exit(config.work_dir)
     try:
         installer, authenticator = plug_sel.choose_configurator_plugins(config, plugins, "run")
     except errors.PluginSelectionError as e:
@@ -1277,6 +1379,11 @@ def renew(config, unused_plugins):
 def make_or_verify_needed_dirs(config):
     """Create or verify existence of config, work, and hook directories.
 
+    The directories are not locked here: commands lock the lineages and
+    accounts they modify, and only lock the whole config or work
+    directory when they span several lineages or change the server
+    configuration.
+
     :param config: Configuration object
     :type config: interfaces.IConfig
 
@@ -1285,9 +1392,9 @@ def make_or_verify_needed_dirs(config):
 
     """
     util.set_up_core_dir(config.config_dir, constants.CONFIG_DIRS_MODE,
-                         compat.os_geteuid(), config.strict_permissions)
+                         compat.os_geteuid(), config.strict_permissions, locked=False)
     util.set_up_core_dir(config.work_dir, constants.CONFIG_DIRS_MODE,
-                         compat.os_geteuid(), config.strict_permissions)
+                         compat.os_geteuid(), config.strict_permissions, locked=False)
 
     hook_dirs = (config.renewal_pre_hooks_dir,
                  config.renewal_deploy_hooks_dir,
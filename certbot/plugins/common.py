@@ -220,6 +220,22 @@ class Installer(Plugin):
             constants.ALL_SSL_DHPARAMS_HASHES)
 
 
+def deployed_domains(deployments):
+    """Domains of the deployments given to the deploy_certs method of installers.
+
+    ``deploy_certs`` isn't part of `certbot.interfaces.IInstaller`, it's
+    provided by the Apache and Nginx installers.
+
+    :param list deployments: tuples of a list of domains and the
+        arguments of :func:`certbot.interfaces.IInstaller.deploy_cert`
+
+    :returns: domains of all the deployments, in order
+    :rtype: `list` of `str`
+
+    """
+    return [domain for deployment in deployments for domain in deployment[0]]
+
+
 class Addr(object):
     r"""Represents an virtual host address.
 
@@ -1,8 +1,13 @@
 """Utilities for plugins discovery and selection."""
 import collections
+import importlib
+import inspect
 import itertools
+import json
 import logging
-import pkg_resources
+import os
+import platform
+import sys
 import six
 
 from collections import OrderedDict
@@ -10,14 +15,31 @@ from collections import OrderedDict
 import zope.interface
 import zope.interface.verify
 
-from acme.magic_typing import Dict  # pylint: disable=unused-import, no-name-in-module
+# pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import Any, Dict, List, Optional, Tuple
+# pylint: enable=unused-import, no-name-in-module
+import certbot
+
+from certbot import compat
 from certbot import constants
 from certbot import errors
 from certbot import interfaces
+from certbot import util
 
+# Scanning the installed distributions is slow, and is only needed when
+# the plugins discovery cache is out of date
+pkg_resources = util.lazy_import("pkg_resources")
 
 logger = logging.getLogger(__name__)
 
+_CACHE_FORMAT_VERSION = 3
+# Describes the Linux distribution, see `certbot.util.get_os_info`
+_OS_RELEASE = "/etc/os-release"
+
+# Entry points and metadata found by the first call to _discover, as a
+# list of (entry point, metadata) pairs
+_DISCOVERED = None  # type: Optional[List[Tuple[Any, Dict[str, Any]]]]
+
 
 class PluginEntryPoint(object):
     """Plugin entry point."""
@@ -47,10 +69,13 @@ class PluginEntryPoint(object):
     # this object is mutable, don't allow it to be hashed!
     __hash__ = None  # type: ignore
 
-    def __init__(self, entry_point):
+    def __init__(self, entry_point, metadata=None):
         self.name = self.entry_point_to_plugin_name(entry_point)
-        self.plugin_cls = entry_point.load()
         self.entry_point = entry_point
+        # Description and interfaces of the plugin, used until plugin_cls
+        # is needed for anything else
+        self._metadata = metadata
+        self._plugin_cls = None
         self._initialized = None
         self._prepared = None
 
@@ -61,9 +86,27 @@ class PluginEntryPoint(object):
             return entry_point.name
         return entry_point.dist.key + ":" + entry_point.name
 
+    @property
+    def plugin_cls(self):
+        """Plugin class, imported on first use."""
+        if self._plugin_cls is None:
+            self._plugin_cls = self.entry_point.load()
+        return self._plugin_cls
+
+    @plugin_cls.setter
+    def plugin_cls(self, plugin_cls):
+        """Set the plugin class, ignoring the cached metadata."""
+        self._plugin_cls = plugin_cls
+
+    def _cached(self, key):
+        """Is the metadata at key known without loading plugin_cls?"""
+        return self._plugin_cls is None and self._metadata is not None and key in self._metadata
+
     @property
     def description(self):
         """Description of the plugin."""
+        if self._cached("description"):
+            return self._metadata["description"]
         return self.plugin_cls.description
 
     @property
@@ -74,6 +117,8 @@ class PluginEntryPoint(object):
     @property
     def long_description(self):
         """Long description of the plugin."""
+        if self._cached("long_description"):
+            return self._metadata["long_description"]
         try:
             return self.plugin_cls.long_description
         except AttributeError:
@@ -82,10 +127,35 @@ class PluginEntryPoint(object):
     @property
     def hidden(self):
         """Should this plugin be hidden from UI?"""
+        if self._cached("hidden"):
+            return self._metadata["hidden"]
         return getattr(self.plugin_cls, "hidden", False)
 
+    def inject_parser_options(self, parser):
+        """Add the command line arguments of the plugin to parser.
+
+        The cached description of the arguments is used if there is
+        one, so the plugin module isn't imported just to build the
+        argument parser.
+
+        :param parser: argparse parser or group to add the arguments to
+
+        """
+        if self._cached("arguments") and self._metadata["arguments"] is not None:
+            for args, kwargs in self._metadata["arguments"]:
+                parser.add_argument(*args, **dict(  # pylint: disable=star-args
+                    (key, _decode_argument_value(value))
+                    for key, value in six.iteritems(kwargs)))
+        else:
+            self.plugin_cls.inject_parser_options(parser, self.name)
+
     def ifaces(self, *ifaces_groups):
         """Does plugin implements specified interface groups?"""
+        if self._cached("interfaces"):
+            implemented = self._metadata["interfaces"]
+            return not ifaces_groups or any(
+                all(iface.__identifier__ in implemented for iface in ifaces)
+                for ifaces in ifaces_groups)
         return not ifaces_groups or any(
             all(iface.implementedBy(self.plugin_cls)
                 for iface in ifaces)
@@ -100,6 +170,7 @@ class PluginEntryPoint(object):
         """Memoized plugin initialization."""
         if not self.initialized:
             self.entry_point.require()  # fetch extras!
+            # plugin_cls is a class | pylint: disable=not-callable
             self._initialized = self.plugin_cls(config, self.name)
         return self._initialized
 
@@ -194,20 +265,21 @@ class PluginsRegistry(collections.Mapping):
 
     @classmethod
     def find_all(cls):
-        """Find plugins using setuptools entry points."""
+        """Find plugins using setuptools entry points.
+
+        The entry points and the description and interfaces of the
+        plugins are only looked up once per process, and are cached on
+        disk until the installed distributions change. Plugin modules
+        are imported when the plugin is initialized, or when something
+        not in the cache is needed.
+
+        """
         plugins = {}  # type: Dict[str, PluginEntryPoint]
-        # pylint: disable=not-callable
-        entry_points = itertools.chain(
-            pkg_resources.iter_entry_points(
-                constants.SETUPTOOLS_PLUGINS_ENTRY_POINT),
-            pkg_resources.iter_entry_points(
-                constants.OLD_SETUPTOOLS_PLUGINS_ENTRY_POINT),)
-        for entry_point in entry_points:
-            plugin_ep = PluginEntryPoint(entry_point)
+        for entry_point, metadata in _discover():
+            plugin_ep = PluginEntryPoint(entry_point, metadata)
             assert plugin_ep.name not in plugins, (
                 "PREFIX_FREE_DISTRIBUTIONS messed up")
-            # providedBy | pylint: disable=no-member
-            if interfaces.IPluginFactory.providedBy(plugin_ep.plugin_cls):
+            if metadata["plugin_factory"]:
                 plugins[plugin_ep.name] = plugin_ep
             else:  # pragma: no cover
                 logger.warning(
@@ -287,3 +359,333 @@ class PluginsRegistry(collections.Mapping):
         if not self._plugins:
             return "No plugins"
         return "\n\n".join(str(p_ep) for p_ep in six.itervalues(self._plugins))
+
+
+class _CachedDistribution(object):
+    """Distribution of a cached entry point."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, key, project_name):
+        self.key = key
+        self.project_name = project_name
+
+
+class _CachedEntryPoint(object):
+    """Entry point loaded from the plugins discovery cache.
+
+    Provides the parts of `pkg_resources.EntryPoint` used by
+    `PluginEntryPoint` without importing `pkg_resources`.
+
+    """
+    def __init__(self, group, name, module_name, attrs, extras, dist):
+        # pylint: disable=too-many-arguments
+        self.group = group
+        self.name = name
+        self.module_name = module_name
+        self.attrs = tuple(attrs)
+        self.extras = tuple(extras)
+        self.dist = dist
+
+    def load(self):
+        """Import and return the object the entry point refers to."""
+        obj = importlib.import_module(self.module_name)
+        for attr in self.attrs:
+            obj = getattr(obj, attr)
+        return obj
+
+    def require(self):
+        """Ensure the extras required by the entry point are installed."""
+        if self.extras:
+            pkg_resources.get_entry_info(
+                self.dist.project_name, self.group, self.name).require()
+
+    def __str__(self):
+        entry_point = "{0} = {1}".format(self.name, self.module_name)
+        if self.attrs:
+            entry_point += ":" + ".".join(self.attrs)
+        if self.extras:
+            entry_point += " [{0}]".format(",".join(self.extras))
+        return entry_point
+
+
+class _ArgumentsRecorder(object):
+    """Records the arguments a plugin adds to an argument parser."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.arguments = []  # type: List[Tuple[Tuple[Any, ...], Dict[str, Any]]]
+
+    def add_argument(self, *args, **kwargs):
+        """Record the arguments of `argparse.ArgumentParser.add_argument`."""
+        self.arguments.append((args, kwargs))
+
+
+def _import_object(reference):
+    """Import the object referenced as ``module:qualified.name``."""
+    module_name, _, qualname = reference.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _encode_argument_value(value):
+    """Encode a keyword argument of add_argument as JSON.
+
+    Classes and functions, such as argparse actions and types, are
+    encoded as references to be imported when the value is decoded.
+
+    :raises TypeError: if value can't be encoded
+
+    """
+    if value is None or isinstance(value, (bool, int, float) + six.string_types):
+        return value
+    if isinstance(value, list):
+        return [_encode_argument_value(item) for item in value]
+    if isinstance(value, dict) and "__object__" not in value and all(
+            isinstance(key, six.string_types) for key in value):
+        return dict((key, _encode_argument_value(item)) for key, item in six.iteritems(value))
+    reference = "{0}:{1}".format(getattr(value, "__module__", None),
+                                 getattr(value, "__qualname__", getattr(value, "__name__", None)))
+    try:
+        if _import_object(reference) is value:
+            return {"__object__": reference}
+    except (ImportError, AttributeError, ValueError):
+        pass
+    raise TypeError("{0!r} can't be cached".format(value))
+
+
+def _decode_argument_value(value):
+    """Decode a value encoded by `_encode_argument_value`."""
+    if isinstance(value, list):
+        return [_decode_argument_value(item) for item in value]
+    if isinstance(value, dict):
+        if "__object__" in value:
+            return _import_object(value["__object__"])
+        return dict((key, _decode_argument_value(item)) for key, item in six.iteritems(value))
+    return value
+
+
+def _plugin_arguments(plugin_cls, name):
+    """Describe the command line arguments of a plugin.
+
+    :param plugin_cls: plugin class
+    :param str name: name of the plugin
+
+    :returns: (positional arguments, keyword arguments) of each call to
+        add_argument encoded as JSON, or `None` if the arguments can't
+        be cached
+    :rtype: `list` or `None`
+
+    """
+    recorder = _ArgumentsRecorder()
+    try:
+        plugin_cls.inject_parser_options(recorder, name)
+        return [[list(args), _encode_argument_value(kwargs)]
+                for args, kwargs in recorder.arguments]
+    except Exception:  # pylint: disable=broad-except
+        logger.debug("Unable to cache the arguments of plugin %s.", name, exc_info=True)
+        return None
+
+
+def _discover():
+    """Find the plugin entry points and the metadata of their plugins.
+
+    :returns: (entry point, metadata) pairs
+    :rtype: `list` of `tuple`
+
+    """
+    global _DISCOVERED  # pylint: disable=global-statement
+    use_cache = not os.environ.get(constants.PLUGINS_CACHE_DISABLE_ENV)
+    if _DISCOVERED is None and use_cache:
+        _DISCOVERED = _read_cache()
+    if _DISCOVERED is None:
+        _DISCOVERED, sources = _scan_entry_points()
+        if use_cache:
+            _write_cache(_DISCOVERED, sources)
+    return _DISCOVERED
+
+
+def _scan_entry_points():
+    """Find the plugin entry points of the installed distributions.
+
+    :returns: (entry point, metadata) pairs, and the paths of the
+        files the entry points and plugin classes were read from
+    :rtype: tuple
+
+    """
+    discovered = []
+    sources = set()
+    groups = (constants.SETUPTOOLS_PLUGINS_ENTRY_POINT,
+              constants.OLD_SETUPTOOLS_PLUGINS_ENTRY_POINT,)
+    # pylint: disable=not-callable
+    entry_points = itertools.chain.from_iterable(
+        ((group, entry_point) for entry_point in pkg_resources.iter_entry_points(group))
+        for group in groups)
+    for group, entry_point in entry_points:
+        plugin_cls = entry_point.load()
+        name = PluginEntryPoint.entry_point_to_plugin_name(entry_point)
+        # providedBy | pylint: disable=no-member
+        metadata = {
+            "group": group,
+            "plugin_factory": bool(interfaces.IPluginFactory.providedBy(plugin_cls)),
+            "description": getattr(plugin_cls, "description", None),
+            "long_description": getattr(plugin_cls, "long_description",
+                                        getattr(plugin_cls, "description", None)),
+            "hidden": getattr(plugin_cls, "hidden", False),
+            "interfaces": [iface.__identifier__ for iface in
+                           zope.interface.implementedBy(plugin_cls).flattened()],
+            "arguments": _plugin_arguments(plugin_cls, name),
+        }
+        discovered.append((entry_point, metadata))
+        egg_info = getattr(entry_point.dist, "egg_info", None)
+        if isinstance(egg_info, str):
+            sources.add(os.path.join(egg_info, "entry_points.txt"))
+        sources.update(_class_sources(plugin_cls))
+    return discovered, sorted(sources)
+
+
+def _class_sources(cls):
+    """Source files of the modules defining a class and its base classes.
+
+    The cached metadata, and notably the arguments added by
+    ``inject_parser_options``, may come from any of these modules.
+
+    :rtype: `list` of `str`
+
+    """
+    paths = []
+    for base in inspect.getmro(cls):
+        path = getattr(sys.modules.get(base.__module__), "__file__", None)
+        if isinstance(path, str):
+            # Compiled files aren't updated until the module is imported
+            paths.append(path[:-1] if path.endswith((".pyc", ".pyo")) else path)
+    return paths
+
+
+def _cache_path():
+    """Path to the plugins discovery cache of the current user."""
+    cache_home = (os.environ.get("XDG_CACHE_HOME") or
+                  os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "certbot", constants.PLUGINS_CACHE)
+
+
+def _stat(path):
+    """Modification time and size of a file, or `None` if it's missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def _distributions(path):
+    """Names of the distribution metadata found in a directory of `sys.path`."""
+    try:
+        return sorted(name for name in os.listdir(path or os.curdir)
+                      if name.endswith((".egg-info", ".dist-info", ".egg", ".egg-link")))
+    except OSError:
+        return []
+
+
+def _environ():
+    """Environment variables the defaults of plugin arguments depend on.
+
+    ``CERTBOT_DOCS`` changes the defaults of some plugin arguments, and
+    defaults found under the home directory depend on ``HOME`` and the
+    ``XDG_*`` variables.
+
+    :rtype: dict
+
+    """
+    return dict((name, value) for name, value in os.environ.items()
+                if name in ("CERTBOT_DOCS", "HOME") or name.startswith("XDG_"))
+
+
+def _fingerprint(sources):
+    """Describe the installed distributions the cache is valid for.
+
+    Installing, upgrading or removing a distribution changes the names
+    of the distribution metadata on `sys.path`, and editing the entry
+    points or the plugins of a distribution changes the modification
+    time or size of its ``entry_points.txt`` or plugin modules. The
+    defaults of plugin arguments may also depend on the operating
+    system, as the Apache plugin detects the distribution it runs on,
+    and on some environment variables (see `_environ`).
+
+    :param list sources: paths of the ``entry_points.txt`` files the
+        plugins were found in, and of the modules defining the plugins
+
+    :rtype: dict
+
+    """
+    return {
+        "python": sys.version,
+        "certbot": certbot.__version__,
+        "os": [platform.system(), platform.release(), _stat(_OS_RELEASE)],
+        "environ": _environ(),
+        "sys_path": [[path, _distributions(path)] for path in sys.path],
+        "sources": [[path, _stat(path)] for path in sources],
+    }
+
+
+def _read_cache():
+    """Load the plugins discovery cache, if it is up to date.
+
+    :returns: (entry point, metadata) pairs, or `None` if the cache is
+        missing or out of date
+    :rtype: `list` of `tuple` or `None`
+
+    """
+    path = _cache_path()
+    try:
+        if os.stat(path).st_uid != compat.os_geteuid():
+            logger.debug("Ignoring %s, which is owned by another user.", path)
+            return None
+        with open(path) as cache_file:
+            cache = json.load(cache_file)
+        if cache.get("version") != _CACHE_FORMAT_VERSION:
+            return None
+        sources = [source for source, _ in cache["fingerprint"]["sources"]]
+        if json.loads(json.dumps(_fingerprint(sources))) != cache["fingerprint"]:
+            logger.debug("Installed distributions changed since %s was written.", path)
+            return None
+        return [(_CachedEntryPoint(
+            entry["metadata"]["group"], entry["name"], entry["module_name"], entry["attrs"],
+            entry["extras"], _CachedDistribution(entry["dist_key"], entry["dist_name"])),
+                 entry["metadata"]) for entry in cache["entry_points"]]
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        logger.debug("Unable to use the plugins discovery cache at %s.", path, exc_info=True)
+        return None
+
+
+def _write_cache(discovered, sources):
+    """Save the results of plugins discovery, if possible.
+
+    :param list discovered: (entry point, metadata) pairs
+    :param list sources: paths of the ``entry_points.txt`` files the
+        plugins were found in, and of the modules defining the plugins
+
+    """
+    path = _cache_path()
+    cache = {
+        "version": _CACHE_FORMAT_VERSION,
+        "fingerprint": _fingerprint(sources),
+        "entry_points": [{
+            "name": entry_point.name,
+            "module_name": entry_point.module_name,
+            "attrs": list(entry_point.attrs),
+            "extras": list(entry_point.extras),
+            "dist_key": entry_point.dist.key,
+            "dist_name": entry_point.dist.project_name,
+            "metadata": metadata,
+        } for entry_point, metadata in discovered],
+    }
+    try:
+        util.make_or_verify_dir(os.path.dirname(path), 0o700, compat.os_geteuid())
+        temp_path = path + ".{0}.tmp".format(os.getpid())
+        with util.safe_open(temp_path, "w", chmod=0o600) as cache_file:
+            json.dump(cache, cache_file)
+        compat.os_rename(temp_path, path)
+    except (IOError, OSError, TypeError, ValueError, errors.Error):
+        logger.debug("Unable to write the plugins discovery cache at %s.", path, exc_info=True)
@@ -1,5 +1,6 @@
 """Tests for certbot.plugins.disco."""
 import functools
+import os
 import string
 import unittest
 
@@ -14,6 +15,7 @@ from certbot import interfaces
 
 from certbot.plugins import standalone
 from certbot.plugins import webroot
+from certbot.tests import util as test_util
 
 EP_SA = pkg_resources.EntryPoint(
     "sa", "certbot.plugins.standalone",
@@ -181,6 +183,71 @@ class PluginEntryPointTest(unittest.TestCase):
     def test_repr(self):
         self.assertEqual("PluginEntryPoint#sa", repr(self.plugin_ep))
 
+    def test_metadata(self):
+        from certbot.plugins.disco import PluginEntryPoint
+        entry_point = mock.MagicMock(dist=mock.MagicMock(key="certbot"))
+        entry_point.name = "sa"
+        # pylint: disable=no-member
+        metadata = {"description": "Desc", "long_description": "Long desc",
+                    "hidden": True, "interfaces": [interfaces.IAuthenticator.__identifier__]}
+        plugin_ep = PluginEntryPoint(entry_point, metadata)
+
+        self.assertEqual("Desc", plugin_ep.description)
+        self.assertEqual("Long desc", plugin_ep.long_description)
+        self.assertTrue(plugin_ep.hidden)
+        self.assertTrue(plugin_ep.ifaces((interfaces.IAuthenticator,)))
+        self.assertFalse(plugin_ep.ifaces((interfaces.IInstaller,)))
+        self.assertFalse(entry_point.load.called)
+
+        self.assertTrue(plugin_ep.plugin_cls is entry_point.load())
+        self.assertEqual(plugin_ep.description, entry_point.load().description)
+
+    def test_inject_parser_options(self):
+        from certbot.plugins.disco import _plugin_arguments
+        from certbot.plugins.disco import PluginEntryPoint
+        arguments = _plugin_arguments(webroot.Authenticator, "webroot")
+        entry_point = mock.MagicMock(dist=mock.MagicMock(key="certbot"))
+        entry_point.name = "webroot"
+        plugin_ep = PluginEntryPoint(entry_point, {"arguments": arguments})
+
+        parser = mock.MagicMock()
+        plugin_ep.inject_parser_options(parser)
+        self.assertFalse(entry_point.load.called)
+        expected = mock.MagicMock()
+        webroot.Authenticator.inject_parser_options(expected, "webroot")
+        self.assertEqual(parser.add_argument.call_args_list,
+                         expected.add_argument.call_args_list)
+
+    def test_inject_parser_options_not_cached(self):
+        from certbot.plugins.disco import PluginEntryPoint
+        entry_point = mock.MagicMock(dist=mock.MagicMock(key="certbot"))
+        entry_point.name = "sa"
+        plugin_ep = PluginEntryPoint(entry_point, {"arguments": None})
+        parser = mock.MagicMock()
+        plugin_ep.inject_parser_options(parser)
+        entry_point.load().inject_parser_options.assert_called_once_with(parser, "sa")
+
+    def test_plugin_arguments_not_cacheable(self):
+        from certbot.plugins.disco import _plugin_arguments
+        plugin_cls = mock.MagicMock()
+        plugin_cls.inject_parser_options.side_effect = (
+            lambda parser, name: parser.add_argument("--foo", default=object()))
+        self.assertTrue(_plugin_arguments(plugin_cls, "foo") is None)
+        plugin_cls.inject_parser_options.side_effect = (
+            lambda parser, name: parser.add_argument("--foo", type=lambda x: x))
+        self.assertTrue(_plugin_arguments(plugin_cls, "foo") is None)
+
+    def test_encode_argument_value(self):
+        from certbot.plugins.disco import _decode_argument_value
+        from certbot.plugins.disco import _encode_argument_value
+        value = {"type": int, "default": [{"a": 1.5}, None, True, "b"]}
+        encoded = _encode_argument_value(value)
+        self.assertEqual(encoded["type"], {"__object__": "builtins:int"}
+                         if six.PY3 else {"__object__": "__builtin__:int"})
+        self.assertEqual(_decode_argument_value(encoded), value)
+        self.assertRaises(TypeError, _encode_argument_value, {"__object__": "a:b"})
+        self.assertRaises(TypeError, _encode_argument_value, ("a", "b"))
+
 
 class PluginsRegistryTest(unittest.TestCase):
     """Tests for certbot.plugins.disco.PluginsRegistry."""
@@ -197,12 +264,17 @@ class PluginsRegistryTest(unittest.TestCase):
         self.plugins = {self.plugin_ep.name: self.plugin_ep}
         self.reg = self._create_new_registry(self.plugins)
 
-    def test_find_all(self):
+    @mock.patch("certbot.plugins.disco._DISCOVERED", None)
+    @mock.patch("certbot.plugins.disco._write_cache")
+    @mock.patch("certbot.plugins.disco._read_cache")
+    def test_find_all(self, mock_read_cache, mock_write_cache):
         from certbot.plugins.disco import PluginsRegistry
+        mock_read_cache.return_value = None
         with mock.patch("certbot.plugins.disco.pkg_resources") as mock_pkg:
             mock_pkg.iter_entry_points.side_effect = [iter([EP_SA]),
                                                       iter([EP_WR])]
             plugins = PluginsRegistry.find_all()
+        self.assertTrue(mock_write_cache.called)
         self.assertTrue(plugins["sa"].plugin_cls is standalone.Authenticator)
         self.assertTrue(plugins["sa"].entry_point is EP_SA)
         self.assertTrue(plugins["wr"].plugin_cls is webroot.Authenticator)
@@ -288,5 +360,144 @@ class PluginsRegistryTest(unittest.TestCase):
         self.assertEqual("Bar\n\nMock", str(reg))
 
 
+class DiscoveryCacheTest(test_util.TempDirTestCase):
+    """Tests for the plugins discovery cache of certbot.plugins.disco."""
+
+    def setUp(self):
+        super(DiscoveryCacheTest, self).setUp()
+        self.environ_patch = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.tempdir})
+        self.environ_patch.start()
+        self.cache_path = os.path.join(self.tempdir, "certbot", "plugins.json")
+        dist = mock.MagicMock(key="certbot", project_name="certbot",
+                              egg_info=os.path.join(self.tempdir, "certbot.egg-info"))
+        self.entry_point = pkg_resources.EntryPoint(
+            "sa", "certbot.plugins.standalone", attrs=("Authenticator",), dist=dist)
+
+    def tearDown(self):
+        self.environ_patch.stop()
+        super(DiscoveryCacheTest, self).tearDown()
+
+    def _discover(self):
+        from certbot.plugins import disco
+        with mock.patch("certbot.plugins.disco._DISCOVERED", None):
+            with mock.patch("certbot.plugins.disco.pkg_resources") as mock_pkg:
+                mock_pkg.iter_entry_points.side_effect = [iter([self.entry_point]),
+                                                          iter([])]
+                discovered = disco._discover()  # pylint: disable=protected-access
+        return discovered, mock_pkg.iter_entry_points.called
+
+    def test_round_trip(self):
+        discovered, scanned = self._discover()
+        self.assertTrue(scanned)
+        self.assertTrue(discovered[0][0] is self.entry_point)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        discovered, scanned = self._discover()
+        self.assertFalse(scanned)
+        entry_point, metadata = discovered[0]
+        self.assertEqual(str(entry_point),
+                         "sa = certbot.plugins.standalone:Authenticator")
+        self.assertTrue(entry_point.load() is standalone.Authenticator)
+        self.assertEqual(entry_point.dist.key, "certbot")
+        self.assertTrue(metadata["plugin_factory"])
+        self.assertEqual(metadata["description"], standalone.Authenticator.description)
+        self.assertTrue(interfaces.IAuthenticator.__identifier__ in  # pylint: disable=no-member
+                        metadata["interfaces"])
+        self.assertTrue(metadata["arguments"])
+
+    def test_invalidated_by_path_change(self):
+        self._discover()
+        with mock.patch("certbot.plugins.disco.sys.path", [self.tempdir]):
+            self.assertTrue(self._discover()[1])
+
+    def test_invalidated_by_source_change(self):
+        os.mkdir(self.entry_point.dist.egg_info)
+        entry_points_txt = os.path.join(self.entry_point.dist.egg_info, "entry_points.txt")
+        open(entry_points_txt, "w").close()
+        self._discover()
+        os.utime(entry_points_txt, (0, 0))
+        self.assertTrue(self._discover()[1])
+
+    def test_invalidated_by_plugin_change(self):
+        module_path = os.path.join(self.tempdir, "plugin.py")
+        with open(module_path, "w") as f:
+            f.write("x = 1\n")
+        with mock.patch("certbot.plugins.disco._class_sources") as mock_sources:
+            mock_sources.return_value = [module_path]
+            self._discover()
+            self.assertFalse(self._discover()[1])
+            # Keep the modification time, only the size changes
+            stat = os.stat(module_path)
+            with open(module_path, "w") as f:
+                f.write("x = 10\n")
+            os.utime(module_path, (stat.st_atime, stat.st_mtime))
+            self.assertTrue(self._discover()[1])
+
+    def test_invalidated_by_environ_change(self):
+        self._discover()
+        with mock.patch.dict(os.environ, {"UNRELATED": "1"}):
+            self.assertFalse(self._discover()[1])
+        with mock.patch.dict(os.environ, {"HOME": os.path.join(self.tempdir, "home")}):
+            self.assertTrue(self._discover()[1])
+        with mock.patch.dict(os.environ, {"XDG_CONFIG_HOME": self.tempdir}):
+            self.assertTrue(self._discover()[1])
+
+    def test_invalidated_by_os_change(self):
+        os_release = os.path.join(self.tempdir, "os-release")
+        with open(os_release, "w") as f:
+            f.write("ID=debian\n")
+        with mock.patch("certbot.plugins.disco._OS_RELEASE", os_release):
+            self._discover()
+            with open(os_release, "w") as f:
+                f.write("ID=centos\n")
+            self.assertTrue(self._discover()[1])
+        with mock.patch("certbot.plugins.disco.platform.release") as mock_release:
+            mock_release.return_value = "0.0-other"
+            self.assertTrue(self._discover()[1])
+
+    def test_class_sources(self):
+        from certbot.plugins import common
+        from certbot.plugins.disco import _class_sources
+        sources = [os.path.splitext(path)[0] for path in _class_sources(standalone.Authenticator)]
+        self.assertTrue(os.path.splitext(standalone.__file__)[0] in sources)
+        self.assertTrue(os.path.splitext(common.__file__)[0] in sources)
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {"CERTBOT_NO_PLUGINS_CACHE": "1"}):
+            self.assertTrue(self._discover()[1])
+            self.assertFalse(os.path.exists(self.cache_path))
+        self._discover()
+        with mock.patch.dict(os.environ, {"CERTBOT_NO_PLUGINS_CACHE": "1"}):
+            self.assertTrue(self._discover()[1])
+
+    def test_corrupted(self):
+        self._discover()
+        with open(self.cache_path, "w") as f:
+            f.write("{")
+        self.assertTrue(self._discover()[1])
+
+    @mock.patch("certbot.plugins.disco.compat.os_geteuid")
+    def test_other_owner(self, mock_geteuid):
+        self._discover()
+        mock_geteuid.return_value = os.stat(self.cache_path).st_uid + 1
+        self.assertTrue(self._discover()[1])
+
+    @mock.patch("certbot.plugins.disco.util.safe_open")
+    def test_write_failure(self, mock_open):
+        mock_open.side_effect = IOError
+        self.assertTrue(self._discover()[1])
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_require_extras(self):
+        from certbot.plugins.disco import _CachedDistribution, _CachedEntryPoint
+        dist = _CachedDistribution("certbot-foo", "certbot-foo")
+        entry_point = _CachedEntryPoint("certbot.plugins", "foo", "foo", [], ["bar"], dist)
+        self.assertEqual(str(entry_point), "foo = foo [bar]")
+        with mock.patch("certbot.plugins.disco.pkg_resources") as mock_pkg:
+            entry_point.require()
+        mock_pkg.get_entry_info.assert_called_once_with("certbot-foo", "certbot.plugins", "foo")
+        self.assertTrue(mock_pkg.get_entry_info().require.called)
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
@@ -1,15 +1,22 @@
 """Common code for DNS Authenticator Plugins."""
 
 import abc
+import json
 import logging
+import multiprocessing.pool
 import os
 import stat
+import tempfile
+import threading
+import time
 from time import sleep
 
 import configobj
 import zope.interface
 from acme import challenges
+from acme.magic_typing import Any, Dict, Optional, Tuple  # pylint: disable=unused-import, no-name-in-module
 
+from certbot import compat
 from certbot import errors
 from certbot import interfaces
 from certbot.display import ops
@@ -18,16 +25,44 @@ from certbot.plugins import common
 
 logger = logging.getLogger(__name__)
 
+ZONE_CACHE_FILE = 'dns_zones.json'
+"""File (relative to `IConfig.work_dir`) where the zones of the domains are cached."""
+
 
 @zope.interface.implementer(interfaces.IAuthenticator)
 @zope.interface.provider(interfaces.IPluginFactory)
 class DNSAuthenticator(common.Plugin):
     """Base class for DNS  Authenticators"""
 
+    max_concurrent_operations = 1
+    """Maximum number of TXT records created or deleted concurrently.
+
+    Authenticators whose `_perform` and `_cleanup` are thread safe can raise it to the number of
+    concurrent requests their DNS provider accepts.
+    """
+
+    operation_timeout = 120
+    """Time to wait for each TXT record creation or deletion run concurrently, in seconds."""
+
+    uses_zone_cache = False
+    """Whether the authenticator finds the zones of the domains with `_get_zone_cache`.
+
+    Only these authenticators have a `zone-cache-seconds` option.
+    """
+
+    uses_propagation_check = True
+    """Whether the authenticator waits for DNS changes with `_wait_for_propagation`.
+
+    Only these authenticators have a `propagation-check` option. Authenticators overriding
+    `perform` without calling it must set this to False.
+    """
+
     def __init__(self, config, name):
         super(DNSAuthenticator, self).__init__(config, name)
 
         self._attempt_cleanup = False
+        self._zone_cache = None  # type: Optional[ZoneCache]
+        self._zone_cache_lock = threading.Lock()
 
     @classmethod
     def add_parser_arguments(cls, add, default_propagation_seconds=10):  # pylint: disable=arguments-differ
@@ -36,6 +71,18 @@ class DNSAuthenticator(common.Plugin):
             type=int,
             help='The number of seconds to wait for DNS to propagate before asking the ACME server '
                  'to verify the DNS record.')
+        if cls.uses_propagation_check:
+            add('propagation-check',
+                default=False,
+                action='store_true',
+                help='Query the authoritative nameservers of the domains until they serve the DNS '
+                     'records, waiting at most the propagation seconds. Requires dnspython.')
+        if cls.uses_zone_cache:
+            add('zone-cache-seconds',
+                default=0,
+                type=int,
+                help='The number of seconds the DNS zones of the domains are cached in the work '
+                     'directory for later runs. They are only cached during the run if 0.')
 
     def get_chall_pref(self, unused_domain): # pylint: disable=missing-docstring,no-self-use
         return [challenges.DNS01]
@@ -48,14 +95,27 @@ class DNSAuthenticator(common.Plugin):
 
         self._attempt_cleanup = True
 
-        responses = []
-        for achall in achalls:
-            domain = achall.domain
-            validation_domain_name = achall.validation_domain_name(domain)
-            validation = achall.validation(achall.account_key)
+        records = self._records(achalls)
+        self._run_operations(self._perform, records, 'Unable to add TXT records')
+
+        self._wait_for_propagation([record[1:] for record in records])
+
+        return [achall.response(achall.account_key) for achall in achalls]
+
+    def _wait_for_propagation(self, records):
+        """
+        Wait for DNS changes to propagate.
 
-            self._perform(domain, validation_domain_name, validation)
-            responses.append(achall.response(achall.account_key))
+        :param list records: `(name, value)` tuples of the created TXT records.
+        """
+        if self.uses_propagation_check and self.conf('propagation-check'):
+            # The ACME server queries the authoritative nameservers, so they are checked directly,
+            # with the propagation seconds as an upper bound.
+            from certbot.plugins import dns_propagation
+            logger.info("Waiting up to %d seconds for DNS changes to propagate",
+                        self.conf('propagation-seconds'))
+            dns_propagation.PropagationChecker().wait(records, self.conf('propagation-seconds'))
+            return
 
         # DNS updates take time to propagate and checking to see if the update has occurred is not
         # reliable (the machine this code is running on might be able to see an update before
@@ -64,16 +124,75 @@ class DNSAuthenticator(common.Plugin):
                     self.conf('propagation-seconds'))
         sleep(self.conf('propagation-seconds'))
 
-        return responses
-
     def cleanup(self, achalls):  # pylint: disable=missing-docstring
         if self._attempt_cleanup:
-            for achall in achalls:
-                domain = achall.domain
-                validation_domain_name = achall.validation_domain_name(domain)
-                validation = achall.validation(achall.account_key)
+            self._run_operations(self._cleanup, self._records(achalls),
+                                 'Unable to delete TXT records')
+
+    def _get_zone_cache(self):
+        """
+        Get the cache of the zones of the domains, shared by the record operations.
+
+        :returns: The zone cache.
+        :rtype: ZoneCache
+        """
+        with self._zone_cache_lock:
+            if self._zone_cache is None:
+                ttl = self.conf('zone-cache-seconds')
+                path = os.path.join(self.config.work_dir, ZONE_CACHE_FILE) if ttl > 0 else None
+                self._zone_cache = ZoneCache(path, ttl, self.name)
+            return self._zone_cache
+
+    @staticmethod
+    def _records(achalls):
+        """
+        The TXT records of challenges.
+
+        :param list achalls: Annotated DNS-01 challenges.
+        :returns: `(domain, validation_domain_name, validation)` tuples.
+        :rtype: list
+        """
+        return [(achall.domain, achall.validation_domain_name(achall.domain),
+                 achall.validation(achall.account_key)) for achall in achalls]
+
+    def _run_operations(self, operation, records, message):
+        """
+        Run a TXT record operation for each record.
 
-                self._cleanup(domain, validation_domain_name, validation)
+        The operations are run on a pool of `max_concurrent_operations` threads if there are more
+        than one, and the errors are then reported together.
+
+        :param callable operation: `_perform` or `_cleanup`.
+        :param list records: `(domain, validation_domain_name, validation)` tuples.
+        :param str message: Description of the failure of the operations.
+        :raises errors.PluginError: If an operation run concurrently fails.
+        """
+        processes = min(self.max_concurrent_operations, len(records))
+        if processes <= 1:
+            for domain, validation_domain_name, validation in records:
+                operation(domain, validation_domain_name, validation)
+            return
+
+        failures = []
+        pool = multiprocessing.pool.ThreadPool(processes)
+        try:
+            results = [(record[1], pool.apply_async(operation, record)) for record in records]
+            for validation_domain_name, result in results:
+                try:
+                    result.get(self.operation_timeout)
+                except multiprocessing.TimeoutError:
+                    failures.append('{0}: timed out after {1} seconds'.format(
+                        validation_domain_name, self.operation_timeout))
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.debug('Encountered error for %s: %s', validation_domain_name, e,
+                                 exc_info=True)
+                    failures.append('{0}: {1}'.format(validation_domain_name, e))
+        finally:
+            # The pool is not joined, so that timed out operations do not block Certbot
+            pool.close()
+
+        if failures:
+            raise errors.PluginError('{0}:\n * {1}'.format(message, '\n * '.join(failures)))
 
     @abc.abstractmethod
     def _setup_credentials(self):  # pragma: no cover
@@ -235,6 +354,136 @@ class DNSAuthenticator(common.Plugin):
             raise errors.PluginError('{0} required to proceed.'.format(label))
 
 
+class ZoneCache(object):
+    """Cache of the zones of domain names.
+
+    The zone of a domain name is the closest of its base domain names which a DNS plugin
+    recognizes as a zone. The zones found, with the data the plugin returned when checking them,
+    and the base domain names checked, are kept in memory during the run. The zones are also kept
+    in a JSON file for `ttl` seconds if `path` is set, so that later runs don't look them up again.
+
+    The cache can be used from concurrent record operations.
+
+    :param str path: The path of the on-disk cache, if any.
+    :param int ttl: The number of seconds the zones are kept on disk.
+    :param str namespace: The section of the on-disk cache, typically the plugin name.
+    """
+
+    def __init__(self, path=None, ttl=0, namespace=''):
+        self.path = path
+        self.ttl = ttl
+        self.namespace = namespace
+        # Zones, expiration times and zone data, by domain name
+        self._zones = None  # type: Optional[Dict[str, Tuple[str, float, Any]]]
+        # Zone data of the base domain names, or False if they are not zones
+        self._checked = {}  # type: Dict[str, Any]
+        self._lock = threading.Lock()
+
+    def find_zone(self, domain, is_zone):
+        """
+        Find the zone of a domain name.
+
+        :param str domain: The domain name.
+        :param callable is_zone: A function checking if a base domain name is a zone. It is only
+            called for the base domain names not checked yet.
+        :returns: The zone, or `None` if no base domain name is a zone.
+        :rtype: str
+        """
+        return self.find_zone_data(domain, is_zone)[0]
+
+    def find_zone_data(self, domain, is_zone):
+        """
+        Find the zone of a domain name, and the data of the zone.
+
+        :param str domain: The domain name.
+        :param callable is_zone: A function returning data about a base domain name if it is a
+            zone, such as its identifier, or a false value otherwise. The data must be JSON
+            serializable. It is only called for the base domain names not checked yet.
+        :returns: The zone and its data, or `(None, None)` if no base domain name is a zone.
+        :rtype: tuple
+        """
+        domain = domain.rstrip('.')
+        with self._lock:
+            zones = self._load()
+            if domain in zones:
+                return zones[domain][0], zones[domain][2]
+
+        for guess in base_domain_name_guesses(domain):
+            with self._lock:
+                checked = self._checked.get(guess)
+            if checked is None:
+                checked = is_zone(guess) or False
+                with self._lock:
+                    self._checked[guess] = checked
+            if checked:
+                with self._lock:
+                    self._load()[domain] = (guess, time.time() + self.ttl, checked)
+                    self._save()
+                return guess, checked
+
+        return None, None
+
+    def invalidate(self, domain):
+        """
+        Forget the zone of a domain name, e.g. when it was not found by the DNS provider.
+
+        :param str domain: The domain name.
+        """
+        domain = domain.rstrip('.')
+        with self._lock:
+            zone = self._load().pop(domain, None)
+            if zone is not None:
+                self._checked.pop(zone[0], None)
+                self._save()
+
+    def _load(self):
+        """
+        Load the zones, from the on-disk cache if there is one.
+
+        :returns: The zones, their expiration times and data, by domain name.
+        :rtype: dict
+        """
+        if self._zones is None:
+            self._zones = {}
+            now = time.time()
+            for domain, (zone, expires, data) in self._read().get(self.namespace, {}).items():
+                if expires > now:
+                    self._zones[domain] = (zone, expires, data)
+        return self._zones
+
+    def _read(self):
+        """
+        Read the on-disk cache.
+
+        :returns: The zones, their expiration times and data, by domain name and namespace.
+        :rtype: dict
+        """
+        if self.path is None or not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, ValueError) as e:
+            logger.debug('Unable to read the DNS zone cache %s: %s', self.path, e)
+            return {}
+
+    def _save(self):
+        """Save the zones of the namespace to the on-disk cache, if there is one."""
+        if self.path is None:
+            return
+        now = time.time()
+        content = self._read()
+        content[self.namespace] = dict((domain, zone) for domain, zone in self._load().items()
+                                       if zone[1] > now)
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(self.path),
+                                             delete=False) as cache_file:
+                json.dump(content, cache_file)
+            compat.os_rename(cache_file.name, self.path)
+        except (IOError, OSError) as e:
+            logger.debug('Unable to write the DNS zone cache %s: %s', self.path, e)
+
+
 class CredentialsConfiguration(object):
     """Represents a user-supplied filed which stores API credentials."""
 
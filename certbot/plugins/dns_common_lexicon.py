@@ -3,7 +3,7 @@ import logging
 
 from requests.exceptions import HTTPError, RequestException
 
-from acme.magic_typing import Union, Dict, Any  # pylint: disable=unused-import,no-name-in-module
+from acme.magic_typing import Union, Dict, Any, Optional  # pylint: disable=unused-import,no-name-in-module
 from certbot import errors
 from certbot.plugins import dns_common
 
@@ -25,8 +25,14 @@ class LexiconClient(object):
     Encapsulates all communication with a DNS provider via Lexicon.
     """
 
-    def __init__(self):
+    def __init__(self, zone_cache=None):
+        """
+        :param dns_common.ZoneCache zone_cache: The cache of the zones of the domains, a new one
+            by default.
+        """
         self.provider = None
+        self.zone_cache = zone_cache or dns_common.ZoneCache()
+        self._authenticated_domain = None  # type: Optional[str]
 
     def add_txt_record(self, domain, record_name, record_content):
         """
@@ -74,33 +80,53 @@ class LexiconClient(object):
         :raises errors.PluginError: if the domain_id cannot be found.
         """
 
-        domain_name_guesses = dns_common.base_domain_name_guesses(domain)
-
-        for domain_name in domain_name_guesses:
-            try:
-                if hasattr(self.provider, 'options'):
-                    # For Lexicon 2.x
-                    self.provider.options['domain'] = domain_name
-                else:
-                    # For Lexicon 3.x
-                    self.provider.domain = domain_name
-
-                self.provider.authenticate()
+        domain_name = self.zone_cache.find_zone(domain, self._authenticate)
+        if domain_name is not None and domain_name != self._authenticated_domain:
+            # The zone was cached, the provider still has to be authenticated for it
+            if not self._authenticate(domain_name):
+                self.zone_cache.invalidate(domain)
+                domain_name = self.zone_cache.find_zone(domain, self._authenticate)
 
-                return  # If `authenticate` doesn't throw an exception, we've found the right name
-            except HTTPError as e:
-                result = self._handle_http_error(e, domain_name)
+        if domain_name is None:
+            domain_name_guesses = dns_common.base_domain_name_guesses(domain)
+            raise errors.PluginError('Unable to determine zone identifier for {0} using zone '
+                                     'names: {1}'.format(domain, domain_name_guesses))
 
-                if result:
-                    raise result
-            except Exception as e:  # pylint: disable=broad-except
-                result = self._handle_general_error(e, domain_name)
-
-                if result:
-                    raise result
+    def _authenticate(self, domain_name):
+        """
+        Authenticate the provider for a domain name.
 
-        raise errors.PluginError('Unable to determine zone identifier for {0} using zone names: {1}'
-                                 .format(domain, domain_name_guesses))
+        :param str domain_name: The domain name.
+        :returns: True if the domain name is a zone of the provider, False otherwise.
+        :rtype: bool
+        :raises errors.PluginError: if an error occurs while authenticating.
+        """
+        self._authenticated_domain = None
+        try:
+            if hasattr(self.provider, 'options'):
+                # For Lexicon 2.x
+                self.provider.options['domain'] = domain_name
+            else:
+                # For Lexicon 3.x
+                self.provider.domain = domain_name
+
+            self.provider.authenticate()
+        except HTTPError as e:
+            result = self._handle_http_error(e, domain_name)
+
+            if result:
+                raise result
+            return False
+        except Exception as e:  # pylint: disable=broad-except
+            result = self._handle_general_error(e, domain_name)
+
+            if result:
+                raise result
+            return False
+
+        # If `authenticate` doesn't throw an exception, we've found the right name
+        self._authenticated_domain = domain_name
+        return True
 
     def _handle_http_error(self, e, domain_name):
         return errors.PluginError('Error determining zone identifier for {0}: {1}.'
@@ -3,14 +3,17 @@
 import collections
 import logging
 import os
+import threading
 import unittest
 
 import mock
 
+from certbot import achallenges
 from certbot import errors
 from certbot.display import util as display_util
 from certbot.plugins import dns_common
 from certbot.plugins import dns_test_common
+from certbot.tests import acme_util
 from certbot.tests import util
 
 
@@ -18,6 +21,7 @@ class DNSAuthenticatorTest(util.TempDirTestCase, dns_test_common.BaseAuthenticat
     # pylint: disable=protected-access
 
     class _FakeDNSAuthenticator(dns_common.DNSAuthenticator):
+        uses_zone_cache = True
         _setup_credentials = mock.MagicMock()
         _perform = mock.MagicMock()
         _cleanup = mock.MagicMock()
@@ -31,6 +35,8 @@ class DNSAuthenticatorTest(util.TempDirTestCase, dns_test_common.BaseAuthenticat
 
     class _FakeConfig(object):
         fake_propagation_seconds = 0
+        fake_propagation_check = False
+        fake_zone_cache_seconds = 0
         fake_config_key = 1
         fake_other_key = None
         fake_file_path = None
@@ -39,6 +45,7 @@ class DNSAuthenticatorTest(util.TempDirTestCase, dns_test_common.BaseAuthenticat
         super(DNSAuthenticatorTest, self).setUp()
 
         self.config = DNSAuthenticatorTest._FakeConfig()
+        self.config.work_dir = self.tempdir
 
         self.auth = DNSAuthenticatorTest._FakeDNSAuthenticator(self.config, "fake")
 
@@ -47,6 +54,107 @@ class DNSAuthenticatorTest(util.TempDirTestCase, dns_test_common.BaseAuthenticat
 
         self.auth._perform.assert_called_once_with(dns_test_common.DOMAIN, mock.ANY, mock.ANY)
 
+    @mock.patch("certbot.plugins.dns_common.sleep")
+    @mock.patch("certbot.plugins.dns_propagation.PropagationChecker")
+    def test_perform_propagation_check(self, mock_checker, mock_sleep):
+        self.config.fake_propagation_check = True
+        self.config.fake_propagation_seconds = 120
+
+        self.auth.perform([self.achall])
+
+        mock_checker().wait.assert_called_once_with(
+            [(self.achall.validation_domain_name(dns_test_common.DOMAIN),
+              self.achall.validation(self.achall.account_key))], 120)
+        self.assertFalse(mock_sleep.called)
+
+    def _achalls(self, count):
+        return [achallenges.KeyAuthorizationAnnotatedChallenge(
+            challb=acme_util.DNS01, domain="{0}.{1}".format(i, dns_test_common.DOMAIN),
+            account_key=dns_test_common.KEY) for i in range(count)]
+
+    def test_perform_concurrently(self):
+        self.auth.max_concurrent_operations = 4
+        self.auth._perform = mock.MagicMock()
+        achalls = self._achalls(10)
+
+        self.assertEqual(len(self.auth.perform(achalls)), 10)
+
+        self.assertEqual(sorted(call[0][0] for call in self.auth._perform.call_args_list),
+                         sorted(achall.domain for achall in achalls))
+
+    def test_perform_concurrently_errors(self):
+        self.auth.max_concurrent_operations = 4
+        self.auth._perform = mock.MagicMock()
+        achalls = self._achalls(3)
+
+        def _perform(domain, unused_name, unused_validation):
+            if domain != achalls[1].domain:
+                raise errors.PluginError("Failed for {0}".format(domain))
+        self.auth._perform.side_effect = _perform
+
+        with self.assertRaises(errors.PluginError) as context:
+            self.auth.perform(achalls)
+        message = str(context.exception)
+        self.assertTrue(message.startswith("Unable to add TXT records"))
+        self.assertTrue("_acme-challenge.0.example.com: Failed for 0.example.com" in message)
+        self.assertTrue("_acme-challenge.2.example.com: Failed for 2.example.com" in message)
+        self.assertFalse("1.example.com" in message)
+        self.assertEqual(self.auth._perform.call_count, 3)
+        self.assertTrue(self.auth._attempt_cleanup)
+
+    def test_cleanup_concurrently_timeout(self):
+        self.auth._attempt_cleanup = True
+        self.auth.max_concurrent_operations = 2
+        self.auth.operation_timeout = 0.01
+        self.auth._cleanup = mock.MagicMock()
+        released = threading.Event()
+        self.auth._cleanup.side_effect = lambda *args: released.wait(5)
+
+        try:
+            self.assertRaises(errors.PluginError, self.auth.cleanup, self._achalls(2))
+        finally:
+            released.set()
+
+    def test_parser_arguments_zone_cache(self):
+        m = mock.MagicMock()
+        self.auth.add_parser_arguments(m)
+        m.assert_any_call('zone-cache-seconds', type=int, default=0, help=mock.ANY)
+
+        m = mock.MagicMock()
+        with mock.patch.object(DNSAuthenticatorTest._FakeDNSAuthenticator, 'uses_zone_cache',
+                               False):
+            self.auth.add_parser_arguments(m)
+        self.assertFalse(mock.call('zone-cache-seconds', type=int, default=0, help=mock.ANY)
+                         in m.call_args_list)
+
+    def test_parser_arguments_propagation_check(self):
+        m = mock.MagicMock()
+        self.auth.add_parser_arguments(m)
+        m.assert_any_call('propagation-check', default=False, action='store_true',
+                          help=mock.ANY)
+
+        m = mock.MagicMock()
+        with mock.patch.object(DNSAuthenticatorTest._FakeDNSAuthenticator,
+                               'uses_propagation_check', False):
+            self.auth.add_parser_arguments(m)
+        self.assertFalse(mock.call('propagation-check', default=False, action='store_true',
+                                   help=mock.ANY) in m.call_args_list)
+
+    def test_get_zone_cache(self):
+        zone_cache = self.auth._get_zone_cache()
+
+        self.assertTrue(self.auth._get_zone_cache() is zone_cache)
+        self.assertEqual(zone_cache.path, None)
+
+    def test_get_zone_cache_on_disk(self):
+        self.config.fake_zone_cache_seconds = 3600
+
+        zone_cache = self.auth._get_zone_cache()
+
+        self.assertEqual(zone_cache.path, os.path.join(self.tempdir, dns_common.ZONE_CACHE_FILE))
+        self.assertEqual(zone_cache.ttl, 3600)
+        self.assertEqual(zone_cache.namespace, "fake")
+
     def test_cleanup(self):
         self.auth._attempt_cleanup = True
 
@@ -208,6 +316,94 @@ class CredentialsConfigurationRequireTest(util.TempDirTestCase):
         self.assertRaises(errors.PluginError, credentials_configuration.require, {"test": ""})
 
 
+class ZoneCacheTest(util.TempDirTestCase):
+
+    def setUp(self):
+        super(ZoneCacheTest, self).setUp()
+
+        self.path = os.path.join(self.tempdir, dns_common.ZONE_CACHE_FILE)
+        self.is_zone = mock.MagicMock(side_effect=lambda name: name == "example.com")
+
+    def _call(self, ttl=3600, namespace="fake"):
+        return dns_common.ZoneCache(self.path, ttl, namespace)
+
+    def test_find_zone(self):
+        zone_cache = dns_common.ZoneCache()
+
+        self.assertEqual(zone_cache.find_zone("foo.example.com.", self.is_zone), "example.com")
+        self.assertEqual(zone_cache.find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertEqual(self.is_zone.call_args_list,
+                         [mock.call("foo.example.com"), mock.call("example.com")])
+
+    def test_find_zone_checked_names(self):
+        zone_cache = dns_common.ZoneCache()
+        zone_cache.find_zone("foo.example.com", self.is_zone)
+
+        self.assertEqual(zone_cache.find_zone("bar.foo.example.com", self.is_zone), "example.com")
+        self.assertEqual(self.is_zone.call_count, 3)
+
+    def test_find_zone_not_found(self):
+        zone_cache = dns_common.ZoneCache()
+
+        self.assertEqual(zone_cache.find_zone("example.org", self.is_zone), None)
+        self.assertEqual(zone_cache.find_zone("example.org", self.is_zone), None)
+        self.assertEqual(self.is_zone.call_count, 2)
+
+    def test_find_zone_on_disk(self):
+        self._call().find_zone("foo.example.com", self.is_zone)
+        self.is_zone.reset_mock()
+
+        self.assertEqual(self._call().find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertFalse(self.is_zone.called)
+
+    def test_find_zone_on_disk_other_namespace(self):
+        self._call(namespace="other").find_zone("foo.example.com", self.is_zone)
+        self._call().find_zone("foo.example.com", self.is_zone)
+        self.is_zone.reset_mock()
+
+        self._call(namespace="other").find_zone("foo.example.com", self.is_zone)
+        self.assertFalse(self.is_zone.called)
+
+    def test_find_zone_on_disk_expired(self):
+        self._call(ttl=-1).find_zone("foo.example.com", self.is_zone)
+        self.is_zone.reset_mock()
+
+        self.assertEqual(self._call().find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertEqual(self.is_zone.call_count, 2)
+
+    def test_find_zone_on_disk_invalid(self):
+        with open(self.path, "w") as cache_file:
+            cache_file.write("invalid")
+
+        self.assertEqual(self._call().find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertEqual(self._call().find_zone("foo.example.com", None), "example.com")
+
+    @mock.patch("certbot.plugins.dns_common.compat.os_rename")
+    def test_find_zone_on_disk_unwritable(self, mock_rename):
+        mock_rename.side_effect = OSError
+
+        self.assertEqual(self._call().find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_find_zone_data(self):
+        is_zone = mock.MagicMock(side_effect=lambda name: "ID" if name == "example.com" else None)
+        self.assertEqual(self._call().find_zone_data("foo.example.com", is_zone),
+                         ("example.com", "ID"))
+        self.assertEqual(self._call().find_zone_data("foo.example.com", None),
+                         ("example.com", "ID"))
+        self.assertEqual(self._call().find_zone_data("example.org", is_zone), (None, None))
+
+    def test_invalidate(self):
+        self._call().find_zone("foo.example.com", self.is_zone)
+        zone_cache = self._call()
+        zone_cache.invalidate("foo.example.com")
+        zone_cache.invalidate("bar.example.com")
+        self.is_zone.reset_mock()
+
+        self.assertEqual(self._call().find_zone("foo.example.com", self.is_zone), "example.com")
+        self.assertEqual(self.is_zone.call_count, 2)
+
+
 class DomainNameGuessTest(unittest.TestCase):
 
     def test_simple_case(self):
@@ -0,0 +1,172 @@
+"""Check the propagation of DNS records to the authoritative nameservers."""
+import logging
+import socket
+import time
+
+from acme.magic_typing import Dict, List, Set, Tuple  # pylint: disable=unused-import, no-name-in-module
+
+# dnspython is not declared as a dependency in Certbot itself, but in the
+# Certbot plugins needing it. Without it, the propagation cannot be checked
+# and is waited for as long as the maximum propagation time.
+try:
+    import dns.exception
+    import dns.flags
+    import dns.message
+    import dns.query
+    import dns.rcode
+    import dns.rdatatype
+    import dns.resolver
+except ImportError:  # pragma: no cover
+    dns = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+INITIAL_DELAY = 1.0
+"""Delay before querying the nameservers again, in seconds."""
+
+MAX_DELAY = 16.0
+"""Maximum delay between the queries to the nameservers, in seconds."""
+
+
+class PropagationChecker(object):
+    """Wait for TXT records to be served by the authoritative nameservers.
+
+    The authoritative nameservers of the zone of each record are found
+    through the recursive resolver, by SOA and NS queries. They are then
+    queried directly, with an exponential backoff, until all of them serve
+    the expected values.
+
+    :param resolver: Recursive resolver used to find the nameservers, the
+        resolver of the system by default
+    :type resolver: `dns.resolver.Resolver`
+    :param int port: Port of the authoritative nameservers
+    :param float timeout: Timeout of each query, in seconds
+
+    """
+    def __init__(self, resolver=None, port=53, timeout=5.0):
+        self.resolver = resolver
+        self.port = port
+        self.timeout = timeout
+        # Addresses of the authoritative nameservers, by zone and nameserver
+        self._nameservers = {}  # type: Dict[str, Dict[str, List[str]]]
+
+    def wait(self, records, max_seconds):
+        """Wait for TXT records to propagate.
+
+        :param list records: `(name, value)` tuples of the expected TXT
+            records
+        :param int max_seconds: Maximum time to wait, in seconds. It is
+            entirely waited if the propagation cannot be checked.
+
+        :returns: `True` if all the authoritative nameservers serve the
+            records, `False` otherwise
+        :rtype: bool
+
+        """
+        deadline = time.time() + max_seconds
+        values = {}  # type: Dict[str, Set[str]]
+        for name, value in records:
+            values.setdefault(name, set()).add(value)
+
+        if dns is None:
+            logger.warning("dnspython is required to check the propagation of "
+                           "DNS changes, waiting %d seconds instead", max_seconds)
+            time.sleep(max_seconds)
+            return False
+        try:
+            pending = [(name, addresses) for name in values
+                       for addresses in self._find_nameservers(name).values()]
+        except (dns.exception.DNSException, socket.error) as error:
+            logger.warning("Unable to find the authoritative nameservers to "
+                           "check the propagation of DNS changes, waiting %d "
+                           "seconds instead", max_seconds)
+            logger.debug("Error was: %s", error, exc_info=True)
+            time.sleep(max(deadline - time.time(), 0))
+            return False
+
+        delay = INITIAL_DELAY
+        while True:
+            pending = [(name, addresses) for name, addresses in pending
+                       if not any(self._serves(address, name, values[name])
+                                  for address in addresses)]
+            if not pending:
+                logger.debug("DNS changes are served by all the authoritative "
+                             "nameservers")
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.warning("DNS changes are not served by all the "
+                               "authoritative nameservers after %d seconds",
+                               max_seconds)
+                return False
+            logger.debug("Waiting for DNS changes to propagate to %d "
+                          "nameservers", len(pending))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_DELAY)
+
+    def _find_nameservers(self, name):
+        """Find the authoritative nameservers of a domain name.
+
+        :param str name: Domain name
+
+        :returns: addresses of the nameservers of the zone of `name`, by
+            nameserver name. The nameservers without an address are left
+            out, since they could never be queried.
+        :rtype: `dict` of `str` to `list` of `str`
+
+        :raises dns.exception.DNSException: if the nameservers or their
+            addresses cannot be found
+
+        """
+        if self.resolver is None:
+            self.resolver = dns.resolver.get_default_resolver()
+        zone = dns.resolver.zone_for_name(name, resolver=self.resolver)
+        if zone.to_text() not in self._nameservers:
+            nameservers = {}  # type: Dict[str, List[str]]
+            for rdata in self.resolver.query(zone, dns.rdatatype.NS):
+                addresses = []  # type: List[str]
+                for rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                    try:
+                        answer = self.resolver.query(rdata.target, rdtype)
+                    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                        continue
+                    addresses.extend(address.address for address in answer)
+                if addresses:
+                    nameservers[rdata.target.to_text()] = addresses
+                else:
+                    logger.debug("No address found for nameserver %s of %s, "
+                                 "ignoring it", rdata.target, zone)
+            if not nameservers:
+                raise dns.exception.DNSException(
+                    "No address found for the nameservers of {0}".format(zone))
+            logger.debug("Authoritative nameservers of %s: %s",
+                         zone.to_text(), nameservers)
+            self._nameservers[zone.to_text()] = nameservers
+        return self._nameservers[zone.to_text()]
+
+    def _serves(self, address, name, values):
+        """Does a nameserver serve the expected values of a TXT record?
+
+        :param str address: Address of the nameserver
+        :param str name: Name of the TXT record
+        :param set values: Expected values of the TXT record
+
+        :rtype: bool
+
+        """
+        query = dns.message.make_query(name, dns.rdatatype.TXT)
+        query.flags &= ~dns.flags.RD
+        try:
+            response = dns.query.udp(
+                query, address, timeout=self.timeout, port=self.port)
+        except (dns.exception.DNSException, socket.error) as error:
+            logger.debug("Unable to query %s for %s: %s", address, name, error)
+            return False
+        if response.rcode() != dns.rcode.NOERROR:
+            return False
+        served = set()  # type: Set[str]
+        for rrset in response.answer:
+            if rrset.rdtype == dns.rdatatype.TXT:
+                served.update(b"".join(rdata.strings).decode("ascii", "replace")
+                              for rdata in rrset)
+        return values.issubset(served)
@@ -0,0 +1,150 @@
+"""Tests for certbot.plugins.dns_propagation."""
+import socket
+import threading
+import unittest
+
+import mock
+
+from acme.magic_typing import List, Tuple  # pylint: disable=unused-import, no-name-in-module
+
+try:
+    import dns.message
+    import dns.rcode
+    import dns.rdatatype
+    import dns.resolver
+    import dns.rrset
+except ImportError:  # pragma: no cover
+    dns = None  # type: ignore
+
+NAME = "_acme-challenge.www.example.com"
+
+
+class StubDNSServer(object):
+    """Stub DNS server answering queries from a dict of records on localhost."""
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []  # type: List[Tuple[str, int]]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        while not self.stopped.is_set():
+            try:
+                wire, address = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            query = dns.message.from_wire(wire)
+            question = query.question[0]
+            self.queries.append((question.name.to_text(), question.rdtype))
+            response = dns.message.make_response(query)
+            key = (question.name.to_text(), question.rdtype)
+            if key in self.records:
+                response.answer.append(dns.rrset.from_text_list(
+                    question.name, 300, "IN", question.rdtype, self.records[key]))
+            elif not any(name == key[0] for name, _ in self.records):
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            self.sock.sendto(response.to_wire(), address)
+
+    def close(self):
+        """Stop the server."""
+        self.stopped.set()
+        self.thread.join()
+        self.sock.close()
+
+
+@unittest.skipIf(dns is None, "dnspython is not installed")
+class PropagationCheckerTest(unittest.TestCase):
+    """Tests for certbot.plugins.dns_propagation.PropagationChecker."""
+
+    def setUp(self):
+        self.server = StubDNSServer({
+            ("example.com.", dns.rdatatype.SOA): [
+                "ns1.example.com. admin.example.com. 1 3600 600 86400 300"],
+            ("example.com.", dns.rdatatype.NS): ["ns1.example.com."],
+            ("ns1.example.com.", dns.rdatatype.A): ["127.0.0.1"],
+            (NAME + ".", dns.rdatatype.TXT): ['"old"', '"value"'],
+        })
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.nameservers = ["127.0.0.1"]
+        resolver.port = self.server.port
+        resolver.lifetime = 5
+
+        from certbot.plugins.dns_propagation import PropagationChecker
+        self.checker = PropagationChecker(resolver, self.server.port, timeout=5)
+
+    def tearDown(self):
+        self.server.close()
+
+    @mock.patch("certbot.plugins.dns_propagation.time.sleep")
+    def test_propagated(self, mock_sleep):
+        self.assertTrue(self.checker.wait([(NAME, "value")], 60))
+        self.assertFalse(mock_sleep.called)
+        self.assertTrue((NAME + ".", dns.rdatatype.TXT) in self.server.queries)
+
+    @mock.patch("certbot.plugins.dns_propagation.time.sleep")
+    def test_propagated_later(self, mock_sleep):
+        def _propagate(unused_seconds):
+            self.server.records[(NAME + ".", dns.rdatatype.TXT)].append('"other"')
+        mock_sleep.side_effect = _propagate
+
+        self.assertTrue(self.checker.wait([(NAME, "value"), (NAME, "other")], 60))
+        mock_sleep.assert_called_once_with(1.0)
+        # The nameservers are only found once
+        self.assertEqual(self.server.queries.count(
+            ("example.com.", dns.rdatatype.NS)), 1)
+
+    @mock.patch("certbot.plugins.dns_propagation.time")
+    def test_not_propagated(self, mock_time):
+        mock_time.time.side_effect = [0, 10, 20, 40, 70]
+
+        self.assertFalse(self.checker.wait([(NAME, "other")], 60))
+        self.assertEqual(mock_time.sleep.call_args_list,
+                         [mock.call(1.0), mock.call(2.0), mock.call(4.0)])
+
+    @mock.patch("certbot.plugins.dns_propagation.time")
+    def test_no_zone(self, mock_time):
+        mock_time.time.side_effect = [0, 5]
+        self.assertFalse(self.checker.wait([("_acme-challenge.example.org", "value")], 60))
+        mock_time.sleep.assert_called_once_with(55)
+
+    @mock.patch("certbot.plugins.dns_propagation.time.sleep")
+    def test_nameserver_without_address(self, mock_sleep):
+        self.server.records[("example.com.", dns.rdatatype.NS)].append(
+            "ns2.example.com.")
+        self.assertTrue(self.checker.wait([(NAME, "value")], 60))
+        self.assertFalse(mock_sleep.called)
+
+    @mock.patch("certbot.plugins.dns_propagation.time")
+    def test_no_nameserver_address(self, mock_time):
+        mock_time.time.side_effect = [0, 5]
+        self.server.records[("example.com.", dns.rdatatype.NS)] = [
+            "ns2.example.com."]
+        self.assertFalse(self.checker.wait([(NAME, "value")], 60))
+        mock_time.sleep.assert_called_once_with(55)
+        self.assertFalse((NAME + ".", dns.rdatatype.TXT) in self.server.queries)
+
+    @mock.patch("certbot.plugins.dns_propagation.time")
+    def test_unreachable_nameserver(self, mock_time):
+        mock_time.time.side_effect = [0, 70]
+        self.checker.port = self.server.port + 1 if self.server.port < 65535 else 1
+        self.checker.timeout = 0.1
+
+        self.assertFalse(self.checker.wait([(NAME, "value")], 60))
+        self.assertFalse(mock_time.sleep.called)
+
+    @mock.patch("certbot.plugins.dns_propagation.time")
+    @mock.patch("certbot.plugins.dns_propagation.dns", None)
+    def test_no_dnspython(self, mock_time):
+        self.assertFalse(self.checker.wait([(NAME, "value")], 60))
+        mock_time.sleep.assert_called_once_with(60)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
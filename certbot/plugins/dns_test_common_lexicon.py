@@ -56,6 +56,22 @@ class BaseLexiconClientTest(object):
                                                             name=self.record_name,
                                                             content=self.record_content)
 
+    def test_add_txt_record_cached_zone(self):
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+
+        self.assertEqual(self.provider_mock.authenticate.call_count, 1)
+
+    def test_add_txt_record_cached_zone_not_found(self):
+        self.client.zone_cache = mock.MagicMock()
+        self.client.zone_cache.find_zone.side_effect = [DOMAIN, None]
+        self.provider_mock.authenticate.side_effect = self.DOMAIN_NOT_FOUND
+
+        self.assertRaises(errors.PluginError,
+                          self.client.add_txt_record,
+                          DOMAIN, self.record_name, self.record_content)
+        self.client.zone_cache.invalidate.assert_called_once_with(DOMAIN)
+
     def test_add_txt_record_fail_to_find_domain(self):
         self.provider_mock.authenticate.side_effect = [self.DOMAIN_NOT_FOUND,
                                                        self.DOMAIN_NOT_FOUND,
@@ -1,6 +1,8 @@
 """Functionality for autorenewal and associated juggling of configurations"""
 from __future__ import print_function
+import contextlib
 import copy
+import datetime
 import itertools
 import logging
 import os
@@ -13,6 +15,7 @@ import six
 import zope.component
 
 import OpenSSL
+import pytz
 
 from acme.magic_typing import List  # pylint: disable=unused-import, no-name-in-module
 
@@ -22,6 +25,7 @@ from certbot import errors
 from certbot import interfaces
 from certbot import util
 from certbot import hooks
+from certbot import lineage_storage
 from certbot import storage
 from certbot import updater
 
@@ -375,6 +379,52 @@ def _renew_describe_results(config, renew_successes, renew_failures,
     disp.notification("\n".join(out), wrap=False)
 
 
+@contextlib.contextmanager
+def _lock_if_due(config, lineage_config, lineagename, lineage):
+    """Lock a lineage in a with block if it is due for renewal.
+
+    Lineages that are not due are not locked, so that they don't keep
+    the renewal of other processes waiting.
+
+    :param configuration.NamespaceConfig config: configuration
+    :param configuration.NamespaceConfig lineage_config: configuration for
+        the lineage
+    :param str lineagename: name of the lineage
+    :param storage.RenewableCert lineage: the lineage
+
+    :returns: a context manager returning whether the lineage was locked
+
+    """
+    if not should_renew(lineage_config, lineage):
+        yield False
+        return
+    with util.lock_lineage(config, lineagename):
+        yield True
+
+
+def _lineages_not_due(config):
+    """Find the lineages that can be skipped without being loaded.
+
+    Lineages that are not due for renewal are only loaded to run the
+    updaters of their installer, so they can be skipped when the updaters
+    are disabled and the lineage storage has an index to find them.
+
+    :param configuration.NamespaceConfig config: configuration
+
+    :returns: names of the lineages not due for renewal
+    :rtype: `set` of `str`
+
+    """
+    store = lineage_storage.get_storage(config)
+    if (config.certname or config.renew_by_default or config.dry_run or
+            not config.disable_renew_updates or not store.indexed):
+        return set()
+    now = pytz.UTC.fromutc(datetime.datetime.utcnow())
+    # Lineages that cannot be read are loaded to report them
+    return (set(store.find_all()) - set(store.find_due(now)) -
+            set(store.find_unreadable()))
+
+
 def handle_renewal_request(config):  # pylint: disable=too-many-locals,too-many-branches,too-many-statements
     """Examine each lineage; renew if due and report results"""
 
@@ -399,6 +449,7 @@ def handle_renewal_request(config):  # pylint: disable=too-many-locals,too-many-
     renew_failures = []
     renew_skipped = []
     parse_failures = []
+    not_due = _lineages_not_due(config)
 
     # Noninteractive renewals include a random delay in order to spread
     # out the load on the certificate authority servers, even if many
@@ -407,66 +458,85 @@ def handle_renewal_request(config):  # pylint: disable=too-many-locals,too-many-
     # shutting down a web service) aren't prolonged unnecessarily.
     apply_random_sleep = not sys.stdin.isatty() and config.random_sleep_on_renew
 
-    for renewal_file in conf_files:
-        disp = zope.component.getUtility(interfaces.IDisplay)
-        disp.notification("Processing " + renewal_file, pause=False)
-        lineage_config = copy.deepcopy(config)
-        lineagename = storage.lineagename_for_filename(renewal_file)
-
-        # Note that this modifies config (to add back the configuration
-        # elements from within the renewal configuration file).
-        try:
-            renewal_candidate = _reconstitute(lineage_config, renewal_file)
-        except Exception as e:  # pylint: disable=broad-except
-            logger.warning("Renewal configuration file %s (cert: %s) "
-                           "produced an unexpected error: %s. Skipping.",
-                           renewal_file, lineagename, e)
-            logger.debug("Traceback was:\n%s", traceback.format_exc())
-            parse_failures.append(renewal_file)
-            continue
-
-        try:
-            if renewal_candidate is None:
+    # Directory flushes of the files written for each renewed lineage are
+    # grouped and done once all lineages have been processed.
+    with util.batch_fsyncs():
+        for renewal_file in conf_files:
+            lineagename = storage.lineagename_for_filename(renewal_file)
+            if lineagename in not_due:
+                renew_skipped.append(renewal_file)
+                continue
+            disp = zope.component.getUtility(interfaces.IDisplay)
+            disp.notification("Processing " + renewal_file, pause=False)
+            lineage_config = copy.deepcopy(config)
+
+            # Note that this modifies config (to add back the configuration
+            # elements from within the renewal configuration file).
+            try:
+                renewal_candidate = _reconstitute(lineage_config, renewal_file)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Renewal configuration file %s (cert: %s) "
+                               "produced an unexpected error: %s. Skipping.",
+                               renewal_file, lineagename, e)
+                logger.debug("Traceback was:\n%s", traceback.format_exc())
                 parse_failures.append(renewal_file)
-            else:
-                # XXX: ensure that each call here replaces the previous one
-                zope.component.provideUtility(lineage_config)
-                renewal_candidate.ensure_deployed()
-                from certbot import main
-                plugins = plugins_disco.PluginsRegistry.find_all()
-                if should_renew(lineage_config, renewal_candidate):
-                    # Apply random sleep upon first renewal if needed
-                    if apply_random_sleep:
-                        sleep_time = random.randint(1, 60 * 8)
-                        logger.info("Non-interactive renewal: random delay of %s seconds",
-                                    sleep_time)
-                        time.sleep(sleep_time)
-                        # We will sleep only once this day, folks.
-                        apply_random_sleep = False
-
-                    # domains have been restored into lineage_config by reconstitute
-                    # but they're unnecessary anyway because renew_cert here
-                    # will just grab them from the certificate
-                    # we already know it's time to renew based on should_renew
-                    # and we have a lineage in renewal_candidate
-                    main.renew_cert(lineage_config, plugins, renewal_candidate)
-                    renew_successes.append(renewal_candidate.fullchain)
-                else:
-                    expiry = crypto_util.notAfter(renewal_candidate.version(
-                        "cert", renewal_candidate.latest_common_version()))
-                    renew_skipped.append("%s expires on %s" % (renewal_candidate.fullchain,
-                                         expiry.strftime("%Y-%m-%d")))
-                # Run updater interface methods
-                updater.run_generic_updaters(lineage_config, renewal_candidate,
-                                             plugins)
-
-        except Exception as e:  # pylint: disable=broad-except
-            # obtain_cert (presumably) encountered an unanticipated problem.
-            logger.warning("Attempting to renew cert (%s) from %s produced an "
-                           "unexpected error: %s. Skipping.", lineagename,
-                               renewal_file, e)
-            logger.debug("Traceback was:\n%s", traceback.format_exc())
-            renew_failures.append(renewal_candidate.fullchain)
+                continue
+
+            try:
+                if renewal_candidate is None:
+                    parse_failures.append(renewal_file)
+                    continue
+                with _lock_if_due(config, lineage_config, lineagename,
+                                  renewal_candidate) as locked:
+                    if locked:
+                        # Read the renewal configuration again now that no
+                        # other process can renew the lineage
+                        lineage_config = copy.deepcopy(config)
+                        renewal_candidate = _reconstitute(lineage_config, renewal_file)
+                        if renewal_candidate is None:
+                            parse_failures.append(renewal_file)
+                            continue
+                    # XXX: ensure that each call here replaces the previous one
+                    zope.component.provideUtility(lineage_config)
+                    renewal_candidate.ensure_deployed()
+                    from certbot import main
+                    # A new registry is needed for plugins to be initialized
+                    # with lineage_config. This is cheap, as plugins discovery
+                    # is cached and plugins are only imported when used.
+                    plugins = plugins_disco.PluginsRegistry.find_all()
+                    if locked and should_renew(lineage_config, renewal_candidate):
+                        # Apply random sleep upon first renewal if needed
+                        if apply_random_sleep:
+                            sleep_time = random.randint(1, 60 * 8)
+                            logger.info("Non-interactive renewal: random delay of %s seconds",
+                                        sleep_time)
+                            time.sleep(sleep_time)
+                            # We will sleep only once this day, folks.
+                            apply_random_sleep = False
+
+                        # domains have been restored into lineage_config by reconstitute
+                        # but they're unnecessary anyway because renew_cert here
+                        # will just grab them from the certificate
+                        # we already know it's time to renew based on should_renew
+                        # and we have a lineage in renewal_candidate
+                        main.renew_cert(lineage_config, plugins, renewal_candidate)
+                        renew_successes.append(renewal_candidate.fullchain)
+                    else:
+                        expiry = crypto_util.notAfter(renewal_candidate.version(
+                            "cert", renewal_candidate.latest_common_version()))
+                        renew_skipped.append("%s expires on %s" % (renewal_candidate.fullchain,
+                                             expiry.strftime("%Y-%m-%d")))
+                    # Run updater interface methods
+                    updater.run_generic_updaters(lineage_config, renewal_candidate,
+                                                 plugins)
+
+            except Exception as e:  # pylint: disable=broad-except
+                # obtain_cert (presumably) encountered an unanticipated problem.
+                logger.warning("Attempting to renew cert (%s) from %s produced an "
+                               "unexpected error: %s. Skipping.", lineagename,
+                                   renewal_file, e)
+                logger.debug("Traceback was:\n%s", traceback.format_exc())
+                renew_failures.append(renewal_candidate.fullchain)
 
     # Describe all the results
     _renew_describe_results(config, renew_successes, renew_failures,
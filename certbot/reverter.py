@@ -1,15 +1,21 @@
 """Reverter class saves configuration checkpoints and allows for recovery."""
+import collections
 import csv
 import glob
+import hashlib
 import logging
 import os
 import shutil
+import stat
+import tempfile
 import time
 import traceback
 
 import six
 import zope.component
 
+from acme.magic_typing import Dict, List, Optional, Tuple  # pylint: disable=unused-import, no-name-in-module
+
 from certbot import compat
 from certbot import constants
 from certbot import errors
@@ -56,14 +62,27 @@ class Reverter(object):
     respectively. Both of these methods can be used to create either
     temporary or in progress changes.
 
+    The contents of the files saved in checkpoints are stored once in
+    :attr:`blobs_dir`, and hard linked in the checkpoints saving them.
+
+    The temporary checkpoint is kept in memory, and reverted from it. Its
+    directory only journals the saved files, created files and undo
+    commands, for :func:`~recovery_routine` to revert it after a crash.
+
     .. note:: Consider moving everything over to CSV format.
 
     :param config: Configuration.
     :type config: :class:`certbot.interfaces.IConfig`
 
+    :ivar str blobs_dir: Directory of the saved file contents, named after
+        their SHA-256 hash and mode
+
     """
     def __init__(self, config):
         self.config = config
+        self.blobs_dir = os.path.join(
+            config.work_dir, constants.BACKUP_BLOBS_DIR)
+        self._temp_checkpoint = None  # type: Optional[_TemporaryCheckpoint]
 
         util.make_or_verify_dir(
             config.backup_dir, constants.CONFIG_DIRS_MODE, compat.os_geteuid(),
@@ -78,7 +97,16 @@ class Reverter(object):
         :raises .ReverterError: when unable to revert config
 
         """
-        if os.path.isdir(self.config.temp_checkpoint_dir):
+        if self._temp_checkpoint is not None:
+            try:
+                self._recover_temp_checkpoint()
+            except errors.ReverterError:
+                logger.critical(
+                    "Incomplete or failed recovery for %s",
+                    self.config.temp_checkpoint_dir,
+                )
+                raise errors.ReverterError("Unable to revert temporary config")
+        elif os.path.isdir(self.config.temp_checkpoint_dir):
             try:
                 self._recover_checkpoint(self.config.temp_checkpoint_dir)
             except errors.ReverterError:
@@ -192,9 +220,126 @@ class Reverter(object):
         :param set save_files: set of filepaths to save
         :param str save_notes: notes about changes during the save
 
+        :raises .ReverterError: if unable to add checkpoint
+
         """
-        self._add_to_checkpoint_dir(
-            self.config.temp_checkpoint_dir, save_files, save_notes)
+        temp_checkpoint = self._get_temp_checkpoint()
+        if temp_checkpoint is None:
+            self._add_to_checkpoint_dir(
+                self.config.temp_checkpoint_dir, save_files, save_notes)
+            return
+
+        cp_dir = self.config.temp_checkpoint_dir
+        with open(os.path.join(cp_dir, "FILEPATHS"), "a") as op_fd:
+            for filename in save_files:
+                # The oldest content is already saved
+                if filename in temp_checkpoint.saves:
+                    continue
+                logger.debug("Creating temporary backup of %s", filename)
+                backup_path = os.path.join(cp_dir, "{0}_{1}".format(
+                    os.path.basename(filename), len(temp_checkpoint.saves)))
+                try:
+                    with open(filename, "rb") as file_fd:
+                        content = file_fd.read()
+                    mode = stat.S_IMODE(os.stat(filename).st_mode)
+                    self._journal_content(content, mode, backup_path)
+                    op_fd.write(filename + os.linesep)
+                    op_fd.flush()
+                except (IOError, OSError):
+                    logger.error(
+                        "Unable to add file %s to checkpoint %s",
+                        filename, cp_dir)
+                    raise errors.ReverterError(
+                        "Unable to add file {0} to checkpoint "
+                        "{1}".format(filename, cp_dir))
+                temp_checkpoint.saves[filename] = (content, mode)
+        temp_checkpoint.notes.append(save_notes)
+
+    def _get_temp_checkpoint(self):
+        """Get the in-memory temporary checkpoint.
+
+        A new one is started if there is no temporary checkpoint. A
+        temporary checkpoint left on disk by another reverter, e.g. after
+        a crash, is kept on disk.
+
+        :returns: the in-memory temporary checkpoint, or `None` if the
+            temporary checkpoint is only on disk
+        :rtype: _TemporaryCheckpoint
+
+        """
+        if (self._temp_checkpoint is None and
+                not os.path.isdir(self.config.temp_checkpoint_dir)):
+            util.make_or_verify_dir(
+                self.config.temp_checkpoint_dir, constants.CONFIG_DIRS_MODE,
+                compat.os_geteuid(), self.config.strict_permissions)
+            self._temp_checkpoint = _TemporaryCheckpoint()
+        return self._temp_checkpoint
+
+    def _journal_content(self, content, mode, backup_path):
+        """Save the content of a file in the temporary checkpoint journal.
+
+        :param bytes content: Content of the file
+        :param int mode: Permission bits of the file
+        :param str backup_path: Path of the copy in the journal
+
+        :raises IOError: if the content cannot be saved
+
+        """
+        blob = os.path.join(self.blobs_dir, "{0}_{1:o}".format(
+            hashlib.sha256(content).hexdigest(), mode))
+        if not os.path.exists(blob):
+            util.make_or_verify_dir(
+                self.blobs_dir, constants.CONFIG_DIRS_MODE, compat.os_geteuid(),
+                self.config.strict_permissions)
+            with open(blob + ".new", "wb") as blob_fd:
+                blob_fd.write(content)
+            os.chmod(blob + ".new", mode)
+            compat.os_rename(blob + ".new", blob)
+        try:
+            os.link(blob, backup_path)
+        except (AttributeError, OSError):
+            logger.debug("Unable to link %s to %s, copying it",
+                         blob, backup_path, exc_info=True)
+            shutil.copy2(blob, backup_path)
+
+    def _recover_temp_checkpoint(self):
+        """Recover the in-memory temporary checkpoint.
+
+        :raises errors.ReverterError: If unable to recover the checkpoint
+
+        """
+        temp_checkpoint = self._temp_checkpoint
+        assert temp_checkpoint is not None
+        for command in reversed(temp_checkpoint.commands):
+            try:
+                util.run_script(command)
+            except errors.SubprocessError:
+                logger.error(
+                    "Unable to run undo command: %s", " ".join(command))
+        try:
+            for path, (content, mode) in six.iteritems(temp_checkpoint.saves):
+                with open(path, "wb") as file_fd:
+                    file_fd.write(content)
+                os.chmod(path, mode)
+        except (IOError, OSError):
+            logger.error("Unable to recover files from the temporary checkpoint")
+            raise errors.ReverterError(
+                "Unable to recover files from the temporary checkpoint")
+        self._remove_files(temp_checkpoint.new_files,
+                           "the temporary checkpoint")
+
+        # The journal is only removed once the checkpoint is reverted, so
+        # that a failure can still be recovered from it
+        self._temp_checkpoint = None
+        try:
+            shutil.rmtree(self.config.temp_checkpoint_dir)
+        except OSError:
+            logger.error("Unable to remove directory: %s",
+                         self.config.temp_checkpoint_dir)
+            raise errors.ReverterError(
+                "Unable to remove directory: %s" %
+                self.config.temp_checkpoint_dir)
+        self._remove_unused_blobs()
 
     def add_to_checkpoint(self, save_files, save_notes):
         """Add files to a permanent checkpoint.
@@ -236,11 +381,11 @@ class Reverter(object):
                 # have the same filename
                 logger.debug("Creating backup of %s", filename)
                 try:
-                    shutil.copy2(filename, os.path.join(
+                    self._backup_file(filename, os.path.join(
                         cp_dir, os.path.basename(filename) + "_" + str(idx)))
                     op_fd.write(filename + os.linesep)
                 # http://stackoverflow.com/questions/4726260/effective-use-of-python-shutil-copy2
-                except IOError:
+                except (IOError, OSError):
                     op_fd.close()
                     logger.error(
                         "Unable to add file %s to checkpoint %s",
@@ -254,6 +399,150 @@ class Reverter(object):
         with open(os.path.join(cp_dir, "CHANGES_SINCE"), "a") as notes_fd:
             notes_fd.write(save_notes)
 
+    def _backup_file(self, filename, backup_path):
+        """Save the content of a file in a checkpoint.
+
+        The content is linked from :attr:`blobs_dir`, where it is only
+        written if no checkpoint saved it yet. It is copied if it cannot be
+        linked.
+
+        :param str filename: Path of the file to save
+        :param str backup_path: Path of the copy in the checkpoint
+
+        :raises IOError: if the file cannot be saved
+
+        """
+        blob = self._store_blob(filename)
+        try:
+            os.link(blob, backup_path)
+        except (AttributeError, OSError):
+            # os.link is not available on Windows with Python 2
+            logger.debug("Unable to link %s to %s, copying it",
+                         blob, backup_path, exc_info=True)
+            shutil.copy2(filename, backup_path)
+
+    def _store_blob(self, filename):
+        """Store the content of a file in :attr:`blobs_dir`.
+
+        :param str filename: Path of the file
+
+        :returns: path of the stored content
+        :rtype: str
+
+        :raises IOError: if the file cannot be stored
+
+        """
+        digest = hashlib.sha256()
+        with open(filename, "rb") as file_fd:
+            for chunk in iter(lambda: file_fd.read(65536), b""):
+                digest.update(chunk)
+        # Blobs are shared by links, the mode is part of the saved content
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+        blob = os.path.join(
+            self.blobs_dir, "{0}_{1:o}".format(digest.hexdigest(), mode))
+        if not os.path.exists(blob):
+            util.make_or_verify_dir(
+                self.blobs_dir, constants.CONFIG_DIRS_MODE, compat.os_geteuid(),
+                self.config.strict_permissions)
+            shutil.copy2(filename, blob + ".new")
+            compat.os_rename(blob + ".new", blob)
+        return blob
+
+    def _remove_unused_blobs(self):
+        """Remove the stored contents no checkpoint links to anymore."""
+        if not os.path.isdir(self.blobs_dir):
+            return
+        for name in os.listdir(self.blobs_dir):
+            blob = os.path.join(self.blobs_dir, name)
+            try:
+                if os.stat(blob).st_nlink <= 1:
+                    os.remove(blob)
+            except OSError:
+                logger.debug("Unable to remove %s", blob, exc_info=True)
+
+    def compact_checkpoints(self, keep):
+        """Compact the oldest finalized checkpoints into one.
+
+        The newest `keep` checkpoints are left as they are, and the older
+        ones are merged into a single checkpoint, which reverts the
+        configuration to its state before the oldest of them.
+
+        :param int keep: Number of checkpoints to keep as they are
+
+        :raises .ReverterError: if the checkpoints cannot be compacted
+
+        """
+        backups = os.listdir(self.config.backup_dir)
+        backups.sort()
+        old = backups[:-keep] if keep > 0 else []
+        if len(old) < 2:
+            return
+        logger.debug("Compacting %d checkpoints into %s", len(old), old[-1])
+
+        trash_dir = tempfile.mkdtemp(dir=self.config.work_dir)
+        merged_dir = os.path.join(trash_dir, "merged")
+        replaced_dir = os.path.join(trash_dir, old[-1])
+        newest_dir = os.path.join(self.config.backup_dir, old[-1])
+        try:
+            self._merge_checkpoints(
+                [os.path.join(self.config.backup_dir, name) for name in old],
+                merged_dir)
+            # The merged checkpoint replaces the newest of the old ones
+            compat.os_rename(newest_dir, replaced_dir)
+            try:
+                compat.os_rename(merged_dir, newest_dir)
+            except OSError:
+                compat.os_rename(replaced_dir, newest_dir)
+                raise
+        except (IOError, OSError):
+            shutil.rmtree(trash_dir, ignore_errors=True)
+            logger.error("Unable to compact checkpoints in %s",
+                         self.config.backup_dir)
+            logger.debug("Exception was:\n%s", traceback.format_exc())
+            raise errors.ReverterError("Unable to compact checkpoints")
+
+        shutil.rmtree(trash_dir, ignore_errors=True)
+        # The merged checkpoints are removed from the newest, so that the
+        # ones left by a failure are the oldest, and rolling them back
+        # after the merged checkpoint still restores the oldest contents
+        for name in reversed(old[:-1]):
+            try:
+                shutil.rmtree(os.path.join(self.config.backup_dir, name))
+            except OSError:
+                logger.warning("Unable to remove compacted checkpoint %s",
+                               os.path.join(self.config.backup_dir, name))
+                break
+        self._remove_unused_blobs()
+
+    def _merge_checkpoints(self, cp_dirs, merged_dir):  # pylint: disable=no-self-use
+        """Merge checkpoints into a new checkpoint directory.
+
+        For each file, the merged checkpoint keeps the oldest change: the
+        oldest saved content, or its creation.
+
+        :param list cp_dirs: Checkpoint directories, from the oldest
+        :param str merged_dir: Directory of the merged checkpoint
+
+        :raises IOError: if the checkpoints cannot be read or merged
+
+        """
+        os.mkdir(merged_dir)
+        _merge_file_changes(cp_dirs, merged_dir)
+        commands = []  # type: List[List[str]]
+        notes = []  # type: List[str]
+        for cp_dir in cp_dirs:
+            if os.path.isfile(os.path.join(cp_dir, "COMMANDS")):
+                with open(os.path.join(cp_dir, "COMMANDS"), "r") as csvfile:
+                    commands.extend(csv.reader(csvfile))
+            with open(os.path.join(cp_dir, "CHANGES_SINCE")) as changes_fd:
+                notes.append(changes_fd.read())
+
+        if commands:
+            with open(os.path.join(merged_dir, "COMMANDS"), "w") as command_file:
+                csv.writer(command_file).writerows(commands)
+        with open(os.path.join(merged_dir, "CHANGES_SINCE"), "w") as notes_fd:
+            notes_fd.write("\n".join(note.rstrip("\n") for note in reversed(notes)))
+
     def _read_and_append(self, filepath):  # pylint: disable=no-self-use
         """Reads the file lines and returns a file obj.
 
@@ -308,6 +597,7 @@ class Reverter(object):
             logger.error("Unable to remove directory: %s", cp_dir)
             raise errors.ReverterError(
                 "Unable to remove directory: %s" % cp_dir)
+        self._remove_unused_blobs()
 
     def _run_undo_commands(self, filepath):  # pylint: disable=no-self-use
         """Run all commands in a file."""
@@ -331,19 +621,18 @@ class Reverter(object):
             when save is attempting to overwrite a temporary file.
 
         """
-        protected_files = []
+        protected_files = []  # type: List[str]
 
-        # Get temp modified files
-        temp_path = os.path.join(self.config.temp_checkpoint_dir, "FILEPATHS")
-        if os.path.isfile(temp_path):
-            with open(temp_path, "r") as protected_fd:
-                protected_files.extend(protected_fd.read().splitlines())
-
-        # Get temp new files
-        new_path = os.path.join(self.config.temp_checkpoint_dir, "NEW_FILES")
-        if os.path.isfile(new_path):
-            with open(new_path, "r") as protected_fd:
-                protected_files.extend(protected_fd.read().splitlines())
+        if self._temp_checkpoint is not None:
+            protected_files.extend(self._temp_checkpoint.saves)
+            protected_files.extend(self._temp_checkpoint.new_files)
+        else:
+            # Get temp modified files
+            protected_files.extend(_read_lines(
+                os.path.join(self.config.temp_checkpoint_dir, "FILEPATHS")))
+            # Get temp new files
+            protected_files.extend(_read_lines(
+                os.path.join(self.config.temp_checkpoint_dir, "NEW_FILES")))
 
         # Verify no save_file is in protected_files
         for filename in protected_files:
@@ -373,6 +662,7 @@ class Reverter(object):
         if not files:
             raise errors.ReverterError("Forgot to provide files to registration call")
 
+        temp_checkpoint = self._get_temp_checkpoint() if temporary else None
         cp_dir = self._get_cp_dir(temporary)
 
         # Append all new files (that aren't already registered)
@@ -383,6 +673,9 @@ class Reverter(object):
             for path in files:
                 if path not in ex_files:
                     new_fd.write("{0}{1}".format(path, os.linesep))
+                    ex_files.append(path)
+                    if temp_checkpoint is not None:
+                        temp_checkpoint.new_files.append(path)
         except (IOError, OSError):
             logger.error("Unable to register file creation(s) - %s", files)
             raise errors.ReverterError(
@@ -407,6 +700,7 @@ class Reverter(object):
         :type command: list of str
 
         """
+        temp_checkpoint = self._get_temp_checkpoint() if temporary else None
         commands_fp = os.path.join(self._get_cp_dir(temporary), "COMMANDS")
         command_file = None
         try:
@@ -417,6 +711,8 @@ class Reverter(object):
 
             csvwriter = csv.writer(command_file)
             csvwriter.writerow(command)
+            if temp_checkpoint is not None:
+                temp_checkpoint.commands.append(list(command))
 
         except (IOError, OSError):
             logger.error("Unable to register undo command")
@@ -467,7 +763,7 @@ class Reverter(object):
                     "Incomplete or failed recovery for IN_PROGRESS checkpoint "
                     "- %s" % self.config.in_progress_dir)
 
-    def _remove_contained_files(self, file_list):  # pylint: disable=no-self-use
+    def _remove_contained_files(self, file_list):
         """Erase all files contained within file_list.
 
         :param str file_list: file containing list of file paths to be deleted
@@ -486,25 +782,44 @@ class Reverter(object):
         try:
             with open(file_list, "r") as list_fd:
                 filepaths = list_fd.read().splitlines()
-                for path in filepaths:
-                    # Files are registered before they are added... so
-                    # check to see if file exists first
-                    if os.path.lexists(path):
-                        os.remove(path)
-                    else:
-                        logger.warning(
-                            "File: %s - Could not be found to be deleted %s - "
-                            "Certbot probably shut down unexpectedly",
-                            os.linesep, path)
         except (IOError, OSError):
             logger.critical(
                 "Unable to remove filepaths contained within %s", file_list)
             raise errors.ReverterError(
                 "Unable to remove filepaths contained within "
                 "{0}".format(file_list))
+        self._remove_files(filepaths, file_list)
 
         return True
 
+    def _remove_files(self, filepaths, source):  # pylint: disable=no-self-use
+        """Erase the files created since a checkpoint.
+
+        :param list filepaths: file paths to be deleted
+        :param str source: where the file paths come from, for the errors
+
+        :raises certbot.errors.ReverterError: If
+            all files cannot be removed
+
+        """
+        try:
+            for path in filepaths:
+                # Files are registered before they are added... so
+                # check to see if file exists first
+                if os.path.lexists(path):
+                    os.remove(path)
+                else:
+                    logger.warning(
+                        "File: %s - Could not be found to be deleted %s - "
+                        "Certbot probably shut down unexpectedly",
+                        os.linesep, path)
+        except (IOError, OSError):
+            logger.critical(
+                "Unable to remove filepaths contained within %s", source)
+            raise errors.ReverterError(
+                "Unable to remove filepaths contained within "
+                "{0}".format(source))
+
     def finalize_checkpoint(self, title):
         """Finalize the checkpoint.
 
@@ -587,3 +902,73 @@ class Reverter(object):
             self.config.in_progress_dir, final_dir)
         raise errors.ReverterError(
             "Unable to finalize checkpoint renaming")
+
+
+class _TemporaryCheckpoint(object):
+    """In-memory temporary checkpoint.
+
+    :ivar collections.OrderedDict saves: Saved content and permission bits,
+        by file path
+    :ivar list new_files: Paths of the files created since the checkpoint
+    :ivar list commands: Commands undoing the changes, in order
+    :ivar list notes: Notes about the changes
+
+    """
+    def __init__(self):
+        self.saves = collections.OrderedDict()  # type: Dict[str, Tuple[bytes, int]]
+        self.new_files = []  # type: List[str]
+        self.commands = []  # type: List[List[str]]
+        self.notes = []  # type: List[str]
+
+
+def _merge_file_changes(cp_dirs, merged_dir):
+    """Merge the FILEPATHS and NEW_FILES of checkpoints.
+
+    The oldest change of each file is kept: its oldest saved content, which
+    is linked into the merged checkpoint, or its creation.
+
+    :param list cp_dirs: Checkpoint directories, from the oldest
+    :param str merged_dir: Directory of the merged checkpoint
+
+    :raises IOError: if the checkpoints cannot be read or merged
+
+    """
+    sources = {}  # type: Dict[str, str]
+    filepaths = []  # type: List[str]
+    new_files = []  # type: List[str]
+    for cp_dir in cp_dirs:
+        for idx, path in enumerate(_read_lines(os.path.join(cp_dir, "FILEPATHS"))):
+            if path not in sources and path not in new_files:
+                sources[path] = os.path.join(
+                    cp_dir, os.path.basename(path) + "_" + str(idx))
+                filepaths.append(path)
+        for path in _read_lines(os.path.join(cp_dir, "NEW_FILES")):
+            if path not in sources and path not in new_files:
+                new_files.append(path)
+
+    for idx, path in enumerate(filepaths):
+        backup_path = os.path.join(
+            merged_dir, os.path.basename(path) + "_" + str(idx))
+        try:
+            os.link(sources[path], backup_path)
+        except (AttributeError, OSError):
+            shutil.copy2(sources[path], backup_path)
+    with open(os.path.join(merged_dir, "FILEPATHS"), "w") as paths_fd:
+        paths_fd.writelines(path + os.linesep for path in filepaths)
+    if new_files:
+        with open(os.path.join(merged_dir, "NEW_FILES"), "w") as new_fd:
+            new_fd.writelines(path + os.linesep for path in new_files)
+
+
+def _read_lines(filepath):
+    """Lines of a checkpoint file, or no lines if it does not exist.
+
+    :param str filepath: Path of the file
+
+    :rtype: `list` of `str`
+
+    """
+    if not os.path.isfile(filepath):
+        return []
+    with open(filepath, "r") as file_fd:
+        return file_fd.read().splitlines()
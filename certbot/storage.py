@@ -1,6 +1,5 @@
 """Renewable certificates storage."""
 import datetime
-import glob
 import logging
 import os
 import re
@@ -11,6 +10,9 @@ import parsedatetime
 import pytz
 import shutil
 import six
+import tempfile
+
+from acme.magic_typing import List  # pylint: disable=unused-import, no-name-in-module
 
 import certbot
 from certbot import cli
@@ -19,6 +21,7 @@ from certbot import constants
 from certbot import crypto_util
 from certbot import errors
 from certbot import error_handler
+from certbot import lineage_storage
 from certbot import util
 
 from certbot.plugins import common as plugins_common
@@ -32,28 +35,58 @@ CURRENT_VERSION = util.get_strict_version(certbot.__version__)
 BASE_PRIVKEY_MODE = 0o600
 
 
-def renewal_conf_files(config):
+def renewal_conf_files(config, domains=None):
     """Build a list of all renewal configuration files.
 
+    With the sqlite lineage storage, these paths only identify lineages
+    and don't exist on disk.
+
     :param certbot.interfaces.IConfig config: Configuration object
+    :param list domains: if given and the lineage storage is indexed, only
+        return the lineages whose newest certificate contains all of these
+        domains, or cannot be read. Callers still have to check the
+        domains of the lineages.
 
     :returns: list of renewal configuration files
     :rtype: `list` of `str`
 
     """
-    result = glob.glob(os.path.join(config.renewal_configs_dir, "*.conf"))
-    result.sort()
-    return result
+    store = lineage_storage.get_storage(config)
+    if domains and store.indexed:
+        found = set(store.find_by_domain(domains[0]))
+        for domain in domains[1:]:
+            found.intersection_update(store.find_by_domain(domain))
+        found.update(store.find_unreadable())
+        names = sorted(found)
+    else:
+        names = store.find_all()
+    return [renewal_filename_for_lineagename(config, name) for name in names]
 
 def renewal_file_for_certname(config, certname):
     """Return /path/to/certname.conf in the renewal conf directory"""
-    path = os.path.join(config.renewal_configs_dir, "{0}.conf".format(certname))
-    if not os.path.exists(path):
+    path = renewal_filename_for_lineagename(config, certname)
+    if not lineage_storage.get_storage(config).exists(certname):
         raise errors.CertStorageError("No certificate found with name {0} (expected "
             "{1}).".format(certname, path))
     return path
 
 
+def renewal_config_for_certname(config, certname):
+    """Return the renewal configuration of the lineage named certname.
+
+    :param certbot.interfaces.IConfig config: Configuration object
+    :param str certname: cert name.
+
+    :rtype: configobj.ConfigObj
+
+    :raises .CertStorageError: if there is no such lineage or its
+        configuration is broken
+
+    """
+    renewal_file_for_certname(config, certname)
+    return lineage_storage.get_storage(config).load(certname)
+
+
 def cert_path_for_cert_name(config, cert_name):
     """ If `--cert-name` was specified, but you need a value for `--cert-path`.
 
@@ -61,8 +94,7 @@ def cert_path_for_cert_name(config, cert_name):
     :param str cert_name: cert name.
 
     """
-    cert_name_implied_conf = renewal_file_for_certname(config, cert_name)
-    fullchain_path = configobj.ConfigObj(cert_name_implied_conf)["fullchain"]
+    fullchain_path = renewal_config_for_certname(config, cert_name)["fullchain"]
     with open(fullchain_path) as f:
         cert_path = (fullchain_path, f.read())
     return cert_path
@@ -99,20 +131,18 @@ def add_time_interval(base_time, interval, textparser=parsedatetime.Calendar()):
     return textparser.parseDT(interval, base_time, tzinfo=tzinfo)[0]
 
 
-def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_data):
-    """Writes a renewal config file with the specified name and values.
+def _update_renewal_config(config, archive_dir, target, relevant_data):
+    """Updates a renewal configuration with the specified values.
 
-    :param str o_filename: Absolute path to the previous version of config file
-    :param str n_filename: Absolute path to the new destination of config file
+    :param configobj.ConfigObj config: Renewal configuration to update
     :param str archive_dir: Absolute path to the archive directory
     :param dict target: Maps ALL_FOUR to their symlink paths
     :param dict relevant_data: Renewal configuration options to save
 
-    :returns: Configuration object for the new config file
+    :returns: The updated configuration object
     :rtype: configobj.ConfigObj
 
     """
-    config = configobj.ConfigObj(o_filename)
     config["version"] = certbot.__version__
     config["archive_dir"] = archive_dir
     for kind in ALL_FOUR:
@@ -134,20 +164,6 @@ def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_d
         default_interval = constants.RENEWER_DEFAULTS["renew_before_expiry"]
         config.initial_comment = ["renew_before_expiry = " + default_interval]
 
-    # TODO: add human-readable comments explaining other available
-    #       parameters
-    logger.debug("Writing new config %s.", n_filename)
-
-    # Ensure that the file exists
-    open(n_filename, 'a').close()
-
-    # Copy permissions from the old version of the file, if it exists.
-    if os.path.exists(o_filename):
-        current_permissions = stat.S_IMODE(os.lstat(o_filename).st_mode)
-        os.chmod(n_filename, current_permissions)
-
-    with open(n_filename, "wb") as f:
-        config.write(outfile=f)
     return config
 
 
@@ -157,14 +173,13 @@ def rename_renewal_config(prev_name, new_name, cli_config):
     :param .NamespaceConfig cli_config: parsed command line
         arguments
     """
-    prev_filename = renewal_filename_for_lineagename(cli_config, prev_name)
-    new_filename = renewal_filename_for_lineagename(cli_config, new_name)
-    if os.path.exists(new_filename):
+    store = lineage_storage.get_storage(cli_config)
+    if store.exists(new_name):
         raise errors.ConfigurationError("The new certificate name "
             "is already in use.")
     try:
-        os.rename(prev_filename, new_filename)
-    except OSError:
+        store.rename(prev_name, new_name)
+    except errors.CertStorageError:
         raise errors.ConfigurationError("Please specify a valid filename "
             "for the new certificate name.")
 
@@ -182,19 +197,14 @@ def update_configuration(lineagename, archive_dir, target, cli_config):
     :rtype: configobj.ConfigObj
 
     """
-    config_filename = renewal_filename_for_lineagename(cli_config, lineagename)
-    temp_filename = config_filename + ".new"
-
-    # If an existing tempfile exists, delete it
-    if os.path.exists(temp_filename):
-        os.unlink(temp_filename)
+    store = lineage_storage.get_storage(cli_config)
 
     # Save only the config items that are relevant to renewal
     values = relevant_values(vars(cli_config.namespace))
-    write_renewal_config(config_filename, temp_filename, archive_dir, target, values)
-    compat.os_rename(temp_filename, config_filename)
+    config = _update_renewal_config(store.load(lineagename), archive_dir, target, values)
+    store.save(lineagename, config)
 
-    return configobj.ConfigObj(config_filename)
+    return store.load(lineagename)
 
 
 def get_link_target(link):
@@ -286,6 +296,53 @@ def renewal_filename_for_lineagename(config, lineagename):
     """
     return os.path.join(config.renewal_configs_dir, lineagename) + ".conf"
 
+class _ArchiveStage(object):
+    """New archive files staged in a temporary directory.
+
+    The files are written and flushed to disk inside a staging directory
+    within the archive directory, then all renamed into place at once, so
+    a crash never leaves a partially written version in the archive.
+
+    :ivar str archive_dir: the archive directory receiving the files
+    :ivar str staging_dir: the temporary directory holding the files
+
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.staging_dir = tempfile.mkdtemp(dir=archive_dir, prefix=".staging-")
+        self._names = []  # type: List[str]
+
+    def path(self, name):
+        """Path of the staged file name"""
+        return os.path.join(self.staging_dir, name)
+
+    def write(self, name, data, chmod=0o666):
+        """Stage a file named name containing data"""
+        with util.safe_open(self.path(name), "wb", chmod=chmod) as f:
+            f.write(data)
+            util.fsync_file(f)
+        self._names.append(name)
+
+    def symlink(self, name, target):
+        """Stage a symlink named name pointing at target"""
+        os.symlink(target, self.path(name))
+        self._names.append(name)
+
+    def commit(self):
+        """Move all staged files into the archive directory"""
+        for name in self._names:
+            compat.os_rename(self.path(name), os.path.join(self.archive_dir, name))
+        os.rmdir(self.staging_dir)
+        # The live links may be switched to the new files right after, so
+        # the files must be in the archive on disk first, even when the
+        # other flushes are batched
+        util.fsync_dir(self.archive_dir, force=True)
+
+    def abort(self):
+        """Discard all staged files"""
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
 def _relpath_from_file(archive_dir, from_file):
     """Path to a directory from a file"""
     return os.path.relpath(archive_dir, os.path.dirname(from_file))
@@ -315,11 +372,12 @@ def delete_files(config, certname):
     """
     renewal_filename = renewal_file_for_certname(config, certname)
     # file exists
+    store = lineage_storage.get_storage(config)
     full_default_archive_dir = full_archive_path(None, config, certname)
     full_default_live_dir = _full_live_path(config, certname)
     try:
-        renewal_config = configobj.ConfigObj(renewal_filename)
-    except configobj.ConfigObjError:
+        renewal_config = store.load(certname)
+    except errors.CertStorageError:
         # config is corrupted
         logger.warning("Could not parse %s. You may wish to manually "
             "delete the contents of %s and %s.", renewal_filename,
@@ -329,8 +387,7 @@ def delete_files(config, certname):
     finally:
         # we couldn't read it, but let's at least delete it
         # if this was going to fail, it already would have.
-        os.remove(renewal_filename)
-        logger.debug("Removed %s", renewal_filename)
+        store.delete(certname)
 
     # cert files and (hopefully) live directory
     # it's not guaranteed that the files are in our default storage
@@ -428,11 +485,8 @@ class RenewableCert(object):
         # may have been chosen based on default values from the
         # systemwide renewal configuration; self.configfile should be
         # used to make and save changes.
-        try:
-            self.configfile = configobj.ConfigObj(config_filename)
-        except configobj.ConfigObjError:
-            raise errors.CertStorageError(
-                "error parsing {0}".format(config_filename))
+        self.configfile = lineage_storage.get_storage(cli_config).load(
+            self.lineagename)
         # TODO: Do we actually use anything from defaults and do we want to
         #       read further defaults from the systemwide renewal configuration
         #       file at this stage?
@@ -833,14 +887,9 @@ class RenewableCert(object):
         filename = "{0}{1}.pem".format(kind, version)
         # Relative rather than absolute target directory
         target_directory = os.path.dirname(os.readlink(link))
-        # TODO: it could be safer to make the link first under a temporary
-        #       filename, then unlink the old link, then rename the new link
-        #       to the old link; this ensures that this process is able to
-        #       create symlinks.
         # TODO: we might also want to check consistency of related links
         #       for the other corresponding items
-        os.unlink(link)
-        os.symlink(os.path.join(target_directory, filename), link)
+        util.atomic_symlink(os.path.join(target_directory, filename), link)
 
     def update_all_links_to(self, version):
         """Change all member objects to point to the specified version.
@@ -858,6 +907,8 @@ class RenewableCert(object):
 
             for _, link in previous_links:
                 os.unlink(link)
+            for link_dir in set(os.path.dirname(getattr(self, kind)) for kind in ALL_FOUR):
+                util.fsync_dir(link_dir)
 
     def names(self, version=None):
         """What are the subject names of this certificate?
@@ -986,24 +1037,22 @@ class RenewableCert(object):
             if not os.path.exists(i):
                 os.makedirs(i, 0o700)
                 logger.debug("Creating directory %s.", i)
-        config_file, config_filename = util.unique_lineage_name(
-            cli_config.renewal_configs_dir, lineagename)
+        store = lineage_storage.get_storage(cli_config)
+        lineagename = store.reserve(lineagename)
+        util.lock_lineage_until_exit(cli_config, lineagename)
         base_readme_path = os.path.join(cli_config.live_dir, README)
         if not os.path.exists(base_readme_path):
             _write_live_readme_to(base_readme_path, is_base_dir=True)
 
         # Determine where on disk everything will go
         # lineagename will now potentially be modified based on which
-        # renewal configuration file could actually be created
-        lineagename = lineagename_for_filename(config_filename)
+        # renewal configuration could actually be reserved
         archive = full_archive_path(None, cli_config, lineagename)
         live_dir = _full_live_path(cli_config, lineagename)
         if os.path.exists(archive):
-            config_file.close()
             raise errors.CertStorageError(
                 "archive directory exists for " + lineagename)
         if os.path.exists(live_dir):
-            config_file.close()
             raise errors.CertStorageError(
                 "live directory exists for " + lineagename)
         os.mkdir(archive)
@@ -1016,37 +1065,31 @@ class RenewableCert(object):
                        for kind in ALL_FOUR])
         archive_target = dict([(kind, os.path.join(archive, kind + "1.pem"))
                                for kind in ALL_FOUR])
-        for kind in ALL_FOUR:
-            os.symlink(_relpath_from_file(archive_target[kind], target[kind]), target[kind])
-        with open(target["cert"], "wb") as f:
-            logger.debug("Writing certificate to %s.", target["cert"])
-            f.write(cert)
-        with util.safe_open(archive_target["privkey"], "wb", chmod=BASE_PRIVKEY_MODE) as f:
-            logger.debug("Writing private key to %s.", target["privkey"])
-            f.write(privkey)
-            # XXX: Let's make sure to get the file permissions right here
-        with open(target["chain"], "wb") as f:
-            logger.debug("Writing chain to %s.", target["chain"])
-            f.write(chain)
-        with open(target["fullchain"], "wb") as f:
+        stage = _ArchiveStage(archive)
+        with error_handler.ErrorHandler(stage.abort):
+            logger.debug("Writing certificate to %s.", archive_target["cert"])
+            stage.write("cert1.pem", cert)
+            logger.debug("Writing private key to %s.", archive_target["privkey"])
+            stage.write("privkey1.pem", privkey, chmod=BASE_PRIVKEY_MODE)
+            logger.debug("Writing chain to %s.", archive_target["chain"])
+            stage.write("chain1.pem", chain)
             # assumes that OpenSSL.crypto.dump_certificate includes
             # ending newline character
-            logger.debug("Writing full chain to %s.", target["fullchain"])
-            f.write(cert + chain)
+            logger.debug("Writing full chain to %s.", archive_target["fullchain"])
+            stage.write("fullchain1.pem", cert + chain)
+            stage.commit()
+        for kind in ALL_FOUR:
+            os.symlink(_relpath_from_file(archive_target[kind], target[kind]), target[kind])
 
         # Write a README file to the live directory
         readme_path = os.path.join(live_dir, README)
         _write_live_readme_to(readme_path)
+        util.fsync_dir(live_dir)
 
-        # Document what we've done in a new renewal config file
-        config_file.close()
-
-        # Save only the config items that are relevant to renewal
-        values = relevant_values(vars(cli_config.namespace))
-
-        new_config = write_renewal_config(config_filename, config_filename, archive,
-            target, values)
-        return cls(new_config.filename, cli_config)
+        # Document what we've done in a new renewal config
+        update_configuration(lineagename, archive, target, cli_config)
+        return cls(renewal_filename_for_lineagename(cli_config, lineagename),
+                   cli_config)
 
     def save_successor(self, prior_version, new_cert,
                        new_privkey, new_chain, cli_config):
@@ -1088,40 +1131,42 @@ class RenewableCert(object):
         old_privkey = os.path.join(
             self.archive_dir, "privkey{0}.pem".format(prior_version))
 
-        # Distinguish the cases where the privkey has changed and where it
-        # has not changed (in the latter case, making an appropriate symlink
-        # to an earlier privkey version)
-        if new_privkey is None:
-            # The behavior below keeps the prior key by creating a new
-            # symlink to the old key or the target of the old key symlink.
-            if os.path.islink(old_privkey):
-                old_privkey = os.readlink(old_privkey)
+        # All files of the new version are staged, flushed to disk together
+        # and then renamed into the archive directory.
+        stage = _ArchiveStage(self.archive_dir)
+        with error_handler.ErrorHandler(stage.abort):
+            # Distinguish the cases where the privkey has changed and where it
+            # has not changed (in the latter case, making an appropriate symlink
+            # to an earlier privkey version)
+            privkey_name = os.path.basename(target["privkey"])
+            if new_privkey is None:
+                # The behavior below keeps the prior key by creating a new
+                # symlink to the old key or the target of the old key symlink.
+                if os.path.islink(old_privkey):
+                    old_privkey = os.readlink(old_privkey)
+                else:
+                    old_privkey = "privkey{0}.pem".format(prior_version)
+                logger.debug("Writing symlink to old private key, %s.", old_privkey)
+                stage.symlink(privkey_name, old_privkey)
             else:
-                old_privkey = "privkey{0}.pem".format(prior_version)
-            logger.debug("Writing symlink to old private key, %s.", old_privkey)
-            os.symlink(old_privkey, target["privkey"])
-        else:
-            with util.safe_open(target["privkey"], "wb", chmod=BASE_PRIVKEY_MODE) as f:
                 logger.debug("Writing new private key to %s.", target["privkey"])
-                f.write(new_privkey)
-            # Preserve gid and (mode & 074) from previous privkey in this lineage.
-            old_mode = stat.S_IMODE(os.stat(old_privkey).st_mode) & \
-                (stat.S_IRGRP | stat.S_IWGRP | stat.S_IXGRP | \
-                 stat.S_IROTH)
-            mode = BASE_PRIVKEY_MODE | old_mode
-            os.chown(target["privkey"], -1, os.stat(old_privkey).st_gid)
-            os.chmod(target["privkey"], mode)
-
-        # Save everything else
-        with open(target["cert"], "wb") as f:
+                stage.write(privkey_name, new_privkey, chmod=BASE_PRIVKEY_MODE)
+                # Preserve gid and (mode & 074) from previous privkey in this lineage.
+                old_mode = stat.S_IMODE(os.stat(old_privkey).st_mode) & \
+                    (stat.S_IRGRP | stat.S_IWGRP | stat.S_IXGRP | \
+                     stat.S_IROTH)
+                mode = BASE_PRIVKEY_MODE | old_mode
+                os.chown(stage.path(privkey_name), -1, os.stat(old_privkey).st_gid)
+                os.chmod(stage.path(privkey_name), mode)
+
+            # Save everything else
             logger.debug("Writing certificate to %s.", target["cert"])
-            f.write(new_cert)
-        with open(target["chain"], "wb") as f:
+            stage.write(os.path.basename(target["cert"]), new_cert)
             logger.debug("Writing chain to %s.", target["chain"])
-            f.write(new_chain)
-        with open(target["fullchain"], "wb") as f:
+            stage.write(os.path.basename(target["chain"]), new_chain)
             logger.debug("Writing full chain to %s.", target["fullchain"])
-            f.write(new_cert + new_chain)
+            stage.write(os.path.basename(target["fullchain"]), new_cert + new_chain)
+            stage.commit()
 
         symlinks = dict((kind, self.configuration[kind]) for kind in ALL_FOUR)
         # Update renewal config file
@@ -353,6 +353,24 @@ class DomainsForCertnameTest(BaseCertManagerTest):
         self.assertTrue(mock_make_or_verify_dir.called)
 
 
+class MigrateLineagesTest(BaseCertManagerTest):
+    """Tests for certbot.cert_manager.migrate_lineages"""
+
+    def _call(self, *args, **kwargs):
+        from certbot import cert_manager
+        return cert_manager.migrate_lineages(*args, **kwargs)
+
+    @test_util.patch_get_utility()
+    def test_migrate_to_sqlite(self, mock_get_utility):
+        self.config.lineage_storage = "sqlite"
+        self._call(self.config)
+        from certbot import storage
+        self.assertEqual(storage.renewal_conf_files(self.config),
+                         [self.config_files[domain].filename
+                          for domain in sorted(self.domains)])
+        self.assertTrue("Imported 2" in mock_get_utility().notification.call_args[0][0])
+
+
 class RenameLineageTest(BaseCertManagerTest):
     """Tests for certbot.cert_manager.rename_lineage"""
 
@@ -112,6 +112,13 @@ class ParseTest(unittest.TestCase):  # pylint: disable=too-many-public-methods
         for d in ('config_dir', 'logs_dir', 'work_dir'):
             self.assertEqual(getattr(namespace, d), cli.flag_default(d))
 
+    @mock.patch("certbot.client.sample_user_agent")
+    def test_user_agent_sample(self, mock_sample):
+        mock_sample.return_value = "SampleAgent/1.0"
+        self.parse(["renew"])
+        self.assertFalse(mock_sample.called)
+        self.assertTrue("SampleAgent/1.0" in self._help_output(["--help", "all"]))
+
     def test_install_abspath(self):
         cert = 'cert'
         key = 'key'
@@ -649,6 +649,24 @@ class EnhanceConfigTest(ClientTestCommon):
         self.client.enhance_config([self.domain], None)
 
 
+class CompactCheckpointsTest(unittest.TestCase):
+    """Tests for certbot.client.compact_checkpoints."""
+
+    @classmethod
+    def _call(cls, keep):
+        from certbot.client import compact_checkpoints
+        with mock.patch("certbot.client.reverter.Reverter") as mock_reverter:
+            compact_checkpoints(mock.MagicMock(keep_checkpoints=keep))
+        return mock_reverter
+
+    def test_keep_all(self):
+        self.assertFalse(self._call(0).called)
+
+    def test_compact(self):
+        mock_reverter = self._call(3)
+        mock_reverter().compact_checkpoints.assert_called_once_with(3)
+
+
 class RollbackTest(unittest.TestCase):
     """Tests for certbot.client.rollback."""
 
@@ -0,0 +1,239 @@
+"""Tests for certbot.lineage_storage."""
+import datetime
+import os
+import sqlite3
+import stat
+import unittest
+
+import configobj
+import mock
+import pytz
+
+from certbot import errors
+
+import certbot.tests.util as test_util
+
+
+class LineageStorageTestMixin(object):
+    """Tests shared by all lineage storage backends."""
+    # pylint: disable=no-member
+
+    def _add_sample_lineage(self):
+        rc_path = test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+        self.storage.save("sample-renewal", configobj.ConfigObj(rc_path))
+        return rc_path
+
+    def test_find_all_empty(self):
+        self.assertEqual(self.storage.find_all(), [])
+
+    def test_save_and_load(self):
+        renewal_config = configobj.ConfigObj()
+        renewal_config["cert"] = "/some/cert.pem"
+        renewal_config["renewalparams"] = {"authenticator": "webroot"}
+        self.storage.save("example.org", renewal_config)
+
+        self.assertTrue(self.storage.exists("example.org"))
+        self.assertFalse(self.storage.exists("example.com"))
+        self.assertEqual(self.storage.find_all(), ["example.org"])
+        loaded = self.storage.load("example.org")
+        self.assertEqual(loaded["cert"], "/some/cert.pem")
+        self.assertEqual(loaded["renewalparams"]["authenticator"], "webroot")
+
+    def test_load_missing(self):
+        self.assertRaises(errors.CertStorageError, self.storage.load, "missing")
+
+    def test_reserve(self):
+        self.assertEqual(self.storage.reserve("example.org"), "example.org")
+        self.assertEqual(self.storage.reserve("example.org"), "example.org-0001")
+        self.assertEqual(self.storage.reserve("example.org"), "example.org-0002")
+        self.assertEqual(len(self.storage.load("example.org-0001")), 0)
+
+    def test_rename(self):
+        self._add_sample_lineage()
+        self.storage.rename("sample-renewal", "renamed")
+        self.assertEqual(self.storage.find_all(), ["renamed"])
+        self.assertEqual(self.storage.find_by_domain("isnot.org"), ["renamed"])
+        self.assertRaises(errors.CertStorageError,
+                          self.storage.rename, "sample-renewal", "other")
+
+    def test_delete(self):
+        self._add_sample_lineage()
+        self.storage.delete("sample-renewal")
+        self.assertEqual(self.storage.find_all(), [])
+        self.assertEqual(self.storage.find_by_domain("isnot.org"), [])
+
+    def test_find_by_domain(self):
+        self._add_sample_lineage()
+        self.assertEqual(self.storage.find_by_domain("isnot.org"), ["sample-renewal"])
+        self.assertEqual(self.storage.find_by_domain("example.org"), [])
+
+    def test_find_due(self):
+        self._add_sample_lineage()
+        # The certificate expires on 2016-05-02 and is renewed 4 years before
+        due = datetime.datetime(2012, 4, 29, 23, 49, tzinfo=pytz.UTC)
+        self.assertEqual(self.storage.find_due(due), [])
+        self.assertEqual(self.storage.find_due(
+            due + datetime.timedelta(minutes=1)), ["sample-renewal"])
+        self.assertEqual(self.storage.find_unreadable(), [])
+
+    def test_find_due_autorenew_disabled(self):
+        rc_path = test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+        renewal_config = configobj.ConfigObj(rc_path)
+        renewal_config["renewalparams"]["autorenew"] = "False"
+        self.storage.save("sample-renewal", renewal_config)
+        self.assertEqual(self.storage.find_due(datetime.datetime.now(pytz.UTC)), [])
+
+    def test_find_without_certificate(self):
+        renewal_config = configobj.ConfigObj()
+        renewal_config["archive_dir"] = os.path.join(self.tempdir, "nowhere")
+        self.storage.save("example.org", renewal_config)
+        self.assertEqual(self.storage.find_by_domain("example.org"), [])
+        self.assertEqual(self.storage.find_due(
+            datetime.datetime.now(pytz.UTC)), [])
+        self.assertEqual(self.storage.find_unreadable(), ["example.org"])
+
+
+class LineageFileStorageTest(LineageStorageTestMixin, test_util.ConfigTestCase):
+    """Tests for certbot.lineage_storage.LineageFileStorage."""
+
+    def setUp(self):
+        super(LineageFileStorageTest, self).setUp()
+        from certbot.lineage_storage import LineageFileStorage
+        self.storage = LineageFileStorage(self.config)
+
+    def test_find_all_ignores_other_files(self):
+        os.makedirs(self.config.renewal_configs_dir)
+        with open(os.path.join(self.config.renewal_configs_dir, "IGNORE.THIS"), "w"):
+            pass
+        self.assertEqual(self.storage.find_all(), [])
+
+    def test_load_broken(self):
+        os.makedirs(self.config.renewal_configs_dir)
+        with open(os.path.join(self.config.renewal_configs_dir, "broken.conf"), "w") as f:
+            f.write("[No closing bracket for you!")
+        self.assertRaises(errors.CertStorageError, self.storage.load, "broken")
+        self.assertEqual(self.storage.find_by_domain("isnot.org"), [])
+        self.assertEqual(self.storage.find_unreadable(), ["broken"])
+
+    def test_save_keeps_permissions(self):
+        rc_path = self._add_sample_lineage()
+        os.chmod(rc_path, 0o640)
+        self.storage.save("sample-renewal", configobj.ConfigObj(rc_path))
+        self.assertEqual(stat.S_IMODE(os.lstat(rc_path).st_mode), 0o640)
+
+
+class LineageSQLiteStorageTest(LineageStorageTestMixin, test_util.ConfigTestCase):
+    """Tests for certbot.lineage_storage.LineageSQLiteStorage."""
+
+    def setUp(self):
+        super(LineageSQLiteStorageTest, self).setUp()
+        from certbot.lineage_storage import LineageSQLiteStorage
+        self.storage = LineageSQLiteStorage(self.config)
+
+    def test_no_renewal_files(self):
+        self._add_sample_lineage()
+        self.assertTrue(os.path.exists(self.config.lineage_db_path))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.config.renewal_configs_dir, "sample-renewal.conf.new")))
+
+    def test_rename_to_existing(self):
+        self.storage.save("a", configobj.ConfigObj())
+        self.storage.save("b", configobj.ConfigObj())
+        self.assertRaises(errors.CertStorageError, self.storage.rename, "a", "b")
+
+    def test_unusable_database(self):
+        os.makedirs(self.config.lineage_db_path)
+        self.assertRaises(errors.CertStorageError, self.storage.find_all)
+
+    def test_invalid_database(self):
+        os.makedirs(os.path.dirname(self.config.lineage_db_path))
+        with open(self.config.lineage_db_path, "w") as f:
+            f.write("Not a database")
+        self.assertRaises(errors.CertStorageError, self.storage.find_all)
+
+    def test_read_does_not_create_database(self):
+        self.assertEqual(self.storage.find_all(), [])
+        self.assertFalse(self.storage.exists("sample-renewal"))
+        self.assertEqual(self.storage.find_by_domain("isnot.org"), [])
+        self.assertRaises(errors.CertStorageError, self.storage.load, "sample-renewal")
+        self.assertFalse(os.path.exists(self.config.lineage_db_path))
+
+    def test_close(self):
+        self._add_sample_lineage()
+        self.storage.close()
+        self.storage.close()
+        self.assertEqual(self.storage.find_all(), ["sample-renewal"])
+
+    def test_single_connection(self):
+        with mock.patch("certbot.lineage_storage.sqlite3.connect",
+                        side_effect=sqlite3.connect) as mock_connect:
+            self._add_sample_lineage()
+            self.storage.find_all()
+            self.storage.load("sample-renewal")
+        self.assertEqual(mock_connect.call_count, 1)
+
+
+class GetStorageTest(test_util.ConfigTestCase):
+    """Tests for certbot.lineage_storage.get_storage and other_storage."""
+
+    def test_files(self):
+        from certbot import lineage_storage
+        self.assertTrue(isinstance(lineage_storage.get_storage(self.config),
+                                   lineage_storage.LineageFileStorage))
+        self.assertTrue(isinstance(lineage_storage.other_storage(self.config),
+                                   lineage_storage.LineageSQLiteStorage))
+
+    def test_sqlite(self):
+        from certbot import lineage_storage
+        self.config.lineage_storage = "sqlite"
+        self.assertTrue(isinstance(lineage_storage.get_storage(self.config),
+                                   lineage_storage.LineageSQLiteStorage))
+        self.assertTrue(isinstance(lineage_storage.other_storage(self.config),
+                                   lineage_storage.LineageFileStorage))
+        self.assertTrue(lineage_storage.get_storage(self.config) is
+                        lineage_storage.get_storage(self.config))
+
+    @mock.patch("certbot.lineage_storage.util.atexit_register")
+    def test_sqlite_closed_at_exit(self, mock_register):
+        from certbot import lineage_storage
+        self.config.lineage_storage = "sqlite"
+        self.config.lineage_db_path = os.path.join(self.tempdir, "closed.db")
+        storage = lineage_storage._sqlite_storage(self.config)  # pylint: disable=protected-access
+        mock_register.assert_called_once_with(storage.close)
+        self.assertTrue(lineage_storage.get_storage(self.config) is storage)
+        self.assertFalse(os.path.exists(self.config.lineage_db_path))
+
+
+class MigrateTest(test_util.ConfigTestCase):
+    """Tests for certbot.lineage_storage.migrate."""
+
+    def setUp(self):
+        super(MigrateTest, self).setUp()
+        from certbot import lineage_storage
+        self.files = lineage_storage.LineageFileStorage(self.config)
+        self.sqlite = lineage_storage.LineageSQLiteStorage(self.config)
+        test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+
+    def _call(self, source, destination):
+        from certbot.lineage_storage import migrate
+        return migrate(source, destination)
+
+    def test_round_trip(self):
+        self.assertEqual(self._call(self.files, self.sqlite), ["sample-renewal"])
+        self.assertEqual(self.sqlite.find_by_domain("isnot.org"), ["sample-renewal"])
+        self.files.delete("sample-renewal")
+
+        self.assertEqual(self._call(self.sqlite, self.files), ["sample-renewal"])
+        self.assertEqual(self.files.load("sample-renewal")["renew_before_expiry"],
+                         "4 years")
+
+    @mock.patch("certbot.lineage_storage.logger")
+    def test_existing_lineage_skipped(self, mock_logger):
+        self.sqlite.save("sample-renewal", configobj.ConfigObj())
+        self.assertEqual(self._call(self.files, self.sqlite), [])
+        self.assertTrue(mock_logger.warning.called)
+        self.assertEqual(len(self.sqlite.load("sample-renewal")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
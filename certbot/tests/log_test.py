@@ -167,6 +167,45 @@ class SetupLogFileHandlerTest(test_util.ConfigTestCase):
         backup_path = os.path.join(self.config.logs_dir, log_file + '.1')
         self.assertEqual(os.path.exists(backup_path), should_rollover)
 
+    @mock.patch('certbot.log.util.set_up_core_dir')
+    def test_logs_dir_locked(self, mock_set_up_core_dir):
+        os.makedirs(self.config.logs_dir)
+        mock_set_up_core_dir.side_effect = errors.LockError
+        handler, log_path = self._call(self.config, 'test.log', '%(message)s')
+        handler.close()
+
+        expected_path = os.path.join(
+            self.config.logs_dir, 'test.log.pid{0}'.format(os.getpid()))
+        self.assertEqual(log_path, expected_path)
+        # Files of concurrent instances are not rotated
+        self.assertEqual(os.listdir(self.config.logs_dir),
+                         ['test.log.pid{0}'.format(os.getpid())])
+
+    def test_process_logs_pruned(self):
+        os.makedirs(self.config.logs_dir)
+        self.config.max_log_backups = 2
+        for i, pid in enumerate((10, 11, 12)):
+            path = os.path.join(self.config.logs_dir, 'test.log.pid{0}'.format(pid))
+            open(path, 'w').close()
+            os.utime(path, (i, i))
+        handler, _ = self._call(self.config, 'test.log', '%(message)s')
+        handler.close()
+
+        names = os.listdir(self.config.logs_dir)
+        self.assertFalse('test.log.pid10' in names)
+        self.assertTrue('test.log.pid11' in names)
+        self.assertTrue('test.log.pid12' in names)
+
+    @mock.patch('certbot.log.os.remove')
+    def test_process_logs_prune_error(self, mock_remove):
+        os.makedirs(self.config.logs_dir)
+        self.config.max_log_backups = 0
+        open(os.path.join(self.config.logs_dir, 'test.log.pid10'), 'w').close()
+        mock_remove.side_effect = OSError
+        handler, _ = self._call(self.config, 'test.log', '%(message)s')
+        handler.close()
+        self.assertTrue(mock_remove.called)
+
     @mock.patch('certbot.log.logging.handlers.RotatingFileHandler')
     def test_max_log_backups_used(self, mock_handler):
         self._call(self.config, 'test.log', '%(message)s')
@@ -7,6 +7,8 @@ import itertools
 import mock
 import os
 import shutil
+import subprocess
+import sys
 import unittest
 import datetime
 import pytz
@@ -28,6 +30,8 @@ from certbot import main
 from certbot import updater
 from certbot import util
 
+from certbot.display import util as display_util
+
 from certbot.plugins import disco
 from certbot.plugins import enhancements
 from certbot.plugins import manual
@@ -53,6 +57,20 @@ class TestHandleIdenticalCerts(unittest.TestCase):
         ret = main._handle_identical_cert_request(mock.Mock(), mock_lineage)
         self.assertEqual(ret, ("reinstall", mock_lineage))
 
+    @mock.patch('certbot.main.renewal.should_renew')
+    @test_util.patch_get_utility()
+    def test_handle_identical_cert_request_without_config_file(self, mock_get_utility,
+                                                               mock_should_renew):
+        mock_should_renew.return_value = False
+        mock_lineage = mock.Mock(lineagename="example.org")
+        mock_lineage.configfile.filename = None
+        mock_get_utility().menu.return_value = (display_util.OK, 0)
+        config = mock.Mock(reinstall=False, verb="certonly")
+        # pylint: disable=protected-access
+        ret = main._handle_identical_cert_request(config, mock_lineage)
+        self.assertEqual(ret, ("reinstall", mock_lineage))
+        self.assertTrue("(ref: example.org)" in mock_get_utility().menu.call_args[0][0])
+
 
 class RunTest(test_util.ConfigTestCase):
     """Tests for certbot.main.run."""
@@ -67,7 +85,8 @@ class RunTest(test_util.ConfigTestCase):
             mock.patch('certbot.main._init_le_client'),
             mock.patch('certbot.main._suggest_donation_if_appropriate'),
             mock.patch('certbot.main._report_new_cert'),
-            mock.patch('certbot.main._find_cert')]
+            mock.patch('certbot.main._find_cert'),
+            mock.patch('certbot.main.util.lock_dir_until_exit')]
 
         self.mock_auth = self.patches[0].start()
         self.mock_success_installation = self.patches[1].start()
@@ -76,6 +95,7 @@ class RunTest(test_util.ConfigTestCase):
         self.mock_suggest_donation = self.patches[4].start()
         self.mock_report_cert = self.patches[5].start()
         self.mock_find_cert = self.patches[6].start()
+        self.mock_lock = self.patches[7].start()
 
     def tearDown(self):
         for patch in self.patches:
@@ -95,6 +115,7 @@ class RunTest(test_util.ConfigTestCase):
         self.mock_find_cert.return_value = True, None
         self._call()
         self.mock_success_installation.assert_called_once_with([self.domain])
+        self.assertTrue(self.mock_lock.called)
 
     def test_reinstall_success(self):
         self.mock_auth.return_value = mock.Mock()
@@ -158,7 +179,8 @@ class CertonlyTest(unittest.TestCase):
     @mock.patch('certbot.cert_manager.domains_for_certname')
     @mock.patch('certbot.renewal.renew_cert')
     @mock.patch('certbot.main._report_new_cert')
-    def test_find_lineage_for_domains_and_certname(self, mock_report_cert,
+    @mock.patch('certbot.main.util.lock_lineage_until_exit')
+    def test_find_lineage_for_domains_and_certname(self, mock_lock, mock_report_cert,
         mock_renew_cert, mock_domains, mock_lineage):
         domains = ['example.com', 'test.org']
         mock_domains.return_value = domains
@@ -169,6 +191,8 @@ class CertonlyTest(unittest.TestCase):
         self.assertTrue(mock_domains.call_count == 1)
         self.assertTrue(mock_renew_cert.call_count == 1)
         self.assertTrue(mock_report_cert.call_count == 1)
+        mock_lock.assert_called_once_with(
+            mock.ANY, mock_lineage.return_value.lineagename)
 
         # user confirms updating lineage with new domains
         self._call(('certonly --webroot -d example.com -d test.com '
@@ -355,7 +379,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
         self._test_delete_opt_out_common(mock_get_utility)
 
     # pylint: disable=too-many-arguments
-    @mock.patch('certbot.storage.renewal_file_for_certname')
+    @mock.patch('certbot.storage.renewal_config_for_certname')
     @mock.patch('certbot.cert_manager.delete')
     @mock.patch('certbot.cert_manager.match_and_check_overlaps')
     @mock.patch('certbot.storage.full_archive_path')
@@ -364,7 +388,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
     def test_overlapping_archive_dirs(self, mock_get_utility,
             mock_cert_path_to_lineage, mock_archive,
             mock_match_and_check_overlaps, mock_delete,
-            mock_renewal_file_for_certname):
+            mock_renewal_config_for_certname):
         # pylint: disable = unused-argument
         config = self.config
         config.cert_path = "/some/reasonable/path"
@@ -375,7 +399,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
         mock_delete.assert_not_called()
 
     # pylint: disable=too-many-arguments
-    @mock.patch('certbot.storage.renewal_file_for_certname')
+    @mock.patch('certbot.storage.renewal_config_for_certname')
     @mock.patch('certbot.cert_manager.match_and_check_overlaps')
     @mock.patch('certbot.storage.full_archive_path')
     @mock.patch('certbot.cert_manager.delete')
@@ -383,7 +407,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
     @test_util.patch_get_utility()
     def test_cert_path_only(self, mock_get_utility,
             mock_cert_path_to_lineage, mock_delete, mock_archive,
-            mock_overlapping_archive_dirs, mock_renewal_file_for_certname):
+            mock_overlapping_archive_dirs, mock_renewal_config_for_certname):
         # pylint: disable = unused-argument
         config = self.config
         config.cert_path = "/some/reasonable/path"
@@ -394,7 +418,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
         self.assertEqual(mock_delete.call_count, 1)
 
     # pylint: disable=too-many-arguments
-    @mock.patch('certbot.storage.renewal_file_for_certname')
+    @mock.patch('certbot.storage.renewal_config_for_certname')
     @mock.patch('certbot.cert_manager.match_and_check_overlaps')
     @mock.patch('certbot.storage.full_archive_path')
     @mock.patch('certbot.cert_manager.cert_path_to_lineage')
@@ -402,7 +426,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
     @test_util.patch_get_utility()
     def test_noninteractive_deletion(self, mock_get_utility, mock_delete,
             mock_cert_path_to_lineage, mock_full_archive_dir,
-            mock_match_and_check_overlaps, mock_renewal_file_for_certname):
+            mock_match_and_check_overlaps, mock_renewal_config_for_certname):
         # pylint: disable = unused-argument
         config = self.config
         config.namespace.noninteractive_mode = True
@@ -415,7 +439,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
         self.assertEqual(mock_delete.call_count, 1)
 
     # pylint: disable=too-many-arguments
-    @mock.patch('certbot.storage.renewal_file_for_certname')
+    @mock.patch('certbot.storage.renewal_config_for_certname')
     @mock.patch('certbot.cert_manager.match_and_check_overlaps')
     @mock.patch('certbot.storage.full_archive_path')
     @mock.patch('certbot.cert_manager.cert_path_to_lineage')
@@ -423,7 +447,7 @@ class DeleteIfAppropriateTest(test_util.ConfigTestCase):
     @test_util.patch_get_utility()
     def test_opt_in_deletion(self, mock_get_utility, mock_delete,
             mock_cert_path_to_lineage, mock_full_archive_dir,
-            mock_match_and_check_overlaps, mock_renewal_file_for_certname):
+            mock_match_and_check_overlaps, mock_renewal_config_for_certname):
         # pylint: disable = unused-argument
         config = self.config
         config.namespace.delete_after_revoke = True
@@ -461,9 +485,39 @@ class DetermineAccountTest(test_util.ConfigTestCase):
     def test_args_account_set(self):
         self.account_storage.save(self.accs[1], self.mock_client)
         self.config.account = self.accs[1].id
-        self.assertEqual((self.accs[1], None), self._call())
+        with mock.patch('certbot.main.util.lock_config_item') as mock_lock:
+            self.assertEqual((self.accs[1], None), self._call())
         self.assertEqual(self.accs[1].id, self.config.account)
         self.assertTrue(self.config.email is None)
+        mock_lock.assert_not_called()
+
+    @mock.patch('certbot.main.util.lock_config_item')
+    def test_accounts_locked(self, mock_lock):
+        self.account_storage.save(self.accs[0], self.mock_client)
+        self.assertEqual((self.accs[0], None), self._call())
+        mock_lock.assert_called_once_with(self.config, "accounts")
+        self.assertTrue(mock_lock.return_value.__enter__.called)
+
+    @mock.patch('certbot.main.util.lock_config_item')
+    @mock.patch('certbot.client.display_ops.get_email')
+    def test_accounts_unlocked_during_prompts(self, mock_get_email, mock_lock):
+        def _get_email():
+            self.assertFalse(mock_lock.return_value.__enter__.call_count >
+                             mock_lock.return_value.__exit__.call_count)
+            return 'foo@bar.baz'
+        mock_get_email.side_effect = _get_email
+
+        def _register(config, account_storage, tos_cb):
+            # pylint: disable=unused-argument
+            account_storage.save(self.accs[0], self.mock_client)
+            return self.accs[0], mock.sentinel.acme
+
+        with mock.patch('certbot.main.client') as client:
+            client.register.side_effect = _register
+            self.assertEqual((self.accs[0], mock.sentinel.acme), self._call())
+        self.assertEqual(mock_lock.call_count, 2)
+        self.assertEqual(mock_lock.return_value.__exit__.call_count, 2)
+        self.assertEqual([self.accs[0]], self.account_storage.find_all())
 
     def test_single_account(self):
         self.account_storage.save(self.accs[0], self.mock_client)
@@ -491,7 +545,7 @@ class DetermineAccountTest(test_util.ConfigTestCase):
                 self.accs[0], mock.sentinel.acme)
             self.assertEqual((self.accs[0], mock.sentinel.acme), self._call())
         client.register.assert_called_once_with(
-            self.config, self.account_storage, tos_cb=mock.ANY)
+            self.config, mock.ANY, tos_cb=mock.ANY)
 
         self.assertEqual(self.accs[0].id, self.config.account)
         self.assertEqual('foo@bar.baz', self.config.email)
@@ -1144,7 +1198,7 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
                         mocked_storage = mock.MagicMock()
                         mocked_account.AccountFileStorage.return_value = mocked_storage
                         mocked_storage.find_all.return_value = ["an account"]
-                        mocked_det.return_value = (mock.MagicMock(), "foo")
+                        mocked_det.return_value = (mock.MagicMock(id="an-account"), "foo")
                         cb_client = mock.MagicMock()
                         mocked_client.Client.return_value = cb_client
                         x = self._call_no_clientmock(
@@ -1176,7 +1230,7 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
                         mocked_storage = mock.MagicMock()
                         mocked_account.AccountFileStorage.return_value = mocked_storage
                         mocked_storage.find_all.return_value = ["an account"]
-                        mock_acc = mock.MagicMock()
+                        mock_acc = mock.MagicMock(id="an-account")
                         mock_regr = mock_acc.regr
                         mocked_det.return_value = (mock_acc, "foo")
                         cb_client = mock.MagicMock()
@@ -1218,7 +1272,8 @@ class UnregisterTest(unittest.TestCase):
             '_determine_account': mock.patch('certbot.main._determine_account'),
             'account': mock.patch('certbot.main.account'),
             'client': mock.patch('certbot.main.client'),
-            'get_utility': test_util.patch_get_utility()}
+            'get_utility': test_util.patch_get_utility(),
+            'util': mock.patch('certbot.main.util')}
         self.mocks = dict((k, v.start()) for k, v in self.patchers.items())
 
     def tearDown(self):
@@ -1242,7 +1297,7 @@ class UnregisterTest(unittest.TestCase):
         mocked_storage.find_all.return_value = ["an account"]
 
         self.mocks['account'].AccountFileStorage.return_value = mocked_storage
-        self.mocks['_determine_account'].return_value = (mock.MagicMock(), "foo")
+        self.mocks['_determine_account'].return_value = (mock.MagicMock(id="an-id"), "foo")
 
         cb_client = mock.MagicMock()
         self.mocks['client'].Client.return_value = cb_client
@@ -1253,6 +1308,7 @@ class UnregisterTest(unittest.TestCase):
         res = main.unregister(config, unused_plugins)
 
         self.assertTrue(res is None)
+        self.mocks['util'].lock_account_until_exit.assert_called_once_with(config, "an-id")
         self.assertTrue(cb_client.acme.deactivate_registration.called)
         m = "Account deactivated."
         self.assertTrue(m in self.mocks['get_utility']().add_message.call_args[0][0])
@@ -1283,7 +1339,7 @@ class MakeOrVerifyNeededDirs(test_util.ConfigTestCase):
         for core_dir in (self.config.config_dir, self.config.work_dir,):
             mock_util.set_up_core_dir.assert_any_call(
                 core_dir, constants.CONFIG_DIRS_MODE,
-                compat.os_geteuid(), self.config.strict_permissions
+                compat.os_geteuid(), self.config.strict_permissions, locked=False
             )
 
         hook_dirs = (self.config.renewal_pre_hooks_dir,
@@ -1296,6 +1352,25 @@ class MakeOrVerifyNeededDirs(test_util.ConfigTestCase):
                 strict=self.config.strict_permissions)
 
 
+class InitLeClientTest(test_util.ConfigTestCase):
+    """Tests for certbot.main._init_le_client."""
+    # pylint: disable=protected-access
+
+    @mock.patch('certbot.main.client')
+    @mock.patch('certbot.main.util.lock_dir_until_exit')
+    def test_installer_locks_work_dir(self, mock_lock, unused_client):
+        main._init_le_client(self.config, None, mock.MagicMock())
+        mock_lock.assert_called_once_with(self.config.work_dir)
+
+    @mock.patch('certbot.main.client')
+    @mock.patch('certbot.main._determine_account')
+    @mock.patch('certbot.main.util.lock_dir_until_exit')
+    def test_authenticator_only(self, mock_lock, mock_determine, unused_client):
+        mock_determine.return_value = (mock.MagicMock(), mock.MagicMock())
+        main._init_le_client(self.config, mock.MagicMock(), None)
+        mock_lock.assert_not_called()
+
+
 class EnhanceTest(test_util.ConfigTestCase):
     """Tests for certbot.main.enhance."""
 
@@ -1303,9 +1378,12 @@ class EnhanceTest(test_util.ConfigTestCase):
         super(EnhanceTest, self).setUp()
         self.get_utility_patch = test_util.patch_get_utility()
         self.mock_get_utility = self.get_utility_patch.start()
+        self.lock_patch = mock.patch('certbot.main.util.lock_dir_until_exit')
+        self.mock_lock = self.lock_patch.start()
         self.mockinstaller = mock.MagicMock(spec=enhancements.AutoHSTSEnhancement)
 
     def tearDown(self):
+        self.lock_patch.stop()
         self.get_utility_patch.stop()
 
     def _call(self, args):
@@ -1370,6 +1448,7 @@ class EnhanceTest(test_util.ConfigTestCase):
                 any([getattr(mock_client.config, e) for e in not_req_enh]))
             self.assertTrue(
                 "example.com" in mock_client.enhance_config.call_args[0][0])
+            self.mock_lock.assert_called_once_with(mock_client.config.work_dir)
 
     @mock.patch('certbot.cert_manager.lineage_for_certname')
     @mock.patch('certbot.main.display_ops.choose_values')
@@ -1445,8 +1524,13 @@ class InstallTest(test_util.ConfigTestCase):
 
     def setUp(self):
         super(InstallTest, self).setUp()
+        self.lock_patch = mock.patch('certbot.main.util.lock_dir_until_exit')
+        self.mock_lock = self.lock_patch.start()
         self.mockinstaller = mock.MagicMock(spec=enhancements.AutoHSTSEnhancement)
 
+    def tearDown(self):
+        self.lock_patch.stop()
+
     @mock.patch('certbot.main.plug_sel.record_chosen_plugins')
     @mock.patch('certbot.main.plug_sel.pick_installer')
     def test_install_enhancement_not_supported(self, mock_inst, _rec):
@@ -1470,6 +1554,59 @@ class InstallTest(test_util.ConfigTestCase):
         self.assertRaises(errors.ConfigurationError,
                           main.install,
                           self.config, plugins)
+        self.mock_lock.assert_called_once_with(self.config.work_dir)
+
+
+# Startup budget of Certbot: modules that must not be imported by
+# ``import certbot.main``, and the time it may take in seconds. The budget
+# is generous so that slow machines pass, tests/startup_benchmark.py gives
+# precise measurements.
+LAZILY_IMPORTED_MODULES = [
+    'OpenSSL', 'acme.client', 'acme.messages', 'certbot.client',
+    'certbot.storage', 'configobj', 'cryptography', 'josepy',
+    'parsedatetime', 'pkg_resources', 'requests',
+]
+IMPORT_TIME_BUDGET = 2.0
+
+_IMPORT_SCRIPT = """
+import sys
+import time
+start = time.time()
+import certbot.main
+print(time.time() - start)
+print(" ".join(sorted(sys.modules)))
+"""
+
+
+class StartupTest(unittest.TestCase):
+    """Tests that importing certbot.main is fast."""
+
+    @classmethod
+    def _import_in_subprocess(cls):
+        output = subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT],
+                                         universal_newlines=True)
+        duration, modules = output.splitlines()[-2:]
+        return float(duration), modules.split()
+
+    def test_lazily_imported_modules(self):
+        _, modules = self._import_in_subprocess()
+        imported = [name for name in LAZILY_IMPORTED_MODULES if name in modules]
+        self.assertEqual(imported, [])
+
+    def test_import_time(self):
+        # Keep the best of a few runs to be robust to noisy machines
+        duration = min(self._import_in_subprocess()[0] for _ in range(3))
+        self.assertTrue(duration < IMPORT_TIME_BUDGET,
+                        'Importing certbot.main took {0:.3f}s, more than the budget '
+                        'of {1}s'.format(duration, IMPORT_TIME_BUDGET))
+
+    def test_default_challenge_ports(self):
+        # constants doesn't import acme.challenges to keep startup fast
+        from acme import challenges
+        self.assertEqual(constants.CLI_DEFAULTS['http01_port'],
+                         challenges.HTTP01Response.PORT)
+        self.assertEqual(constants.CLI_DEFAULTS['tls_sni_01_port'],
+                         challenges.TLSSNI01Response.PORT)
 
 
 if __name__ == '__main__':
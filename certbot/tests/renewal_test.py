@@ -4,6 +4,7 @@ from __future__ import print_function
 
 import sys
 
+import configobj
 import mock
 import unittest
 import datetime
@@ -111,7 +112,8 @@ class RenewalTest(test_util.ConfigTestCase): # pylint: disable=too-many-public-m
         chain_path = os.path.normpath(os.path.join(self.config.config_dir,
                                                    'live/foo.bar/fullchain.pem'))
         mock_lineage = mock.MagicMock(cert=cert_path, fullchain=chain_path,
-                                      cert_path=cert_path, fullchain_path=chain_path)
+                                      cert_path=cert_path, fullchain_path=chain_path,
+                                      lineagename='foo.bar')
         mock_lineage.should_autorenew.return_value = due_for_renewal
         mock_lineage.has_pending_deployment.return_value = False
         mock_lineage.names.return_value = ['isnot.org']
@@ -440,10 +442,39 @@ class RenewalTest(test_util.ConfigTestCase): # pylint: disable=too-many-public-m
         should_renew.return_value = False
         test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
         expiry = datetime.datetime.now() + datetime.timedelta(days=90)
-        _, _, stdout = self._test_renewal_common(False, extra_args=None, should_renew=False,
-                                                 args=['renew'], expiry_date=expiry)
+        with mock.patch('certbot.renewal.util.lock_lineage') as mock_lock:
+            _, _, stdout = self._test_renewal_common(False, extra_args=None, should_renew=False,
+                                                     args=['renew'], expiry_date=expiry)
         self.assertTrue('No renewals were attempted.' in stdout.getvalue())
         self.assertTrue('The following certs are not due for renewal yet:' in stdout.getvalue())
+        # Lineages that are not due aren't locked
+        mock_lock.assert_not_called()
+
+    @mock.patch('certbot.renewal.util.lock_lineage')
+    def test_renew_rereads_config_under_lock(self, mock_lock):
+        test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+        from certbot import renewal
+        reconstitute = renewal._reconstitute  # pylint: disable=protected-access
+        with mock.patch('certbot.renewal._reconstitute') as mock_reconstitute:
+            mock_reconstitute.side_effect = reconstitute
+            self._test_renewal_common(True, [], args=['renew', '--dry-run'])
+        self.assertEqual(mock_lock.call_count, 1)
+        self.assertEqual(mock_lock.call_args[0][1], 'sample-renewal')
+        self.assertEqual(mock_reconstitute.call_count, 2)
+
+    @mock.patch('certbot.renewal._reconstitute')
+    def test_renew_skips_lineages_not_due_without_loading(self, mock_reconstitute):
+        from certbot import lineage_storage
+        rc_path = test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+        renewal_config = configobj.ConfigObj(rc_path)
+        renewal_config['renewalparams']['autorenew'] = 'False'
+        self.config.lineage_storage = 'sqlite'
+        lineage_storage.get_storage(self.config).save('sample-renewal', renewal_config)
+
+        _, stdout, _, _ = self._call(['renew', '--lineage-storage', 'sqlite',
+                                      '--disable-renew-updates'])
+        self.assertFalse(mock_reconstitute.called)
+        self.assertTrue('The following certs are not due for renewal yet:' in stdout.getvalue())
 
     def test_certonly_renewal_lineage(self):
         """
@@ -57,8 +57,10 @@ class ReverterCheckpointLocalTest(test_util.ConfigTestCase):
         self.reverter.add_to_temp_checkpoint(self.sets[1], "save2")
 
         self.assertTrue(os.path.isdir(self.config.temp_checkpoint_dir))
-        self.assertEqual(get_save_notes(
-            self.config.temp_checkpoint_dir), "save1save2")
+        # pylint: disable=protected-access
+        self.assertEqual(self.reverter._temp_checkpoint.notes, ["save1", "save2"])
+        self.assertFalse(os.path.isfile(
+            os.path.join(self.config.temp_checkpoint_dir, "CHANGES_SINCE")))
         self.assertFalse(os.path.isfile(
             os.path.join(self.config.temp_checkpoint_dir, "NEW_FILES")))
 
@@ -73,6 +75,19 @@ class ReverterCheckpointLocalTest(test_util.ConfigTestCase):
                 errors.ReverterError, self.reverter.add_to_checkpoint,
                 self.sets[0], "save1")
 
+    @mock.patch("certbot.reverter.os.link")
+    def test_add_to_temp_checkpoint_copy_failure(self, mock_link):
+        mock_link.side_effect = OSError
+        with mock.patch("certbot.reverter.shutil.copy2") as mock_copy2:
+            mock_copy2.side_effect = IOError("bad copy")
+            self.assertRaises(
+                errors.ReverterError, self.reverter.add_to_temp_checkpoint,
+                self.sets[0], "save1")
+        self.reverter.add_to_temp_checkpoint(self.sets[0], "save1")
+        update_file(self.config1, "updated-directive")
+        self.reverter.revert_temporary_config()
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+
     def test_checkpoint_conflict(self):
         """Make sure that checkpoint errors are thrown appropriately."""
         config3 = os.path.join(self.dir1, "config3.txt")
@@ -199,13 +214,23 @@ class ReverterCheckpointLocalTest(test_util.ConfigTestCase):
             side_effect=errors.ReverterError("e"))
 
         # pylint: disable=protected-access
-        self.reverter._recover_checkpoint = mock_recover
+        self.reverter._recover_temp_checkpoint = mock_recover
 
         self.reverter.add_to_temp_checkpoint(self.sets[0], "config1 save")
 
         self.assertRaises(
             errors.ReverterError, self.reverter.revert_temporary_config)
 
+    def test_recover_journal_revert_temp_failures(self):
+        from certbot.reverter import Reverter
+        self.reverter.add_to_temp_checkpoint(self.sets[0], "config1 save")
+
+        reverter = Reverter(self.config)
+        with mock.patch.object(reverter, "_recover_checkpoint",
+                               side_effect=errors.ReverterError("e")):
+            self.assertRaises(
+                errors.ReverterError, reverter.revert_temporary_config)
+
     def test_recover_checkpoint_rollback_failure(self):
         mock_recover = mock.MagicMock(
             side_effect=errors.ReverterError("e"))
@@ -221,10 +246,14 @@ class ReverterCheckpointLocalTest(test_util.ConfigTestCase):
     def test_recover_checkpoint_copy_failure(self):
         self.reverter.add_to_temp_checkpoint(self.sets[0], "save1")
 
-        with mock.patch("certbot.reverter.shutil.copy2") as mock_copy2:
-            mock_copy2.side_effect = OSError("bad copy")
+        with mock.patch("certbot.reverter.os.chmod") as mock_chmod:
+            mock_chmod.side_effect = OSError("bad chmod")
             self.assertRaises(
                 errors.ReverterError, self.reverter.revert_temporary_config)
+        # The checkpoint can still be reverted
+        update_file(self.config1, "updated-directive")
+        self.reverter.revert_temporary_config()
+        self.assertEqual(read_in(self.config1), "directive-dir1")
 
     def test_recover_checkpoint_rm_failure(self):
         self.reverter.add_to_temp_checkpoint(self.sets[0], "temp save")
@@ -249,6 +278,48 @@ class ReverterCheckpointLocalTest(test_util.ConfigTestCase):
         self.assertRaises(
             errors.ReverterError, self.reverter.revert_temporary_config)
 
+    @test_util.broken_on_windows
+    def test_revert_temp_from_memory(self):
+        self.reverter.add_to_temp_checkpoint(self.sets[2], "save1")
+        update_file(self.config1, "updated-directive")
+        os.chmod(self.config1, 0o600)
+        # The journal is not read back
+        for name in os.listdir(self.config.temp_checkpoint_dir):
+            if name != "FILEPATHS":
+                update_file(os.path.join(
+                    self.config.temp_checkpoint_dir, name), "journal")
+
+        self.reverter.revert_temporary_config()
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+        self.assertNotEqual(os.stat(self.config1).st_mode & 0o777, 0o600)
+        self.assertFalse(os.path.exists(self.config.temp_checkpoint_dir))
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.util.run_script")
+    def test_recovery_routine_after_crash(self, mock_run):
+        from certbot.reverter import Reverter
+        config3 = os.path.join(self.dir1, "config3.txt")
+        self.reverter.register_file_creation(True, config3)
+        update_file(config3, "challenge")
+        self.reverter.register_undo_command(True, ["undo"])
+        self.reverter.add_to_temp_checkpoint(self.sets[0], "save1")
+        update_file(self.config1, "updated-directive")
+
+        # A new reverter keeps adding to the journal left on disk
+        reverter = Reverter(self.config)
+        reverter.add_to_temp_checkpoint(self.sets[1], "save2")
+        update_file(self.config2, "updated-directive")
+        self.assertRaises(errors.ReverterError, reverter.add_to_checkpoint,
+                          self.sets[0], "perm save")
+
+        Reverter(self.config).recovery_routine()
+        mock_run.assert_called_once_with(["undo"])
+        self.assertFalse(os.path.isfile(config3))
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+        self.assertFalse(os.path.exists(self.config.temp_checkpoint_dir))
+
     @test_util.broken_on_windows
     def test_recovery_routine_temp_and_perm(self):
         # Register a new perm checkpoint file
@@ -420,6 +491,94 @@ class TestFullCheckpointsReverter(test_util.ConfigTestCase):
         self.assertTrue("Second Checkpoint" in config_changes)
         self.assertTrue("Third Checkpoint" in config_changes)
 
+    @test_util.broken_on_windows
+    def test_checkpoints_share_contents(self):
+        self.reverter.add_to_checkpoint(self.sets[0], "first save")
+        self.reverter.finalize_checkpoint("First Checkpoint")
+        self.reverter.add_to_checkpoint(self.sets[2], "second save")
+        self.reverter.finalize_checkpoint("Second Checkpoint")
+
+        blobs = os.listdir(self.reverter.blobs_dir)
+        self.assertEqual(len(blobs), 2)
+        self.assertEqual(sorted(os.stat(os.path.join(
+            self.reverter.blobs_dir, blob)).st_nlink for blob in blobs), [2, 3])
+
+        self.reverter.rollback_checkpoints(1)
+        self.assertEqual(len(os.listdir(self.reverter.blobs_dir)), 1)
+        self.reverter.rollback_checkpoints(1)
+        self.assertEqual(os.listdir(self.reverter.blobs_dir), [])
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.reverter.os.link")
+    def test_checkpoint_without_links(self, mock_link):
+        mock_link.side_effect = OSError
+        self._setup_three_checkpoints()
+        self.reverter.rollback_checkpoints(3)
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+
+    @test_util.broken_on_windows
+    def test_compact_checkpoints(self):
+        self.reverter.register_undo_command(False, ["undo", "command"])
+        self.reverter.add_to_checkpoint(set(), "command save")
+        self.reverter.finalize_checkpoint("Command Checkpoint")
+        config3 = self._setup_three_checkpoints()
+        self.reverter.compact_checkpoints(1)
+
+        backups = sorted(os.listdir(self.config.backup_dir))
+        self.assertEqual(len(backups), 2)
+        merged_dir = os.path.join(self.config.backup_dir, backups[0])
+        self.assertEqual(get_filepaths(merged_dir).splitlines(),
+                         [self.config1, self.config2])
+        self.assertEqual(get_new_files(merged_dir), [config3])
+        self.assertEqual(get_undo_commands(merged_dir), [["undo", "command"]])
+        self.assertTrue(get_save_notes(merged_dir).startswith("-- Second Checkpoint --"))
+        self.assertTrue("command save" in get_save_notes(merged_dir))
+
+        # Each stored content is linked once from the remaining checkpoints
+        blobs = os.listdir(self.reverter.blobs_dir)
+        self.assertEqual(len(blobs), 4)
+        self.assertTrue(all(os.stat(os.path.join(
+            self.reverter.blobs_dir, blob)).st_nlink == 2 for blob in blobs))
+        with mock.patch("certbot.reverter.util.run_script") as mock_run:
+            self.reverter.rollback_checkpoints(2)
+        mock_run.assert_called_once_with(["undo", "command"])
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+        self.assertFalse(os.path.isfile(config3))
+
+    def test_compact_checkpoints_nothing_to_do(self):
+        self._setup_three_checkpoints()
+        self.reverter.compact_checkpoints(2)
+        self.reverter.compact_checkpoints(0)
+        self.assertEqual(len(os.listdir(self.config.backup_dir)), 3)
+
+    @test_util.broken_on_windows
+    def test_compact_checkpoints_failure(self):
+        self._setup_three_checkpoints()
+        backups = sorted(os.listdir(self.config.backup_dir))
+        with mock.patch("certbot.reverter.compat.os_rename") as mock_rename:
+            mock_rename.side_effect = [None, OSError, None]
+            self.assertRaises(
+                errors.ReverterError, self.reverter.compact_checkpoints, 1)
+        self.assertEqual(mock_rename.call_count, 3)
+        self.assertEqual(sorted(os.listdir(self.config.backup_dir)), backups)
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.reverter.logger")
+    def test_compact_checkpoints_remove_failure(self, mock_logger):
+        config3 = self._setup_three_checkpoints()
+        with mock.patch("certbot.reverter.shutil.rmtree") as mock_rmtree:
+            mock_rmtree.side_effect = [None, OSError]
+            self.reverter.compact_checkpoints(1)
+        self.assertEqual(mock_logger.warning.call_count, 1)
+
+        self.reverter.rollback_checkpoints(3)
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+        self.assertFalse(os.path.isfile(config3))
+
     def _setup_three_checkpoints(self):
         """Generate some finalized checkpoints."""
         # Checkpoint1 - config1
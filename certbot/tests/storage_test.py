@@ -3,7 +3,6 @@
 import datetime
 import os
 import shutil
-import stat
 import unittest
 
 import configobj
@@ -331,16 +330,18 @@ class RenewableCertTests(BaseRenewableCertTest):
             self.assertEqual(self.test_rc.current_version(kind), 12)
 
     def test_update_all_links_to_full_failure(self):
-        def unlink_or_raise(path, real_unlink=os.unlink):
+        from certbot import util
+
+        def symlink_or_raise(target, link, real_symlink=util.atomic_symlink):
             # pylint: disable=missing-docstring
-            if "fullchain" in os.path.basename(path):
+            if "fullchain" in os.path.basename(link):
                 raise ValueError
             else:
-                real_unlink(path)
+                real_symlink(target, link)
 
         self._write_out_ex_kinds()
-        with mock.patch("certbot.storage.os.unlink") as mock_unlink:
-            mock_unlink.side_effect = unlink_or_raise
+        with mock.patch("certbot.storage.util.atomic_symlink") as mock_symlink:
+            mock_symlink.side_effect = symlink_or_raise
             self.assertRaises(ValueError, self.test_rc.update_all_links_to, 12)
 
         for kind in ALL_FOUR:
@@ -522,6 +523,29 @@ class RenewableCertTests(BaseRenewableCertTest):
         self.assertFalse(os.path.islink(self.test_rc.version("privkey", 10)))
         self.assertFalse(os.path.exists(temp_config_file))
 
+    @test_util.broken_on_windows
+    @mock.patch("certbot.storage.relevant_values")
+    def test_save_successor_staging(self, mock_rv):
+        mock_rv.side_effect = lambda x: x
+        for kind in ALL_FOUR:
+            self._write_out_kind(kind, 1)
+        self.test_rc.update_all_links_to(1)
+        archive_dir = self.test_rc.archive_dir
+
+        with mock.patch("certbot.storage.util.fsync_dir") as mock_fsync_dir:
+            self.test_rc.save_successor(1, b"cert", None, b"chain", self.config)
+        self.assertTrue(mock.call(archive_dir, force=True) in mock_fsync_dir.call_args_list)
+        self.assertEqual(sorted(os.listdir(archive_dir)), sorted(
+            "{0}{1}.pem".format(kind, version) for kind in ALL_FOUR for version in (1, 2)))
+
+        # A failure while staging leaves the archive untouched
+        with mock.patch("certbot.storage.util.fsync_file") as mock_fsync_file:
+            mock_fsync_file.side_effect = IOError
+            self.assertRaises(IOError, self.test_rc.save_successor,
+                              2, b"cert", None, b"chain", self.config)
+        self.assertEqual(self.test_rc.next_free_version(), 3)
+        self.assertFalse(any(name.startswith(".staging") for name in os.listdir(archive_dir)))
+
     @test_util.broken_on_windows
     @mock.patch("certbot.storage.relevant_values")
     def test_save_successor_maintains_group_mode(self, mock_rv):
@@ -794,16 +818,13 @@ class RenewableCertTests(BaseRenewableCertTest):
                           storage.RenewableCert,
                           self.config_file.filename, self.config)
 
-    def test_write_renewal_config(self):
+    def test_update_renewal_config(self):
         # Mostly tested by the process of creating and updating lineages,
-        # but we can test that this successfully creates files, removes
-        # unneeded items, and preserves comments.
-        temp = os.path.join(self.config.config_dir, "sample-file")
-        temp2 = os.path.join(self.config.config_dir, "sample-file.new")
-        with open(temp, "w") as f:
-            f.write("[renewalparams]\nuseful = value # A useful value\n"
-                    "useless = value # Not needed\n")
-        os.chmod(temp, 0o640)
+        # but we can test that this removes unneeded items and preserves
+        # comments.
+        renewal_config = configobj.ConfigObj([
+            "[renewalparams]", "useful = value # A useful value",
+            "useless = value # Not needed"])
         target = {}
         for x in ALL_FOUR:
             target[x] = "somewhere"
@@ -811,10 +832,10 @@ class RenewableCertTests(BaseRenewableCertTest):
         relevant_data = {"useful": "new_value"}
 
         from certbot import storage
-        storage.write_renewal_config(temp, temp2, archive_dir, target, relevant_data)
+        # pylint: disable=protected-access
+        storage._update_renewal_config(renewal_config, archive_dir, target, relevant_data)
 
-        with open(temp2, "r") as f:
-            content = f.read()
+        content = "\n".join(renewal_config.write())
         # useful value was updated
         self.assertTrue("useful = new_value" in content)
         # associated comment was preserved
@@ -823,9 +844,6 @@ class RenewableCertTests(BaseRenewableCertTest):
         self.assertTrue("useless" not in content)
         # check version was stored
         self.assertTrue("version = {0}".format(certbot.__version__) in content)
-        # ensure permissions are copied
-        self.assertEqual(stat.S_IMODE(os.lstat(temp).st_mode),
-                         stat.S_IMODE(os.lstat(temp2).st_mode))
 
     def test_update_symlinks(self):
         from certbot import storage
@@ -842,6 +860,52 @@ class RenewableCertTests(BaseRenewableCertTest):
         storage.RenewableCert(self.config_file.filename, self.config,
             update_symlinks=True)
 
+class SQLiteRenewableCertTest(test_util.ConfigTestCase):
+    """Tests for RenewableCert with the sqlite lineage storage."""
+
+    def setUp(self):
+        super(SQLiteRenewableCertTest, self).setUp()
+        self.config.lineage_storage = "sqlite"
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.storage.relevant_values")
+    def test_new_lineage_and_successor(self, mock_rv):
+        mock_rv.side_effect = lambda x: {"authenticator": "webroot"}
+
+        from certbot import storage
+        cert = test_util.load_vector("cert_512.pem")
+        result = storage.RenewableCert.new_lineage(
+            "example.com", cert, b"privkey", b"chain", self.config)
+        # pylint: disable=protected-access
+        self.assertTrue(result._consistent())
+        self.assertFalse(os.path.exists(os.path.join(
+            self.config.renewal_configs_dir, "example.com.conf")))
+        self.assertEqual(storage.renewal_conf_files(self.config), [
+            os.path.join(self.config.renewal_configs_dir, "example.com.conf")])
+        self.assertEqual(storage.renewal_conf_files(self.config, ["example.com"]),
+                         storage.renewal_conf_files(self.config))
+        self.assertEqual(storage.renewal_conf_files(self.config, ["example.org"]), [])
+
+        self.assertEqual(2, result.save_successor(1, cert, None, b"chain2", self.config))
+        reloaded = storage.RenewableCert(
+            storage.renewal_file_for_certname(self.config, "example.com"), self.config)
+        self.assertEqual(reloaded.configuration["renewalparams"]["authenticator"],
+                         "webroot")
+        self.assertEqual(reloaded.latest_common_version(), 2)
+
+        second = storage.RenewableCert.new_lineage(
+            "example.com", cert, b"privkey", b"chain", self.config)
+        self.assertEqual(second.lineagename, "example.com-0001")
+
+        storage.rename_renewal_config("example.com-0001", "renamed", self.config)
+        self.assertRaises(errors.ConfigurationError, storage.rename_renewal_config,
+                          "renamed", "example.com", self.config)
+        with mock.patch("certbot.storage.logger"):
+            storage.delete_files(self.config, "example.com")
+        self.assertEqual(storage.renewal_conf_files(self.config), [
+            os.path.join(self.config.renewal_configs_dir, "renamed.conf")])
+
+
 class DeleteFilesTest(BaseRenewableCertTest):
     """Tests for certbot.storage.delete_files"""
     def setUp(self):
@@ -3,6 +3,7 @@
 .. warning:: This module is not part of the public API.
 
 """
+import atexit
 import os
 import pkg_resources
 import shutil
@@ -29,6 +30,12 @@ from certbot import util
 
 from certbot.display import util as display_util
 
+# Keep the plugins discovery cache of the user untouched by the tests, and
+# by the Certbot processes they run
+_CACHE_HOME = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _CACHE_HOME, True)
+os.environ["XDG_CACHE_HOME"] = _CACHE_HOME
+
 
 def vector_path(*names):
     """Path to a test vector."""
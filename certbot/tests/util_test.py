@@ -1,7 +1,10 @@
 """Tests for certbot.util."""
 import argparse
 import errno
+import functools
 import os
+import sys
+import types
 import unittest
 
 import mock
@@ -109,6 +112,123 @@ class LockDirUntilExit(test_util.TempDirTestCase):
         self.assertEqual(mock_logger.debug.call_count, 0)
 
 
+class LockConfigItemUntilExitTest(test_util.ConfigTestCase):
+    """Tests for the lineage and account locks of certbot.util."""
+
+    def setUp(self):
+        super(LockConfigItemUntilExitTest, self).setUp()
+        # reset global state from other tests
+        import certbot.util
+        reload_module(certbot.util)
+        os.makedirs(self.config.config_dir)
+        self.lineage_lock = os.path.join(self.config.locks_dir, 'lineage-example.org.lock')
+
+    @classmethod
+    def _lock_lineage(cls, config, lineagename):
+        from certbot import util
+        return util.lock_lineage_until_exit(config, lineagename)
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_lineage(self, unused_register):
+        self._lock_lineage(self.config, 'example.org')
+        self._lock_lineage(self.config, 'example.org')
+
+        from certbot import util
+        self.assertEqual(list(util._LOCKS), [self.lineage_lock])  # pylint: disable=protected-access
+        self.assertTrue(os.path.exists(self.lineage_lock))
+        # The config directory is only locked while locking the lineage
+        self.assertFalse(os.path.exists(
+            os.path.join(self.config.config_dir, '.certbot.lock')))
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_account(self, unused_register):
+        from certbot import util
+        util.lock_account_until_exit(self.config, 'abcd')
+        self.assertTrue(os.path.exists(
+            os.path.join(self.config.locks_dir, 'account-abcd.lock')))
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_config_dir_held_by_this_process(self, unused_register):
+        from certbot import util
+        util.lock_dir_until_exit(self.config.config_dir)
+        self._lock_lineage(self.config, 'example.org')
+        self.assertTrue(os.path.exists(self.lineage_lock))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.config.config_dir, '.certbot.lock')))
+
+    @mock.patch('certbot.util.constants.CONFIG_ITEM_LOCK_TIMEOUT', 0)
+    def test_lineage_held_by_other_process(self):
+        os.makedirs(self.config.locks_dir)
+        assert_raises = functools.partial(
+            self.assertRaises, errors.LockError,
+            self._lock_lineage, self.config, 'example.org')
+        test_util.lock_and_call(assert_raises, self.lineage_lock)
+
+    @mock.patch('certbot.util.constants.CONFIG_DIR_LOCK_TIMEOUT', 0)
+    def test_config_dir_held_by_other_process(self):
+        assert_raises = functools.partial(
+            self.assertRaises, errors.LockError,
+            self._lock_lineage, self.config, 'example.org')
+        test_util.lock_and_call(assert_raises, self.config.config_dir)
+        self.assertFalse(os.path.exists(self.lineage_lock))
+
+    @mock.patch('certbot.util.time')
+    @mock.patch('certbot.util.lock.lock_dir')
+    def test_config_dir_lock_retried(self, mock_lock_dir, mock_time):
+        mock_time.time.return_value = 0
+        dir_lock = mock.MagicMock()
+        mock_lock_dir.side_effect = [errors.LockError, dir_lock]
+        with mock.patch('certbot.util.atexit_register'):
+            self._lock_lineage(self.config, 'example.org')
+        self.assertEqual(mock_lock_dir.call_count, 2)
+        self.assertTrue(mock_time.sleep.called)
+        dir_lock.release.assert_called_once_with()
+
+    @mock.patch('certbot.util.time')
+    @mock.patch('certbot.util.lock.LockFile')
+    @mock.patch('certbot.util.lock.lock_dir')
+    def test_lineage_lock_retried(self, mock_lock_dir, mock_lock_file, mock_time):
+        mock_time.time.return_value = 0
+        mock_lock_file.side_effect = [errors.LockError, mock.MagicMock()]
+        with mock.patch('certbot.util.atexit_register'):
+            self._lock_lineage(self.config, 'example.org')
+        self.assertEqual(mock_lock_file.call_count, 2)
+        self.assertTrue(mock_time.sleep.called)
+        # The config directory is released between attempts
+        self.assertEqual(mock_lock_dir.call_count, 2)
+        self.assertEqual(mock_lock_dir.return_value.release.call_count, 2)
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_lineage_released_after_block(self, unused_register):
+        from certbot import util
+        with util.lock_lineage(self.config, 'example.org'):
+            self.assertEqual(list(util._LOCKS),  # pylint: disable=protected-access
+                             [self.lineage_lock])
+            # Holding the lineage until exit inside the block has no effect
+            self._lock_lineage(self.config, 'example.org')
+        self.assertFalse(util._LOCKS)  # pylint: disable=protected-access
+        self.assertFalse(os.path.exists(self.lineage_lock))
+        # Another process can now take the lock
+        test_util.lock_and_call(lambda: None, self.lineage_lock)
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_lineage_held_until_exit_not_released(self, unused_register):
+        from certbot import util
+        self._lock_lineage(self.config, 'example.org')
+        with util.lock_lineage(self.config, 'example.org'):
+            pass
+        self.assertEqual(list(util._LOCKS),  # pylint: disable=protected-access
+                         [self.lineage_lock])
+
+    def test_lineage_released_on_error(self):
+        from certbot import util
+        def _raise():
+            with util.lock_lineage(self.config, 'example.org'):
+                raise ValueError()
+        self.assertRaises(ValueError, _raise)
+        self.assertFalse(util._LOCKS)  # pylint: disable=protected-access
+
+
 class SetUpCoreDirTest(test_util.TempDirTestCase):
     """Tests for certbot.util.make_or_verify_core_dir."""
 
@@ -123,6 +243,11 @@ class SetUpCoreDirTest(test_util.TempDirTestCase):
         self.assertTrue(os.path.exists(new_dir))
         self.assertEqual(mock_lock.call_count, 1)
 
+    @mock.patch('certbot.util.lock_dir_until_exit')
+    def test_unlocked(self, mock_lock):
+        self._call(self.tempdir, 0o700, compat.os_geteuid(), False, locked=False)
+        mock_lock.assert_not_called()
+
     @mock.patch('certbot.util.make_or_verify_dir')
     def test_failure(self, mock_make_or_verify):
         mock_make_or_verify.side_effect = OSError
@@ -324,6 +449,62 @@ class SafelyRemoveTest(test_util.TempDirTestCase):
         self.assertRaises(OSError, self._call)
 
 
+class FsyncDirTest(test_util.TempDirTestCase):
+    """Tests for certbot.util.fsync_dir and certbot.util.batch_fsyncs."""
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.util.os.fsync")
+    def test_immediate(self, mock_fsync):
+        from certbot.util import fsync_dir
+        fsync_dir(self.tempdir)
+        self.assertEqual(mock_fsync.call_count, 1)
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.util.os.fsync")
+    def test_batch(self, mock_fsync):
+        from certbot.util import batch_fsyncs, fsync_dir
+        other_dir = os.path.join(self.tempdir, "other")
+        os.mkdir(other_dir)
+        removed_dir = os.path.join(self.tempdir, "removed")
+        os.mkdir(removed_dir)
+        with batch_fsyncs():
+            fsync_dir(self.tempdir)
+            with batch_fsyncs():
+                fsync_dir(other_dir)
+                fsync_dir(self.tempdir)
+            fsync_dir(removed_dir)
+            os.rmdir(removed_dir)
+            self.assertFalse(mock_fsync.called)
+        self.assertEqual(mock_fsync.call_count, 2)
+        fsync_dir(self.tempdir)
+        self.assertEqual(mock_fsync.call_count, 3)
+
+    @test_util.broken_on_windows
+    @mock.patch("certbot.util.os.fsync")
+    def test_batch_forced(self, mock_fsync):
+        from certbot.util import batch_fsyncs, fsync_dir
+        with batch_fsyncs():
+            fsync_dir(self.tempdir, force=True)
+            self.assertEqual(mock_fsync.call_count, 1)
+        self.assertEqual(mock_fsync.call_count, 1)
+
+
+class AtomicSymlinkTest(test_util.TempDirTestCase):
+    """Tests for certbot.util.atomic_symlink."""
+
+    @test_util.broken_on_windows
+    def test_replace(self):
+        from certbot.util import atomic_symlink
+        link = os.path.join(self.tempdir, "link")
+        atomic_symlink("first", link)
+        self.assertEqual(os.readlink(link), "first")
+        # leftover from an interrupted swap
+        os.symlink("stale", link + ".new")
+        atomic_symlink("second", link)
+        self.assertEqual(os.readlink(link), "second")
+        self.assertFalse(os.path.lexists(link + ".new"))
+
+
 class SafeEmailTest(unittest.TestCase):
     """Test safe_email."""
     @classmethod
@@ -627,5 +808,58 @@ class AtexitRegisterTest(unittest.TestCase):
             atexit_func(*args[1:], **kwargs)  # pylint: disable=star-args
 
 
+class LazyImportTest(unittest.TestCase):
+    """Tests for certbot.util.lazy_import."""
+
+    @classmethod
+    def _call(cls, name):
+        from certbot.util import lazy_import
+        return lazy_import(name)
+
+    def setUp(self):
+        self.name = 'certbot.tests.testdata_lazy_module'
+        self.assertFalse(self.name in sys.modules)
+        self.module = types.ModuleType(self.name)
+        self.module.answer = 42
+
+    def _mock_import(self):
+        def import_module(name):
+            """Import the test module as name."""
+            sys.modules[name] = self.module
+            return self.module
+        return mock.patch('certbot.util.importlib.import_module', side_effect=import_module)
+
+    def tearDown(self):
+        sys.modules.pop(self.name, None)
+
+    def test_already_imported(self):
+        self.assertTrue(self._call('certbot.util') is sys.modules['certbot.util'])
+
+    def test_imported_on_first_use(self):
+        with self._mock_import() as mock_import:
+            lazy = self._call(self.name)
+            self.assertFalse(mock_import.called)
+            self.assertEqual(lazy.answer, 42)
+            self.assertEqual(lazy.answer, 42)
+        mock_import.assert_called_once_with(self.name)
+        self.assertTrue('answer' in dir(lazy))
+        self.assertTrue(self.name in repr(lazy))
+
+    def test_attributes_forwarded(self):
+        with self._mock_import():
+            lazy = self._call(self.name)
+            lazy.question = 'unknown'
+            self.assertEqual(self.module.question, 'unknown')
+            del lazy.answer
+        self.assertFalse(hasattr(self.module, 'answer'))
+
+    def test_patch(self):
+        with self._mock_import():
+            lazy = self._call(self.name)
+            with mock.patch.object(lazy, 'answer', 0):
+                self.assertEqual(self.module.answer, 0)
+        self.assertEqual(self.module.answer, 42)
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
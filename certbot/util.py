@@ -2,10 +2,12 @@
 import argparse
 import atexit
 import collections
+import contextlib
 # distutils.version under virtualenv confuses pylint
 # For more info, see: https://github.com/PyCQA/pylint/issues/73
 import distutils.version  # pylint: disable=import-error,no-name-in-module
 import errno
+import importlib
 import logging
 import os
 import platform
@@ -14,12 +16,16 @@ import six
 import socket
 import subprocess
 import sys
+import time
+import types
 
 from collections import OrderedDict
 
 import configargparse
 
-from acme.magic_typing import Tuple, Union  # pylint: disable=unused-import, no-name-in-module
+# pylint: disable=unused-import, no-name-in-module
+from acme.magic_typing import Optional, Set, Tuple, Union
+# pylint: enable=unused-import, no-name-in-module
 from certbot import compat
 from certbot import constants
 from certbot import errors
@@ -56,6 +62,9 @@ _INITIAL_PID = os.getpid()
 # program exits before the lock is cleaned up, it is automatically
 # released, but the file isn't deleted.
 _LOCKS = OrderedDict() # type: OrderedDict[str, lock.LockFile]
+# Directories whose entries must be flushed to disk at the end of the
+# current batch_fsyncs() block, or None when no batch is in progress.
+_DEFERRED_DIR_SYNCS = None  # type: Optional[Set[str]]
 
 
 def run_script(params, log=logger.error):
@@ -127,12 +136,187 @@ def lock_dir_until_exit(dir_path):
 
     :raises errors.LockError: if the lock is held by another process
 
+    """
+    _lock_until_exit(dir_path, lambda: lock.lock_dir(dir_path))
+
+
+def lock_lineage_until_exit(config, lineagename):
+    """Lock a single certificate lineage until program exit.
+
+    Other Certbot processes can keep working on other lineages. See
+    `lock_config_item_until_exit` for how this interacts with the lock
+    of the whole configuration directory.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str lineagename: name of the lineage
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    lock_config_item_until_exit(config, "lineage-" + lineagename)
+
+
+def lock_lineage(config, lineagename):
+    """Lock a single certificate lineage for the duration of a with block.
+
+    See `lock_config_item`.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str lineagename: name of the lineage
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    return lock_config_item(config, "lineage-" + lineagename)
+
+
+def lock_account_until_exit(config, account_id):
+    """Lock a single ACME account until program exit.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str account_id: ID of the account
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    lock_config_item_until_exit(config, "account-" + account_id)
+
+
+def lock_config_item_until_exit(config, name):
+    """Lock a single item of the configuration directory until program exit.
+
+    Operations spanning several lineages or accounts lock the whole
+    ``config.config_dir`` with `lock_dir_until_exit` for their duration,
+    and then lock every item they modify. To lock a single item, the
+    configuration directory lock is taken for as long as it takes to
+    lock the item, unless this process already holds it. This way, no
+    item lock can be taken while another process holds the lock of the
+    whole directory, and that process cannot modify an item locked by
+    another process. An item locked by another process is waited for up
+    to `constants.CONFIG_ITEM_LOCK_TIMEOUT` seconds.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str name: name of the item, used for its lock file
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    lock_path = os.path.join(config.locks_dir, name + ".lock")
+    _lock_until_exit(lock_path, lambda: _lock_config_item(config, lock_path))
+
+
+@contextlib.contextmanager
+def lock_config_item(config, name):
+    """Lock a single item of the configuration directory in a with block.
+
+    The lock is taken as described in `lock_config_item_until_exit`, and
+    released at the end of the block, unless this process already held it
+    before. Requests to hold it until exit made inside the block have no
+    effect.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str name: name of the item, used for its lock file
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    lock_path = os.path.join(config.locks_dir, name + ".lock")
+    if lock_path in _LOCKS:
+        yield
+        return
+    # The lock is registered in _LOCKS while the block runs, so that it is
+    # not taken again by this process meanwhile
+    _lock_until_exit(lock_path, lambda: _lock_config_item(config, lock_path))
+    try:
+        yield
+    finally:
+        _LOCKS[lock_path].release()
+        del _LOCKS[lock_path]
+
+
+def _lock_config_item(config, lock_path):
+    """Lock the file of an item of the configuration directory.
+
+    If another process holds the item, the lock is retried for up to
+    `constants.CONFIG_ITEM_LOCK_TIMEOUT` seconds. The configuration
+    directory lock is not held between the attempts.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+    :param str lock_path: path to the lock file of the item
+
+    :returns: the locked LockFile object
+    :rtype: lock.LockFile
+
+    :raises errors.LockError: if the lock is still held by another
+        process after the timeout
+
+    """
+    make_or_verify_dir(config.locks_dir, constants.CONFIG_DIRS_MODE,
+                       compat.os_geteuid(), config.strict_permissions)
+    deadline = time.time() + constants.CONFIG_ITEM_LOCK_TIMEOUT
+    while True:
+        if config.config_dir in _LOCKS:
+            dir_lock = None
+        else:
+            dir_lock = _wait_for_dir_lock(config.config_dir,
+                                          constants.CONFIG_DIR_LOCK_TIMEOUT)
+        try:
+            return lock.LockFile(lock_path)
+        except errors.LockError:
+            if time.time() >= deadline:
+                raise
+        finally:
+            if dir_lock is not None:
+                dir_lock.release()
+        time.sleep(0.1)
+
+
+def _wait_for_dir_lock(dir_path, timeout):
+    """Lock the directory at dir_path, retrying for up to timeout seconds.
+
+    :param str dir_path: path to directory
+    :param float timeout: number of seconds to wait for the lock
+
+    :returns: the locked LockFile object
+    :rtype: lock.LockFile
+
+    :raises errors.LockError: if the lock is still held by another
+        process after timeout seconds
+
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return lock.lock_dir(dir_path)
+        except errors.LockError:
+            if time.time() >= deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _lock_until_exit(key, acquire):
+    """Acquire a lock with acquire, unless key is already locked.
+
+    :param str key: path identifying the lock
+    :param callable acquire: function returning a locked `lock.LockFile`
+
     """
     if not _LOCKS:  # this is the first lock to be released at exit
         atexit_register(_release_locks)
 
-    if dir_path not in _LOCKS:
-        _LOCKS[dir_path] = lock.lock_dir(dir_path)
+    if key not in _LOCKS:
+        _LOCKS[key] = acquire()
 
 
 def _release_locks():
@@ -144,13 +328,14 @@ def _release_locks():
             logger.debug(msg, exc_info=True)
 
 
-def set_up_core_dir(directory, mode, uid, strict):
+def set_up_core_dir(directory, mode, uid, strict, locked=True):
     """Ensure directory exists with proper permissions and is locked.
 
     :param str directory: Path to a directory.
     :param int mode: Directory mode.
     :param int uid: Directory owner.
     :param bool strict: require directory to be owned by current user
+    :param bool locked: whether to lock the directory until program exit
 
     :raises .errors.LockError: if the directory cannot be locked
     :raises .errors.Error: if the directory cannot be made or verified
@@ -158,7 +343,8 @@ def set_up_core_dir(directory, mode, uid, strict):
     """
     try:
         make_or_verify_dir(directory, mode, uid, strict)
-        lock_dir_until_exit(directory)
+        if locked:
+            lock_dir_until_exit(directory)
     except OSError as error:
         logger.debug("Exception was:", exc_info=True)
         raise errors.Error(PERM_ERR_FMT.format(error))
@@ -295,6 +481,83 @@ def safely_remove(path):
             raise
 
 
+def fsync_dir(directory, force=False):
+    """Flush the entries of a directory (renames, new files) to disk.
+
+    Within a :func:`batch_fsyncs` block, the flush is deferred until the
+    end of the block so that a directory shared by several writes is
+    only flushed once, unless `force` is set. This is a no-op on systems
+    which can't open directories, such as Windows.
+
+    :param str directory: path to the directory
+    :param bool force: flush the directory now, even within a
+        :func:`batch_fsyncs` block. This is needed when later writes
+        must not reach the disk before the entries of the directory.
+
+    """
+    if _DEFERRED_DIR_SYNCS is not None and not force:
+        _DEFERRED_DIR_SYNCS.add(os.path.abspath(directory))
+        return
+    if not hasattr(os, "O_DIRECTORY"):  # pragma: no cover
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def batch_fsyncs():
+    """Group the directory flushes of the enclosed writes.
+
+    File contents are still flushed before they are renamed into place,
+    but each directory touched inside the block is flushed only once,
+    when the block exits, except for the flushes forced by the callers.
+    Nested blocks join the outermost one.
+
+    """
+    global _DEFERRED_DIR_SYNCS  # pylint: disable=global-statement
+    if _DEFERRED_DIR_SYNCS is not None:
+        yield
+        return
+    _DEFERRED_DIR_SYNCS = set()
+    try:
+        yield
+    finally:
+        directories, _DEFERRED_DIR_SYNCS = _DEFERRED_DIR_SYNCS, None
+        for directory in sorted(directories):
+            if os.path.isdir(directory):
+                fsync_dir(directory)
+
+
+def fsync_file(file_obj):
+    """Flush the contents of an open file to disk.
+
+    :param file_obj: file object opened for writing
+
+    """
+    file_obj.flush()
+    os.fsync(file_obj.fileno())
+
+
+def atomic_symlink(target, link):
+    """Create or replace the symlink link, pointing at target, atomically.
+
+    The new link is created next to link and renamed over it, so link
+    always exists and points to either the old or the new target.
+
+    :param str target: target of the symlink
+    :param str link: path to the symlink
+
+    """
+    temp_link = link + ".new"
+    if os.path.lexists(temp_link):
+        os.unlink(temp_link)
+    os.symlink(target, temp_link)
+    compat.os_rename(temp_link, link)
+
+
 def get_filtered_names(all_names):
     """Removes names that aren't considered valid by Let's Encrypt.
 
@@ -663,3 +926,50 @@ def atexit_register(func, *args, **kwargs):
 def _atexit_call(func, *args, **kwargs):
     if _INITIAL_PID == os.getpid():
         func(*args, **kwargs)
+
+
+def lazy_import(name):
+    """Return the module called name, importing it on first use.
+
+    Modules that are only needed by some commands are imported this
+    way to keep Certbot's startup time low. The returned object forwards
+    attribute reads, writes and deletions to the actual module, so it can
+    be used (and patched in tests) like the module itself.
+
+    :param str name: absolute name of the module
+
+    :returns: the module if it is already imported, otherwise a proxy
+        importing it on first use
+    :rtype: types.ModuleType
+
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return _LazyModule(name)
+
+
+class _LazyModule(types.ModuleType):
+    """Proxy for a module that is imported on first attribute access."""
+
+    def _load(self):
+        module = self.__dict__.get("_module")
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return "<lazily imported module {0!r}>".format(self.__name__)
@@ -0,0 +1,84 @@
+"""Compare the throughput of the Nginx configuration parsers.
+
+Usage: python tests/nginx_parser_benchmark.py [SERVER_BLOCKS]
+
+A configuration with SERVER_BLOCKS server blocks (default: 2000, about
+50,000 lines) is generated and parsed with both the pyparsing based
+parser and the native parser of the Nginx plugin. The time taken by
+`certbot_nginx.nginxparser.loads`, which also builds an UnspacedList
+from the parsed tree, is reported as well.
+
+"""
+from __future__ import print_function
+
+import sys
+import timeit
+
+from certbot_nginx import nginxparser
+
+SERVER_BLOCK = """
+# Virtual host number {0}
+server {{
+    listen 80;
+    listen [::]:80;
+    server_name www{0}.example.org example{0}.org;
+    root /var/www/example{0};
+    index index.html index.htm;
+    access_log /var/log/nginx/example{0}.access.log;
+
+    location / {{
+        try_files $uri $uri/ =404;
+    }}
+
+    location ~ \\.php$ {{
+        include fastcgi_params;
+        fastcgi_pass unix:/run/php/php-fpm.sock;
+        fastcgi_param SCRIPT_FILENAME $document_root$fastcgi_script_name;
+    }}
+
+    location ~* \\.(?:gif|jpe?g|png)$ {{
+        add_header Cache-Control 'public, must-revalidate';
+        expires 30d;
+    }}
+}}
+"""
+
+
+def generate_config(server_blocks):
+    """Generate an Nginx configuration.
+
+    :param int server_blocks: number of server blocks
+
+    :rtype: str
+
+    """
+    servers = "".join(SERVER_BLOCK.format(i) for i in range(server_blocks))
+    return "user www-data;\nhttp {{{0}}}\n".format(servers)
+
+
+def benchmark(func, repeat=3):
+    """Best time to run func, in seconds."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(argv):
+    """Run the benchmark."""
+    server_blocks = int(argv[1]) if len(argv) > 1 else 2000
+    source = generate_config(server_blocks)
+    lines = source.count("\n")
+    print("Parsing {0} lines ({1} bytes)".format(lines, len(source)))
+    parsers = (("pyparsing", lambda: nginxparser.RawNginxParser(source).as_list(), False),
+               ("native", lambda: nginxparser.NativeNginxParser(source).as_list(), True))
+    assert all(nginxparser.loads(source, native) == nginxparser.loads(source)
+               for _, _, native in parsers)
+    for name, parse_source, native in parsers:
+        # pylint: disable=cell-var-from-loop
+        parse = benchmark(parse_source)
+        load = benchmark(lambda: nginxparser.loads(source, native))
+        print("{0:>10}: parse {1:.3f}s ({2:.0f} lines/s), "
+              "loads {3:.3f}s ({4:.0f} lines/s)".format(
+                  name, parse, lines / parse, load, lines / load))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
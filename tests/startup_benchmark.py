@@ -0,0 +1,71 @@
+"""Measure how long Certbot takes to start.
+
+Usage: python tests/startup_benchmark.py [REPEAT]
+
+The wall time of importing `certbot.main` and of running
+`certbot --version` is measured in fresh interpreters, and the best of
+REPEAT runs (default: 5) is reported. On Python 3.7+, the modules taking
+the longest to import, as reported by `python -X importtime`, are listed
+as well.
+
+"""
+from __future__ import print_function
+
+import subprocess
+import sys
+import timeit
+
+IMPORT_SCRIPT = "import certbot.main"
+VERSION_SCRIPT = """
+import sys
+from certbot.main import main
+sys.exit(main(['--version']))
+"""
+
+
+def benchmark(args, repeat):
+    """Best wall time to run a command, in seconds."""
+    def _run():
+        subprocess.check_call(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return min(timeit.repeat(_run, number=1, repeat=repeat))
+
+
+def slowest_imports(count=15):
+    """Modules taking the longest to import, with their cumulative time.
+
+    :param int count: number of modules to return
+
+    :returns: `list` of `tuple` of the time in seconds and module name
+    :rtype: list
+
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT],
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main(argv):
+    """Run the benchmark."""
+    repeat = int(argv[1]) if len(argv) > 1 else 5
+    baseline = benchmark([sys.executable, "-c", "pass"], repeat)
+    print("{0:>22}: {1:.3f}s".format("python startup", baseline))
+    for name, script in (("import certbot.main", IMPORT_SCRIPT),
+                         ("certbot --version", VERSION_SCRIPT)):
+        duration = benchmark([sys.executable, "-c", script], repeat)
+        print("{0:>22}: {1:.3f}s ({2:.3f}s over python startup)".format(
+            name, duration, duration - baseline))
+    if sys.version_info >= (3, 7):
+        print("\nSlowest imports of certbot.main (cumulative):")
+        for duration, module in slowest_imports():
+            print("{0:8.3f}s  {1}".format(duration, module))
+
+
+if __name__ == "__main__":
+    main(sys.argv)